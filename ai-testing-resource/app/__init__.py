@@ -89,6 +89,24 @@ def create_app(testing=False):
     def health_check():
         return jsonify({'status': 'healthy', 'service': 'ai-testing-resource'}), 200
 
+    # Readiness: 503 until startup warmup has loaded the model, index,
+    # tokenizer and Anthropic client (see app/warmup.py). The ALB target
+    # group checks this route; /health above is the container liveness check
+    ready_route = '/ready'
+    prefixed_ready = f"{url_prefix}/ready" if url_prefix else '/ready'
+
+    @app.route(ready_route)
+    @app.route(prefixed_ready)
+    def readiness_check():
+        from config import WARMUP_ENABLED
+        from .warmup import READY, readiness
+
+        if not WARMUP_ENABLED:
+            return jsonify({'status': READY, 'service': 'ai-testing-resource', 'warmup': 'disabled'}), 200
+        report = readiness.snapshot()
+        report['service'] = 'ai-testing-resource'
+        return jsonify(report), 200 if report['status'] == READY else 503
+
     # Setup lazy database session initialization
     setup_database_session(app)
 
@@ -1,18 +1,62 @@
 """AI Service with three versions demonstrating iteration"""
 
+import contextlib
+import copy
+import functools
+import hashlib
 import logging
 import os
 import time
-from typing import Optional
+from typing import Iterator
 import anthropic
 
-from .utils import count_tokens, format_response, convert_markdown_to_html
-from .rag import get_relevant_docs
+from config import (
+    CONCURRENCY_INITIAL,
+    CONCURRENCY_MAX,
+    CONCURRENCY_MIN,
+    EMBEDDING_BACKEND,
+    MAX_PROMPT_TOKENS,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_MAX_WAIT_SECONDS,
+    RATE_LIMIT_REQUESTS_PER_MINUTE,
+    RATE_LIMIT_TOKENS_PER_MINUTE,
+    RERANK_BUDGET_MS,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RETRIEVAL_MAX_DISTANCE,
+    RETRIEVAL_MAX_DISTANCE_BY_CATEGORY,
+    RETRIEVAL_MODE,
+    RETRIEVAL_SHORT_CIRCUIT_ENABLED,
+    ROUTER_MAX_PARTITIONS,
+    ROUTER_MIN_MARGIN,
+    ROUTING_ENABLED,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_BYTES,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_WAIT_SECONDS,
+)
+from .utils import convert_markdown_to_html, sanitize_input
+from .confidence import ConfidenceGate, parse_category_thresholds
+from .context_packer import estimate_tokens, pack_context
+from .rag import (COLLECTION_NAME, EMBEDDING_MODEL, active_generation, category_centroids, embed_query,
+                  embedding_store_snapshot, get_relevant_chunks, merge_ranked, query_embedding_cache)
+from .pipeline import AnswerState, FunctionStage, Pipeline, Span, Stage, StreamingStage
+from .query_router import QueryRouter
+from .rerank import LexicalReranker
+from .semantic_cache import SemanticCache
+from .singleflight import SingleFlight
+from .ratelimit import (
+    ConcurrencyGovernor, Permit, RateLimiter, RateLimitExceeded, ERROR, SUCCESS, THROTTLED
+)
 
 logger = logging.getLogger(__name__)
 
-# Initialize Anthropic client
+# Initialize Anthropic clients
 client = None
+async_client = None
 
 
 class AIServiceError(Exception):
@@ -42,70 +86,141 @@ def get_client():
     return client
 
 
+def get_async_client():
+    """Get or create the AsyncAnthropic client used by the ask_async family"""
+    global async_client
+    if async_client is None:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            logger.error("ANTHROPIC_API_KEY not configured")
+            raise AIServiceError("AI service is not configured. Please try again later.")
+        try:
+            async_client = anthropic.AsyncAnthropic(api_key=api_key)
+        except Exception as e:
+            logger.error(f"Failed to initialize async Anthropic client: {e}")
+            raise AIServiceError("AI service initialization failed.")
+    return async_client
+
+
+def _api_error(e: Exception) -> AIServiceError:
+    """Translate an Anthropic SDK exception into a user-friendly AIServiceError"""
+    if isinstance(e, AIServiceError):
+        return e
+    if isinstance(e, anthropic.APIConnectionError):
+        logger.error(f"API connection error: {e}")
+        return AIServiceError("Unable to connect to AI service. Please try again.", e)
+    if isinstance(e, anthropic.RateLimitError):
+        logger.error(f"Rate limit: {e}")
+        return AIServiceError(BUSY_MESSAGE, e)
+    if isinstance(e, anthropic.APIStatusError):
+        logger.error(f"API error: {e}")
+        return AIServiceError("AI service encountered an error.", e)
+    logger.error(f"Unexpected error: {e}")
+    return AIServiceError("An unexpected error occurred.", e)
+
+
 # ============================================
-# V1: VERBOSE PROMPT (will produce too-long responses)
+# RATE LIMITING
 # ============================================
-V1_SYSTEM_PROMPT = """You are a helpful customer support agent for Acme Widgets Inc.
+# Every model call holds a permit: request/token buckets queue short waits,
+# and the AIMD governor narrows concurrency when the API starts answering 429
+rate_limiter = RateLimiter(
+    requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE,
+    tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE,
+    max_wait_seconds=RATE_LIMIT_MAX_WAIT_SECONDS,
+    governor=ConcurrencyGovernor(
+        initial=CONCURRENCY_INITIAL,
+        minimum=CONCURRENCY_MIN,
+        maximum=CONCURRENCY_MAX,
+    ),
+)
+
+BUSY_MESSAGE = "AI service is busy. Please try again in a moment."
+
+
+def _estimate_tokens(system, question: str, max_tokens: int) -> int:
+    """Rough request cost (~4 chars per token); settled against real usage after the call"""
+    if isinstance(system, list):
+        system = ''.join(block.get('text', '') for block in system)
+    return (len(system) + len(question)) // 4 + max_tokens
+
+
+def _billed_tokens(usage) -> int:
+    """Tokens a response counts against the per-minute budget"""
+    return (usage.input_tokens + usage.output_tokens
+            + (getattr(usage, 'cache_creation_input_tokens', None) or 0))
+
+
+def _call_outcome(e: BaseException):
+    """Classify a failed call for the governor: (outcome, retry_after seconds)"""
+    # 429 is the rate limit; 529 (overloaded) is the same signal at API scope
+    if isinstance(e, anthropic.RateLimitError) or getattr(e, 'status_code', None) == 529:
+        retry_after = None
+        response = getattr(e, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+        return THROTTLED, retry_after
+    return ERROR, None
+
+
+def _busy(e: RateLimitExceeded) -> AIServiceError:
+    logger.warning(f"Rate limiter refused call: {e}")
+    return AIServiceError(BUSY_MESSAGE, e)
+
+
+@contextlib.contextmanager
+def _rate_limited(system, question: str, max_tokens: int):
+    """Hold a rate-limiter permit for the duration of one model call"""
+    if not RATE_LIMIT_ENABLED:
+        yield Permit(cost=0)
+        return
 
-Provide comprehensive, detailed answers of at least 300 words. Be thorough and cover
-all aspects of the customer's question. Include relevant background information and
-context to ensure the customer fully understands the topic.
+    try:
+        permit = rate_limiter.acquire(_estimate_tokens(system, question, max_tokens))
+    except RateLimitExceeded as e:
+        raise _busy(e)
 
-Always maintain a professional and friendly tone."""
+    try:
+        yield permit
+    except BaseException as e:
+        rate_limiter.release(permit, *_call_outcome(e))
+        raise
+    rate_limiter.release(permit, SUCCESS)
 
 
-def ask_v1(question: str) -> dict:
-    """
-    Version 1: Verbose responses.
-    Problem: Prompt specifies 300+ words when users want ~80 words.
-    """
-    start_time = time.time()
+@contextlib.asynccontextmanager
+async def _rate_limited_async(system, question: str, max_tokens: int):
+    """Async _rate_limited: queued callers wait on the event loop"""
+    if not RATE_LIMIT_ENABLED:
+        yield Permit(cost=0)
+        return
 
     try:
-        response = get_client().messages.create(
-            model=DEFAULT_MODEL,
-            max_tokens=1024,
-            system=V1_SYSTEM_PROMPT,
-            messages=[
-                {"role": "user", "content": question}
-            ]
-        )
-    except AIServiceError:
+        permit = await rate_limiter.acquire_async(_estimate_tokens(system, question, max_tokens))
+    except RateLimitExceeded as e:
+        raise _busy(e)
+
+    try:
+        yield permit
+    except BaseException as e:
+        rate_limiter.release(permit, *_call_outcome(e))
         raise
-    except anthropic.APIConnectionError as e:
-        logger.error(f"API connection error: {e}")
-        raise AIServiceError("Unable to connect to AI service. Please try again.")
-    except anthropic.RateLimitError as e:
-        logger.error(f"Rate limit: {e}")
-        raise AIServiceError("AI service is busy. Please try again in a moment.")
-    except anthropic.APIStatusError as e:
-        logger.error(f"API error: {e}")
-        raise AIServiceError("AI service encountered an error.")
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise AIServiceError("An unexpected error occurred.")
+    rate_limiter.release(permit, SUCCESS)
 
-    latency_ms = int((time.time() - start_time) * 1000)
 
-    # Convert markdown to HTML for proper rendering
-    html_text = convert_markdown_to_html(response.content[0].text)
+# ============================================
+# V1: VERBOSE PROMPT (will produce too-long responses)
+# ============================================
+V1_SYSTEM_PROMPT = """You are a helpful customer support agent for Acme Widgets Inc.
 
-    # V1 does not use knowledge base
-    trace = {
-        'version': 'v1',
-        'not_in_use': True,
-        'reason': 'V1 does not use knowledge base retrieval'
-    }
+Provide comprehensive, detailed answers of at least 300 words. Be thorough and cover
+all aspects of the customer's question. Include relevant background information and
+context to ensure the customer fully understands the topic.
 
-    return format_response(
-        text=html_text,
-        latency_ms=latency_ms,
-        tokens={
-            'prompt': response.usage.input_tokens,
-            'completion': response.usage.output_tokens
-        },
-        trace=trace
-    )
+Always maintain a professional and friendly tone."""
 
 
 # ============================================
@@ -119,64 +234,14 @@ You have knowledge of Acme's products, pricing, return policies, and shipping op
 Answer questions confidently based on your knowledge of the company."""
 
 
-def ask_v2(question: str) -> dict:
-    """
-    Version 2: Concise but potentially inaccurate.
-    Problem: No access to actual company data, will hallucinate specifics.
-    """
-    start_time = time.time()
-
-    try:
-        response = get_client().messages.create(
-            model=DEFAULT_MODEL,
-            max_tokens=512,
-            system=V2_SYSTEM_PROMPT,
-            messages=[
-                {"role": "user", "content": question}
-            ]
-        )
-    except AIServiceError:
-        raise
-    except anthropic.APIConnectionError as e:
-        logger.error(f"API connection error: {e}")
-        raise AIServiceError("Unable to connect to AI service. Please try again.")
-    except anthropic.RateLimitError as e:
-        logger.error(f"Rate limit: {e}")
-        raise AIServiceError("AI service is busy. Please try again in a moment.")
-    except anthropic.APIStatusError as e:
-        logger.error(f"API error: {e}")
-        raise AIServiceError("AI service encountered an error.")
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise AIServiceError("An unexpected error occurred.")
-
-    latency_ms = int((time.time() - start_time) * 1000)
-
-    # Convert markdown to HTML for proper rendering
-    html_text = convert_markdown_to_html(response.content[0].text)
-
-    # V2 does not use knowledge base
-    trace = {
-        'version': 'v2',
-        'not_in_use': True,
-        'reason': 'V2 does not use knowledge base retrieval'
-    }
-
-    return format_response(
-        text=html_text,
-        latency_ms=latency_ms,
-        tokens={
-            'prompt': response.usage.input_tokens,
-            'completion': response.usage.output_tokens
-        },
-        trace=trace
-    )
-
-
 # ============================================
 # V3: RAG WITH CHROMA (accurate, grounded)
 # ============================================
-V3_SYSTEM_PROMPT = """You are a helpful customer support agent for Acme Widgets Inc.
+# What V3 says when the knowledge base has nothing relevant
+V3_FALLBACK_ANSWER = ("I don't have specific information about that, "
+                      "but I can help you contact our support team.")
+
+V3_SYSTEM_PREAMBLE = """You are a helpful customer support agent for Acme Widgets Inc.
 
 Provide concise answers of approximately 80 words. Be direct and helpful.
 
@@ -188,64 +253,160 @@ Use ONLY the information provided in the context below to answer questions.
 If the context doesn't contain relevant information, say "I don't have specific
 information about that, but I can help you contact our support team."
 
-Context:
-{context}"""
+Context:"""
+
+# Full prompt as a single string (rendered in traces)
+V3_SYSTEM_PROMPT = V3_SYSTEM_PREAMBLE + "\n{context}"
+
+V3_NO_CONTEXT = "No relevant information found."
+
+V3_N_RESULTS = 3  # Chunks retrieved per question, merged per document
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Headroom for message framing and tokenizer differences (tiktoken vs. Claude)
+PROMPT_OVERHEAD_TOKENS = 50
 
+# Anthropic accepts at most 4 cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
 
-def ask_v3(question: str) -> dict:
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+# Changes whenever the V3 prompt changes, so cached answers never outlive it
+V3_PROMPT_VERSION = _prompt_hash(V3_SYSTEM_PROMPT)
+
+# Skips the model call when no retrieved doc is close enough to answer from
+confidence_gate = ConfidenceGate(
+    max_distance=RETRIEVAL_MAX_DISTANCE,
+    by_category=parse_category_thresholds(RETRIEVAL_MAX_DISTANCE_BY_CATEGORY),
+)
+
+# Predicts which knowledge base categories a V3 question needs
+query_router = QueryRouter(min_margin=ROUTER_MIN_MARGIN, max_partitions=ROUTER_MAX_PARTITIONS)
+
+# Reorders V3's retrieval candidates by exact matches within a time budget
+reranker = LexicalReranker(budget_ms=RERANK_BUDGET_MS)
+
+# Process-wide semantic response cache for V3
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    max_bytes=SEMANTIC_CACHE_MAX_BYTES,
+)
+
+# Concurrent identical requests wait on one in-flight computation
+inflight = SingleFlight(wait_timeout=SINGLE_FLIGHT_WAIT_SECONDS)
+
+# Part of the single-flight key, so requests under different prompts never share an answer
+PROMPT_HASHES = {
+    'v1': _prompt_hash(V1_SYSTEM_PROMPT),
+    'v2': _prompt_hash(V2_SYSTEM_PROMPT),
+    'v3': V3_PROMPT_VERSION,
+}
+
+
+def _flight_key(question: str, version: str) -> tuple:
+    """Requests coalesce when question (normalized), version, model and prompt all match"""
+    normalized = sanitize_input(question).casefold()
+    return (normalized, version, DEFAULT_MODEL, PROMPT_HASHES[version])
+
+
+def _shared_result(result: dict) -> dict:
+    """Give each coalesced caller its own copy, flagged as coalesced"""
+    shared = copy.deepcopy(result)
+    shared['metadata']['coalesced'] = True
+    return shared
+
+
+def _format_doc(doc: dict) -> str:
+    return f"[{doc['title']}]\n{doc['content']}"
+
+
+def _stable_doc_order(docs: list) -> list:
+    """Order docs by ID so the same set of docs always yields the same prompt prefix"""
+    return sorted(docs, key=lambda doc: doc['id'])
+
+
+def _build_v3_system_blocks(docs: list) -> list:
     """
-    Version 3: RAG-powered accurate responses.
-    Solution: Retrieves relevant docs from Chroma, grounds response in facts.
+    Split the V3 system prompt into blocks with prompt-cache breakpoints.
+
+    The instruction preamble never changes, so it is the first block and the
+    first breakpoint. Each retrieved document follows as its own block in
+    stable ID order: questions that retrieve the same documents, in any
+    relevance order, send an identical prefix. The remaining breakpoints go on
+    the last document blocks; the final one covers the whole system prompt.
+    (Prefixes shorter than the model's minimum cacheable length are simply
+    not cached.)
     """
-    start_time = time.time()
+    blocks = [{'type': 'text', 'text': V3_SYSTEM_PREAMBLE, 'cache_control': {'type': 'ephemeral'}}]
 
-    # Retrieve relevant documents
-    docs = get_relevant_docs(question, n_results=3)
+    doc_blocks = [{'type': 'text', 'text': _format_doc(doc)} for doc in _stable_doc_order(docs)]
+    for block in doc_blocks[-(MAX_CACHE_BREAKPOINTS - 1):]:
+        block['cache_control'] = {'type': 'ephemeral'}
 
-    # Build context from retrieved docs
-    context_parts = []
-    sources = []
-    for doc in docs:
-        context_parts.append(f"[{doc['title']}]\n{doc['content']}")
-        sources.append({'id': doc['id'], 'title': doc['title']})
+    return blocks + (doc_blocks or [{'type': 'text', 'text': V3_NO_CONTEXT}])
 
-    context = "\n\n---\n\n".join(context_parts) if context_parts else "No relevant information found."
 
-    system_prompt = V3_SYSTEM_PROMPT.format(context=context)
+def _usage_tokens(usage) -> dict:
+    """
+    Token counts from response.usage.
+
+    input_tokens excludes prompt-cache reads and writes, so 'prompt' adds them
+    back to stay comparable with uncached requests.
+    """
+    cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+    cache_creation = getattr(usage, 'cache_creation_input_tokens', None) or 0
+    return {
+        'prompt': usage.input_tokens + cache_read + cache_creation,
+        'completion': usage.output_tokens,
+        'cache_read': cache_read,
+        'cache_creation': cache_creation
+    }
 
-    try:
-        response = get_client().messages.create(
-            model=DEFAULT_MODEL,
-            max_tokens=512,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": question}
-            ]
-        )
-    except AIServiceError:
-        raise
-    except anthropic.APIConnectionError as e:
-        logger.error(f"API connection error: {e}")
-        raise AIServiceError("Unable to connect to AI service. Please try again.")
-    except anthropic.RateLimitError as e:
-        logger.error(f"Rate limit: {e}")
-        raise AIServiceError("AI service is busy. Please try again in a moment.")
-    except anthropic.APIStatusError as e:
-        logger.error(f"API error: {e}")
-        raise AIServiceError("AI service encountered an error.")
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise AIServiceError("An unexpected error occurred.")
 
-    latency_ms = int((time.time() - start_time) * 1000)
+def _prompt_cache_trace(system_blocks: list, tokens: dict) -> dict:
+    """Summarize system blocks and prompt-cache usage for the trace"""
+    return {
+        'blocks': [
+            {
+                'chars': len(block['text']),
+                'cache_breakpoint': 'cache_control' in block
+            }
+            for block in system_blocks
+        ],
+        'cache_read_input_tokens': tokens.get('cache_read', 0),
+        'cache_creation_input_tokens': tokens.get('cache_creation', 0)
+    }
 
-    # Convert markdown to HTML for proper rendering
-    html_text = convert_markdown_to_html(response.content[0].text)
 
-    # V3 full pipeline trace
+def _v3_cache_key(docs: list, kb_generation: str = None) -> tuple:
+    """
+    Exact part of the cache key: prompt version, model, knowledge base
+    generation (a reload may change a doc's text but not its ID) and
+    grounding docs (as packed)
+    """
+    return ('v3', V3_PROMPT_VERSION, DEFAULT_MODEL, kb_generation,
+            tuple((doc['id'], tuple(doc.get('chunks', ())), doc.get('truncated', False)) for doc in docs))
+
+
+def _routing_trace(route) -> dict:
+    """The router's decision for the trace, with the process-wide fallback rate so far"""
+    if route is None:
+        return None
+    return {**route.to_dict(), 'fallback_rate': query_router.snapshot()['fallback_rate']}
+
+
+def _build_v3_trace(question: str, docs: list, context: str, system_prompt: str,
+                    packing: dict = None, kb_generation: str = None, routing: dict = None) -> dict:
+    """Build the knowledge base pipeline trace shown in the demo trace panel"""
     trace = {
         'version': 'v3',
         'query': question,
+        'kb_generation': kb_generation,
         'retrieved_docs': [
             {
                 'title': doc['title'],
@@ -258,26 +419,358 @@ def ask_v3(question: str) -> dict:
         'system_prompt': system_prompt,
         'user_message': question
     }
+    if packing is not None:
+        trace['context_packing'] = packing
+    if routing is not None:
+        trace['routing'] = routing
+    return trace
+
+
+def _preview(text: str, limit: int = 100) -> str:
+    return text[:limit] + '...' if len(text) > limit else text
+
+
+# ============================================
+# PIPELINE STAGES
+# ============================================
+# Each version is a list of stages; every stage fills in its span's
+# input/output with sizes and previews so traces show where time goes.
+def _embed_stage(state: AnswerState, span: Span):
+    """Embed the question (skipped when a precomputed embedding was passed in)"""
+    span.input = {'text': state.question}
+    span.metadata = {'model': EMBEDDING_MODEL, 'backend': EMBEDDING_BACKEND}
+    if state.embedding is None:
+        state.embedding = embed_query(state.question)
+    else:
+        span.metadata['precomputed'] = True
+    span.output = {'dimensions': len(state.embedding)}
+
+
+def _route_stage(state: AnswerState, span: Span):
+    """Predict the categories to search from keywords and the question embedding"""
+    span.metadata = {'enabled': ROUTING_ENABLED}
+    if not ROUTING_ENABLED:
+        return
+    # Centroids of the active generation; the categories are the same if a
+    # reload swaps it before retrieval pins one
+    state.route = query_router.route(state.question, state.embedding, category_centroids())
+    span.input = {'text': state.question}
+    span.output = state.route.to_dict()
+
+
+def _retrieve_stage(state: AnswerState, span: Span):
+    timings = {}
+    # Pinned for the whole answer, so a reload mid-request cannot mix generations
+    generation = active_generation()
+    state.kb_generation = generation.id
+    categories = state.route.categories if state.route is not None else []
+    # A wider candidate set when the rerank stage will pick from it
+    n_results = max(V3_N_RESULTS, RERANK_CANDIDATES) if RERANK_ENABLED else V3_N_RESULTS
+    state.chunks = get_relevant_chunks(state.question, n_results=n_results, query_embedding=state.embedding,
+                                       mode=RETRIEVAL_MODE, timings=timings, generation=generation,
+                                       categories=categories or None)
+    state.docs = merge_ranked(state.chunks[:V3_N_RESULTS])
+    span.input = {'embedding_dim': len(state.embedding), 'n_results': n_results, 'mode': RETRIEVAL_MODE,
+                  'categories': categories or 'all'}
+    span.output = {
+        'documents': [
+            {
+                'id': doc['id'],
+                'title': doc['title'],
+                'distance': round(doc['distance'], 3),
+                **({'rrf_score': doc['rrf_score']} if 'rrf_score' in doc else {}),
+                'sections': doc.get('sections', []),
+                'content_preview': _preview(doc['content'], 40)
+            }
+            for doc in state.docs
+        ]
+    }
+    # Per-path wall time, e.g. {'vector_ms': 1.2, 'lexical_ms': 0.3, 'fusion_ms': 0.1}
+    span.metadata = {'collection': COLLECTION_NAME, 'kb_generation': generation.id, 'timings': timings}
+
+
+def _rerank_stage(state: AnswerState, span: Span):
+    """Keep the V3_N_RESULTS best candidates under the lexical rerank score, within its time budget"""
+    span.metadata = {'enabled': RERANK_ENABLED, 'budget_ms': RERANK_BUDGET_MS}
+    if not RERANK_ENABLED:
+        return
+    span.input = {'candidates': [chunk['id'] for chunk in state.chunks], 'k': V3_N_RESULTS}
+    result = reranker.rerank(state.question, state.chunks, V3_N_RESULTS)
+    span.output = result.to_dict()
+    if result.applied:
+        state.docs = merge_ranked(result.chunks)
+
+
+def _confidence_stage(state: AnswerState, span: Span):
+    """Finish with the fallback answer when no retrieved doc is relevant enough"""
+    assessment = confidence_gate.assess(state.docs)
+    span.input = {'distances': [round(doc['distance'], 3) for doc in state.docs]}
+    span.output = assessment.to_dict()
+    span.metadata = {'enabled': RETRIEVAL_SHORT_CIRCUIT_ENABLED}
+    if assessment.confident or not RETRIEVAL_SHORT_CIRCUIT_ENABLED:
+        return
+
+    state.markdown = V3_FALLBACK_ANSWER
+    state.text = convert_markdown_to_html(V3_FALLBACK_ANSWER)
+    state.sources = []
+    note = (f"(Model not called: best distance {span.output['best_distance']} "
+            f"exceeds threshold {assessment.threshold})")
+    state.trace = _build_v3_trace(state.question, state.docs, V3_NO_CONTEXT, note,
+                                  kb_generation=state.kb_generation, routing=_routing_trace(state.route))
+    state.trace['short_circuit'] = {'reason': 'low_retrieval_confidence', **assessment.to_dict()}
+    state.done = True
+    span.output['short_circuit'] = True
+
+
+def _context_budget(question: str) -> int:
+    """Tokens left for retrieved context once the fixed parts of the prompt are counted"""
+    fixed = estimate_tokens(V3_SYSTEM_PREAMBLE) + estimate_tokens(question) + PROMPT_OVERHEAD_TOKENS
+    return max(0, MAX_PROMPT_TOKENS - fixed)
+
+
+def _context_stage(state: AnswerState, span: Span):
+    """
+    Pack retrieved docs into the context within the prompt token budget.
+
+    Docs are chosen in relevance order (truncated at section boundaries when
+    they do not fit whole), then laid out in the same stable order as the
+    system blocks.
+    """
+    packed = pack_context(state.docs, _context_budget(state.question), _format_doc,
+                          separator=CONTEXT_SEPARATOR)
+    state.context_docs = packed.docs
+    state.sources = [{'id': doc['id'], 'title': doc['title']} for doc in packed.docs]
+    context_parts = [_format_doc(doc) for doc in _stable_doc_order(packed.docs)]
+    state.context = CONTEXT_SEPARATOR.join(context_parts) if context_parts else V3_NO_CONTEXT
+    state.trace = _build_v3_trace(state.question, state.docs, state.context,
+                                  V3_SYSTEM_PROMPT.format(context=state.context),
+                                  packing=packed.summary(), kb_generation=state.kb_generation,
+                                  routing=_routing_trace(state.route))
+
+    span.input = {'doc_count': len(state.docs), 'budget_tokens': packed.budget}
+    span.output = {
+        'context_length': len(state.context),
+        'packed_tokens': packed.tokens,
+        'truncated': packed.truncated,
+        'dropped': packed.dropped,
+        'preview': _preview(state.context)
+    }
+    span.metadata = {'separator': CONTEXT_SEPARATOR}
+
+
+def _cache_lookup_stage(state: AnswerState, span: Span):
+    """Finish early with a cached answer for a semantically equivalent question"""
+    span.input = {'doc_ids': [doc['id'] for doc in state.context_docs]}
+    span.metadata = {'enabled': SEMANTIC_CACHE_ENABLED}
+    if not SEMANTIC_CACHE_ENABLED:
+        return
+
+    hit = semantic_cache.lookup(_v3_cache_key(state.context_docs, state.kb_generation), state.embedding)
+    span.output = {'hit': hit is not None}
+    if hit is None:
+        return
+
+    state.cache = {
+        'hit': True,
+        'similarity': round(hit.similarity, 4),
+        'matched_question': hit.entry.question,
+        'saved_tokens': dict(hit.entry.tokens),
+    }
+    state.markdown = hit.entry.text
+    state.text = convert_markdown_to_html(hit.entry.text)
+    state.trace['cache'] = state.cache
+    state.done = True
+    span.output['similarity'] = state.cache['similarity']
+
+
+def _static_prompt_stage(version: str, system_prompt: str, max_tokens: int) -> Stage:
+    """Prompt stage for versions that send a fixed system prompt (no retrieval)"""
+    def build(state: AnswerState, span: Span):
+        state.system = system_prompt
+        state.system_prompt = system_prompt
+        state.max_tokens = max_tokens
+        state.trace = {
+            'version': version,
+            'not_in_use': True,
+            'reason': f'{version.upper()} does not use knowledge base retrieval'
+        }
+        span.input = {'template': f'{version.upper()}_SYSTEM_PROMPT'}
+        span.output = {'prompt_length': len(system_prompt), 'preview': _preview(system_prompt)}
+        span.metadata = {'template_version': _prompt_hash(system_prompt)}
+
+    return FunctionStage('Prompt Construction', 'prompt', build)
+
+
+def _v3_prompt_stage(state: AnswerState, span: Span):
+    state.system = _build_v3_system_blocks(state.context_docs)
+    state.system_prompt = V3_SYSTEM_PROMPT.format(context=state.context)
+    state.max_tokens = 512
+
+    span.input = {'template': 'V3_SYSTEM_PROMPT'}
+    span.output = {
+        'prompt_length': len(state.system_prompt),
+        'blocks': len(state.system),
+        'preview': _preview(state.system_prompt)
+    }
+    span.metadata = {'template_version': V3_PROMPT_VERSION}
+
+
+class ModelCallStage(StreamingStage):
+    """Call the model with the built prompt: blocking, async or streamed"""
+    name = 'Claude API Call'
+    span_type = 'llm'
+
+    def _request(self, state: AnswerState) -> dict:
+        return {
+            'model': DEFAULT_MODEL,
+            'max_tokens': state.max_tokens,
+            'system': state.system,
+            'messages': [
+                {"role": "user", "content": state.question}
+            ]
+        }
+
+    def _record(self, state: AnswerState, span: Span, response, permit: Permit):
+        state.response = response
+        state.text = ''.join(block.text for block in response.content if block.type == 'text')
+        state.tokens = _usage_tokens(response.usage)
+        if isinstance(state.system, list):
+            state.trace['prompt_cache'] = _prompt_cache_trace(state.system, state.tokens)
+
+        span.input = {
+            'model': DEFAULT_MODEL,
+            'max_tokens': state.max_tokens,
+            'message_preview': state.question
+        }
+        span.output = {
+            'response_preview': _preview(state.text),
+            'usage': {
+                'input_tokens': response.usage.input_tokens,
+                'output_tokens': response.usage.output_tokens,
+                'cache_read_input_tokens': state.tokens['cache_read'],
+                'cache_creation_input_tokens': state.tokens['cache_creation']
+            },
+            'stop_reason': response.stop_reason
+        }
+        span.metadata['rate_limit_wait_ms'] = permit.waited_ms
+
+    def run(self, state: AnswerState, span: Span):
+        try:
+            with _rate_limited(state.system, state.question, state.max_tokens) as permit:
+                response = get_client().messages.create(**self._request(state))
+                permit.used_tokens = _billed_tokens(response.usage)
+        except Exception as e:
+            raise _api_error(e)
+        self._record(state, span, response, permit)
+
+    async def run_async(self, state: AnswerState, span: Span):
+        try:
+            async with _rate_limited_async(state.system, state.question, state.max_tokens) as permit:
+                response = await get_async_client().messages.create(**self._request(state))
+                permit.used_tokens = _billed_tokens(response.usage)
+        except Exception as e:
+            raise _api_error(e)
+        self._record(state, span, response, permit)
+
+    def stream(self, state: AnswerState, span: Span, started: float) -> Iterator[str]:
+        try:
+            with _rate_limited(state.system, state.question, state.max_tokens) as permit, \
+                    get_client().messages.stream(**self._request(state)) as stream:
+                for text in stream.text_stream:
+                    if not text:
+                        continue
+                    if state.first_token_ms is None:
+                        state.first_token_ms = int((time.perf_counter() - started) * 1000)
+                    yield text
+                response = stream.get_final_message()
+                permit.used_tokens = _billed_tokens(response.usage)
+        except Exception as e:
+            raise _api_error(e)
+        self._record(state, span, response, permit)
+        span.metadata['first_token_ms'] = state.first_token_ms
+
+
+def _render_stage(state: AnswerState, span: Span):
+    """Convert the model's markdown to HTML for display"""
+    span.input = {'markdown_length': len(state.text)}
+    state.markdown = state.text
+    state.text = convert_markdown_to_html(state.text)
+    span.output = {'html_length': len(state.text)}
+
+
+def _cache_store_stage(state: AnswerState, span: Span):
+    """Cache a fresh V3 answer for semantically equivalent follow-up questions"""
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_cache.store(_v3_cache_key(state.context_docs, state.kb_generation), state.embedding, state.question,
+                             state.markdown, state.tokens)
+    state.cache = {'hit': False, 'enabled': SEMANTIC_CACHE_ENABLED}
+    state.trace['cache'] = state.cache
+    span.output = {'stored': SEMANTIC_CACHE_ENABLED}
+
+
+EMBED = FunctionStage('Query Embedding', 'embedding', _embed_stage, blocking=True)
+ROUTE = FunctionStage('Query Routing', 'routing', _route_stage, blocking=True)
+RETRIEVE = FunctionStage('ChromaDB Retrieval', 'retrieval', _retrieve_stage, blocking=True)
+RERANK = FunctionStage('Lexical Rerank', 'retrieval', _rerank_stage, blocking=True)
+CONFIDENCE = FunctionStage('Retrieval Confidence', 'retrieval', _confidence_stage)
+BUILD_CONTEXT = FunctionStage('Context Building', 'context', _context_stage, blocking=True)
+CACHE_LOOKUP = FunctionStage('Semantic Cache Lookup', 'cache', _cache_lookup_stage)
+CALL_MODEL = ModelCallStage()
+RENDER = FunctionStage('Render', 'render', _render_stage, blocking=True)
+CACHE_STORE = FunctionStage('Semantic Cache Store', 'cache', _cache_store_stage)
+
+PIPELINES = {
+    'v1': Pipeline('v1', [
+        _static_prompt_stage('v1', V1_SYSTEM_PROMPT, 1024), CALL_MODEL, RENDER,
+    ]),
+    'v2': Pipeline('v2', [
+        _static_prompt_stage('v2', V2_SYSTEM_PROMPT, 512), CALL_MODEL, RENDER,
+    ]),
+    'v3': Pipeline('v3', [
+        EMBED, ROUTE, RETRIEVE, RERANK, CONFIDENCE, BUILD_CONTEXT, CACHE_LOOKUP,
+        FunctionStage('Prompt Construction', 'prompt', _v3_prompt_stage),
+        CALL_MODEL, RENDER, CACHE_STORE,
+    ]),
+}
+
+
+def _pipeline(version: str) -> Pipeline:
+    """Pipeline for a version; unknown versions fall back to V3"""
+    return PIPELINES.get(version, PIPELINES['v3'])
 
-    return format_response(
-        text=html_text,
-        sources=sources,
-        latency_ms=latency_ms,
-        tokens={
-            'prompt': response.usage.input_tokens,
-            'completion': response.usage.output_tokens
-        },
-        trace=trace
-    )
+
+def ask_v1(question: str) -> dict:
+    """
+    Version 1: Verbose responses.
+    Problem: Prompt specifies 300+ words when users want ~80 words.
+    """
+    return PIPELINES['v1'].run(question)
 
 
-def ask(question: str, version: str = 'v3') -> dict:
+def ask_v2(question: str) -> dict:
+    """
+    Version 2: Concise but potentially inaccurate.
+    Problem: No access to actual company data, will hallucinate specifics.
+    """
+    return PIPELINES['v2'].run(question)
+
+
+def ask_v3(question: str, query_embedding=None) -> dict:
+    """
+    Version 3: RAG-powered accurate responses.
+    Solution: Retrieves relevant docs from Chroma, grounds response in facts.
+    """
+    return PIPELINES['v3'].run(question, embedding=query_embedding)
+
+
+def ask(question: str, version: str = 'v3', query_embedding=None) -> dict:
     """
     Main entry point - route to appropriate version.
 
     Args:
         question: User's question
         version: 'v1', 'v2', or 'v3'
+        query_embedding: Precomputed question embedding (V3 only)
 
     Returns:
         Response dict with text, sources, and metadata
@@ -288,5 +781,88 @@ def ask(question: str, version: str = 'v3') -> dict:
         'v3': ask_v3
     }
 
-    func = version_funcs.get(version, ask_v3)
-    return func(question)
+    if version not in version_funcs:
+        version = 'v3'
+    func = version_funcs[version]
+    if version == 'v3' and query_embedding is not None:
+        func = functools.partial(ask_v3, query_embedding=query_embedding)
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return func(question)
+
+    result, shared = inflight.do(_flight_key(question, version), lambda: func(question))
+    return _shared_result(result) if shared else result
+
+
+def get_service_metrics() -> dict:
+    """Process-wide counters for the caches, coalescing and rate limiter"""
+    return {
+        'semantic_cache': semantic_cache.snapshot(),
+        'query_embeddings': query_embedding_cache.snapshot(),
+        'embedding_store': embedding_store_snapshot(),
+        'routing': query_router.snapshot(),
+        'rerank': reranker.snapshot(),
+        'single_flight': inflight.snapshot(),
+        'rate_limiter': rate_limiter.snapshot(),
+    }
+
+
+# ============================================
+# STREAMING (Server-Sent Events)
+# ============================================
+def ask_stream(question: str, version: str = 'v3') -> Iterator[dict]:
+    """
+    Streaming entry point - yields answer text as the model generates it.
+
+    Yields:
+        {'event': 'delta', 'data': {'text': str}} for each text fragment, then
+        {'event': 'done', 'data': <format_response dict>} once the message is
+        complete. The final payload carries sources, token usage, the trace and
+        'time_to_first_token_ms' alongside 'latency_ms'.
+
+    Raises:
+        AIServiceError: If the request could not be started or was interrupted
+    """
+    return _pipeline(version).stream(question)
+
+
+# ============================================
+# ASYNC (AsyncAnthropic)
+# ============================================
+async def ask_v1_async(question: str) -> dict:
+    """Async version of ask_v1"""
+    return await PIPELINES['v1'].run_async(question)
+
+
+async def ask_v2_async(question: str) -> dict:
+    """Async version of ask_v2"""
+    return await PIPELINES['v2'].run_async(question)
+
+
+async def ask_v3_async(question: str) -> dict:
+    """Async version of ask_v3"""
+    return await PIPELINES['v3'].run_async(question)
+
+
+async def ask_async(question: str, version: str = 'v3') -> dict:
+    """
+    Async entry point - route to appropriate version.
+
+    Same contract as ask(), but awaits the model call so one process can hold
+    many in-flight requests.
+    """
+    version_funcs = {
+        'v1': ask_v1_async,
+        'v2': ask_v2_async,
+        'v3': ask_v3_async
+    }
+
+    if version not in version_funcs:
+        version = 'v3'
+    func = version_funcs[version]
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return await func(question)
+
+    result, shared = await inflight.do_async(_flight_key(question, version), lambda: func(question))
+    return _shared_result(result) if shared else result
@@ -0,0 +1,138 @@
+"""ASGI serving mode for Acme Support Bot
+
+The Flask app is WSGI, so every request under gunicorn/werkzeug holds a worker
+thread until the model answers. This module wraps it in an ASGI application
+that handles POST /ask/async natively on the event loop (via ask_async) and
+hands every other request to Flask through asgiref's WsgiToAsgi adapter.
+
+Run with:
+    uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 5000
+or:
+    SERVER_MODE=asgi python run.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+
+from .ai_service import ask_async, AIServiceError
+from .routes import record_trace
+from .utils import sanitize_input
+
+logger = logging.getLogger(__name__)
+
+# Questions are capped at 500 chars by sanitize_input; anything far larger is abuse
+MAX_BODY_BYTES = 64 * 1024
+
+
+class AsyncAskApplication:
+    """ASGI app that serves /ask/async natively and delegates the rest to Flask"""
+
+    def __init__(self, flask_app, url_prefix: str = None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        if url_prefix is None:
+            url_prefix = os.getenv('APPLICATION_ROOT', '')
+        self.ask_path = f"{url_prefix}/ask/async"
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if self._is_native_ask(scope):
+            await self._ask(receive, send)
+            return
+
+        await self.wsgi(scope, receive, send)
+
+    def _is_native_ask(self, scope) -> bool:
+        """JSON POSTs to /ask/async are served on the loop; form posts go to Flask"""
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            return False
+        if scope['path'] != self.ask_path:
+            return False
+        headers = dict(scope.get('headers') or [])
+        content_type = headers.get(b'content-type', b'').decode('latin-1')
+        return content_type.startswith('application/json')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _ask(self, receive, send):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_BODY_BYTES:
+                await self._send_json(send, 413, {'error': 'Request body too large'})
+                return
+
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            await self._send_json(send, 400, {'error': 'Invalid JSON body'})
+            return
+
+        if not isinstance(data, dict):
+            data = {}
+
+        question = sanitize_input(str(data.get('question', '')))
+        version = data.get('version', 'v3')
+
+        if not question:
+            await self._send_json(send, 400, {'error': 'Please provide a question'})
+            return
+
+        try:
+            response = await ask_async(question, version=version)
+            # Broadcasting blocks, so it runs off the shared loop
+            await asyncio.get_running_loop().run_in_executor(None, record_trace, question, response)
+            await self._send_json(send, 200, response)
+        except AIServiceError as e:
+            await self._send_json(send, 503, {'error': e.message})  # Service Unavailable
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            await self._send_json(send, 500, {'error': 'An unexpected error occurred'})
+
+    async def _send_json(self, send, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app=None):
+    """Create the ASGI application, building the Flask app if not given"""
+    if flask_app is None:
+        from config import KB_WATCH_INTERVAL_SECONDS, WARMUP_ENABLED
+        from . import create_app
+        flask_app = create_app()
+        # Started by the uvicorn factory rather than run.py, so start the
+        # background work run.py would
+        if KB_WATCH_INTERVAL_SECONDS > 0:
+            from .kb_reload import KnowledgeBaseWatcher
+            KnowledgeBaseWatcher(interval=KB_WATCH_INTERVAL_SECONDS).start()
+        if WARMUP_ENABLED:
+            from .warmup import start_warmup
+            start_warmup()
+    return AsyncAskApplication(flask_app)
@@ -0,0 +1,127 @@
+"""Batch question answering with bounded-concurrency fan-out
+
+QA and eval jobs send many questions at once. Rather than paying the model
+latency once per question in series, run_batch fans them out over a bounded
+thread pool and yields each result as soon as it completes, so the route can
+stream them back as NDJSON. For V3 the question embeddings are computed up
+front in a single batched embedding call and handed to each worker.
+
+A failure on one question (AIServiceError or anything unexpected) becomes an
+'error' item; it never fails the rest of the batch. A final 'summary' item
+carries aggregate latency and token stats.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional
+
+from .ai_service import ask, AIServiceError
+from .rag import embed_queries
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[int], percentile: float) -> int:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    index = min(int(len(sorted_values) * percentile), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _embed_all(questions: List[str]) -> List[Optional[list]]:
+    """Embed every question in one call; fall back to per-question embedding on failure"""
+    try:
+        return embed_queries(questions)
+    except Exception as e:
+        logger.warning(f"Batch embedding failed, embedding per question: {e}")
+        return [None] * len(questions)
+
+
+def _answer(index: int, question: str, version: str, embedding) -> dict:
+    """Answer one question, turning failures into an error item"""
+    try:
+        response = ask(question, version=version, query_embedding=embedding)
+        return {'type': 'result', 'index': index, 'question': question, 'response': response}
+    except AIServiceError as e:
+        return {'type': 'error', 'index': index, 'question': question, 'error': e.message}
+    except Exception as e:
+        logger.error(f"Unexpected error in batch item {index}: {e}", exc_info=True)
+        return {'type': 'error', 'index': index, 'question': question,
+                'error': 'An unexpected error occurred'}
+
+
+def summarize(items: List[dict], wall_ms: int) -> dict:
+    """Aggregate latency and token stats over completed batch items"""
+    results = [item['response']['metadata'] for item in items if item['type'] == 'result']
+    latencies = sorted(meta['latency_ms'] for meta in results)
+
+    return {
+        'type': 'summary',
+        'total': len(items),
+        'succeeded': len(results),
+        'failed': len(items) - len(results),
+        'wall_ms': wall_ms,
+        'latency_ms': {
+            'mean': int(sum(latencies) / len(latencies)) if latencies else 0,
+            'p50': _percentile(latencies, 0.50),
+            'p95': _percentile(latencies, 0.95),
+            'max': latencies[-1] if latencies else 0,
+        },
+        'tokens': {
+            'prompt': sum(meta['prompt_tokens'] for meta in results),
+            'completion': sum(meta['completion_tokens'] for meta in results),
+            'total': sum(meta['total_tokens'] for meta in results),
+        },
+    }
+
+
+def run_batch(questions: List[str], version: str = 'v3', max_workers: int = 8) -> Iterator[dict]:
+    """
+    Answer questions concurrently, yielding items in completion order.
+
+    Args:
+        questions: Sanitized questions; empty strings are reported as errors
+        version: 'v1', 'v2', or 'v3'
+        max_workers: Upper bound on questions in flight at once
+
+    Yields:
+        {'type': 'result', 'index', 'question', 'response'} or
+        {'type': 'error', 'index', 'question', 'error'} per question,
+        then one {'type': 'summary', ...} item
+    """
+    start_time = time.time()
+    items = []
+    if version not in ('v1', 'v2'):
+        version = 'v3'  # Same fallback as ask()
+
+    valid = [(i, q) for i, q in enumerate(questions) if q]
+    for i, question in enumerate(questions):
+        if not question:
+            item = {'type': 'error', 'index': i, 'question': question,
+                    'error': 'Please provide a question'}
+            items.append(item)
+            yield item
+
+    embeddings = [None] * len(valid)
+    if version == 'v3' and valid:
+        embeddings = _embed_all([q for _, q in valid])
+
+    if valid:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(valid)))) as pool:
+            futures = [
+                pool.submit(_answer, i, question, version, embedding)
+                for (i, question), embedding in zip(valid, embeddings)
+            ]
+            try:
+                for future in as_completed(futures):
+                    item = future.result()
+                    items.append(item)
+                    yield item
+            finally:
+                # Client went away mid-stream: don't start questions nobody will read
+                for future in futures:
+                    future.cancel()
+
+    yield summarize(items, int((time.time() - start_time) * 1000))
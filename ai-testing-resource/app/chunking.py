@@ -0,0 +1,174 @@
+"""Header-aware chunking of knowledge base markdown
+
+Each markdown file is split at its header lines, so a chunk is one section
+(header plus body). A header with no body of its own (the document title
+right above the first subsection) is kept with the section that follows.
+Sections longer than max_chars are split into overlapping windows, breaking
+at a paragraph or line end where possible.
+
+Every chunk records its parent document, section path (the chain of headers
+above it) and character offsets into the source, so chunks retrieved from the
+same document can be merged back together in document order.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+
+_HEADER = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$', re.MULTILINE)
+
+SECTION_SEPARATOR = " > "
+
+
+@dataclass
+class Chunk:
+    """One retrievable piece of a knowledge base document"""
+    parent_id: str
+    index: int
+    section_path: List[str]
+    content: str  # Exactly source[start:end]
+    start: int
+    end: int
+
+    @property
+    def id(self) -> str:
+        return f"{self.parent_id}#{self.index}"
+
+    @property
+    def section(self) -> str:
+        return SECTION_SEPARATOR.join(self.section_path)
+
+    def embedding_text(self) -> str:
+        """Content prefixed with the headers above it, so a subsection keeps its document's topic"""
+        ancestors = [title for title in self.section_path[:-1] if title not in self.content]
+        return '\n'.join(ancestors + [self.content]) if ancestors else self.content
+
+
+def _sections(content: str) -> List[tuple]:
+    """(start, end, section_path, has_body) for each header-led section"""
+    headers = list(_HEADER.finditer(content))
+    if not headers or headers[0].start() > 0 and content[:headers[0].start()].strip():
+        headers = [None] + headers
+
+    sections = []
+    path = []  # [(level, title)]
+    for i, match in enumerate(headers):
+        start = match.start() if match else 0
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(content)
+        if match:
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2))]
+            body = content[match.end():end]
+        else:
+            body = content[start:end]
+        sections.append((start, end, [title for _, title in path], bool(body.strip())))
+    return sections
+
+
+def _trim(content: str, start: int, end: int) -> tuple:
+    """Shrink [start, end) to exclude surrounding whitespace"""
+    while start < end and content[start].isspace():
+        start += 1
+    while end > start and content[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _windows(content: str, start: int, end: int, max_chars: int, overlap: int) -> List[tuple]:
+    """Split [start, end) into overlapping windows of at most max_chars"""
+    windows = []
+    while end - start > max_chars:
+        limit = start + max_chars
+        cut = max(content.rfind('\n\n', start, limit), content.rfind('\n', start, limit))
+        if cut <= start + max_chars // 2:
+            cut = content.rfind(' ', start, limit)
+        if cut <= start + max_chars // 2:
+            cut = limit
+        windows.append(_trim(content, start, cut))
+        # Start the next window overlap chars back, at a word boundary
+        next_start = max(cut - overlap, start + 1)
+        while next_start < cut and not content[next_start - 1].isspace():
+            next_start += 1
+        start = next_start
+    windows.append(_trim(content, start, end))
+    return [(s, e) for s, e in windows if e > s]
+
+
+def chunk_markdown(parent_id: str, content: str, max_chars: int = 1000, overlap: int = 150) -> List[Chunk]:
+    """
+    Split a markdown document into header-aware chunks.
+
+    Args:
+        parent_id: ID of the source document
+        content: Markdown text
+        max_chars: Largest chunk size
+        overlap: Characters repeated between consecutive windows of an oversized section
+
+    Returns:
+        Chunks in document order
+    """
+    chunks = []
+    pending_start = None  # Start of header-only sections waiting for a body
+
+    for start, end, path, has_body in _sections(content):
+        if not has_body:
+            pending_start = start if pending_start is None else pending_start
+            continue
+        if pending_start is not None:
+            start, pending_start = pending_start, None
+
+        for s, e in _windows(content, *_trim(content, start, end), max_chars, overlap):
+            chunks.append(Chunk(parent_id, len(chunks), path, content[s:e], s, e))
+
+    if pending_start is not None:
+        s, e = _trim(content, pending_start, len(content))
+        if e > s:
+            chunks.append(Chunk(parent_id, len(chunks), [], content[s:e], s, e))
+
+    return chunks
+
+
+def merge_chunks(hits: List[Dict]) -> List[Dict]:
+    """
+    Merge retrieved chunks into one entry per parent document.
+
+    Parents are ordered by their best (lowest) distance; each parent's chunks
+    are joined in document order, dropping text repeated by window overlap.
+
+    Args:
+        hits: Retrieved chunks with 'parent_id', 'id', 'title', 'category',
+            'section', 'content', 'distance', 'start' and 'end'
+
+    Returns:
+        List of dicts with 'id' (the parent), 'title', 'category', 'content',
+        'distance', 'chunks' and 'sections'
+    """
+    by_parent = {}
+    for hit in hits:
+        by_parent.setdefault(hit['parent_id'], []).append(hit)
+
+    merged = []
+    for parent_id, parts in by_parent.items():
+        parts = sorted(parts, key=lambda hit: hit['start'])
+        pieces, end = [], None
+        for hit in parts:
+            if end is not None and hit['start'] < end:
+                # Overlapping window: keep only the new text
+                if hit['end'] > end:
+                    pieces[-1] += hit['content'][end - hit['start']:]
+                    end = hit['end']
+                continue
+            pieces.append(hit['content'])
+            end = hit['end']
+
+        merged.append({
+            'id': parent_id,
+            'title': parts[0]['title'],
+            'category': parts[0]['category'],
+            'content': '\n\n'.join(pieces),
+            'distance': min(hit['distance'] for hit in parts),
+            'chunks': [hit['id'] for hit in parts],
+            'sections': [hit['section'] for hit in parts],
+        })
+
+    return sorted(merged, key=lambda doc: doc['distance'])
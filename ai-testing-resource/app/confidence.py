@@ -0,0 +1,105 @@
+"""Retrieval-confidence gate for V3
+
+When every retrieved document is far from the question (an off-topic
+question such as "What is your cryptocurrency payment policy?"), the model can
+only answer with the canned "I don't have specific information" sentence. The
+gate detects that case from the Chroma distances alone so V3 can return the
+fallback immediately instead of paying for a model call.
+
+Thresholds are maximum distances, optionally per document category (a loose
+category like 'general' may need a tighter bound than 'pricing'). Use
+scripts/calibrate_retrieval_threshold.py to choose them from labelled questions.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+
+def parse_category_thresholds(spec: str) -> Dict[str, float]:
+    """Parse 'returns=1.2,pricing=1.35' into {'returns': 1.2, 'pricing': 1.35}"""
+    thresholds = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        category, _, value = item.partition('=')
+        thresholds[category.strip()] = float(value)
+    return thresholds
+
+
+@dataclass
+class Assessment:
+    """Outcome of checking retrieved docs against the thresholds"""
+    confident: bool
+    best_distance: Optional[float]
+    best_doc_id: Optional[str]
+    threshold: Optional[float]
+
+    def to_dict(self) -> dict:
+        return {
+            'confident': self.confident,
+            'best_distance': None if self.best_distance is None else round(self.best_distance, 4),
+            'best_doc_id': self.best_doc_id,
+            'threshold': self.threshold,
+        }
+
+
+@dataclass
+class ConfidenceGate:
+    """Decides whether any retrieved doc is close enough to ground an answer"""
+    max_distance: float
+    by_category: Dict[str, float] = field(default_factory=dict)
+
+    def threshold_for(self, category: Optional[str]) -> float:
+        return self.by_category.get(category, self.max_distance)
+
+    def assess(self, docs: List[dict]) -> Assessment:
+        """
+        Confident when at least one doc is within its category's threshold.
+
+        The reported best doc is the one with the most headroom under (or the
+        least overshoot over) its own threshold.
+        """
+        best = None
+        for doc in docs:
+            threshold = self.threshold_for(doc.get('category'))
+            margin = threshold - doc['distance']
+            if best is None or margin > best[0]:
+                best = (margin, doc, threshold)
+
+        if best is None:
+            return Assessment(confident=False, best_distance=None, best_doc_id=None, threshold=self.max_distance)
+
+        margin, doc, threshold = best
+        return Assessment(
+            confident=margin >= 0,
+            best_distance=doc['distance'],
+            best_doc_id=doc['id'],
+            threshold=threshold,
+        )
+
+
+def choose_threshold(positive: Sequence[float], negative: Sequence[float],
+                     min_recall: float = 1.0) -> Optional[float]:
+    """
+    Pick a maximum distance from labelled examples.
+
+    positive are distances of the right document for answerable questions;
+    negative are best distances for questions the KB cannot answer. The
+    threshold keeps at least min_recall of the positives and, within that,
+    sits midway into the gap before the next negative so small drifts in
+    embedding distances do not flip decisions.
+
+    Returns None when there are no positives.
+    """
+    if not positive:
+        return None
+
+    ordered = sorted(positive)
+    keep = min(len(ordered), max(1, math.ceil(len(ordered) * min_recall - 1e-9)))
+    floor = ordered[keep - 1]
+
+    above = sorted(d for d in negative if d > floor)
+    if not above:
+        return round(floor, 4)
+    return round((floor + above[0]) / 2, 4)
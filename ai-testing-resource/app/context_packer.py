@@ -0,0 +1,136 @@
+"""Token-budgeted context packing for retrieval-augmented prompts
+
+Retrieved documents are added to the prompt context in relevance order until
+a token budget is used up. A document that does not fit whole is truncated at
+markdown section boundaries (header lines), keeping its leading sections, so
+the model never sees half a section. Documents whose first section alone does
+not fit are dropped; later, smaller documents may still fit.
+"""
+
+import functools
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+_HEADER = re.compile(r'^#{1,6}\s', re.MULTILINE)
+
+
+def split_sections(content: str) -> List[str]:
+    """Split markdown into sections, each starting at a header line.
+
+    Text before the first header (if any) is its own leading section.
+    """
+    starts = [m.start() for m in _HEADER.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    bounds = starts + [len(content)]
+    sections = [content[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+    return [section for section in sections if section]
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base encoding, or None if it cannot be loaded (tried once)"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+    return _encoding
+
+
+@functools.lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """
+    Token count for budget decisions, memoized per text.
+
+    Uses tiktoken when its encoding is available, otherwise ~4 chars per
+    token. Either way it approximates the model's own tokenizer, so budgets
+    should leave some headroom.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+@dataclass
+class PackedContext:
+    """Documents chosen for the context and what was left out"""
+    docs: List[dict]  # In relevance order; 'content' may be truncated
+    tokens: int
+    budget: int
+    dropped: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            'budget_tokens': self.budget,
+            'packed_tokens': self.tokens,
+            'packed': [doc['id'] for doc in self.docs],
+            'truncated': self.truncated,
+            'dropped': self.dropped,
+        }
+
+
+def pack_context(
+    docs: List[dict],
+    budget: int,
+    format_doc: Callable[[dict], str],
+    separator: str = "\n\n---\n\n",
+    count: Callable[[str], int] = estimate_tokens,
+) -> PackedContext:
+    """
+    Fill a token budget with documents in relevance order.
+
+    Args:
+        docs: Retrieved docs (with 'id' and 'content'), most relevant first
+        budget: Token budget for the formatted context
+        format_doc: How a doc is rendered into the context (title + content)
+        separator: Joiner between docs, counted against the budget
+        count: Token counter
+
+    Returns:
+        PackedContext with copies of the included docs
+    """
+    separator_tokens = count(separator)
+    packed, dropped, truncated = [], [], []
+    used = 0
+
+    for doc in docs:
+        overhead = separator_tokens if packed else 0
+        remaining = budget - used - overhead
+
+        cost = count(format_doc(doc))
+        if cost <= remaining:
+            packed.append(dict(doc))
+            used += overhead + cost
+            continue
+
+        # Keep as many leading sections as fit
+        kept, cost = [], 0
+        for section in split_sections(doc['content']):
+            candidate = count(format_doc({**doc, 'content': '\n\n'.join(kept + [section])}))
+            if candidate > remaining:
+                break
+            kept.append(section)
+            cost = candidate
+
+        if kept:
+            packed.append({**doc, 'content': '\n\n'.join(kept), 'truncated': True})
+            truncated.append(doc['id'])
+            used += overhead + cost
+        else:
+            dropped.append(doc['id'])
+
+    return PackedContext(docs=packed, tokens=used, budget=budget, dropped=dropped, truncated=truncated)
@@ -0,0 +1,260 @@
+"""Embedding caches: an in-process LRU for questions and a shared on-disk store
+
+The MiniLM forward pass is the largest CPU cost of a V3 answer, and support
+questions repeat. EmbeddingLRU maps (model, normalized question) to the
+embedding, so a repeated question skips the model entirely. Normalization
+only collapses whitespace and case: all-MiniLM-L6-v2 lowercases its input
+anyway, so the cached vector is the one the model would have produced.
+
+EmbeddingStore persists embeddings by (model, SHA-256 of the exact text) in
+SQLite, shared by every worker process and surviving restarts, so re-indexing
+and cold starts only run the model on text it has never seen.
+CachedEmbeddingFunction wraps an embedding function with the store.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Cache key form of a text: whitespace collapsed, casefolded"""
+    return ' '.join(text.split()).casefold()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Running counters for an EmbeddingLRU"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+        }
+
+
+class EmbeddingLRU:
+    """Thread-safe LRU map from a key to a read-only float32 vector"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.stats = EmbeddingCacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return vector
+
+    def put(self, key: Hashable, embedding) -> np.ndarray:
+        """Cache an embedding (shared between callers, so stored read-only) and return it"""
+        vector = np.array(embedding, dtype=np.float32).ravel()
+        vector.setflags(write=False)
+        if self.max_entries <= 0:
+            return vector
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        """Counters plus current size, for metrics endpoints"""
+        with self._lock:
+            data = self.stats.to_dict()
+            data['entries'] = len(self._entries)
+            data['max_entries'] = self.max_entries
+        return data
+
+
+@dataclass
+class EmbeddingStoreStats:
+    """Running counters for an EmbeddingStore (this process only)"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'errors': self.errors,
+        }
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed float32 embeddings in SQLite, bounded by LRU eviction.
+
+    The database runs in WAL mode, so any number of processes read while one
+    writes; each thread uses its own connection. A hit refreshes the entry's
+    last_used time, and writes evict the least recently used entries beyond
+    max_entries. SQLite errors are logged and treated as misses: the cache
+    never stops embeddings from being computed.
+
+    Args:
+        path: SQLite database file
+        max_entries: Entries kept across all models
+    """
+
+    # SQLite limits host parameters per statement (999 on older builds)
+    _CHUNK = 500
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.stats = EmbeddingStoreStats()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    hash BLOB NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **changes):
+        with self._stats_lock:
+            for name, value in changes.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings for the texts that have one, keyed by text"""
+        hashes = {text_hash(text): text for text in texts}
+        found = {}
+        try:
+            conn = self._connect()
+            keys = list(hashes)
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]).fetchall()
+                for digest, blob in rows:
+                    found[hashes[bytes(digest)]] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND hash IN "
+                        f"({','.join('?' * len(rows))})", [time.time(), model, *(row[0] for row in rows)])
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store read failed ({self.path}): {e}")
+            self._count(errors=1)
+        self._count(hits=len(found), misses=len(hashes) - len(found))
+        return found
+
+    def put_many(self, model: str, texts: List[str], vectors: List) -> None:
+        """Store embeddings, then evict least recently used entries over max_entries"""
+        now = time.time()
+        rows = [(model, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany('INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)', rows)
+                excess = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute('DELETE FROM embeddings WHERE rowid IN '
+                                 '(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)', (excess,))
+                    self._count(evictions=excess)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store write failed ({self.path}): {e}")
+            self._count(errors=1)
+
+    def __len__(self) -> int:
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def snapshot(self) -> dict:
+        """Counters plus current size, for metrics endpoints"""
+        with self._stats_lock:
+            data = self.stats.to_dict()
+        data['entries'] = len(self)
+        data['max_entries'] = self.max_entries
+        return data
+
+
+class CachedEmbeddingFunction:
+    """
+    An embedding function that asks an EmbeddingStore before running the model.
+
+    Only texts missing from the store reach the wrapped function (in one
+    call), and their embeddings are stored for every later caller. Usable
+    anywhere the wrapped function is, including as a Chroma collection's
+    embedding_function.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List], store: EmbeddingStore, model_name: str):
+        self._embed = embed
+        self.store = store
+        self.model_name = model_name
+
+    @property
+    def model(self) -> Callable[[List[str]], List]:
+        """The wrapped embedding function, for calls that must reach the model"""
+        return self._embed
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        texts = list(input)
+        found = self.store.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            computed = [np.asarray(vector, dtype=np.float32) for vector in self._embed(missing)]
+            self.store.put_many(self.model_name, missing, computed)
+            found.update(zip(missing, computed))
+        return [found[text] for text in texts]
@@ -0,0 +1,148 @@
+"""Build-time index snapshots: the whole knowledge base index in one file
+
+A snapshot holds everything needed to serve retrieval without embedding the
+corpus: the embedding matrix, chunk IDs, documents and metadata, the BM25
+term counts, the indexing manifest, and what it was built from (embedding
+model key and knowledge base fingerprint). scripts/build_index_snapshot.py
+writes one during the Docker build; at startup rag opens it as the active
+generation if both fingerprints still match, and refuses it otherwise.
+
+File layout:
+    MAGIC (8 bytes) | header length (uint64, little-endian) | header JSON |
+    zero padding to a 64-byte boundary | float32 matrix (rows x dimensions)
+
+The matrix is memory-mapped read-only, so opening a snapshot costs a JSON
+parse, and pages are shared by every process serving the same image.
+"""
+
+import json
+import struct
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .vector_index import NumpyIndex, _Snapshot, _normalize, _replace_file
+
+MAGIC = b'ACMEKBS\x00'
+FORMAT_VERSION = 1
+
+# Matrix start alignment, so the mapped rows are aligned for vectorized reads
+ALIGNMENT = 64
+
+_LENGTH = struct.Struct('<Q')
+
+
+class SnapshotMismatch(ValueError):
+    """A snapshot that is unreadable, or was built for another model or knowledge base"""
+
+
+def write_snapshot(path: str, records: dict, info: dict):
+    """
+    Write a snapshot atomically.
+
+    Args:
+        path: Output file
+        records: 'ids', 'embeddings', 'documents' and 'metadatas', as from
+            a collection's get()
+        info: Further header fields; rag stores 'embedding_model',
+            'kb_fingerprint', 'chunking', 'manifest' and 'lexical'
+    """
+    ids = list(records['ids'])
+    embeddings = np.asarray(records['embeddings'], dtype=np.float32)
+    matrix = _normalize(embeddings.reshape(len(ids), -1)) if ids else np.zeros((0, 0), dtype=np.float32)
+    header = {
+        **info,
+        'format_version': FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'rows': matrix.shape[0],
+        'dimensions': matrix.shape[1],
+        'ids': ids,
+        'documents': list(records['documents']),
+        'metadatas': list(records['metadatas']),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    start = len(MAGIC) + _LENGTH.size + len(header_bytes)
+    padding = b'\0' * (-start % ALIGNMENT)
+
+    def write(f):
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(padding)
+        f.write(np.ascontiguousarray(matrix, dtype='<f4').tobytes())
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _replace_file(path, write)
+
+
+def read_header(path: str) -> Tuple[dict, int]:
+    """The header and the matrix offset; raises SnapshotMismatch if the file is not a complete snapshot"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SnapshotMismatch(f"{path} is not an index snapshot")
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        try:
+            header = json.loads(f.read(length))
+        except ValueError as e:
+            raise SnapshotMismatch(f"{path} has an unreadable header: {e}")
+
+    if header.get('format_version') != FORMAT_VERSION:
+        raise SnapshotMismatch(f"{path} is format {header.get('format_version')}, expected {FORMAT_VERSION}")
+    start = len(MAGIC) + _LENGTH.size + length
+    offset = start + (-start % ALIGNMENT)
+    expected_size = offset + header['rows'] * header['dimensions'] * 4
+    if path.stat().st_size != expected_size:
+        raise SnapshotMismatch(f"{path} is {path.stat().st_size} bytes, expected {expected_size} (truncated?)")
+    return header, offset
+
+
+def load_snapshot(path: str, embedding_model: str, kb_fingerprint: Optional[str]) -> 'SnapshotIndex':
+    """
+    Open a snapshot for serving, if it matches the running configuration.
+
+    Raises:
+        SnapshotMismatch: If it is unreadable, or was built with another
+            embedding model or from other knowledge base contents
+    """
+    header, offset = read_header(path)
+    if header.get('embedding_model') != embedding_model:
+        raise SnapshotMismatch(f"{path} was built with embedding model {header.get('embedding_model')!r}, "
+                               f"running {embedding_model!r}")
+    if header.get('kb_fingerprint') != kb_fingerprint:
+        raise SnapshotMismatch(f"{path} was built from knowledge base {header.get('kb_fingerprint')}, "
+                               f"found {kb_fingerprint}")
+    return SnapshotIndex(path, header, offset)
+
+
+class SnapshotIndex(NumpyIndex):
+    """
+    Read-only exact index over a memory-mapped snapshot.
+
+    Searches like NumpyIndex; upsert and delete raise, since the snapshot
+    belongs to the image. Changes go into a new generation seeded from it.
+    """
+
+    def __init__(self, path: str, header: dict, offset: int):
+        self._header = header
+        self._offset = offset
+        super().__init__(path)
+        self.info = {key: value for key, value in header.items() if key not in ('ids', 'documents', 'metadatas')}
+
+    def _load(self) -> _Snapshot:
+        header = self._header
+        shape = (header['rows'], header['dimensions'])
+        if header['rows']:
+            matrix = np.memmap(self.path, dtype='<f4', mode='r', offset=self._offset, shape=shape)
+        else:
+            matrix = np.zeros(shape, dtype=np.float32)
+        return _Snapshot(matrix, header['ids'], header['documents'], header['metadatas'])
+
+    def upsert(self, *args, **kwargs):
+        raise ValueError(f"Index snapshot {self.path} is read-only")
+
+    def delete(self, *args, **kwargs):
+        raise ValueError(f"Index snapshot {self.path} is read-only")
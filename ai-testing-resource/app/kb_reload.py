@@ -0,0 +1,118 @@
+"""Knowledge base hot reload: background reloads and a directory watcher
+
+rag.reload_knowledge_base builds and swaps in a new index generation;
+this module runs it off the request path. start_reload() is what the admin
+endpoint calls, and KnowledgeBaseWatcher polls the knowledge base directory
+and reloads when a markdown file is added, changed or removed.
+
+Reloads build into the index's own files, so run the watcher (or call the
+endpoint) in one process per index.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from config import KNOWLEDGE_BASE_DIR
+from . import rag
+
+logger = logging.getLogger(__name__)
+
+_status_lock = threading.Lock()
+_status = {'running': False, 'last_result': None, 'last_error': None, 'finished_at': None}
+
+
+def reload_status() -> dict:
+    """The active generation and the outcome of the last background reload"""
+    with _status_lock:
+        status = dict(_status)
+    generation = rag.active_generation()
+    status['generation'] = generation.id
+    status['slot'] = generation.slot
+    return status
+
+
+def _run_reload(knowledge_dir: str, force: bool):
+    result, error = None, None
+    try:
+        result = rag.reload_knowledge_base(knowledge_dir, force=force)
+    except Exception as e:
+        logger.exception("Knowledge base reload failed")
+        error = str(e)
+    with _status_lock:
+        _status.update(running=False, last_result=result, last_error=error, finished_at=time.time())
+
+
+def start_reload(knowledge_dir: str = str(KNOWLEDGE_BASE_DIR), force: bool = False) -> bool:
+    """
+    Reload the knowledge base on a background thread.
+
+    Returns:
+        False (and does nothing) if a background reload is already running
+    """
+    with _status_lock:
+        if _status['running']:
+            return False
+        _status['running'] = True
+    threading.Thread(target=_run_reload, args=(knowledge_dir, force), name='kb-reload', daemon=True).start()
+    return True
+
+
+def knowledge_base_signature(knowledge_dir: str) -> tuple:
+    """Name, size and modification time of every markdown file; changes when any file does"""
+    files = []
+    for path in sorted(Path(knowledge_dir).glob('*.md')):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(files)
+
+
+class KnowledgeBaseWatcher:
+    """
+    Polls the knowledge base directory and reloads when its files change.
+
+    A change is only acted on once the directory has stopped changing for a
+    whole interval, so an editor or deploy writing several files in a row
+    triggers a single reload.
+
+    Args:
+        knowledge_dir: Directory of markdown files
+        interval: Seconds between polls
+    """
+
+    def __init__(self, knowledge_dir: str = str(KNOWLEDGE_BASE_DIR), interval: float = 5.0):
+        self.knowledge_dir = knowledge_dir
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'KnowledgeBaseWatcher':
+        self._thread = threading.Thread(target=self._run, name='kb-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        seen = knowledge_base_signature(self.knowledge_dir)
+        pending = None
+        while not self._stop.wait(self.interval):
+            current = knowledge_base_signature(self.knowledge_dir)
+            if current == seen:
+                pending = None
+                continue
+            if current != pending:
+                # Changed since the last poll: wait for it to settle
+                pending = current
+                continue
+            if start_reload(self.knowledge_dir):
+                logger.info(f"Knowledge base files changed in {self.knowledge_dir}; reloading")
+                seen, pending = current, None
@@ -0,0 +1,187 @@
+"""BM25 inverted index for lexical retrieval, and reciprocal-rank fusion
+
+Sentence embeddings blur exact identifiers: "Widget Pro X2", "IP67" or "$49"
+land near any product or pricing text. BM25 scores chunks by the query terms
+they literally contain, weighted by how rare each term is, so a model name
+or SKU pulls in the chunk that mentions it. rag.get_relevant_docs(mode='hybrid')
+runs both searches and fuses the rankings with reciprocal_rank_fusion().
+
+The index keeps per-chunk term counts (persisted as JSON) and derives the
+postings from them, so it can be updated chunk by chunk alongside the vector
+store. Writes are copy-on-write: a search takes the lock only to grab the
+postings and lengths it needs, and scores them outside it while writers
+publish new dicts.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from math import log
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Terms keep inner dots ("5.5", "v2.1") so versions and sizes stay one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+# Question words that carry no lexical signal in a support knowledge base
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or our
+the this to what when where which who why with you your
+""".split())
+
+# Reciprocal-rank fusion constant (Cormack et al.): damps the head of each ranking
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms, stopwords removed ("IP67-rated" -> ['ip67', 'rated'])"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk IDs.
+
+    Args:
+        k1: Term-frequency saturation
+        b: Document length normalization (0 = none, 1 = full)
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._terms: Dict[str, Dict[str, int]] = {}  # Chunk ID -> term counts
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}  # Term -> chunk ID -> count
+        self._total_length = 0
+        self._copied: set = set()  # Terms whose postings the current write already copied
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def ids(self) -> set:
+        return set(self._terms)
+
+    def upsert(self, ids: List[str], texts: List[str]):
+        """Index or re-index chunks"""
+        with self._writing():
+            for chunk_id, text in zip(ids, texts):
+                self._remove(chunk_id)
+                self._add(chunk_id, Counter(tokenize(text)))
+
+    def delete(self, ids: Iterable[str]):
+        with self._writing():
+            for chunk_id in ids:
+                self._remove(chunk_id)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the lock for a write that leaves the dicts searches grabbed untouched"""
+        with self._lock:
+            self._lengths = dict(self._lengths)
+            self._copied = set()
+            try:
+                yield
+            finally:
+                self._copied = set()
+
+    def _writable_postings(self, term: str) -> Dict[str, int]:
+        """The term's postings, copied the first time this write touches them"""
+        if term not in self._copied:
+            self._postings[term] = dict(self._postings.get(term, {}))
+            self._copied.add(term)
+        return self._postings[term]
+
+    def _add(self, chunk_id: str, counts: Dict[str, int]):
+        self._terms[chunk_id] = dict(counts)
+        length = sum(counts.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+        for term, count in counts.items():
+            self._writable_postings(term)[chunk_id] = count
+
+    def _remove(self, chunk_id: str):
+        counts = self._terms.pop(chunk_id, None)
+        if counts is None:
+            return
+        self._total_length -= self._lengths.pop(chunk_id)
+        for term in counts:
+            postings = self._writable_postings(term)
+            del postings[chunk_id]
+            if not postings:
+                del self._postings[term]
+                self._copied.discard(term)
+
+    def search(self, query: str, n_results: int = 10,
+               include: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        (chunk ID, score) of the best-scoring chunks, highest first; chunks sharing no term are left out.
+
+        include, if given, keeps only the chunk IDs it returns True for.
+        """
+        terms = set(tokenize(query))
+        # Writers replace these dicts rather than change them, so scoring
+        # needs the lock only to take a consistent set of them
+        with self._lock:
+            n = len(self._terms)
+            if not n:
+                return []
+            average_length = self._total_length / n
+            lengths = self._lengths
+            matched = [postings for postings in map(self._postings.get, terms) if postings]
+
+        scores: Dict[str, float] = {}
+        for postings in matched:
+            idf = log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, count in postings.items():
+                if include is not None and not include(chunk_id):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:n_results]
+
+    def to_dict(self) -> dict:
+        """Parameters and per-chunk term counts, JSON-serializable"""
+        with self._lock:
+            return {'k1': self.k1, 'b': self.b, 'chunks': dict(self._terms)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BM25Index':
+        index = cls(k1=data['k1'], b=data['b'])
+        with index._writing():
+            for chunk_id, counts in data['chunks'].items():
+                index._add(chunk_id, counts)
+        return index
+
+    def save(self, path: str):
+        """Write the term counts atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(self.to_dict())
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """Read an index written by save(); raises OSError or ValueError if missing or unreadable"""
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> Dict[str, float]:
+    """
+    Fuse ranked ID lists: each ID scores sum(1 / (k + rank)) over the lists
+    it appears in (rank starting at 1). Needs no score calibration between
+    BM25 and cosine similarity, only the order each produced.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
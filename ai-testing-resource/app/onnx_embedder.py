@@ -0,0 +1,119 @@
+"""all-MiniLM-L6-v2 on onnxruntime, without PyTorch
+
+SentenceTransformer loads full PyTorch and runs fp32 inference; the same
+model exported to ONNX runs on onnxruntime (already installed with Chroma)
+with a fraction of the import time and memory. OnnxEmbedder reproduces the
+sentence-transformers pipeline (WordPiece tokens truncated at 256, mean
+pooling over the attention mask, L2 normalization), so fp32 vectors match
+the PyTorch ones to float precision.
+
+With quantize=True the weights are converted once to dynamic int8
+(onnxruntime.quantization, which needs the onnx package) and cached beside
+the fp32 model. That is faster again on CPU, but vectors drift slightly, so
+int8 indexes are keyed separately (see rag.embedding_model_key).
+
+The model files are Chroma's ONNX export of all-MiniLM-L6-v2, in Chroma's
+cache directory; they are downloaded through Chroma the first time if
+missing.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Where Chroma's ONNXMiniLM_L6_V2 keeps the exported model
+DEFAULT_MODEL_DIR = Path.home() / '.cache' / 'chroma' / 'onnx_models' / 'all-MiniLM-L6-v2' / 'onnx'
+
+FP32_MODEL_FILE = 'model.onnx'
+INT8_MODEL_FILE = 'model_int8.onnx'
+
+# sentence-transformers' max_seq_length for all-MiniLM-L6-v2
+MAX_SEQ_LENGTH = 256
+
+
+def download_model(model_dir: Path):
+    """Fetch the ONNX export through Chroma's embedding function (checksum verified)"""
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    chroma_ef = ONNXMiniLM_L6_V2()
+    if Path(chroma_ef.DOWNLOAD_PATH) / chroma_ef.EXTRACTED_FOLDER_NAME != model_dir:
+        raise FileNotFoundError(f"No ONNX model in {model_dir} (only {DEFAULT_MODEL_DIR} is downloaded)")
+    logger.info(f"Downloading the ONNX all-MiniLM-L6-v2 export to {model_dir}")
+    # Its first call downloads the model when missing; one throwaway text
+    # keeps us on the public API instead of its private downloader
+    chroma_ef(['download'])
+
+
+def quantize_model(fp32_path: Path, int8_path: Path):
+    """Write a dynamic int8 copy of the model (weights int8, activations quantized at run time)"""
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("int8 quantization needs the onnx package: pip install onnx") from e
+
+    tmp = int8_path.with_name(int8_path.name + '.tmp')
+    quantize_dynamic(str(fp32_path), str(tmp), weight_type=QuantType.QInt8)
+    os.replace(tmp, int8_path)
+
+
+class OnnxEmbedder:
+    """
+    Sentence-transformers-compatible embedding function on onnxruntime.
+
+    Args:
+        model_dir: Directory holding model.onnx and tokenizer.json
+        quantize: Run the dynamic int8 model (created on first use)
+        threads: onnxruntime intra-op threads (0 = onnxruntime's default)
+    """
+
+    def __init__(self, model_dir: Optional[str] = None, quantize: bool = False, threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir) if model_dir else DEFAULT_MODEL_DIR
+        fp32_path = self.model_dir / FP32_MODEL_FILE
+        if not fp32_path.exists() or not (self.model_dir / 'tokenizer.json').exists():
+            download_model(self.model_dir)
+
+        model_path = fp32_path
+        if quantize:
+            model_path = self.model_dir / INT8_MODEL_FILE
+            if not model_path.exists():
+                logger.info(f"Quantizing {fp32_path} to int8")
+                quantize_model(fp32_path, model_path)
+        self.model_path = model_path
+
+        self._tokenizer = Tokenizer.from_file(str(self.model_dir / 'tokenizer.json'))
+        self._tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        # Pad to the longest text in each batch rather than to a fixed length
+        self._tokenizer.enable_padding(pad_id=0, pad_token='[PAD]')
+
+        options = onnxruntime.SessionOptions()
+        options.log_severity_level = 3
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        texts = list(input)
+        if not texts:
+            return []
+        encoded = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self._input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+
+        hidden = self._session.run(None, feeds)[0]  # (batch, tokens, 384)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return list((pooled / np.where(norms == 0, 1e-12, norms)).astype(np.float32))
@@ -0,0 +1,230 @@
+"""Composable answer pipeline with per-stage spans
+
+Each prompt version is declared as an ordered list of stages (embed,
+retrieve, build context, build prompt, call model, render, ...). A Pipeline
+runs the stages against a shared AnswerState and records one span per stage
+with real wall time and the sizes each stage reports. The spans use the same
+schema the trace viewer renders for the generated traces:
+
+    span_id, name, span_type, start_time, duration_ms, input, output, metadata
+
+(start_time is milliseconds since the pipeline started.)
+
+A stage can finish the answer early by setting state.done (e.g. a semantic
+cache hit); the remaining stages are skipped. The same stage list serves the
+blocking, async and streaming entry points: the model stage provides all
+three call styles, and blocking stages run in an executor under asyncio.
+"""
+
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .utils import format_response
+
+
+@dataclass
+class Span:
+    """Timing and summary of one stage run"""
+    span_id: str
+    name: str
+    span_type: str
+    start_time: int
+    duration_ms: int = 0
+    input: Dict[str, Any] = field(default_factory=dict)
+    output: Dict[str, Any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            'span_id': self.span_id,
+            'name': self.name,
+            'span_type': self.span_type,
+            'start_time': self.start_time,
+            'duration_ms': self.duration_ms,
+            'input': self.input,
+            'output': self.output,
+            'metadata': self.metadata,
+        }
+
+
+@dataclass
+class AnswerState:
+    """Everything stages read and write while answering one question"""
+    question: str
+    version: str
+    embedding: Any = None
+    route: Any = None  # query_router.RouteDecision: the categories retrieval searches
+    kb_generation: Optional[str] = None  # Knowledge base generation the docs came from
+    chunks: List[dict] = field(default_factory=list)  # Retrieved candidate chunks, unmerged, best first
+    docs: List[dict] = field(default_factory=list)  # As retrieved, most relevant first
+    context_docs: List[dict] = field(default_factory=list)  # As packed into the context
+    context: Optional[str] = None
+    sources: List[dict] = field(default_factory=list)
+    system: Any = None  # str, or a list of system blocks
+    system_prompt: Optional[str] = None  # Flattened system prompt for the trace
+    max_tokens: int = 512
+    response: Any = None
+    text: str = ''  # HTML once rendered
+    markdown: str = ''  # The answer before rendering, as streamed to clients
+    tokens: Dict[str, int] = field(default_factory=dict)
+    trace: Dict[str, Any] = field(default_factory=dict)
+    cache: Optional[dict] = None
+    first_token_ms: Optional[int] = None
+    done: bool = False  # Set by a stage that has produced the final answer
+
+
+class Stage:
+    """One step of an answer pipeline.
+
+    Subclasses set name and span_type and implement run(). Stages that block
+    on CPU or disk set blocking = True so the async runner moves them off the
+    event loop; stages doing network I/O override run_async() instead.
+    """
+    name = ''
+    span_type = ''
+    blocking = False
+
+    def run(self, state: AnswerState, span: Span):
+        raise NotImplementedError
+
+    async def run_async(self, state: AnswerState, span: Span):
+        if self.blocking:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.run, state, span)
+        else:
+            self.run(state, span)
+
+
+class FunctionStage(Stage):
+    """Stage backed by a plain function(state, span)"""
+
+    def __init__(self, name: str, span_type: str, fn: Callable[[AnswerState, Span], None],
+                 blocking: bool = False):
+        self.name = name
+        self.span_type = span_type
+        self.fn = fn
+        self.blocking = blocking
+
+    def run(self, state: AnswerState, span: Span):
+        self.fn(state, span)
+
+
+class StreamingStage(Stage):
+    """A stage that can also yield text deltas as it produces them (the model call)"""
+
+    def stream(self, state: AnswerState, span: Span, started: float) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class _SpanRecorder:
+    """Collects spans for one pipeline run"""
+
+    def __init__(self, version: str):
+        self.trace_id = f"{version}-{uuid.uuid4().hex[:12]}"
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+
+    def elapsed_ms(self) -> int:
+        return int((time.perf_counter() - self.started) * 1000)
+
+    @contextmanager
+    def record(self, stage: Stage):
+        span = Span(
+            span_id=f"{self.trace_id}-span-{len(self.spans) + 1}",
+            name=stage.name,
+            span_type=stage.span_type,
+            start_time=self.elapsed_ms(),
+        )
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.metadata['error'] = type(e).__name__
+            raise
+        finally:
+            span.duration_ms = int((time.perf_counter() - start) * 1000)
+            self.spans.append(span)
+
+
+class Pipeline:
+    """An ordered list of stages answering questions for one prompt version"""
+
+    def __init__(self, version: str, stages: List[Stage]):
+        self.version = version
+        self.stages = stages
+
+    def _new_state(self, question: str, state_fields: dict) -> AnswerState:
+        return AnswerState(question=question, version=self.version, **state_fields)
+
+    def run(self, question: str, **state_fields) -> dict:
+        """Run every stage in the calling thread and return the formatted response"""
+        state = self._new_state(question, state_fields)
+        recorder = _SpanRecorder(self.version)
+
+        for stage in self.stages:
+            with recorder.record(stage) as span:
+                stage.run(state, span)
+            if state.done:
+                break
+
+        return self._finish(state, recorder)
+
+    async def run_async(self, question: str, **state_fields) -> dict:
+        """Run the stages on the event loop (blocking stages in the default executor)"""
+        state = self._new_state(question, state_fields)
+        recorder = _SpanRecorder(self.version)
+
+        for stage in self.stages:
+            with recorder.record(stage) as span:
+                await stage.run_async(state, span)
+            if state.done:
+                break
+
+        return self._finish(state, recorder)
+
+    def stream(self, question: str, **state_fields) -> Iterator[dict]:
+        """
+        Run the stages, streaming text from the StreamingStage as it arrives.
+
+        Yields {'event': 'delta', 'data': {'text'}} events followed by one
+        {'event': 'done', 'data': <response>}. Deltas are always the unrendered
+        (markdown) answer; the done payload carries the rendered text. A
+        pipeline that finishes early (cache hit, low-confidence fallback)
+        yields its whole markdown answer as a single delta.
+        """
+        state = self._new_state(question, state_fields)
+        recorder = _SpanRecorder(self.version)
+
+        for stage in self.stages:
+            with recorder.record(stage) as span:
+                if isinstance(stage, StreamingStage):
+                    for text in stage.stream(state, span, recorder.started):
+                        yield {'event': 'delta', 'data': {'text': text}}
+                else:
+                    stage.run(state, span)
+            if state.done:
+                markdown = state.markdown or state.text  # Stages that never render set text only
+                if markdown:
+                    yield {'event': 'delta', 'data': {'text': markdown}}
+                break
+
+        yield {'event': 'done', 'data': self._finish(state, recorder)}
+
+    def _finish(self, state: AnswerState, recorder: _SpanRecorder) -> dict:
+        latency_ms = recorder.elapsed_ms()
+        trace = dict(state.trace)
+        trace['spans'] = [span.to_dict() for span in recorder.spans]
+
+        return format_response(
+            text=state.text,
+            sources=state.sources,
+            latency_ms=latency_ms,
+            time_to_first_token_ms=state.first_token_ms,
+            tokens=state.tokens,
+            trace=trace,
+            cache=state.cache
+        )
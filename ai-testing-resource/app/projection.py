@@ -0,0 +1,290 @@
+"""Dimensionality-reduced vector search: PCA or Matryoshka truncation
+
+ProjectedIndex is a NumpyIndex (VECTOR_INDEX_MODE=projected) that searches
+a reduced copy of the embeddings, typically 64-128 dimensions instead of
+384, so the matrix every query scans is 3-6x smaller. float16 storage halves
+it again, but NumPy has no half-precision matrix product: float16 rows are
+upcast block by block on every scan, which costs more CPU than it saves, so
+it is for memory-bound deployments. The projection is fitted on the
+knowledge base when the index is published (so once per bulk ingest inside
+deferred_writes()) and applied to query embeddings the same way:
+
+- pca: the top principal directions of the stored embeddings (uncentered,
+  so dot products in the reduced space approximate the full cosines)
+- truncate: the first dimensions, renormalized; only meaningful for
+  Matryoshka-trained embedding models, whose leading dimensions carry most
+  of the signal
+
+With rescore > 0 the rescore * k best reduced-space candidates are re-scored
+exactly on the full vectors and the final top k and distances are exact.
+The full matrix stays on disk memory-mapped once the index is reopened, so
+only the re-scored rows are read. Full vectors are still what get() returns
+(category centroids, index snapshots).
+
+On disk the index adds projection.npz (method and components) and
+reduced.npy to the NumpyIndex files. scripts/benchmark_projection.py
+reports recall against memory per setting.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .vector_index import (QUERY_BATCH_ROWS, NumpyIndex, _normalize, _partition_rows, _replace_file, _Snapshot,
+                           _top_k, _top_k_rows)
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_FILE = 'projection.npz'
+REDUCED_FILE = 'reduced.npy'
+
+METHODS = ('pca', 'truncate')
+DTYPES = ('float32', 'float16')
+
+# Rows projected, or upcast to float32 for scoring, per block
+PROJECT_BATCH_ROWS = 65536
+
+
+@dataclass(frozen=True)
+class Projection:
+    """
+    A fitted reduction from full embeddings to dimensions.
+
+    Attributes:
+        method: 'pca' or 'truncate'
+        dimensions: Reduced dimensionality
+        components: (full dimensions, dimensions) for pca, None for truncate
+        fitted_rows: Rows the projection was fitted on
+        retained: Share of the embeddings' energy (sum of squares) kept
+    """
+    method: str
+    dimensions: int
+    components: Optional[np.ndarray]
+    fitted_rows: int
+    retained: float
+
+    def apply(self, vectors) -> np.ndarray:
+        """Reduced float32 rows for full (normalized) embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == 'truncate':
+            return _normalize(vectors[..., :self.dimensions])
+        return vectors @ self.components
+
+    def save(self, f):
+        components = self.components if self.components is not None else np.zeros((0, 0), dtype=np.float32)
+        np.savez(f, method=self.method, dimensions=self.dimensions, components=components,
+                 fitted_rows=self.fitted_rows, retained=self.retained)
+
+    @classmethod
+    def load(cls, path) -> 'Projection':
+        with np.load(path) as data:
+            method = str(data['method'])
+            return cls(method, int(data['dimensions']), data['components'] if method == 'pca' else None,
+                       int(data['fitted_rows']), float(data['retained']))
+
+
+def fit_projection(vectors: np.ndarray, dimensions: int, method: str = 'pca') -> Projection:
+    """
+    Fit a projection of (n, dim) unit-length rows to dimensions.
+
+    PCA accumulates the (dim, dim) second-moment matrix block by block, so
+    fitting costs one pass over the rows whatever their number.
+    """
+    n, dim = vectors.shape
+    if not 0 < dimensions < dim:
+        raise ValueError(f"Projection to {dimensions} dimensions needs 0 < dimensions < {dim}")
+    if method not in METHODS:
+        raise ValueError(f"Unknown projection method: {method}")
+
+    if method == 'truncate':
+        energy = sum(float(np.sum(np.square(vectors[start:start + PROJECT_BATCH_ROWS, :dimensions],
+                                            dtype=np.float64)))
+                     for start in range(0, n, PROJECT_BATCH_ROWS))
+        return Projection('truncate', dimensions, None, n, energy / n if n else 0.0)
+
+    moment = np.zeros((dim, dim), dtype=np.float64)
+    for start in range(0, n, PROJECT_BATCH_ROWS):
+        block = np.asarray(vectors[start:start + PROJECT_BATCH_ROWS], dtype=np.float64)
+        moment += block.T @ block
+    eigenvalues, eigenvectors = np.linalg.eigh(moment)  # Ascending
+    top = np.argsort(eigenvalues)[::-1][:dimensions]
+    total = float(np.trace(moment))
+    retained = float(np.sum(eigenvalues[top])) / total if total else 0.0
+    components = np.ascontiguousarray(eigenvectors[:, top], dtype=np.float32)
+    return Projection('pca', dimensions, components, n, retained)
+
+
+def project_rows(projection: Projection, matrix: np.ndarray, dtype: str) -> np.ndarray:
+    """The reduced matrix, projected a block at a time"""
+    reduced = np.empty((len(matrix), projection.dimensions), dtype=dtype)
+    for start in range(0, len(matrix), PROJECT_BATCH_ROWS):
+        reduced[start:start + PROJECT_BATCH_ROWS] = projection.apply(matrix[start:start + PROJECT_BATCH_ROWS])
+    return reduced
+
+
+def _scan(queries: np.ndarray, reduced: np.ndarray) -> np.ndarray:
+    """(queries, rows) reduced-space scores; float16 rows are upcast a block at a time"""
+    scores = np.empty((len(queries), len(reduced)), dtype=np.float32)
+    for start in range(0, len(reduced), PROJECT_BATCH_ROWS):
+        block = reduced[start:start + PROJECT_BATCH_ROWS].astype(np.float32, copy=False)
+        scores[:, start:start + len(block)] = queries @ block.T
+    return scores
+
+
+@dataclass(frozen=True)
+class _ProjectedState:
+    """Snapshot plus its reduced rows, published together"""
+    snapshot: _Snapshot
+    projection: Optional[Projection]  # None below min_fit_rows
+    reduced: Optional[np.ndarray]  # (n, dimensions) in the configured dtype
+
+
+class ProjectedIndex(NumpyIndex):
+    """
+    Index that scans reduced vectors and re-scores its best candidates on full ones.
+
+    Args:
+        path: Index directory
+        dimensions: Stored dimensions searched per query
+        method: 'pca' or 'truncate' (Matryoshka models only)
+        dtype: 'float32' or 'float16' (half the memory, slower scans) for
+            the reduced vectors
+        rescore: Re-score rescore * k candidates on full vectors; 0 returns
+            reduced-space results and approximate distances
+        min_fit_rows: Search full vectors until the index has this many rows
+        refit_growth: Refit once rows exceed this multiple of the last fit
+    """
+
+    def __init__(self, path: str, dimensions: int = 128, method: str = 'pca', dtype: str = 'float32',
+                 rescore: int = 4, min_fit_rows: int = 1024, refit_growth: float = 2.0):
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported projection dtype: {dtype}")
+        self.dimensions = dimensions
+        self.method = method
+        self.dtype = dtype
+        self.rescore = rescore
+        self.min_fit_rows = min_fit_rows
+        self.refit_growth = refit_growth
+        super().__init__(path)
+        self._projected = self._load_projected(self._snapshot)
+        if self._stale(self._projected):
+            # e.g. an index built in exact mode, or opened with other settings
+            with self._lock:
+                self._publish()
+
+    # ---- projection ----
+
+    def _load_projected(self, snapshot: _Snapshot) -> _ProjectedState:
+        try:
+            projection = Projection.load(self.path / PROJECTION_FILE)
+            reduced = np.load(self.path / REDUCED_FILE, mmap_mode='r')
+            if len(reduced) == len(snapshot.ids):
+                return _ProjectedState(snapshot, projection, reduced)
+            logger.warning(f"Reduced vectors at {self.path} do not match the index, reprojecting")
+        except (OSError, KeyError, ValueError):
+            pass
+        return _ProjectedState(snapshot, None, None)
+
+    def _fits(self, projection: Optional[Projection]) -> bool:
+        """Whether a projection was fitted with the current settings"""
+        return (projection is not None and projection.method == self.method
+                and projection.dimensions == self.dimensions)
+
+    def _searches_full(self, snapshot: _Snapshot) -> bool:
+        """Too few rows to fit on, or nothing to reduce"""
+        rows, dim = snapshot.matrix.shape
+        return rows < max(1, self.min_fit_rows) or dim <= self.dimensions
+
+    def _stale(self, state: _ProjectedState) -> bool:
+        if self._searches_full(state.snapshot):
+            return state.projection is not None
+        return (not self._fits(state.projection) or state.reduced.dtype != np.dtype(self.dtype)
+                or len(state.snapshot.ids) > self.refit_growth * state.projection.fitted_rows)
+
+    def _publish(self):
+        snap = self._pending
+        projection, reduced = self._projected.projection, None
+        if self._searches_full(snap):
+            projection = None
+        else:
+            if not self._fits(projection) or len(snap.ids) > self.refit_growth * projection.fitted_rows:
+                projection = fit_projection(snap.matrix, self.dimensions, self.method)
+                logger.info(f"Fitted {self.method} projection at {self.path}: {snap.matrix.shape[1]} -> "
+                            f"{self.dimensions} dimensions, {projection.retained:.1%} of energy retained")
+            reduced = project_rows(projection, snap.matrix, self.dtype)
+        super()._publish()
+        if projection is not None:
+            _replace_file(self.path / PROJECTION_FILE, projection.save)
+            _replace_file(self.path / REDUCED_FILE, lambda f: np.save(f, reduced))
+        else:
+            for name in (PROJECTION_FILE, REDUCED_FILE):
+                (self.path / name).unlink(missing_ok=True)
+        self._projected = _ProjectedState(snap, projection, reduced)
+
+    def storage(self) -> dict:
+        """Bytes of the full and the searched (reduced) vectors, and the energy the projection keeps"""
+        state = self._projected
+        rows, dim = state.snapshot.matrix.shape
+        full_bytes = rows * dim * 4
+        if state.reduced is None:
+            return {'rows': rows, 'dimensions': dim, 'projected': False, 'full_bytes': full_bytes,
+                    'searched_bytes': full_bytes}
+        return {
+            'rows': rows,
+            'dimensions': dim,
+            'projected': True,
+            'method': state.projection.method,
+            'reduced_dimensions': state.projection.dimensions,
+            'dtype': str(state.reduced.dtype),
+            'retained': round(state.projection.retained, 4),
+            'full_bytes': full_bytes,
+            'searched_bytes': int(state.reduced.nbytes),
+        }
+
+    # ---- read path ----
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None,
+              rescore: Optional[int] = None, **_) -> dict:
+        """
+        Like NumpyIndex.query, scanning the reduced vectors.
+
+        rescore overrides the index setting for this call.
+        """
+        state = self._projected
+        if state.projection is None:
+            return super().query(query_embeddings, n_results, where=where)
+
+        snap = state.snapshot
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        reduced_queries = state.projection.apply(queries)
+        if where:
+            partitions = self._partitions_for(snap, where)
+            blocks = [p.block('reduced', state.reduced) for p in partitions]
+            rows = _partition_rows(partitions)
+        else:
+            blocks, rows = [state.reduced], None
+        searched = sum(len(block) for block in blocks)
+        k = min(n_results, searched)
+        if not k:
+            return self._result(snap, [None] * len(queries))
+        rescore = self.rescore if rescore is None else rescore
+        candidates = min(searched, k * rescore) if rescore else k
+
+        ranked = []
+        for start in range(0, len(queries), QUERY_BATCH_ROWS):
+            batch = reduced_queries[start:start + QUERY_BATCH_ROWS]
+            scores = np.concatenate([_scan(batch, block) for block in blocks], axis=1)
+            top = _top_k_rows(scores, candidates)
+            positions = top if rows is None else rows[top]
+            if not rescore:
+                ranked.extend(zip(positions, np.take_along_axis(scores, top, axis=1)))
+                continue
+            for query, candidate_rows in zip(queries[start:start + QUERY_BATCH_ROWS], positions):
+                exact = np.asarray(snap.matrix[candidate_rows], dtype=np.float32) @ query
+                best = _top_k(exact, k)
+                ranked.append((candidate_rows[best], exact[best]))
+        return self._result(snap, ranked)
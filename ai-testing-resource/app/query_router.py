@@ -0,0 +1,164 @@
+"""Local query router: which knowledge base partitions a question needs
+
+Every chunk carries the category rag.categorize_doc gives its document
+(pricing, returns, shipping, products, general). The router predicts the
+categories a question is about, without a model call, so V3 retrieval only
+scores those partitions:
+
+- keyword rules: the share of the question's category keywords per category
+- nearest centroid: cosine similarity between the question embedding (the
+  one V3 already computes) and each category's mean chunk embedding
+
+A category's score is its centroid similarity plus keyword_weight times its
+keyword share. The categories within min_margin of the best score are
+searched; when more than max_partitions are that close (or there is nothing
+to route on) the router falls back to a global search.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .lexical import tokenize
+
+# Terms that point at a category; matched against lexical.tokenize() output
+KEYWORD_RULES = {
+    'pricing': frozenset("""
+        price prices pricing cost costs cheap cheaper expensive plan plans tier tiers subscription
+        subscriptions billing billed monthly annual annually discount discounts fee fees quote
+        enterprise pay paying payment
+    """.split()),
+    'returns': frozenset("""
+        return returns returned returning refund refunds refunded exchange exchanges warranty
+        defective damaged broken faulty restocking rma
+    """.split()),
+    'shipping': frozenset("""
+        ship ships shipped shipping delivery deliver delivered arrive arrives tracking track
+        courier carrier express overnight international customs package parcel dispatch
+    """.split()),
+    'products': frozenset("""
+        spec specs specification specifications feature features battery waterproof ip67
+        dimensions weight size compatible compatibility sensor sensors model models
+    """.split()),
+}
+
+
+@dataclass
+class RouteDecision:
+    """
+    Where one question is searched.
+
+    Attributes:
+        category: Best-scoring category (None if nothing could be scored)
+        categories: Partitions to search; empty means the whole collection
+        confidence: Score gap between the last searched and the first
+            skipped category (0 on fallback)
+        method: 'keywords+centroid', 'centroid' or 'none'
+        scores: Combined score per category
+        fallback: True when the question is searched globally
+    """
+    category: Optional[str]
+    categories: List[str]
+    confidence: float
+    method: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    fallback: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            'category': self.category,
+            'categories': self.categories,
+            'confidence': round(self.confidence, 4),
+            'method': self.method,
+            'scores': {category: round(score, 4) for category, score in self.scores.items()},
+            'fallback': self.fallback,
+        }
+
+
+class QueryRouter:
+    """
+    Keyword rules plus nearest centroid over category partitions.
+
+    Args:
+        min_margin: Categories scoring within this of the best are searched too
+        max_partitions: Fall back to a global search when more categories than
+            this are within min_margin
+        keyword_weight: Weight of the keyword share against cosine similarity
+        rules: Keywords per category (default: KEYWORD_RULES)
+    """
+
+    def __init__(self, min_margin: float = 0.05, max_partitions: int = 2, keyword_weight: float = 0.2,
+                 rules: Optional[Dict[str, frozenset]] = None):
+        self.min_margin = min_margin
+        self.max_partitions = max_partitions
+        self.keyword_weight = keyword_weight
+        self.rules = KEYWORD_RULES if rules is None else rules
+        self._lock = threading.Lock()
+        self._routed = 0
+        self._fallbacks = 0
+        self._by_category: Dict[str, int] = {}
+
+    def keyword_shares(self, question: str) -> Dict[str, float]:
+        """Fraction of the question's keyword hits that belong to each category"""
+        terms = tokenize(question)
+        hits = {category: sum(term in keywords for term in terms) for category, keywords in self.rules.items()}
+        total = sum(hits.values())
+        return {category: count / total for category, count in hits.items() if count} if total else {}
+
+    def route(self, question: str, embedding, centroids: Dict[str, np.ndarray]) -> RouteDecision:
+        """
+        Decide which partitions to search for a question.
+
+        Args:
+            question: Question text (for the keyword rules)
+            embedding: Question embedding, or None
+            centroids: Unit-length mean chunk embedding per category present
+                in the knowledge base (rag.category_centroids)
+        """
+        decision = self._decide(question, embedding, centroids)
+        with self._lock:
+            self._routed += 1
+            if decision.fallback:
+                self._fallbacks += 1
+            else:
+                self._by_category[decision.category] = self._by_category.get(decision.category, 0) + 1
+        return decision
+
+    def _decide(self, question: str, embedding, centroids: Dict[str, np.ndarray]) -> RouteDecision:
+        if embedding is None or len(centroids) < 2:
+            # Nothing to compare, or a single partition that is the whole collection anyway
+            return RouteDecision(None, [], 0.0, 'none', fallback=True)
+
+        q = np.asarray(embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        shares = self.keyword_shares(question)
+        scores = {category: float(np.dot(q, centroid)) + self.keyword_weight * shares.get(category, 0.0)
+                  for category, centroid in centroids.items()}
+        method = 'keywords+centroid' if any(category in centroids for category in shares) else 'centroid'
+
+        ranked = sorted(scores, key=lambda category: (-scores[category], category))
+        best = scores[ranked[0]]
+        selected = [category for category in ranked if best - scores[category] <= self.min_margin]
+        if len(selected) > self.max_partitions or len(selected) == len(ranked):
+            return RouteDecision(ranked[0], [], 0.0, method, scores, fallback=True)
+
+        confidence = scores[selected[-1]] - scores[ranked[len(selected)]]
+        return RouteDecision(ranked[0], sorted(selected), confidence, method, scores)
+
+    def snapshot(self) -> dict:
+        """Routing counters: questions routed, global fallbacks and their rate, routes per top category"""
+        with self._lock:
+            return {
+                'routed': self._routed,
+                'fallbacks': self._fallbacks,
+                'fallback_rate': round(self._fallbacks / self._routed, 4) if self._routed else 0.0,
+                'by_category': dict(self._by_category),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routed = 0
+            self._fallbacks = 0
+            self._by_category = {}
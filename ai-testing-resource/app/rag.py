@@ -1,8 +1,49 @@
-"""RAG (Retrieval Augmented Generation) with Chroma vector store"""
-
+"""RAG (Retrieval Augmented Generation) with a pluggable vector store
+
+VECTOR_BACKEND selects the store behind get_collection(): 'chroma' (a Chroma
+PersistentClient collection at CHROMA_PATH) or 'numpy' (app.vector_index, an
+in-process matrix index at VECTOR_INDEX_PATH that never imports chromadb,
+searched exactly, over reduced vectors (VECTOR_INDEX_MODE=projected) or,
+with VECTOR_INDEX_MODE=ivf, approximately).
+Both expose the same count/get/upsert/delete/query calls.
+
+A BM25 index over the same chunks (app.lexical) is kept in sync by
+initialize_knowledge_base; get_relevant_docs(mode='hybrid') fuses its
+ranking with the vector ranking. get_relevant_docs_batch serves many
+queries with batched embedding and vector search (evals, replays).
+
+The collection and BM25 index together form a KnowledgeBaseGeneration.
+reload_knowledge_base builds a new generation beside the active one and
+swaps it in with a single assignment, so queries already running finish
+against the generation they started with. A build-time index snapshot
+(app.index_snapshot, INDEX_SNAPSHOT_PATH) that matches the embedding model
+and knowledge base files is served as a read-only generation, so startup
+embeds nothing.
+"""
+
+import contextlib
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
+
+import numpy as np
+
+from config import (CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS, EMBED_BATCH_SIZE, EMBEDDING_BACKEND,
+                    EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH, HYBRID_CANDIDATES, IVF_MIN_TRAIN_ROWS,
+                    INDEX_SNAPSHOT_PATH, IVF_NLIST, IVF_NPROBE, KNOWLEDGE_BASE_DIR, ONNX_MODEL_DIR, ONNX_THREADS,
+                    PROJECTION_DIMENSIONS, PROJECTION_DTYPE, PROJECTION_METHOD, PROJECTION_MIN_ROWS,
+                    PROJECTION_RESCORE, QUERY_EMBEDDING_CACHE_SIZE, RETRIEVAL_MODE, VECTOR_BACKEND,
+                    VECTOR_INDEX_MODE, VECTOR_INDEX_PATH)
+from .chunking import chunk_markdown, merge_chunks
+from .embedding_cache import CachedEmbeddingFunction, EmbeddingLRU, EmbeddingStore, normalize_text
+from .lexical import BM25Index, reciprocal_rank_fusion
 
 # Lazy imports - only import chromadb when needed to avoid startup errors
 # This prevents chromadb telemetry from blocking Flask startup
@@ -10,10 +51,44 @@ from typing import List, Dict, Optional
 # Initialize Chroma
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
 
+# Where the store was kept while CHROMA_PATH was ignored: chromadb's default
+# PersistentClient path, relative to the working directory
+LEGACY_CHROMA_PATH = "./chroma"
+
+# Chroma collection of the base generation; later generations add a suffix
+COLLECTION_NAME = "acme_knowledge_base"
+
+# Sentence-transformers model used for documents and queries
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+EMBEDDING_BACKENDS = ('sentence-transformers', 'onnx', 'onnx-int8')
+
+# Generation slot of the build-time index snapshot
+SNAPSHOT_SLOT = 'snapshot'
+
+# Index manifest format; bump to force a full re-index
+MANIFEST_VERSION = 1
+
+# Chunks embedded and upserted per call while indexing
+INDEX_BATCH_SIZE = 256
+
+# Query embeddings searched per vector store call in get_relevant_docs_batch
+QUERY_BATCH_SIZE = 256
+
 # Lazy initialization
 _chroma_client = None
-_collection = None
+_generation = None
 _embedding_function = None
+_embedding_store = None
+
+# One generation is built at a time
+_reload_lock = threading.Lock()
+
+# Question embeddings by (model, normalized text), shared by every request
+query_embedding_cache = EmbeddingLRU(QUERY_EMBEDDING_CACHE_SIZE)
+
+# Runs the BM25 search while the calling thread runs the vector query
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lexical')
 
 
 def get_chroma_client():
@@ -33,79 +108,548 @@ def get_chroma_client():
             anonymized_telemetry=False,
             persist_directory=CHROMA_PATH
         )
-        _chroma_client = chromadb.PersistentClient(settings=settings)
+        _migrate_legacy_store()
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH, settings=settings)
     return _chroma_client
 
 
+def _migrate_legacy_store():
+    """
+    Move a Chroma store left at LEGACY_CHROMA_PATH into CHROMA_PATH, once.
+
+    Only when CHROMA_PATH is missing or empty, so an existing store there is
+    never overwritten. The contents move rather than the directory itself,
+    since CHROMA_PATH may be a mounted volume.
+    """
+    legacy = Path(LEGACY_CHROMA_PATH)
+    target = Path(CHROMA_PATH)
+    if not (legacy / 'chroma.sqlite3').exists() or legacy.resolve() == target.resolve():
+        return
+    if target.exists() and any(target.iterdir()):
+        return
+    target.mkdir(parents=True, exist_ok=True)
+    for path in legacy.iterdir():
+        shutil.move(str(path), str(target / path.name))
+    legacy.rmdir()
+    print(f"Moved the Chroma store from {legacy} to {target}")
+
+
+class SentenceTransformerEmbedder:
+    """Chroma's SentenceTransformerEmbeddingFunction without importing chromadb"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self._model = SentenceTransformer(model_name)
+
+    def __call__(self, input: List[str]) -> List:
+        return list(self._model.encode(list(input), convert_to_numpy=True))
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """The persistent embedding store at EMBEDDING_CACHE_PATH (None when disabled)"""
+    global _embedding_store
+    if _embedding_store is None and EMBEDDING_CACHE_PATH:
+        _embedding_store = EmbeddingStore(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _embedding_store
+
+
+def embedding_store_snapshot() -> Optional[dict]:
+    """Embedding store counters, once the store is in use (None before, or when disabled)"""
+    return _embedding_store.snapshot() if _embedding_store is not None else None
+
+
+def embedding_model_key() -> str:
+    """
+    Identifies the vectors the configured model produces, for the index
+    manifest and the embedding caches. ONNX fp32 reproduces the PyTorch
+    vectors, so it shares their key; int8 vectors differ, so they get their own.
+    """
+    return f"{EMBEDDING_MODEL}:int8" if EMBEDDING_BACKEND == 'onnx-int8' else EMBEDDING_MODEL
+
+
 def get_embedding_function():
-    """Get the embedding function - uses sentence-transformers (local, free)"""
+    """
+    Get the embedding function - uses sentence-transformers (local, free).
+
+    EMBEDDING_BACKEND selects PyTorch or onnxruntime inference of the same
+    model. Wrapped with the persistent embedding store, when enabled, so the
+    model only runs on text no worker has embedded before.
+    """
     global _embedding_function
     if _embedding_function is None:
-        # Import chromadb embedding functions only when needed (lazy import)
-        from chromadb.utils import embedding_functions
-        # Use sentence-transformers for embeddings (works locally without API)
-        _embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND!r}; use one of {EMBEDDING_BACKENDS}")
+        if EMBEDDING_BACKEND != 'sentence-transformers':
+            from .onnx_embedder import OnnxEmbedder
+            ef = OnnxEmbedder(ONNX_MODEL_DIR or None, quantize=EMBEDDING_BACKEND == 'onnx-int8',
+                              threads=ONNX_THREADS)
+        elif VECTOR_BACKEND == 'numpy':
+            ef = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        else:
+            # Import chromadb embedding functions only when needed (lazy import)
+            from chromadb.utils import embedding_functions
+            # Use sentence-transformers for embeddings (works locally without API)
+            ef = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=EMBEDDING_MODEL
+            )
+        store = get_embedding_store()
+        _embedding_function = CachedEmbeddingFunction(ef, store, embedding_model_key()) if store else ef
     return _embedding_function
 
 
+def index_path() -> str:
+    """Where the active backend keeps its data"""
+    return VECTOR_INDEX_PATH if VECTOR_BACKEND == 'numpy' else CHROMA_PATH
+
+
+@dataclass
+class KnowledgeBaseGeneration:
+    """
+    One build of the knowledge base: a vector collection and its BM25 index.
+
+    A query takes the active generation once and uses it throughout, so a
+    reload never shows it a half-built index.
+
+    Attributes:
+        slot: Where it is stored ('' for the base location, 'gen-<n>' for
+            reloads, SNAPSHOT_SLOT for the build-time snapshot)
+        collection: The vector store
+        id: Fingerprint of the documents, embedding model and chunking it holds
+        lexical: BM25 index, loaded on first use (see get_lexical_index)
+        manifest: Index manifest, when held in memory rather than in the
+            slot's manifest file (snapshots)
+        centroids: Mean chunk embedding per category, computed on first use
+            (see category_centroids)
+    """
+    slot: str
+    collection: Any
+    id: str = ''
+    lexical: Optional[BM25Index] = None
+    manifest: Optional[dict] = None
+    centroids: Optional[Dict[str, np.ndarray]] = None
+
+
+def _slot_path(slot: str) -> Path:
+    """Base of a generation's files: the backend's data path, suffixed for later generations"""
+    data_path = Path(index_path())
+    return data_path.with_name(f"{data_path.name}.{slot}") if slot else data_path
+
+
+def generation_pointer_path() -> Path:
+    """Records which generation is active (e.g. <CHROMA_PATH>.generation.json)"""
+    data_path = Path(index_path())
+    return data_path.with_name(data_path.name + '.generation.json')
+
+
+def _open_collection(slot: str):
+    """Open or create a generation's collection for the configured backend"""
+    if VECTOR_BACKEND == 'numpy':
+        from .vector_index import open_index
+        if VECTOR_INDEX_MODE == 'projected':
+            params = dict(method=PROJECTION_METHOD, dimensions=PROJECTION_DIMENSIONS, dtype=PROJECTION_DTYPE,
+                          rescore=PROJECTION_RESCORE, min_fit_rows=PROJECTION_MIN_ROWS)
+        else:
+            params = dict(nlist=IVF_NLIST, nprobe=IVF_NPROBE, min_train_rows=IVF_MIN_TRAIN_ROWS)
+        return open_index(str(_slot_path(slot)), VECTOR_INDEX_MODE, **params)
+    return get_chroma_client().get_or_create_collection(
+        name=f"{COLLECTION_NAME}_{slot}" if slot else COLLECTION_NAME,
+        embedding_function=get_embedding_function()
+    )
+
+
+def _open_snapshot_generation() -> Optional[KnowledgeBaseGeneration]:
+    """The index snapshot at INDEX_SNAPSHOT_PATH, if there is one built from this model and knowledge base"""
+    if not INDEX_SNAPSHOT_PATH or not Path(INDEX_SNAPSHOT_PATH).exists():
+        return None
+    from .index_snapshot import SnapshotMismatch, load_snapshot
+
+    knowledge_path = Path(KNOWLEDGE_BASE_DIR)
+    fingerprint = _fingerprint(_scan(knowledge_path)) if knowledge_path.exists() else None
+    try:
+        collection = load_snapshot(INDEX_SNAPSHOT_PATH, embedding_model_key(), fingerprint)
+    except (OSError, KeyError, SnapshotMismatch) as e:
+        print(f"Index snapshot not used: {e}")
+        return None
+    return KnowledgeBaseGeneration(SNAPSHOT_SLOT, collection, fingerprint,
+                                   lexical=BM25Index.from_dict(collection.info['lexical']),
+                                   manifest=collection.info['manifest'])
+
+
+def active_generation() -> KnowledgeBaseGeneration:
+    """
+    The generation queries should use. Opened on first call: the index
+    snapshot if it matches, else the slot named in the pointer file, else
+    (pointer lost) the newest fully built slot.
+    """
+    global _generation
+    if _generation is None:
+        generation = _open_snapshot_generation()
+        if generation is None:
+            try:
+                slot = json.loads(generation_pointer_path().read_text()).get('slot', '')
+            except (OSError, ValueError):
+                slot = _newest_built_slot()
+            generation = KnowledgeBaseGeneration(slot, _open_collection(slot), _fingerprint(_load_manifest(slot)))
+        _generation = generation
+    return _generation
+
+
+def _generation_manifest(generation: KnowledgeBaseGeneration) -> dict:
+    """The manifest a generation was built with"""
+    return generation.manifest if generation.manifest is not None else _load_manifest(generation.slot)
+
+
 def get_collection():
-    """Get or create the knowledge base collection"""
-    global _collection
-    if _collection is None:
-        client = get_chroma_client()
-        ef = get_embedding_function()
-
-        _collection = client.get_or_create_collection(
-            name="acme_knowledge_base",
-            embedding_function=ef
-        )
+    """Get or create the active generation's collection for the configured backend"""
+    return active_generation().collection
+
+
+def manifest_path(slot: Optional[str] = None) -> Path:
+    """Index manifest, stored next to the backend's data (e.g. <CHROMA_PATH>.manifest.json)"""
+    data_path = _slot_path(active_generation().slot if slot is None else slot)
+    return data_path.with_name(data_path.name + '.manifest.json')
+
+
+def lexical_index_path(slot: Optional[str] = None) -> Path:
+    """BM25 index, stored next to the backend's data (e.g. <CHROMA_PATH>.bm25.json)"""
+    data_path = _slot_path(active_generation().slot if slot is None else slot)
+    return data_path.with_name(data_path.name + '.bm25.json')
 
-    return _collection
 
+def lexical_text(document: str, metadata: dict) -> str:
+    """What BM25 indexes for a chunk: its title and section path as well as its text"""
+    return ' '.join([metadata.get('title', ''), metadata.get('section', ''), document])
 
-def initialize_knowledge_base(knowledge_dir: str = "data/knowledge_base"):
+
+def get_lexical_index(generation: Optional[KnowledgeBaseGeneration] = None) -> BM25Index:
+    """
+    Get a generation's BM25 index (default: the active one), loading it from disk.
+
+    Rebuilt from the collection's documents (no embedding needed) when the
+    file is missing, unreadable or covers different chunks than the
+    collection, e.g. after an index built before hybrid retrieval existed.
+    """
+    generation = generation or active_generation()
+    if generation.lexical is None:
+        collection = generation.collection
+        path = str(lexical_index_path(generation.slot))
+        try:
+            index = BM25Index.load(path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is None or index.ids() != set(collection.get(include=[])['ids']):
+            records = collection.get(include=['documents', 'metadatas'])
+            index = BM25Index()
+            index.upsert(records['ids'], [lexical_text(doc, meta or {}) for doc, meta
+                                          in zip(records['documents'], records['metadatas'])])
+            index.save(path)
+        generation.lexical = index
+    return generation.lexical
+
+
+def _load_manifest(slot: Optional[str] = None) -> dict:
+    """Per-document index entries from the last run ({} if missing, unreadable or outdated)"""
+    try:
+        manifest = json.loads(manifest_path(slot).read_text())
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('docs', {})
+
+
+def _save_manifest(docs: dict, slot: Optional[str] = None):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    path = manifest_path(slot)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps({'version': MANIFEST_VERSION, 'docs': docs}, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def _index_entry(content: str) -> dict:
+    """What a document was indexed from: a change to any of these means re-embedding it"""
+    return {
+        'hash': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        'embedding_model': embedding_model_key(),
+        'chunking': f"{CHUNK_MAX_CHARS}/{CHUNK_OVERLAP_CHARS}",
+    }
+
+
+def _is_current(previous: dict, entry: dict, existing_ids: set) -> bool:
+    """True if a manifest entry matches and all its chunks are still in the collection"""
+    return (previous is not None
+            and all(previous.get(key) == value for key, value in entry.items())
+            and set(previous.get('chunks', [])) <= existing_ids)
+
+
+def _fingerprint(manifest: dict) -> str:
+    """Generation ID: a hash of each document's index entry (chunk IDs aside)"""
+    entries = {doc_id: {key: entry.get(key) for key in ('hash', 'embedding_model', 'chunking')}
+               for doc_id, entry in manifest.items()}
+    return hashlib.sha256(json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def initialize_knowledge_base(knowledge_dir: str = "data/knowledge_base", force: bool = False) -> Optional[Dict[str, int]]:
     """
-    Load knowledge base documents into Chroma.
-    Call this once during setup.
+    Load knowledge base documents into Chroma, incrementally.
+    Runs on every startup; only new or changed files are embedded.
+
+    Each markdown file is split into header-aware chunks (see app.chunking);
+    chunks are embedded with their parent headers and stored with the parent
+    document, section path and character offsets.
+
+    A manifest next to the index data records each document's content hash,
+    embedding model, chunk settings and chunk IDs. Files whose entry still
+    matches (and whose chunks are still in the collection) are skipped;
+    chunks of removed files, and any other entries the manifest does not
+    account for, are deleted.
+
+    Args:
+        knowledge_dir: Directory of markdown files
+        force: Re-embed every file regardless of the manifest
+
+    Returns:
+        Counts of 'added', 'updated', 'skipped' and 'deleted' documents
+        (None if the directory does not exist)
     """
     knowledge_path = Path(knowledge_dir)
 
     if not knowledge_path.exists():
         print(f"Knowledge base directory not found: {knowledge_dir}")
-        return
+        return None
+
+    generation = active_generation()
+    if generation.slot == SNAPSHOT_SLOT:
+        # Read-only: any change goes into a new generation seeded from it
+        result = reload_knowledge_base(knowledge_dir, force=force)
+        if not result['swapped']:
+            print(f"Knowledge base: serving index snapshot {INDEX_SNAPSHOT_PATH} "
+                  f"({result['skipped']} documents, generation {generation.id})")
+        return {key: result[key] for key in ('added', 'updated', 'skipped', 'deleted')}
+
+    counts, manifest = _ingest(knowledge_path, generation, {} if force else _load_manifest(generation.slot))
+    generation.id = _fingerprint(manifest)
+    return counts
+
+
+def _ingest(knowledge_path: Path, generation: KnowledgeBaseGeneration, previous: dict):
+    """
+    Bring a generation's collection, BM25 index and manifest up to date with
+    the markdown files, given the manifest its collection was built from.
+
+    Returns:
+        (counts, manifest)
+    """
+    collection = generation.collection
+    lexical = get_lexical_index(generation)
+    existing_ids = set(collection.get(include=[])['ids'])
+    manifest = {}
+    counts = {'added': 0, 'updated': 0, 'skipped': 0, 'deleted': 0}
 
     documents = []
+    embedding_texts = []
     metadatas = []
     ids = []
 
-    for md_file in knowledge_path.glob("*.md"):
+    for md_file in sorted(knowledge_path.glob("*.md")):
         content = md_file.read_text()
         doc_id = md_file.stem
 
+        entry = _index_entry(content)
+        if _is_current(previous.get(doc_id), entry, existing_ids):
+            manifest[doc_id] = previous[doc_id]
+            counts['skipped'] += 1
+            continue
+        counts['updated' if doc_id in previous else 'added'] += 1
+
         # Extract title from first line if it's a header
         lines = content.strip().split('\n')
         title = lines[0].lstrip('#').strip() if lines[0].startswith('#') else doc_id.replace('_', ' ').title()
 
-        documents.append(content)
-        metadatas.append({
-            'id': doc_id,
-            'title': title,
-            'filename': md_file.name,
-            'category': categorize_doc(doc_id)
-        })
-        ids.append(doc_id)
-
-    if documents:
-        collection = get_collection()
-        # Upsert to handle re-initialization
-        collection.upsert(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-        print(f"Loaded {len(documents)} documents into knowledge base")
+        chunks = chunk_markdown(doc_id, content, CHUNK_MAX_CHARS, CHUNK_OVERLAP_CHARS)
+        manifest[doc_id] = {**entry, 'chunks': [chunk.id for chunk in chunks]}
+        for chunk in chunks:
+            documents.append(chunk.content)
+            embedding_texts.append(chunk.embedding_text())
+            metadatas.append({
+                'id': chunk.id,
+                'parent_id': doc_id,
+                'title': title,
+                'filename': md_file.name,
+                'category': categorize_doc(doc_id),
+                'section': chunk.section,
+                'chunk_index': chunk.index,
+                'start': chunk.start,
+                'end': chunk.end
+            })
+            ids.append(chunk.id)
+
+    counts['deleted'] = len(set(previous) - set(manifest))
+
+    # Chunks of removed files, of chunks an update no longer produces, and
+    # entries from before the manifest existed
+    expected_ids = {chunk_id for entry in manifest.values() for chunk_id in entry['chunks']}
+    stale = existing_ids - expected_ids
+
+    # The NumPy indexes save (and retrain IVF lists) once for the whole run
+    deferred = getattr(collection, 'deferred_writes', contextlib.nullcontext)
+    with deferred():
+        if stale:
+            collection.delete(ids=sorted(stale))
+
+        for i in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = slice(i, i + INDEX_BATCH_SIZE)
+            collection.upsert(
+                documents=documents[batch],
+                embeddings=[[float(x) for x in e] for e in embed_many(embedding_texts[batch])],
+                metadatas=metadatas[batch],
+                ids=ids[batch]
+            )
+
+    if stale or ids:
+        lexical.delete(stale)
+        lexical.upsert(ids, [lexical_text(doc, meta) for doc, meta in zip(documents, metadatas)])
+        lexical.save(str(lexical_index_path(generation.slot)))
+    _save_manifest(manifest, generation.slot)
+    print(f"Knowledge base: {counts['added']} added, {counts['updated']} updated, "
+          f"{counts['skipped']} skipped, {counts['deleted']} deleted ({len(ids)} chunks embedded)")
+    return counts, manifest
+
+
+def _scan(knowledge_path: Path) -> dict:
+    """Index entries the markdown files would get, without chunking or embedding them"""
+    return {md_file.stem: _index_entry(md_file.read_text()) for md_file in sorted(knowledge_path.glob("*.md"))}
+
+
+def _slot_number(slot: str) -> int:
+    return int(slot.split('-')[1]) if slot.startswith('gen-') else 0
+
+
+def _generation_slots() -> set:
+    """Slots with data on disk or in Chroma, active or not"""
+    base = Path(index_path())
+    slots = {path.name[len(base.name) + 1:].split('.')[0] for path in base.parent.glob(f"{base.name}.gen-*")}
+    if VECTOR_BACKEND != 'numpy':
+        prefix = f"{COLLECTION_NAME}_"
+        for collection in get_chroma_client().list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith(prefix + 'gen-'):
+                slots.add(name[len(prefix):])
+    return slots | {''}
+
+
+def _newest_built_slot() -> str:
+    """The newest generation slot whose build finished (its manifest is written last), else the base slot"""
+    built = [slot for slot in _generation_slots() if slot and manifest_path(slot).exists()]
+    return max(built, key=_slot_number, default='')
+
+
+def _drop_generation(slot: str):
+    """Delete a generation's collection and files"""
+    if VECTOR_BACKEND == 'numpy':
+        shutil.rmtree(_slot_path(slot), ignore_errors=True)
+    else:
+        with contextlib.suppress(ValueError):
+            get_chroma_client().delete_collection(f"{COLLECTION_NAME}_{slot}" if slot else COLLECTION_NAME)
+    for path in (manifest_path(slot), lexical_index_path(slot)):
+        path.unlink(missing_ok=True)
+
+
+def _copy_generation(source: KnowledgeBaseGeneration, target: KnowledgeBaseGeneration):
+    """Seed a new generation with the chunks and BM25 index of another, so only changes are embedded"""
+    records = source.collection.get(include=['embeddings', 'documents', 'metadatas'])
+    deferred = getattr(target.collection, 'deferred_writes', contextlib.nullcontext)
+    with deferred():
+        for i in range(0, len(records['ids']), INDEX_BATCH_SIZE):
+            batch = slice(i, i + INDEX_BATCH_SIZE)
+            target.collection.upsert(
+                documents=records['documents'][batch],
+                embeddings=[[float(x) for x in e] for e in records['embeddings'][batch]],
+                metadatas=records['metadatas'][batch],
+                ids=records['ids'][batch]
+            )
+    if source.lexical is not None:
+        source.lexical.save(str(lexical_index_path(target.slot)))
+    elif lexical_index_path(source.slot).exists():
+        shutil.copyfile(lexical_index_path(source.slot), lexical_index_path(target.slot))
+
+
+def reload_knowledge_base(knowledge_dir: str = str(KNOWLEDGE_BASE_DIR), force: bool = False) -> Optional[Dict]:
+    """
+    Re-ingest the knowledge base into a new generation, then make it active.
+
+    Safe while queries run: the new generation is built in its own slot,
+    seeded with the active generation's chunks so only new or changed files
+    are embedded, and swapped in with one assignment once complete. Queries
+    already running finish against the generation they started with, so it
+    is kept; older slots are deleted only once the generation pointer file
+    names the new slot, so a failed build or a crash never leaves the
+    active generation without data, and restarts open the new slot.
+
+    Args:
+        knowledge_dir: Directory of markdown files
+        force: Rebuild every file, even if nothing changed
+
+    Returns:
+        'generation' and 'previous' IDs, whether it 'swapped', and the
+        indexing counts (None if the directory does not exist)
+    """
+    global _generation
+    knowledge_path = Path(knowledge_dir)
+    if not knowledge_path.exists():
+        print(f"Knowledge base directory not found: {knowledge_dir}")
+        return None
+
+    with _reload_lock:
+        current = active_generation()
+        entries = _scan(knowledge_path)
+        if not force and _fingerprint(entries) == current.id:
+            return {'generation': current.id, 'previous': current.id, 'swapped': False,
+                    'added': 0, 'updated': 0, 'skipped': len(entries), 'deleted': 0}
+
+        slots = _generation_slots()
+        slot = f"gen-{max(_slot_number(s) for s in slots | {current.slot}) + 1}"
+        generation = KnowledgeBaseGeneration(slot, _open_collection(slot))
+        if not force:
+            _copy_generation(current, generation)
+        counts, manifest = _ingest(knowledge_path, generation, {} if force else _generation_manifest(current))
+        generation.id = _fingerprint(manifest)
+        get_lexical_index(generation)
+
+        pointer = generation_pointer_path()
+        tmp = pointer.with_name(pointer.name + '.tmp')
+        tmp.write_text(json.dumps({'slot': slot, 'id': generation.id}))
+        os.replace(tmp, pointer)
+        _generation = generation
+        for stale in slots - {current.slot, slot}:
+            _drop_generation(stale)
+
+    print(f"Knowledge base generation {generation.id} active (was {current.id})")
+    return {'generation': generation.id, 'previous': current.id, 'swapped': True, **counts}
+
+
+def export_index_snapshot(path: str, generation: Optional[KnowledgeBaseGeneration] = None) -> dict:
+    """
+    Write a generation (default: the active one) as an index snapshot file.
+
+    Returns:
+        The snapshot header, without the per-chunk records
+    """
+    from .index_snapshot import read_header, write_snapshot
+
+    generation = generation or active_generation()
+    records = generation.collection.get(include=['embeddings', 'documents', 'metadatas'])
+    write_snapshot(path, records, {
+        'embedding_model': embedding_model_key(),
+        'kb_fingerprint': generation.id,
+        'chunking': f"{CHUNK_MAX_CHARS}/{CHUNK_OVERLAP_CHARS}",
+        'manifest': _generation_manifest(generation),
+        'lexical': get_lexical_index(generation).to_dict(),
+    })
+    header, _ = read_header(path)
+    return {key: value for key, value in header.items()
+            if key not in ('ids', 'documents', 'metadatas', 'manifest', 'lexical')}
 
 
 def categorize_doc(doc_id: str) -> str:
@@ -122,39 +666,305 @@ def categorize_doc(doc_id: str) -> str:
         return 'general'
 
 
-def get_relevant_docs(query: str, n_results: int = 3) -> List[Dict]:
+def chunk_category(chunk_id: str) -> str:
+    """Category of a chunk, from its parent document ID (the part of the chunk ID before '#')"""
+    return categorize_doc(chunk_id.split('#')[0])
+
+
+def category_centroids(generation: Optional[KnowledgeBaseGeneration] = None) -> Dict[str, np.ndarray]:
+    """
+    Unit-length mean chunk embedding of each category in a generation
+    (default: the active one), for the query router.
+
+    Computed from the stored embeddings on first use and kept on the
+    generation, so a reload brings its own centroids.
+    """
+    generation = generation or active_generation()
+    if generation.centroids is None:
+        records = generation.collection.get(include=['metadatas', 'embeddings'])
+        sums: Dict[str, np.ndarray] = {}
+        for i, metadata in enumerate(records['metadatas'] or []):
+            e = np.asarray(records['embeddings'][i], dtype=np.float32)
+            category = (metadata or {}).get('category', 'general')
+            sums[category] = sums.get(category, 0) + e / (np.linalg.norm(e) or 1.0)
+        generation.centroids = {category: total / (np.linalg.norm(total) or 1.0)
+                                for category, total in sorted(sums.items())}
+    return generation.centroids
+
+
+def embed_many(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[np.ndarray]:
+    """
+    Embed texts with the knowledge base embedding function, batch_size at a time.
+
+    One model call per batch is much cheaper than one per text; bounding the
+    batch keeps peak memory flat for large inputs. Shared by ingestion, the
+    batch endpoint and evals.
+
+    Returns:
+        One float32 vector per text, in input order
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    ef = get_embedding_function()
+    vectors = []
+    for i in range(0, len(texts), max(1, batch_size)):
+        vectors.extend(np.asarray(e, dtype=np.float32) for e in ef(texts[i:i + batch_size]))
+    return vectors
+
+
+def _query_cache_key(query: str) -> tuple:
+    return (embedding_model_key(), normalize_text(query))
+
+
+def embed_query(query: str) -> np.ndarray:
+    """
+    Embed a query with the knowledge base embedding function.
+
+    Repeated questions (up to whitespace and case) are served from
+    query_embedding_cache without running the model. Callers that need the
+    embedding for something else (e.g. the semantic response cache) compute
+    it once here and pass it to get_relevant_docs.
+    """
+    key = _query_cache_key(query)
+    cached = query_embedding_cache.get(key)
+    if cached is not None:
+        return cached
+    return query_embedding_cache.put(key, embed_many([query])[0])
+
+
+def embed_queries(queries: List[str]) -> List[np.ndarray]:
+    """
+    Embed many queries, running the model once per batch of uncached ones.
+
+    Cached questions are reused and duplicates within the call embedded once
+    (used by the batch endpoint).
+    """
+    keys = [_query_cache_key(query) for query in queries]
+    vectors = {key: query_embedding_cache.get(key) for key in dict.fromkeys(keys)}
+    missing = [key for key, vector in vectors.items() if vector is None]
+    texts = {key: query for key, query in zip(keys, queries)}
+    for key, vector in zip(missing, embed_many([texts[key] for key in missing])):
+        vectors[key] = query_embedding_cache.put(key, vector)
+    return [vectors[key] for key in keys]
+
+
+def _hits(results: dict, query: int = 0) -> List[Dict]:
+    """Chunks of one query (default: the first) in a Chroma-shaped result, in rank order"""
+    hits = []
+    if results['documents'] and results['documents'][query]:
+        for i, doc in enumerate(results['documents'][query]):
+            metadata = results['metadatas'][query][i] if results['metadatas'] else {}
+            distance = results['distances'][query][i] if results['distances'] else 0
+            hits.append(_hit(doc, metadata, distance, f'doc_{i}'))
+    return hits
+
+
+def _hit(document: str, metadata: dict, distance: float, default_id: str) -> Dict:
+    chunk_id = metadata.get('id', default_id)
+    return {
+        'id': chunk_id,
+        'parent_id': metadata.get('parent_id', chunk_id),
+        'title': metadata.get('title', 'Unknown'),
+        'category': metadata.get('category', 'general'),
+        'section': metadata.get('section', ''),
+        'content': document,
+        'distance': distance,
+        'start': metadata.get('start', 0),
+        'end': metadata.get('end', len(document))
+    }
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def get_relevant_docs(query: str, n_results: int = 3, query_embedding=None, mode: Optional[str] = None,
+                      timings: Optional[Dict[str, float]] = None,
+                      generation: Optional[KnowledgeBaseGeneration] = None,
+                      categories: Optional[List[str]] = None) -> List[Dict]:
     """
-    Query Chroma for relevant documents.
+    Query the knowledge base for relevant documents.
+
+    The n_results best chunks are retrieved and merged per parent document,
+    so the result holds at most n_results documents containing only their
+    matching sections.
+
+    In 'hybrid' mode the BM25 search runs on a worker thread while this
+    thread runs the vector query; each contributes its HYBRID_CANDIDATES
+    best chunks, and the n_results chunks with the highest reciprocal-rank
+    fusion score are kept. Documents are then ordered by fused score and
+    carry it as 'rrf_score'. Every returned chunk still gets its vector
+    distance (computed from its stored embedding if only BM25 found it), so
+    the confidence gate works the same in both modes.
+
+    Args:
+        query: Question text
+        n_results: Number of chunks to retrieve
+        query_embedding: Precomputed embedding of query (skips re-embedding)
+        mode: 'vector' or 'hybrid' (default: RETRIEVAL_MODE)
+        timings: If given, filled with per-path milliseconds ('vector_ms',
+            and in hybrid mode 'lexical_ms' and 'fusion_ms')
+        generation: Knowledge base generation to search (default: the active one)
+        categories: Only search chunks in these categories (see
+            categorize_doc); both the vector and BM25 searches are
+            restricted, so other partitions are never scored
 
     Returns:
-        List of dicts with 'id', 'title', 'content', 'distance'
+        List of dicts with 'id', 'title', 'category', 'content', 'distance',
+        'chunks' and 'sections', most relevant first
     """
-    collection = get_collection()
+    return merge_ranked(get_relevant_chunks(query, n_results, query_embedding, mode, timings, generation,
+                                            categories))
 
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
 
-    docs = []
-    if results['documents'] and results['documents'][0]:
-        for i, doc in enumerate(results['documents'][0]):
-            metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-            distance = results['distances'][0][i] if results['distances'] else 0
-
-            docs.append({
-                'id': metadata.get('id', f'doc_{i}'),
-                'title': metadata.get('title', 'Unknown'),
-                'content': doc,
-                'distance': distance
-            })
+def get_relevant_chunks(query: str, n_results: int = 3, query_embedding=None, mode: Optional[str] = None,
+                        timings: Optional[Dict[str, float]] = None,
+                        generation: Optional[KnowledgeBaseGeneration] = None,
+                        categories: Optional[List[str]] = None) -> List[Dict]:
+    """
+    The n_results best chunks, unmerged, most relevant first (see get_relevant_docs).
+
+    For callers that rerank candidates before merging them with
+    merge_ranked. In 'hybrid' mode each chunk carries its 'rrf_score'.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ('vector', 'hybrid'):
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    timings = {} if timings is None else timings
+    generation = generation or active_generation()
+    collection = generation.collection
+
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    query_embedding = [float(x) for x in query_embedding]
+
+    # Chroma where filter over the 'category' metadata every chunk carries
+    where = {}
+    if categories:
+        categories = sorted(set(categories))
+        where = {'where': {'category': categories[0] if len(categories) == 1 else {'$in': categories}}}
+
+    if mode == 'vector':
+        results, timings['vector_ms'] = _timed(
+            lambda: collection.query(query_embeddings=[query_embedding], n_results=n_results, **where))
+        return _hits(results)
+
+    # Capped at the collection size, which Chroma otherwise warns about on every query
+    candidates = max(1, min(max(n_results, HYBRID_CANDIDATES), collection.count()))
+    include = (lambda chunk_id: chunk_category(chunk_id) in categories) if categories else None
+    lexical = _lexical_executor.submit(_timed, get_lexical_index(generation).search, query, candidates, include)
+    results, timings['vector_ms'] = _timed(
+        lambda: collection.query(query_embeddings=[query_embedding], n_results=candidates, **where))
+    lexical_ranking, timings['lexical_ms'] = lexical.result()
+
+    started = time.perf_counter()
+    chunks = _fuse(collection, query_embedding, _hits(results), lexical_ranking, n_results)
+    timings['fusion_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return chunks
+
+
+def merge_ranked(chunks: List[Dict]) -> List[Dict]:
+    """
+    Merge ranked chunks per parent document (chunking.merge_chunks).
 
+    Documents are ordered by distance, or by the best score of their chunks
+    when the chunks carry one: 'rerank_score' (from a reranker) before
+    'rrf_score' (hybrid retrieval). The document carries that score too.
+    """
+    docs = merge_chunks(chunks)
+    for key in ('rerank_score', 'rrf_score'):
+        if chunks and key in chunks[0]:
+            scores = {chunk['id']: chunk[key] for chunk in chunks}
+            for doc in docs:
+                doc[key] = round(max(scores[chunk_id] for chunk_id in doc['chunks']), 5)
+            docs.sort(key=lambda doc: -doc[key])
+            break
     return docs
 
 
+def _fuse(collection, query_embedding, vector_ranking: List[Dict], lexical_ranking: list,
+          n_results: int) -> List[Dict]:
+    """The n_results chunks with the best reciprocal-rank fusion score, best first (hybrid mode)"""
+    vector_hits = {hit['id']: hit for hit in vector_ranking}
+    fused = reciprocal_rank_fusion(list(vector_hits), [chunk_id for chunk_id, _ in lexical_ranking])
+    best = sorted(fused, key=lambda chunk_id: (-fused[chunk_id], chunk_id))[:n_results]
+
+    # Chunks only BM25 found: fetch them and their vector distance
+    missing = [chunk_id for chunk_id in best if chunk_id not in vector_hits]
+    if missing:
+        records = collection.get(ids=missing, include=['documents', 'metadatas', 'embeddings'])
+        q = np.array(query_embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        for chunk_id, doc, metadata, embedding in zip(records['ids'], records['documents'],
+                                                      records['metadatas'], records['embeddings']):
+            e = np.asarray(embedding, dtype=np.float32)
+            distance = max(0.0, float(2.0 - 2.0 * np.dot(q, e / (np.linalg.norm(e) or 1.0))))
+            vector_hits[chunk_id] = _hit(doc, metadata or {}, distance, chunk_id)
+
+    return [{**vector_hits[chunk_id], 'rrf_score': fused[chunk_id]} for chunk_id in best
+            if chunk_id in vector_hits]
+
+
+def get_relevant_docs_batch(queries: List[str], n_results: int = 3, query_embeddings=None,
+                            mode: Optional[str] = None,
+                            generation: Optional[KnowledgeBaseGeneration] = None) -> List[List[Dict]]:
+    """
+    get_relevant_docs for many queries at once (evals, threshold calibration, replays).
+
+    Each distinct query is embedded once through embed_many, EMBED_BATCH_SIZE
+    per forward pass; the query embedding LRU is bypassed so a replay does not
+    evict live questions. The vector store then gets QUERY_BATCH_SIZE
+    embeddings per call: one matrix product and row-wise top k for the NumPy
+    indexes, one batched HNSW search for Chroma. In 'hybrid' mode each
+    query's BM25 search and fusion then run as in get_relevant_docs.
+
+    Args:
+        queries: Question texts
+        n_results: Number of chunks to retrieve per query
+        query_embeddings: Precomputed embeddings, one per query (skips embedding)
+        mode: 'vector' or 'hybrid' (default: RETRIEVAL_MODE)
+        generation: Knowledge base generation to search (default: the active one)
+
+    Returns:
+        One list per query, in order, each as get_relevant_docs returns it
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in ('vector', 'hybrid'):
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    queries = list(queries)
+    if not queries:
+        return []
+    generation = generation or active_generation()
+    collection = generation.collection
+
+    if query_embeddings is None:
+        distinct = list(dict.fromkeys(queries))
+        vectors = dict(zip(distinct, embed_many(distinct)))
+        query_embeddings = [vectors[query] for query in queries]
+    embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(len(queries), -1)
+
+    if mode == 'vector':
+        candidates = n_results
+    else:
+        candidates = max(1, min(max(n_results, HYBRID_CANDIDATES), collection.count()))
+    rankings = []
+    for start in range(0, len(queries), QUERY_BATCH_SIZE):
+        block = embeddings[start:start + QUERY_BATCH_SIZE]
+        results = collection.query(query_embeddings=block, n_results=candidates)
+        rankings.extend(_hits(results, i) for i in range(len(block)))
+
+    if mode == 'vector':
+        return [merge_ranked(ranking) for ranking in rankings]
+    lexical = get_lexical_index(generation)
+    return [merge_ranked(_fuse(collection, embedding, ranking, lexical.search(query, candidates), n_results))
+            for query, embedding, ranking in zip(queries, embeddings, rankings)]
+
+
 def generate_embedding(text: str) -> List[float]:
     """Generate embedding for a single text (for testing/debugging)"""
-    ef = get_embedding_function()
-    result = ef([text])
+    result = embed_many([text])
     # Convert numpy floats to Python floats for type consistency
     return [float(x) for x in result[0]] if result else []
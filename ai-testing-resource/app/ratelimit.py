@@ -0,0 +1,288 @@
+"""Client-side rate limiting and adaptive concurrency for model calls
+
+Two mechanisms sit in front of every Anthropic call:
+
+- Token buckets for requests/minute and tokens/minute. A caller reserves its
+  cost up front; when a bucket is short the balance goes negative and the
+  caller sleeps until it refills, so later callers queue behind earlier ones.
+  A wait longer than the deadline is refused immediately (RateLimitExceeded)
+  instead of queueing a request that would time out anyway.
+- An AIMD concurrency governor. The in-flight limit grows by roughly one per
+  window of successful calls and halves when the API answers 429, so a burst
+  backs off instead of hammering the API with requests that will fail.
+
+The limiter knows nothing about the Anthropic SDK: callers report each
+outcome ('success', 'throttled' or 'error') and the tokens actually used.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+SUCCESS = 'success'
+THROTTLED = 'throttled'
+ERROR = 'error'
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a permit cannot be granted within the wait deadline"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit wait of {retry_after:.1f}s exceeds deadline")
+
+
+class TokenBucket:
+    """Refilling bucket whose balance may go negative to queue reservations"""
+
+    def __init__(self, per_minute: float, capacity: float = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def available(self, now: float = None) -> float:
+        now = self._clock() if now is None else now
+        self._refill(now)
+        return self._tokens
+
+    def wait_time(self, amount: float, now: float = None) -> float:
+        """Seconds until amount can be taken (amounts above capacity wait for a full bucket)"""
+        now = self._clock() if now is None else now
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        wait = 0.0 if self._tokens >= needed else (needed - self._tokens) / self.rate
+        return max(wait, self._blocked_until - now)
+
+    def reserve(self, amount: float, now: float = None):
+        now = self._clock() if now is None else now
+        self._refill(now)
+        self._tokens -= amount
+
+    def refund(self, amount: float, now: float = None):
+        """Return (or, with a negative amount, additionally charge) tokens"""
+        now = self._clock() if now is None else now
+        self._refill(now)
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def block_until(self, until: float):
+        """Grant nothing before until (e.g. the server's retry-after)"""
+        self._blocked_until = max(self._blocked_until, until)
+
+
+class ConcurrencyGovernor:
+    """AIMD limit on in-flight calls: additive increase, multiplicative decrease"""
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 32,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        """Block up to timeout seconds for a slot"""
+        with self._condition:
+            ok = self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout=timeout)
+            if ok:
+                self._in_flight += 1
+            return ok
+
+    def release(self, outcome: str = SUCCESS):
+        with self._condition:
+            self._in_flight -= 1
+            if outcome == SUCCESS:
+                # +1 per limit's worth of successes, i.e. roughly +1 per round trip
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            elif outcome == THROTTLED:
+                now = self._clock()
+                # One decrease per cooldown: a burst of 429s from the same window is one signal
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self._limit = max(self.minimum, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+@dataclass
+class Permit:
+    """A granted request slot plus its reserved token cost"""
+    cost: int
+    waited_ms: int = 0
+    used_tokens: Optional[int] = None  # Set by the caller from the response usage
+
+
+@dataclass
+class RateLimiterStats:
+    """Running counters for a RateLimiter"""
+    granted: int = 0
+    rejected: int = 0
+    throttled: int = 0
+    errors: int = 0
+    queued: int = 0
+    total_wait_ms: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'granted': self.granted,
+            'rejected': self.rejected,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'queued': self.queued,
+            'avg_wait_ms': int(self.total_wait_ms / self.granted) if self.granted else 0,
+        }
+
+
+class RateLimiter:
+    """Request/token buckets plus an AIMD governor, shared by sync and async callers"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 50,
+        tokens_per_minute: float = 40000,
+        max_wait_seconds: float = 5.0,
+        governor: ConcurrencyGovernor = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        poll_interval: float = 0.02,
+    ):
+        self.max_wait_seconds = max_wait_seconds
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self.governor = governor or ConcurrencyGovernor(clock=clock)
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.stats = RateLimiterStats()
+
+    def _reserve(self, cost: int) -> float:
+        """Reserve one request and cost tokens; return the wait, or refuse past the deadline"""
+        with self._lock:
+            now = self._clock()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+            if wait > self.max_wait_seconds:
+                self.stats.rejected += 1
+                raise RateLimitExceeded(wait)
+            self.requests.reserve(1, now)
+            self.tokens.reserve(cost, now)
+            if wait > 0:
+                self.stats.queued += 1
+            self._waiting += 1
+            return wait
+
+    def _unreserve(self, cost: int):
+        with self._lock:
+            now = self._clock()
+            self.requests.refund(1, now)
+            self.tokens.refund(cost, now)
+            self.stats.rejected += 1
+
+    def _granted(self, cost: int, start: float) -> Permit:
+        waited_ms = int((self._clock() - start) * 1000)
+        with self._lock:
+            self.stats.granted += 1
+            self.stats.total_wait_ms += waited_ms
+        return Permit(cost=cost, waited_ms=waited_ms)
+
+    def _done_waiting(self):
+        with self._lock:
+            self._waiting -= 1
+
+    def acquire(self, cost: int) -> Permit:
+        """Block until a permit is available, or raise RateLimitExceeded"""
+        start = self._clock()
+        deadline = start + self.max_wait_seconds
+        wait = self._reserve(cost)
+        try:
+            if wait > 0:
+                self._sleep(wait)
+            if not self.governor.acquire(timeout=max(0.0, deadline - self._clock())):
+                self._unreserve(cost)
+                raise RateLimitExceeded(self.max_wait_seconds)
+        finally:
+            self._done_waiting()
+        return self._granted(cost, start)
+
+    async def acquire_async(self, cost: int) -> Permit:
+        """Async acquire: waits on the event loop instead of blocking a thread"""
+        start = self._clock()
+        deadline = start + self.max_wait_seconds
+        wait = self._reserve(cost)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            while not self.governor.try_acquire():
+                if self._clock() >= deadline:
+                    self._unreserve(cost)
+                    raise RateLimitExceeded(self.max_wait_seconds)
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            self._unreserve(cost)
+            raise
+        finally:
+            self._done_waiting()
+        return self._granted(cost, start)
+
+    def release(self, permit: Permit, outcome: str = SUCCESS, retry_after: float = None):
+        """Return the slot, settle the token reservation and feed the governor"""
+        with self._lock:
+            now = self._clock()
+            if permit.used_tokens is not None:
+                self.tokens.refund(permit.cost - permit.used_tokens, now)
+            if outcome == THROTTLED:
+                self.stats.throttled += 1
+                if retry_after:
+                    self.requests.block_until(now + retry_after)
+                    self.tokens.block_until(now + retry_after)
+            elif outcome == ERROR:
+                self.stats.errors += 1
+        self.governor.release(outcome)
+
+    def snapshot(self) -> dict:
+        """Permits, queue depth and concurrency, for metrics endpoints"""
+        with self._lock:
+            now = self._clock()
+            data = self.stats.to_dict()
+            data['requests_available'] = round(self.requests.available(now), 2)
+            data['tokens_available'] = int(self.tokens.available(now))
+            data['queue_depth'] = self._waiting
+        data['concurrency_limit'] = self.governor.limit
+        data['in_flight'] = self.governor.in_flight
+        return data
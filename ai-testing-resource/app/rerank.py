@@ -0,0 +1,158 @@
+"""Cheap local reranking of retrieved chunks for V3
+
+Vector distance alone ranks "Widget Pro X1" and "Widget Pro X2" sections
+about the same, and a $49 plan next to a $99 one. V3 therefore retrieves a
+wider candidate set (RERANK_CANDIDATES chunks) and keeps the k best under a
+score that also rewards exact matches:
+
+- identifier overlap: the share of the question's numbers, SKUs / model
+  codes and capitalized names ("30", "49.99", "x2", "ip67", "enterprise")
+  that occur in the chunk text
+- title match: the share of the question's terms in the chunk's document
+  title and section path
+- vector score: cosine similarity, 1 - distance / 2
+
+Reranking has a hard time budget. It is skipped up front when the measured
+cost per candidate says the candidate set would overrun it, and abandoned
+(keeping the retrieval order) if scoring runs past it anyway. A skipped
+rerank returns the same chunks retrieval would have returned without it.
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .lexical import STOPWORDS, tokenize
+
+# Capitalized words; the ones not starting a sentence are taken as names
+_CAPITALIZED = re.compile(r"\b[A-Z][A-Za-z0-9]*")
+
+# Smoothing of the measured scoring cost per candidate
+COST_SMOOTHING = 0.2
+
+# A predicted overrun lowers the cost estimate by this factor, so a one-off
+# slow run (e.g. a cold cache) does not disable reranking for good
+SKIP_DECAY = 0.9
+
+
+def identifier_terms(question: str) -> set:
+    """Numbers, codes and capitalized names in a question, as lexical.tokenize terms"""
+    terms = {term for term in tokenize(question) if any(c.isdigit() for c in term)}
+    for match in _CAPITALIZED.finditer(question):
+        before = question[:match.start()].rstrip()
+        if before and before[-1] not in '.?!':
+            terms.update(tokenize(match.group()))
+    return terms - STOPWORDS
+
+
+@dataclass
+class RerankResult:
+    """Chunks to keep, and whether reranking ran"""
+    chunks: List[dict]
+    applied: bool
+    skipped: Optional[str] = None  # 'too_few_candidates', 'over_budget' or 'timeout'
+    elapsed_ms: float = 0.0
+    candidates: int = 0
+    identifiers: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'applied': self.applied,
+            'skipped': self.skipped,
+            'elapsed_ms': round(self.elapsed_ms, 3),
+            'candidates': self.candidates,
+            'kept': [chunk['id'] for chunk in self.chunks],
+            'identifiers': self.identifiers,
+        }
+
+
+class LexicalReranker:
+    """
+    Rerank retrieved chunks by vector score plus exact term matches.
+
+    Args:
+        budget_ms: Hard limit on time spent reranking one question
+        vector_weight: Weight of cosine similarity
+        identifier_weight: Weight of the identifier overlap share
+        title_weight: Weight of the title / section match share
+    """
+
+    def __init__(self, budget_ms: float = 5.0, vector_weight: float = 1.0, identifier_weight: float = 0.3,
+                 title_weight: float = 0.2):
+        self.budget_ms = budget_ms
+        self.vector_weight = vector_weight
+        self.identifier_weight = identifier_weight
+        self.title_weight = title_weight
+        self._lock = threading.Lock()
+        self._cost_ms: Optional[float] = None  # Smoothed milliseconds per candidate
+        self._counts: Dict[str, int] = {'applied': 0, 'over_budget': 0, 'timeout': 0, 'too_few_candidates': 0}
+
+    def score(self, chunk: dict, identifiers: set, question_terms: set) -> float:
+        text_terms = set(tokenize(chunk['content']))
+        identifier_share = len(identifiers & text_terms) / len(identifiers) if identifiers else 0.0
+        title_terms = set(tokenize(f"{chunk.get('title', '')} {chunk.get('section', '')}"))
+        title_share = len(question_terms & title_terms) / len(question_terms) if question_terms else 0.0
+        return (self.vector_weight * (1.0 - chunk['distance'] / 2.0)
+                + self.identifier_weight * identifier_share
+                + self.title_weight * title_share)
+
+    def rerank(self, question: str, chunks: List[dict], k: int) -> RerankResult:
+        """
+        The k best of chunks (retrieval order, best first) under the rerank score.
+
+        Kept chunks are copies carrying 'rerank_score'. When reranking is
+        skipped the first k chunks are returned unchanged.
+        """
+        started = time.perf_counter()
+        if len(chunks) <= k:
+            return self._skip('too_few_candidates', chunks, k, started)
+
+        with self._lock:
+            over_budget = self._cost_ms is not None and self._cost_ms * len(chunks) > self.budget_ms
+            if over_budget:
+                self._cost_ms *= SKIP_DECAY
+        if over_budget:
+            return self._skip('over_budget', chunks, k, started)
+
+        deadline = started + self.budget_ms / 1000
+        identifiers = identifier_terms(question)
+        question_terms = set(tokenize(question))
+        scored = []
+        for chunk in chunks:
+            if time.perf_counter() > deadline:
+                self._record_cost(started, len(scored) + 1)
+                return self._skip('timeout', chunks, k, started)
+            scored.append(self.score(chunk, identifiers, question_terms))
+
+        order = sorted(range(len(chunks)), key=lambda i: -scored[i])[:k]
+        kept = [{**chunks[i], 'rerank_score': round(scored[i], 5)} for i in order]
+        self._record_cost(started, len(chunks))
+        with self._lock:
+            self._counts['applied'] += 1
+        return RerankResult(kept, True, elapsed_ms=(time.perf_counter() - started) * 1000,
+                            candidates=len(chunks), identifiers=sorted(identifiers))
+
+    def _record_cost(self, started: float, scored: int):
+        per_chunk = (time.perf_counter() - started) * 1000 / scored
+        with self._lock:
+            if self._cost_ms is None:
+                self._cost_ms = per_chunk
+            else:
+                self._cost_ms += COST_SMOOTHING * (per_chunk - self._cost_ms)
+
+    def _skip(self, reason: str, chunks: List[dict], k: int, started: float) -> RerankResult:
+        with self._lock:
+            self._counts[reason] += 1
+        return RerankResult(list(chunks[:k]), False, reason, (time.perf_counter() - started) * 1000,
+                            candidates=len(chunks))
+
+    def snapshot(self) -> dict:
+        """Reranks applied and skipped (by reason), and the current cost estimate per candidate"""
+        with self._lock:
+            return {
+                **self._counts,
+                'budget_ms': self.budget_ms,
+                'cost_per_candidate_ms': None if self._cost_ms is None else round(self._cost_ms, 4),
+            }
@@ -1,9 +1,15 @@
 """Routes for Acme Support Bot demo"""
 
+import asyncio
+import hmac
+import json
 import logging
-from flask import Blueprint, render_template, request, jsonify
-from .ai_service import ask, AIServiceError
-from .utils import sanitize_input
+from flask import Blueprint, Response, render_template, request, jsonify, stream_with_context
+from .ai_service import ask, ask_async, ask_stream, get_service_metrics, AIServiceError
+from .batch import run_batch
+from .utils import sanitize_input, format_sse
+from .kb_reload import reload_status, start_reload
+from config import BATCH_MAX_QUESTIONS, BATCH_MAX_WORKERS, KB_ADMIN_TOKEN
 
 logger = logging.getLogger(__name__)
 
@@ -17,29 +23,172 @@ app_bp = Blueprint('app', __name__)
 #     return render_template('ask.html', active_nav='demo')
 
 
+def _read_question():
+    """Read and sanitize (question, version) from a JSON or form POST body"""
+    data = request.get_json() if request.is_json else request.form
+
+    question = data.get('question', '')
+    version = data.get('version', 'v3')
+
+    # Sanitize input
+    return sanitize_input(question), version
+
+
+def record_trace(question, response):
+    """Hand an answer to production monitoring; never fails the request"""
+    try:
+        from monitoring.recorder import record_answer
+        record_answer(question, response)
+    except Exception as e:
+        logger.warning(f"Trace not recorded: {e}")
+
+
+def _wants_stream() -> bool:
+    """True when the client asked for a streamed answer via ?stream=1"""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
 @app_bp.route('/ask', methods=['GET', 'POST'])
 def ask_route():
     """Handle questions to the support bot"""
     if request.method == 'GET':
         return render_template('ask.html', active_nav='demo')
 
+    if _wants_stream():
+        return ask_stream_route()
+
     # Handle POST request
-    data = request.get_json() if request.is_json else request.form
+    question, version = _read_question()
 
-    question = data.get('question', '')
-    version = data.get('version', 'v3')
+    if not question:
+        return jsonify({'error': 'Please provide a question'}), 400
 
-    # Sanitize input
-    question = sanitize_input(question)
+    try:
+        response = ask(question, version=version)
+        record_trace(question, response)
+        return jsonify(response)
+    except AIServiceError as e:
+        return jsonify({'error': e.message}), 503  # Service Unavailable
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@app_bp.route('/ask/async', methods=['POST'])
+async def ask_async_route():
+    """Answer a question using the AsyncAnthropic client.
+
+    Under the WSGI server this runs on a per-request event loop; when served
+    through app.asgi the same path is handled natively on the shared loop.
+    Identical concurrent questions share one model call either way.
+    """
+    question, version = _read_question()
 
     if not question:
         return jsonify({'error': 'Please provide a question'}), 400
 
     try:
-        response = ask(question, version=version)
+        response = await ask_async(question, version=version)
+        await asyncio.get_running_loop().run_in_executor(None, record_trace, question, response)
         return jsonify(response)
     except AIServiceError as e:
         return jsonify({'error': e.message}), 503  # Service Unavailable
     except Exception as e:
         logger.error(f"Unexpected error: {e}", exc_info=True)
         return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@app_bp.route('/ask/stream', methods=['POST'])
+def ask_stream_route():
+    """Stream the answer as Server-Sent Events.
+
+    Emits 'delta' events with text fragments as they are generated, then a
+    single 'done' event carrying the same payload as POST /ask. Failures after
+    the stream has started are reported as an 'error' event.
+    """
+    question, version = _read_question()
+
+    if not question:
+        return jsonify({'error': 'Please provide a question'}), 400
+
+    def generate():
+        try:
+            for item in ask_stream(question, version=version):
+                if item['event'] == 'done':
+                    record_trace(question, item['data'])
+                yield format_sse(item['event'], item['data'])
+        except AIServiceError as e:
+            yield format_sse('error', {'error': e.message})
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            yield format_sse('error', {'error': 'An unexpected error occurred'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering so deltas flush immediately
+        }
+    )
+
+
+@app_bp.route('/ask/batch', methods=['POST'])
+def ask_batch_route():
+    """Answer a list of questions concurrently, streamed back as NDJSON.
+
+    Body: {"questions": [...], "version": "v3"}. Each line is a 'result' or
+    'error' item (with the question's index) in completion order, followed by
+    a final 'summary' line with aggregate latency and token stats.
+    """
+    data = request.get_json(silent=True) or {}
+    questions = data.get('questions') if isinstance(data, dict) else None
+    version = data.get('version', 'v3') if isinstance(data, dict) else 'v3'
+
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'Please provide a list of questions'}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f'At most {BATCH_MAX_QUESTIONS} questions per batch'}), 413
+
+    questions = [sanitize_input(q) if isinstance(q, str) else '' for q in questions]
+
+    def generate():
+        for item in run_batch(questions, version=version, max_workers=BATCH_MAX_WORKERS):
+            if item['type'] == 'result':
+                record_trace(item['question'], item['response'])
+            yield json.dumps(item) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+@app_bp.route('/ask/metrics')
+def ask_metrics_route():
+    """Process-local counters for the answer path (cache, coalescing)"""
+    return jsonify(get_service_metrics())
+
+
+@app_bp.route('/kb/generation')
+def kb_generation_route():
+    """Active knowledge base generation and the last reload's outcome"""
+    return jsonify(reload_status())
+
+
+@app_bp.route('/kb/reload', methods=['POST'])
+def kb_reload_route():
+    """Re-ingest the knowledge base into a new generation in the background"""
+    if not KB_ADMIN_TOKEN:
+        return jsonify({'error': 'Knowledge base reload is disabled (set KB_ADMIN_TOKEN)'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), KB_ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 403
+
+    force = str(request.args.get('force', '')).lower() == 'true'
+    if not start_reload(force=force):
+        return jsonify({'status': 'running', **reload_status()}), 409
+    return jsonify({'status': 'started', **reload_status()}), 202
@@ -0,0 +1,174 @@
+"""Semantic response cache keyed on question embeddings
+
+Support questions repeat with different wording ("what is your return policy?",
+"return policy?"). The cache stores answers alongside the normalized embedding
+of the question that produced them; a later question is a hit when its
+embedding is within a cosine-similarity threshold of a cached one AND the
+exact key (prompt version, model, retrieved doc IDs) matches, so an answer is
+never reused across prompt changes or different grounding documents.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+@dataclass
+class CacheEntry:
+    """A cached answer and the question embedding it was produced for"""
+    key: Hashable
+    embedding: np.ndarray  # L2-normalized float32
+    question: str
+    text: str
+    tokens: Dict[str, int]
+    created_at: float
+    size_bytes: int
+
+
+@dataclass
+class CacheHit:
+    """Result of a successful lookup"""
+    entry: CacheEntry
+    similarity: float
+
+
+@dataclass
+class CacheStats:
+    """Running counters for a SemanticCache"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    saved_prompt_tokens: int = 0
+    saved_completion_tokens: int = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'saved_prompt_tokens': self.saved_prompt_tokens,
+            'saved_completion_tokens': self.saved_completion_tokens,
+        }
+
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class SemanticCache:
+    """Thread-safe LRU cache with TTL and a memory cap, matched by similarity"""
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+        max_bytes: int = 16 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._by_key: Dict[Hashable, list] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def lookup(self, key: Hashable, embedding) -> Optional[CacheHit]:
+        """Return the most similar live entry for key, or None on a miss"""
+        query = _normalize(embedding)
+        now = self._clock()
+
+        with self._lock:
+            best_id, best_similarity = None, -1.0
+            for entry_id in list(self._by_key.get(key, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.stats.expirations += 1
+                    continue
+                similarity = float(np.dot(query, entry.embedding))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            entry = self._entries[best_id]
+            self.stats.hits += 1
+            self.stats.saved_prompt_tokens += entry.tokens.get('prompt', 0)
+            self.stats.saved_completion_tokens += entry.tokens.get('completion', 0)
+            return CacheHit(entry=entry, similarity=best_similarity)
+
+    def store(self, key: Hashable, embedding, question: str, text: str, tokens: Dict[str, int]):
+        """Cache an answer, evicting least recently used entries to stay in bounds"""
+        vector = _normalize(embedding)
+        size = vector.nbytes + len(question.encode('utf-8')) + len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CacheEntry(
+                key=key,
+                embedding=vector,
+                question=question,
+                text=text,
+                tokens=dict(tokens),
+                created_at=self._clock(),
+                size_bytes=size,
+            )
+            self._by_key.setdefault(key, []).append(entry_id)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> dict:
+        """Counters plus current size, for metrics endpoints"""
+        with self._lock:
+            data = self.stats.to_dict()
+            data['entries'] = len(self._entries)
+            data['bytes'] = self._bytes
+        return data
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size_bytes
+        ids = self._by_key.get(entry.key)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._by_key[entry.key]
@@ -0,0 +1,174 @@
+"""Request coalescing (single-flight) for identical in-flight work
+
+When many callers ask for the same thing at once, only the first one (the
+leader) runs the computation; the others wait for it and share its result or
+its exception. Nothing is cached: once the leader finishes, the next caller
+with the same key starts a new computation.
+
+Both the threaded path (SingleFlight.do) and the asyncio path
+(SingleFlight.do_async) are supported. Async callers coalesce with other
+async callers on any event loop: under the WSGI server Flask runs each async
+view on a loop of its own, so followers wait on the leader through a
+thread-safe future rather than one bound to the leader's loop.
+
+A caller that gives up never takes the others down with it: the async
+computation runs as a task of its own, so cancelling the request that
+started it (e.g. a client disconnect) leaves it running for the rest; if
+the computation itself is cancelled, the callers still waiting retry with
+a new leader. Threaded followers wait at most wait_timeout for a leader,
+then run the computation themselves.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+@dataclass
+class SingleFlightStats:
+    """Running counters for a SingleFlight group"""
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    wait_timeouts: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'wait_timeouts': self.wait_timeouts,
+        }
+
+
+class _Call:
+    """An in-flight threaded computation"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key.
+
+    Args:
+        wait_timeout: Seconds a threaded follower waits for the leader before
+            running the computation itself (None waits indefinitely)
+    """
+
+    def __init__(self, wait_timeout: Optional[float] = None):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()  # Running async computations, referenced until done
+        self.stats = SingleFlightStats()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless a call with the same key is already in flight.
+
+        Returns:
+            (result, shared) - shared is True when the result came from
+            another caller's computation
+        """
+        with self._lock:
+            self.stats.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats.executions += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                # The leader is stuck; do not stay stuck with it
+                with self._lock:
+                    self.stats.wait_timeouts += 1
+                return fn(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn() unless a call with the same key is already in flight.
+
+        The first caller starts fn() as a task on its loop; every caller, on
+        that loop or another one, then awaits its result.
+
+        Returns:
+            (result, shared) - see do()
+        """
+        with self._lock:
+            self.stats.calls += 1
+            call = self._async_calls.get(key)
+            if call is not None:
+                self.stats.coalesced += 1
+                leader = False
+            else:
+                call = concurrent.futures.Future()
+                self._async_calls[key] = call
+                self.stats.executions += 1
+                leader = True
+
+        if leader:
+            task = asyncio.get_running_loop().create_task(self._run(key, call, fn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        try:
+            # Shield so a caller being cancelled does not cancel the shared call
+            return await asyncio.shield(asyncio.wrap_future(call)), not leader
+        except asyncio.CancelledError:
+            if not call.cancelled():
+                raise  # This caller was cancelled
+        # The computation was cancelled, not this caller: run it again
+        return await self.do_async(key, fn)
+
+    async def _run(self, key: Hashable, call: concurrent.futures.Future, fn: Callable[[], Awaitable[Any]]):
+        """Settle call with fn()'s outcome"""
+        try:
+            result = await fn()
+        except Exception as e:
+            self._forget(key)
+            call.set_exception(e)
+        except BaseException:
+            self._forget(key)
+            call.cancel()
+            raise
+        else:
+            self._forget(key)
+            call.set_result(result)
+
+    def _forget(self, key: Hashable):
+        """Let the next caller with key start a new computation"""
+        with self._lock:
+            del self._async_calls[key]
+
+    def snapshot(self) -> dict:
+        """Counters plus current in-flight count, for metrics endpoints"""
+        with self._lock:
+            data = self.stats.to_dict()
+            data['in_flight'] = len(self._calls) + len(self._async_calls)
+        return data
@@ -1,5 +1,6 @@
 """Utility functions for Acme Support Bot"""
 
+import json
 import re
 import tiktoken
 import markdown
@@ -76,7 +77,9 @@ def format_response(
     sources: list = None,
     latency_ms: int = 0,
     tokens: dict = None,
-    trace: dict = None
+    trace: dict = None,
+    time_to_first_token_ms: int = None,
+    cache: dict = None
 ) -> dict:
     """
     Structure AI output for display.
@@ -87,9 +90,13 @@ def format_response(
             'sources': [{'id': str, 'title': str}],
             'metadata': {
                 'latency_ms': int,
+                'time_to_first_token_ms': int (equals latency_ms when not streamed),
                 'prompt_tokens': int,
                 'completion_tokens': int,
-                'total_tokens': int
+                'total_tokens': int,
+                'cache_read_input_tokens': int (prompt tokens served from Anthropic's prompt cache),
+                'cache_creation_input_tokens': int (prompt tokens written to it),
+                'cache': {'hit': bool, 'similarity': float, ...} (V3 only)
             },
             'trace': {
                 'version': str,
@@ -99,20 +106,39 @@ def format_response(
                 'retrieved_docs': [...] (for v3),
                 'formatted_context': str (for v3),
                 'system_prompt': str (for v3),
-                'user_message': str (for v3)
+                'user_message': str (for v3),
+                'spans': [{'span_id', 'name', 'span_type', 'start_time',
+                           'duration_ms', 'input', 'output', 'metadata'}]
             }
         }
     """
     tokens = tokens or {}
 
+    metadata = {
+        'latency_ms': latency_ms,
+        'time_to_first_token_ms': latency_ms if time_to_first_token_ms is None else time_to_first_token_ms,
+        'prompt_tokens': tokens.get('prompt', 0),
+        'completion_tokens': tokens.get('completion', 0),
+        'total_tokens': tokens.get('prompt', 0) + tokens.get('completion', 0),
+        'cache_read_input_tokens': tokens.get('cache_read', 0),
+        'cache_creation_input_tokens': tokens.get('cache_creation', 0)
+    }
+    if cache is not None:
+        metadata['cache'] = cache
+
     return {
         'text': text.strip(),
         'sources': sources or [],
-        'metadata': {
-            'latency_ms': latency_ms,
-            'prompt_tokens': tokens.get('prompt', 0),
-            'completion_tokens': tokens.get('completion', 0),
-            'total_tokens': tokens.get('prompt', 0) + tokens.get('completion', 0)
-        },
+        'metadata': metadata,
         'trace': trace or {}
     }
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Serialize one Server-Sent Event.
+
+    Each event is an 'event:' line naming the event type followed by a single
+    'data:' line of JSON, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
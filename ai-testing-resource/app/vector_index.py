@@ -0,0 +1,606 @@
+"""In-process NumPy vector indexes
+
+NumpyIndex is an exact nearest-neighbour index for knowledge bases of up to
+tens of thousands of chunks: embeddings are L2-normalized float32 rows of one
+matrix, a query is a single matrix-vector product, and np.argpartition picks
+the top k without sorting every score. Many queries in one call are scored
+QUERY_BATCH_ROWS at a time as one matrix product with a row-wise top k.
+
+IVFIndex adds an approximate mode for hundreds of thousands of chunks
+(IVF-flat): rows are grouped around nlist k-means centroids, and a query only
+scans the rows of its nprobe nearest centroids. nprobe trades recall for
+latency per query. New rows join their nearest centroid; the centroids are
+retrained when the index has grown by retrain_growth since the last training.
+Below min_train_rows the index simply searches exactly. A where-filtered
+query probes its partitions' own inverted lists (built once per partition
+and training): the nprobe nearest centroids that hold partition rows, so
+it scans about as many rows as an unfiltered one would of a partition-sized
+index. Partitions smaller than min_train_rows are scanned exactly. app.projection adds
+a third mode that scans PCA-reduced (or truncated) vectors.
+
+Queries can be restricted with a Chroma-style where filter on one metadata
+key ({'category': 'returns'} or {'category': {'$in': [...]}}). The rows of
+each value of a filtered key are grouped once per published snapshot, and
+the first query of a partition copies its rows into a contiguous block that
+later ones scan directly, so a filtered query only scores its partitions'
+rows and never gathers them per call. The blocks together add at most one
+copy of the matrix per filtered key.
+
+Both implement the subset of the Chroma Collection API that app.rag uses
+(count, get, upsert, delete, query), so any of them can sit behind
+rag.get_collection(). Distances are squared L2 between normalized vectors
+(2 - 2 * cosine), matching Chroma's default space for the unit-length
+sentence-transformers embeddings, so thresholds carry over between backends.
+
+On disk an index is a directory with embeddings.npy (loaded memory-mapped)
+and metadata.json (ids, documents and metadatas, in row order); IVFIndex
+adds ivf.npz (centroids and row assignments). Many writes can be grouped
+with deferred_writes(), which publishes and saves once at the end.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+METADATA_FILE = 'metadata.json'
+IVF_FILE = 'ivf.npz'
+
+# Rows scored per matrix product while assigning rows to centroids
+ASSIGN_BATCH_ROWS = 8192
+
+# Queries scored per matrix product in a multi-query search, bounding the
+# (queries x rows) score matrix
+QUERY_BATCH_ROWS = 256
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _replace_file(path: Path, write):
+    """Write via a temporary name so readers never see a partial file"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """Immutable index contents; writers publish a new one, readers never lock"""
+    matrix: np.ndarray  # (n, dim) float32, rows normalized
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[dict]
+
+    @cached_property
+    def positions(self) -> Dict[str, int]:
+        """Row of each ID, built on first use and kept with the snapshot"""
+        return {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+
+class _Partition:
+    """Rows of one value of a filtered metadata key, plus arrays derived from them on first use"""
+
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        self._derived = {}  # name: (source, derived array)
+
+    def derived(self, name: str, source: np.ndarray, build: Callable[[np.ndarray, np.ndarray], np.ndarray]):
+        """build(source, rows), kept until it is asked for with another source"""
+        cached = self._derived.get(name)
+        if cached is None or cached[0] is not source:
+            cached = (source, build(source, self.rows))
+            self._derived[name] = cached
+        return cached[1]
+
+    def block(self, name: str, source: np.ndarray) -> np.ndarray:
+        """The partition's rows of source (e.g. the embedding matrix) as one contiguous array"""
+        return self.derived(name, source, lambda matrix, rows: np.ascontiguousarray(matrix[rows]))
+
+
+def _partition_rows(partitions: List[_Partition]) -> np.ndarray:
+    """Index rows of partitions laid end to end, as their blocks are scored"""
+    if len(partitions) == 1:
+        return partitions[0].rows
+    return np.concatenate([p.rows for p in partitions]) if partitions else np.zeros(0, dtype=np.int64)
+
+
+def _empty(dim: int = 0) -> _Snapshot:
+    return _Snapshot(np.zeros((0, dim), dtype=np.float32), [], [], [])
+
+
+def _where_values(where: dict):
+    """(key, allowed values) of a single-key equality or $in filter"""
+    if len(where) != 1:
+        raise ValueError(f"Unsupported where filter: {where}")
+    (key, condition), = where.items()
+    if isinstance(condition, dict):
+        if set(condition) != {'$in'}:
+            raise ValueError(f"Unsupported where filter: {where}")
+        return key, list(condition['$in'])
+    return key, [condition]
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, highest first"""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """_top_k for every row of a (queries, n) score matrix at once"""
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class NumpyIndex:
+    """Exact cosine index over an in-memory float32 matrix, persisted as .npy + JSON"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._deferred = 0
+        self._dirty = False
+        self._buffer = None  # Writable rows with spare capacity; [:n] mirrors the pending snapshot
+        self._snapshot = self._load()  # Published to readers
+        self._partitions = (None, {})  # (snapshot, {metadata key: {value: _Partition}}) for filtered queries
+        self._pending = self._snapshot  # Latest state, ahead of _snapshot inside deferred_writes()
+
+    # ---- persistence ----
+
+    def _load(self) -> _Snapshot:
+        embeddings_path = self.path / EMBEDDINGS_FILE
+        metadata_path = self.path / METADATA_FILE
+        if not embeddings_path.exists() or not metadata_path.exists():
+            return _empty()
+
+        try:
+            matrix = np.load(embeddings_path, mmap_mode='r')
+            meta = json.loads(metadata_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Vector index at {self.path} unreadable, starting empty: {e}")
+            return _empty()
+
+        if matrix.ndim != 2 or len(meta.get('ids', [])) != matrix.shape[0]:
+            logger.warning(f"Vector index at {self.path} is inconsistent, starting empty")
+            return _empty()
+        return _Snapshot(matrix, meta['ids'], meta['documents'], meta['metadatas'])
+
+    def _save(self, snapshot: _Snapshot):
+        self.path.mkdir(parents=True, exist_ok=True)
+        _replace_file(self.path / EMBEDDINGS_FILE,
+                      lambda f: np.save(f, np.ascontiguousarray(snapshot.matrix, dtype=np.float32)))
+        metadata = json.dumps({
+            'ids': snapshot.ids,
+            'documents': snapshot.documents,
+            'metadatas': snapshot.metadatas,
+        }).encode('utf-8')
+        _replace_file(self.path / METADATA_FILE, lambda f: f.write(metadata))
+
+    # ---- write path ----
+
+    def _rows_with_room(self, snap: _Snapshot, extra: int, copy: bool) -> np.ndarray:
+        """
+        A writable buffer whose first n rows are snap's, with room for extra more.
+
+        Appends go past row n, which published snapshots never look at, so
+        they need no copy; capacity doubles to keep bulk loads linear. copy
+        forces a fresh buffer (when existing rows are about to be overwritten
+        while readers may hold them).
+        """
+        n, dim = snap.matrix.shape
+        buffer = self._buffer
+        if copy or buffer is None or buffer.shape[1] != dim or len(buffer) < n + extra:
+            capacity = max(n + extra, 2 * n, 64)
+            buffer = np.empty((capacity, dim), dtype=np.float32)
+            buffer[:n] = snap.matrix
+            self._buffer = buffer
+        return buffer
+
+    def _commit(self, snapshot: _Snapshot, written_rows: List[int] = None, kept_rows: List[int] = None):
+        """Make snapshot the new state: publish and save now, or at the end of deferred_writes()"""
+        self._pending = snapshot
+        if self._deferred:
+            self._dirty = True
+        else:
+            self._publish()
+
+    def _publish(self):
+        self._save(self._pending)
+        self._snapshot = self._pending
+        self._dirty = False
+
+    @contextmanager
+    def deferred_writes(self):
+        """Group upserts and deletes: readers see the old contents until one save at the end"""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self._publish()
+
+    # ---- Collection API ----
+
+    def count(self) -> int:
+        return len(self._snapshot.ids)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **_) -> dict:
+        """Records by ID (all when ids is None); unknown IDs are skipped, as in Chroma"""
+        include = ['documents', 'metadatas'] if include is None else include
+        snap = self._snapshot
+        if ids is None:
+            rows = list(range(len(snap.ids)))
+        else:
+            positions = snap.positions
+            rows = [positions[doc_id] for doc_id in ids if doc_id in positions]
+
+        result = {'ids': [snap.ids[i] for i in rows]}
+        result['documents'] = [snap.documents[i] for i in rows] if 'documents' in include else None
+        result['metadatas'] = [snap.metadatas[i] for i in rows] if 'metadatas' in include else None
+        result['embeddings'] = np.asarray(snap.matrix[rows]) if 'embeddings' in include else None
+        return result
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[dict]):
+        """Insert or replace records"""
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate IDs in upsert")
+
+        with self._lock:
+            snap = self._pending
+            if snap.ids and vectors.shape[1] != snap.matrix.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match "
+                                 f"index dimensionality {snap.matrix.shape[1]}")
+            if not snap.ids:
+                snap = _empty(vectors.shape[1])
+
+            positions = snap.positions
+            replaced = [(positions[doc_id], i) for i, doc_id in enumerate(ids) if doc_id in positions]
+            appended = [i for i, doc_id in enumerate(ids) if doc_id not in positions]
+
+            n = len(snap.ids)
+            buffer = self._rows_with_room(snap, len(appended), copy=bool(replaced))
+            new_documents, new_metadatas = list(snap.documents), list(snap.metadatas)
+            for row, i in replaced:
+                buffer[row] = vectors[i]
+                new_documents[row] = documents[i]
+                new_metadatas[row] = metadatas[i]
+            buffer[n:n + len(appended)] = vectors[appended]
+
+            updated = _Snapshot(
+                buffer[:n + len(appended)],
+                list(snap.ids) + [ids[i] for i in appended],
+                new_documents + [documents[i] for i in appended],
+                new_metadatas + [metadatas[i] for i in appended],
+            )
+            written = [row for row, _ in replaced] + list(range(n, n + len(appended)))
+            self._commit(updated, written_rows=written)
+
+    def delete(self, ids: List[str]):
+        """Remove records by ID"""
+        with self._lock:
+            snap = self._pending
+            drop = set(ids)
+            keep = [i for i, doc_id in enumerate(snap.ids) if doc_id not in drop]
+            if len(keep) == len(snap.ids):
+                return
+            matrix = np.array(snap.matrix[keep], dtype=np.float32).reshape(len(keep), snap.matrix.shape[1])
+            self._buffer = None
+            updated = _Snapshot(
+                matrix,
+                [snap.ids[i] for i in keep],
+                [snap.documents[i] for i in keep],
+                [snap.metadatas[i] for i in keep],
+            )
+            self._commit(updated, kept_rows=keep)
+
+    def _partitions_for(self, snap: _Snapshot, where: dict) -> List[_Partition]:
+        """Partitions matching a where filter, grouped once per snapshot and key"""
+        key, values = _where_values(where)
+        cached_snap, partitions = self._partitions
+        if cached_snap is not snap:
+            partitions = {}
+        by_value = partitions.get(key)
+        if by_value is None:
+            grouped: Dict[object, List[int]] = {}
+            for row, metadata in enumerate(snap.metadatas):
+                grouped.setdefault((metadata or {}).get(key), []).append(row)
+            by_value = {value: _Partition(np.asarray(rows, dtype=np.int64)) for value, rows in grouped.items()}
+            partitions = {**partitions, key: by_value}
+            self._partitions = (snap, partitions)
+        return [by_value[value] for value in dict.fromkeys(values) if value in by_value]
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None, **_) -> dict:
+        """
+        Top n_results rows per query embedding, nearest first.
+
+        where restricts the search to rows whose metadata matches it (see
+        the module docstring for the supported forms).
+
+        Returns the Chroma query shape: {'ids', 'documents', 'metadatas',
+        'distances'}, each a list with one list per query.
+        """
+        snap = self._snapshot
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        if where:
+            partitions = self._partitions_for(snap, where)
+            matrices = [p.block('matrix', snap.matrix) for p in partitions]
+            rows = _partition_rows(partitions)
+        else:
+            matrices, rows = [snap.matrix], None
+        k = min(n_results, sum(len(matrix) for matrix in matrices))
+        if not k:
+            return self._result(snap, [None] * len(queries))
+
+        # Many queries are scored a block at a time, with one top-k per block
+        ranked = []
+        for start in range(0, len(queries), QUERY_BATCH_ROWS):
+            batch = queries[start:start + QUERY_BATCH_ROWS]
+            # (queries, rows) cosine similarities, partitions laid end to end
+            scores = np.concatenate([batch @ matrix.T for matrix in matrices], axis=1)
+            top = _top_k_rows(scores, k)
+            positions = top if rows is None else rows[top]
+            ranked.extend(zip(positions, np.take_along_axis(scores, top, axis=1)))
+        return self._result(snap, ranked)
+
+    @staticmethod
+    def _format(snap: _Snapshot, hits: list, k: int) -> dict:
+        """Build the Chroma query result from (rows, scores) candidates per query"""
+        ranked = []
+        for hit in hits:
+            if hit is None or not k:
+                ranked.append(None)
+            else:
+                rows, scores = hit
+                top = _top_k(scores, min(k, len(rows)))
+                ranked.append((rows[top], scores[top]))
+        return NumpyIndex._result(snap, ranked)
+
+    @staticmethod
+    def _result(snap: _Snapshot, ranked: list) -> dict:
+        """Build the Chroma query result from the (rows, scores) per query, best first"""
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for hit in ranked:
+            order, scores = ([], None) if hit is None else hit
+            result['ids'].append([snap.ids[i] for i in order])
+            result['documents'].append([snap.documents[i] for i in order])
+            result['metadatas'].append([snap.metadatas[i] for i in order])
+            result['distances'].append([] if scores is None else [float(max(0.0, 2.0 - 2.0 * s)) for s in scores])
+        return result
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for each row, scored in batches to bound memory"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH_ROWS):
+        block = vectors[start:start + ASSIGN_BATCH_ROWS]
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means: unit-length centroids maximizing cosine similarity.
+
+    Empty clusters are re-seeded from random rows.
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        labels = _nearest_centroid(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=k)
+        occupied = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[occupied]
+        centroids[occupied] = _normalize(np.add.reduceat(vectors[order], starts, axis=0))
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+def _inverted_lists(assignments: np.ndarray, rows: np.ndarray, nlist: int):
+    """(rows sorted by centroid, offsets) so sorted[offsets[c]:offsets[c + 1]] are centroid c's rows"""
+    labels = assignments[rows]
+    order = rows[np.argsort(labels, kind='stable')]
+    return order, np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))])
+
+
+@dataclass(frozen=True)
+class _IVFState:
+    """Snapshot plus its inverted lists, published together"""
+    snapshot: _Snapshot
+    centroids: Optional[np.ndarray]  # (nlist, dim), None while untrained
+    assignments: np.ndarray  # Centroid per row (-1 while untrained)
+    order: np.ndarray  # Rows sorted by centroid
+    offsets: np.ndarray  # order[offsets[c]:offsets[c + 1]] are centroid c's rows
+    trained_rows: int
+
+
+class IVFIndex(NumpyIndex):
+    """
+    Approximate index: inverted lists over k-means centroids (IVF-flat).
+
+    Args:
+        path: Index directory
+        nlist: Number of centroids (0 picks about 4 * sqrt(rows) at training time)
+        nprobe: Centroids scanned per query; higher is slower and more exact
+        min_train_rows: Search exactly until the index has this many rows
+        retrain_growth: Retrain once rows exceed this multiple of the last training size
+        train_sample_per_list: Rows sampled per centroid for training
+    """
+
+    def __init__(self, path: str, nlist: int = 0, nprobe: int = 16, min_train_rows: int = 4096,
+                 retrain_growth: float = 2.0, train_sample_per_list: int = 32):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self.retrain_growth = retrain_growth
+        self.train_sample_per_list = train_sample_per_list
+        super().__init__(path)
+        self._ivf = self._load_ivf(self._snapshot)
+        self._pending_ivf = self._ivf
+        if self._needs_training(self._ivf):
+            # e.g. an index built in exact mode, or grown past min_train_rows elsewhere
+            with self._lock:
+                self._publish()
+
+    # ---- inverted lists ----
+
+    @staticmethod
+    def _state(snapshot: _Snapshot, centroids, assignments, trained_rows: int) -> _IVFState:
+        if centroids is None:
+            order, offsets = np.arange(len(assignments)), np.array([0, len(assignments)])
+        else:
+            order = np.argsort(assignments, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+        return _IVFState(snapshot, centroids, assignments, order, offsets, trained_rows)
+
+    def _load_ivf(self, snapshot: _Snapshot) -> _IVFState:
+        n = len(snapshot.ids)
+        try:
+            with np.load(self.path / IVF_FILE) as data:
+                centroids, assignments = data['centroids'], data['assignments']
+                trained_rows = int(data['trained_rows'])
+            if len(assignments) == n and centroids.shape[1:] == snapshot.matrix.shape[1:]:
+                return self._state(snapshot, centroids, assignments, trained_rows)
+            logger.warning(f"IVF lists at {self.path} do not match the index, retraining")
+        except (OSError, KeyError, ValueError):
+            pass
+        return self._state(snapshot, None, np.full(n, -1, dtype=np.int32), 0)
+
+    def _needs_training(self, state: _IVFState) -> bool:
+        n = len(state.snapshot.ids)
+        if n < max(1, self.min_train_rows):
+            return False
+        return state.centroids is None or n > self.retrain_growth * state.trained_rows
+
+    def _train(self, state: _IVFState) -> _IVFState:
+        snap = state.snapshot
+        n = len(snap.ids)
+        nlist = self.nlist or max(1, int(4 * math.sqrt(n)))
+        rng = np.random.default_rng(n)
+        sample_size = min(n, nlist * self.train_sample_per_list)
+        sample = np.asarray(snap.matrix[np.sort(rng.choice(n, sample_size, replace=False))])
+        logger.info(f"Training IVF index at {self.path}: {nlist} lists from {sample_size} of {n} rows")
+        centroids = kmeans(sample, nlist, seed=n)
+        return self._state(snap, centroids, _nearest_centroid(snap.matrix, centroids), n)
+
+    # ---- write path ----
+
+    def _commit(self, snapshot: _Snapshot, written_rows: List[int] = None, kept_rows: List[int] = None):
+        state = self._pending_ivf
+        assignments = state.assignments
+        if kept_rows is not None:
+            assignments = assignments[kept_rows]
+        if written_rows:
+            grown = np.full(len(snapshot.ids), -1, dtype=np.int32)
+            grown[:len(assignments)] = assignments
+            if state.centroids is not None:
+                rows = np.asarray(written_rows)
+                grown[rows] = _nearest_centroid(snapshot.matrix[rows], state.centroids)
+            assignments = grown
+
+        # Only assignments are kept current here; the lists are rebuilt (and
+        # training run) once per publish, so a deferred bulk load sorts once
+        self._pending_ivf = _IVFState(snapshot, state.centroids, assignments, state.order,
+                                      state.offsets, state.trained_rows)
+        super()._commit(snapshot, written_rows, kept_rows)
+
+    def _publish(self):
+        state = self._pending_ivf
+        state = self._state(state.snapshot, state.centroids, state.assignments, state.trained_rows)
+        if self._needs_training(state):
+            state = self._train(state)
+        self._pending = state.snapshot
+        super()._publish()
+        if state.centroids is not None:
+            _replace_file(self.path / IVF_FILE, lambda f: np.savez(
+                f, centroids=state.centroids, assignments=state.assignments, trained_rows=state.trained_rows))
+        self._pending_ivf = state
+        self._ivf = state
+
+    # ---- read path ----
+
+    def query(self, query_embeddings, n_results: int = 10, nprobe: int = None, where: Optional[dict] = None,
+              **_) -> dict:
+        """
+        Like NumpyIndex.query, scanning the rows of the nprobe nearest centroids.
+
+        A where-filtered query probes the nearest centroids holding rows of
+        its partitions and scans only those rows; partitions smaller than
+        min_train_rows are scanned exactly.
+        """
+        state = self._ivf
+        if state.centroids is None:
+            return super().query(query_embeddings, n_results, where=where)
+
+        snap = state.snapshot
+        nlist = len(state.centroids)
+        if where:
+            partitions = self._partitions_for(snap, where)
+            searched = sum(len(p.rows) for p in partitions)
+            if searched < self.min_train_rows:
+                return super().query(query_embeddings, n_results, where=where)
+            lists = [p.derived('ivf', state.assignments, lambda assignments, rows: _inverted_lists(
+                assignments, rows, nlist)) for p in partitions]
+        else:
+            searched = len(snap.ids)
+            lists = [(state.order, state.offsets)]
+
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        centroid_scores = queries @ state.centroids.T
+        occupied = sum(np.diff(offsets) for _, offsets in lists) > 0
+        centroid_scores[:, ~occupied] = -np.inf  # Never probe lists without rows to search
+        nprobe = min(nprobe or self.nprobe, int(occupied.sum()))
+        probes = np.argsort(-centroid_scores, axis=1)[:, :nprobe]
+
+        hits = []
+        for query, probed in zip(queries, probes):
+            rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for order, offsets in lists for c in probed])
+            hits.append((rows, snap.matrix[rows] @ query) if len(rows) else None)
+        return self._format(snap, hits, min(n_results, searched))
+
+
+def open_index(path: str, mode: str = 'exact', **params) -> NumpyIndex:
+    """
+    Open (or create) a NumPy index in 'exact', 'ivf' or 'projected' mode.
+
+    params go to IVFIndex, or to app.projection.ProjectedIndex.
+    """
+    if mode == 'ivf':
+        return IVFIndex(path, **params)
+    if mode == 'projected':
+        from .projection import ProjectedIndex
+        return ProjectedIndex(path, **params)
+    if mode != 'exact':
+        raise ValueError(f"Unknown vector index mode: {mode}")
+    return NumpyIndex(path)
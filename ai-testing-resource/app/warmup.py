@@ -0,0 +1,240 @@
+"""Startup warmup and readiness reporting
+
+Everything V3 needs is loaded lazily: the chromadb import, the embedding
+model, the persistent collection (and BM25 index in hybrid mode), tiktoken's
+encoding and the Anthropic client. Left alone, the first requests after a
+deploy pay for all of it. warmup() does that work up front, then runs a few
+retrievals so the model and index are past their first-call costs.
+
+Each component's state and load time is kept in a ReadinessRegistry, which
+GET /ready reports: 200 once every component is warm, 503 before that (or if
+one failed). /health stays a liveness check, so the load balancer should
+route traffic on /ready (the ALB target group does; ECS container health
+stays on /health). Optional components do not hold readiness back when
+they fail; /ready then reports them under 'degraded'. The Anthropic client
+is optional because a missing API key is the same on every task, and
+marking them all unready would drain the whole service. The knowledge base
+(model, collection and retrieval) is optional as it was before warmup
+existed: the app still answers without it, and a load that failed once is
+retried lazily by the first request that needs it.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+# Short, typical support questions; retrieval runs each once
+WARMUP_QUESTIONS = (
+    "What is your return policy?",
+    "How much does the Enterprise plan cost?",
+    "How long does shipping take?",
+)
+
+
+@dataclass
+class ComponentState:
+    """Warm state of one startup component"""
+    name: str
+    status: str = PENDING
+    load_ms: Optional[float] = None
+    detail: Dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        data = {'status': self.status, 'load_ms': self.load_ms}
+        if self.detail:
+            data['detail'] = self.detail
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class ReadinessRegistry:
+    """
+    Thread-safe record of the warmup components, in warmup order.
+
+    Args:
+        components: Component names, all pending until warmup reaches them
+        optional: Components whose failure does not make the service unready
+    """
+
+    def __init__(self, components: List[str], optional: Tuple[str, ...] = ()):
+        self._lock = threading.Lock()
+        self._components = {name: ComponentState(name) for name in components}
+        self.optional = frozenset(optional)
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def start(self) -> bool:
+        """Mark warmup as started; False if it already was"""
+        with self._lock:
+            if self.started_at is not None:
+                return False
+            self.started_at = time.time()
+            return True
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    def update(self, name: str, status: str, load_ms: Optional[float] = None,
+               detail: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            state = self._components[name]
+            state.status = status
+            state.load_ms = round(load_ms, 1) if load_ms is not None else None
+            state.detail = detail or {}
+            state.error = error
+
+    def _ready(self) -> bool:
+        return all(state.status == READY or (state.status == FAILED and name in self.optional)
+                   for name, state in self._components.items())
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return self._ready()
+
+    def snapshot(self) -> dict:
+        """Overall status plus each component, for the /ready endpoint"""
+        with self._lock:
+            statuses = [state.status for state in self._components.values()]
+            if self._ready():
+                overall = READY
+            elif FAILED in statuses and self.finished_at is not None:
+                overall = FAILED
+            elif self.started_at is None:
+                overall = PENDING
+            else:
+                overall = WARMING
+            data = {
+                'status': overall,
+                'components': {name: state.to_dict() for name, state in self._components.items()},
+            }
+            degraded = [name for name, state in self._components.items() if state.status == FAILED]
+            if overall == READY and degraded:
+                data['degraded'] = degraded
+            if self.started_at is not None:
+                end = self.finished_at or time.time()
+                data['warmup_ms'] = round((end - self.started_at) * 1000, 1)
+        return data
+
+    def reset(self):
+        """Back to the never-warmed state (tests)"""
+        with self._lock:
+            for name in self._components:
+                self._components[name] = ComponentState(name)
+            self.started_at = None
+            self.finished_at = None
+
+
+def _warm_embedding_model() -> dict:
+    from .rag import get_embedding_function
+
+    ef = get_embedding_function()
+    # One forward pass on the model itself, past the persistent store, so
+    # the first real question does not pay for it
+    model = getattr(ef, 'model', ef)
+    dimensions = len(model([WARMUP_QUESTIONS[0]])[0])
+    return {'dimensions': dimensions}
+
+
+def _warm_collection() -> dict:
+    from .rag import get_collection
+
+    return {'chunks': get_collection().count()}
+
+
+def _warm_retrieval() -> dict:
+    from config import RETRIEVAL_MODE
+    from .rag import category_centroids, get_embedding_function, get_relevant_docs
+
+    # The query router's category centroids, computed on first use
+    categories = len(category_centroids())
+    ef = get_embedding_function()
+    model = getattr(ef, 'model', ef)
+    latencies = []
+    for question in WARMUP_QUESTIONS:
+        started = time.perf_counter()
+        # Embedded directly so warmup questions never enter the query caches
+        get_relevant_docs(question, query_embedding=model([question])[0])
+        latencies.append(round((time.perf_counter() - started) * 1000, 1))
+    return {'mode': RETRIEVAL_MODE, 'categories': categories, 'query_ms': latencies}
+
+
+def _warm_tokenizer() -> dict:
+    from .context_packer import _get_encoding, estimate_tokens
+
+    encoding = _get_encoding()
+    estimate_tokens(WARMUP_QUESTIONS[0])
+    return {'encoding': encoding.name if encoding is not None else 'length estimate'}
+
+
+def _warm_anthropic_client() -> dict:
+    from .ai_service import get_async_client, get_client
+
+    get_client()
+    get_async_client()
+    return {}
+
+
+# (name, function) in the order warmup runs them; retrieval needs the model
+# and collection loaded first, so their load times are reported separately
+COMPONENTS: List[Tuple[str, Callable[[], dict]]] = [
+    ('embedding_model', _warm_embedding_model),
+    ('collection', _warm_collection),
+    ('retrieval', _warm_retrieval),
+    ('tokenizer', _warm_tokenizer),
+    ('anthropic_client', _warm_anthropic_client),
+]
+
+# Failures here are reported but do not hold readiness back (see the module docstring)
+OPTIONAL_COMPONENTS = ('embedding_model', 'collection', 'retrieval', 'anthropic_client')
+
+readiness = ReadinessRegistry([name for name, _ in COMPONENTS], optional=OPTIONAL_COMPONENTS)
+
+
+def warmup(registry: ReadinessRegistry = readiness) -> bool:
+    """
+    Load and exercise every component, recording each in the registry.
+
+    A failing component is recorded and the rest still warm, so /ready shows
+    everything that is wrong at once. Runs only once per registry.
+
+    Returns:
+        True if every component is ready
+    """
+    if not registry.start():
+        return registry.is_ready()
+
+    for name, warm in COMPONENTS:
+        registry.update(name, WARMING)
+        started = time.perf_counter()
+        try:
+            detail = warm()
+        except Exception as e:
+            load_ms = (time.perf_counter() - started) * 1000
+            logger.warning(f"Warmup of {name} failed after {load_ms:.0f}ms: {e}")
+            registry.update(name, FAILED, load_ms, error=str(e))
+            continue
+        load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Warmed {name} in {load_ms:.0f}ms")
+        registry.update(name, READY, load_ms, detail)
+
+    registry.finish()
+    return registry.is_ready()
+
+
+def start_warmup(registry: ReadinessRegistry = readiness) -> threading.Thread:
+    """Run warmup() on a daemon thread, so the server listens (and /health answers) meanwhile"""
+    thread = threading.Thread(target=warmup, args=(registry,), name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -20,9 +20,97 @@ EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
 # Chroma settings
 CHROMA_PATH = os.getenv('CHROMA_PATH', str(BASE_DIR / 'chroma_db'))
 
+# Vector store behind retrieval: 'chroma', or 'numpy' for the in-process
+# matrix index (memory-mapped .npy plus a JSON sidecar at VECTOR_INDEX_PATH)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma').lower()
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', str(BASE_DIR / 'vector_index'))
+
+# numpy index search: 'exact', 'projected' (below), or 'ivf' for approximate
+# search over k-means inverted lists (IVF_NLIST lists, 0 = about
+# 4 * sqrt(chunks); each query scans the IVF_NPROBE nearest). Below
+# IVF_MIN_TRAIN_ROWS chunks search is exact. V3 queries routed to categories
+# (ROUTING_ENABLED, below) probe the IVF_NPROBE nearest lists that hold rows
+# of those categories, and scan categories under IVF_MIN_TRAIN_ROWS chunks
+# exactly.
+VECTOR_INDEX_MODE = os.getenv('VECTOR_INDEX_MODE', 'exact').lower()
+IVF_NLIST = int(os.getenv('IVF_NLIST', '0'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+IVF_MIN_TRAIN_ROWS = int(os.getenv('IVF_MIN_TRAIN_ROWS', '4096'))
+
+# numpy index 'projected' mode: queries scan PROJECTION_DIMENSIONS-dim copies
+# of the embeddings (PROJECTION_METHOD 'pca', fitted on the knowledge base at
+# ingest, or 'truncate' for Matryoshka-trained models) stored as
+# PROJECTION_DTYPE ('float16' halves memory but scans slower), then re-score
+# PROJECTION_RESCORE * k candidates on the full vectors (0 = no re-score).
+# Below PROJECTION_MIN_ROWS chunks search is exact.
+PROJECTION_METHOD = os.getenv('PROJECTION_METHOD', 'pca').lower()
+PROJECTION_DIMENSIONS = int(os.getenv('PROJECTION_DIMENSIONS', '128'))
+PROJECTION_DTYPE = os.getenv('PROJECTION_DTYPE', 'float32').lower()
+PROJECTION_RESCORE = int(os.getenv('PROJECTION_RESCORE', '4'))
+PROJECTION_MIN_ROWS = int(os.getenv('PROJECTION_MIN_ROWS', '1024'))
+
+# Retrieval: 'vector' (embedding similarity) or 'hybrid' (vector plus a BM25
+# index over the same chunks, fused by reciprocal rank). Each path contributes
+# its HYBRID_CANDIDATES best chunks to the fusion.
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector').lower()
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '20'))
+
+# Query routing: V3 predicts the question's categories (keyword rules plus the
+# nearest category centroid of its embedding) and only searches those
+# partitions. Categories scoring within ROUTER_MIN_MARGIN of the best are
+# searched too; if more than ROUTER_MAX_PARTITIONS are that close, the
+# search falls back to the whole knowledge base
+ROUTING_ENABLED = os.getenv('ROUTING_ENABLED', 'True').lower() == 'true'
+ROUTER_MIN_MARGIN = float(os.getenv('ROUTER_MIN_MARGIN', '0.05'))
+ROUTER_MAX_PARTITIONS = int(os.getenv('ROUTER_MAX_PARTITIONS', '2'))
+
+# Reranking: V3 retrieves RERANK_CANDIDATES chunks and keeps the best few
+# under vector score plus exact number / SKU / name and section-title
+# matches (app.rerank). The rerank is skipped, keeping the retrieval order,
+# when it would take longer than RERANK_BUDGET_MS
+RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'True').lower() == 'true'
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))
+RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', '5'))
+
+# Embedding: repeated questions reuse their embedding from a process-wide LRU
+# of QUERY_EMBEDDING_CACHE_SIZE entries (0 disables); rag.embed_many runs the
+# model on at most EMBED_BATCH_SIZE texts per forward pass
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+
+# Persistent embedding store shared by all workers and restarts: SQLite file
+# of embeddings by (model, text hash), consulted before running the model
+# (empty path disables); least recently used entries beyond the cap are evicted
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', str(BASE_DIR / 'embedding_cache.sqlite'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '50000'))
+
+# Embedding inference: 'sentence-transformers' (PyTorch), 'onnx' (same model
+# on onnxruntime, no torch import) or 'onnx-int8' (dynamically quantized;
+# vectors differ slightly, so it keeps its own index and caches). ONNX_MODEL_DIR
+# defaults to Chroma's ONNX model cache; ONNX_THREADS 0 = onnxruntime default
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers').lower()
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', '')
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))
+
+# Startup warmup: load the embedding model, collection, tokenizer and Anthropic
+# client and run a few retrievals before taking traffic; GET /ready reports it
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True').lower() == 'true'
+
 # Knowledge base
 KNOWLEDGE_BASE_DIR = BASE_DIR / 'data' / 'knowledge_base'
 
+# Build-time index snapshot (scripts/build_index_snapshot.py): served read-only
+# and memory-mapped when it matches the embedding model and knowledge base
+# files, so startup embeds nothing. Empty disables
+INDEX_SNAPSHOT_PATH = os.getenv('INDEX_SNAPSHOT_PATH', '')
+
+# Knowledge base hot reload: changed files are ingested into a new index
+# generation that is swapped in atomically. KB_WATCH_INTERVAL_SECONDS polls the
+# directory (0 = off); POST /kb/reload needs the X-Admin-Token header to match
+# KB_ADMIN_TOKEN (unset = endpoint disabled)
+KB_WATCH_INTERVAL_SECONDS = float(os.getenv('KB_WATCH_INTERVAL_SECONDS', '0'))
+KB_ADMIN_TOKEN = os.getenv('KB_ADMIN_TOKEN', '')
+
 # Traces
 TRACES_DIR = BASE_DIR / 'data' / 'traces'
 
@@ -33,10 +121,54 @@ TESTS_DIR = BASE_DIR / 'tests'
 TARGET_WORD_COUNT = 80
 WORD_COUNT_TOLERANCE = 0.25  # 25% tolerance
 
-# Token limits
-MAX_PROMPT_TOKENS = 2000
+# Knowledge base chunking: markdown is split at headers, and sections longer
+# than CHUNK_MAX_CHARS into windows overlapping by CHUNK_OVERLAP_CHARS
+CHUNK_MAX_CHARS = int(os.getenv('CHUNK_MAX_CHARS', '1000'))
+CHUNK_OVERLAP_CHARS = int(os.getenv('CHUNK_OVERLAP_CHARS', '150'))
+
+# Token limits (V3 packs retrieved context to keep prompts under MAX_PROMPT_TOKENS)
+MAX_PROMPT_TOKENS = int(os.getenv('MAX_PROMPT_TOKENS', '2000'))
 MAX_COMPLETION_TOKENS = 500
 
+# Semantic response cache (V3): serve a cached answer when a new question's
+# embedding is this similar (cosine) to a cached one with the same prompt
+# version, model and retrieved documents
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '3600'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000'))
+SEMANTIC_CACHE_MAX_BYTES = int(os.getenv('SEMANTIC_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Request coalescing: concurrent identical questions share one model call.
+# A waiting (threaded) request gives up on a leader after
+# SINGLE_FLIGHT_WAIT_SECONDS and calls the model itself.
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', '120'))
+
+# Client-side rate limiting for Anthropic calls: token buckets for requests and
+# tokens per minute, plus an AIMD concurrency limit that halves on 429s.
+# Calls that would wait longer than RATE_LIMIT_MAX_WAIT_SECONDS fail fast.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv('RATE_LIMIT_REQUESTS_PER_MINUTE', '50'))
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.getenv('RATE_LIMIT_TOKENS_PER_MINUTE', '40000'))
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv('RATE_LIMIT_MAX_WAIT_SECONDS', '5'))
+CONCURRENCY_INITIAL = int(os.getenv('CONCURRENCY_INITIAL', '8'))
+CONCURRENCY_MIN = int(os.getenv('CONCURRENCY_MIN', '1'))
+CONCURRENCY_MAX = int(os.getenv('CONCURRENCY_MAX', '32'))
+
+# Retrieval-confidence short-circuit (V3): when no retrieved document is
+# within RETRIEVAL_MAX_DISTANCE (Chroma L2 distance, lower is closer) the
+# fallback answer is returned without calling the model. Per-category
+# overrides use "returns=1.3,pricing=1.4"; calibrate both with
+# scripts/calibrate_retrieval_threshold.py
+RETRIEVAL_SHORT_CIRCUIT_ENABLED = os.getenv('RETRIEVAL_SHORT_CIRCUIT_ENABLED', 'True').lower() == 'true'
+RETRIEVAL_MAX_DISTANCE = float(os.getenv('RETRIEVAL_MAX_DISTANCE', '1.5'))
+RETRIEVAL_MAX_DISTANCE_BY_CATEGORY = os.getenv('RETRIEVAL_MAX_DISTANCE_BY_CATEGORY', '')
+
+# Batch endpoint (POST /ask/batch)
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '50'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+
 # Latency thresholds (milliseconds)
 LATENCY_THRESHOLD_P50 = 2000
 LATENCY_THRESHOLD_P95 = 5000
@@ -4,6 +4,7 @@ from .models import ProductionTrace, AnomalyThresholds
 from .anomaly import AnomalyDetector
 from .metrics import MetricsAggregator
 from .stream import init_socketio, broadcast_trace, broadcast_alert
+from .recorder import record_answer
 
 __all__ = [
     'ProductionTrace',
@@ -13,4 +14,5 @@ __all__ = [
     'init_socketio',
     'broadcast_trace',
     'broadcast_alert',
+    'record_answer',
 ]
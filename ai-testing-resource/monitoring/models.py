@@ -1,5 +1,6 @@
 """Data models for production monitoring"""
 
+import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional, Dict
@@ -21,6 +22,8 @@ class ProductionTrace:
     user_feedback: Optional[str] = None  # "positive", "negative"
     detected_category: Optional[str] = None
     anomaly_flags: List[str] = field(default_factory=list)
+    time_to_first_token_ms: Optional[int] = None
+    routing_fallback: Optional[bool] = None  # True when the router searched the whole knowledge base
 
     def to_dict(self) -> dict:
         return {
@@ -29,6 +32,7 @@ class ProductionTrace:
             'question': self.question,
             'response': self.response,
             'latency_ms': self.latency_ms,
+            'time_to_first_token_ms': self.time_to_first_token_ms,
             'prompt_tokens': self.prompt_tokens,
             'completion_tokens': self.completion_tokens,
             'model_version': self.model_version,
@@ -36,6 +40,7 @@ class ProductionTrace:
             'sources': self.sources,
             'user_feedback': self.user_feedback,
             'detected_category': self.detected_category,
+            'routing_fallback': self.routing_fallback,
             'anomaly_flags': self.anomaly_flags,
         }
 
@@ -45,6 +50,35 @@ class ProductionTrace:
             data['timestamp'] = datetime.fromisoformat(data['timestamp'])
         return cls(**data)
 
+    @classmethod
+    def from_response(cls, question: str, response: dict, model_version: str,
+                      timestamp: Optional[datetime] = None) -> 'ProductionTrace':
+        """Build a trace from an ai_service answer (the app.utils.format_response shape)
+
+        detected_category and routing_fallback come from the V3 query
+        router's decision in the answer's trace; v1/v2 answers leave them None.
+        """
+        metadata = response.get('metadata', {})
+        trace = response.get('trace') or {}
+        routing = trace.get('routing') or {}
+        spans = trace.get('spans') or []
+        trace_id = spans[0]['span_id'].rsplit('-span-', 1)[0] if spans else uuid.uuid4().hex[:12]
+        return cls(
+            id=trace_id,
+            timestamp=timestamp or datetime.utcnow(),
+            question=question,
+            response=response.get('text', ''),
+            latency_ms=metadata.get('latency_ms', 0),
+            prompt_tokens=metadata.get('prompt_tokens', 0),
+            completion_tokens=metadata.get('completion_tokens', 0),
+            model_version=model_version,
+            prompt_version=trace.get('version', 'unknown'),
+            sources=response.get('sources', []),
+            detected_category=routing.get('category'),
+            time_to_first_token_ms=metadata.get('time_to_first_token_ms'),
+            routing_fallback=routing.get('fallback'),
+        )
+
 
 @dataclass
 class AnomalyThresholds:
@@ -0,0 +1,33 @@
+"""Recording of production traces from answered questions
+
+The /ask routes hand every answer to record_answer(), which turns it into a
+ProductionTrace (with the V3 router's category decision) and broadcasts it
+to connected monitoring clients. Nothing is kept in the process: consumers
+aggregate the traces they receive.
+"""
+
+from typing import Optional
+
+from config import ANTHROPIC_MODEL, MONITORING_ENABLED
+from .models import ProductionTrace
+from .stream import broadcast_trace
+
+
+def record_answer(question: str, response: dict,
+                  model_version: str = ANTHROPIC_MODEL) -> Optional[ProductionTrace]:
+    """Record an ai_service answer as a production trace
+
+    Args:
+        question: The (sanitized) question asked
+        response: The answer as returned by POST /ask
+        model_version: Model that produced the answer
+
+    Returns:
+        The broadcast trace, or None when monitoring is disabled
+    """
+    if not MONITORING_ENABLED:
+        return None
+
+    trace = ProductionTrace.from_response(question, response, model_version)
+    broadcast_trace(trace.to_dict())
+    return trace
@@ -63,9 +63,25 @@ def main():
         traceback.print_exc()
         sys.exit(1)
 
+    # Hot-reload knowledge base edits without a restart
+    from config import KB_WATCH_INTERVAL_SECONDS
+    if KB_WATCH_INTERVAL_SECONDS > 0:
+        from app.kb_reload import KnowledgeBaseWatcher
+        print(f"Watching the knowledge base for changes every {KB_WATCH_INTERVAL_SECONDS:g}s...")
+        KnowledgeBaseWatcher(interval=KB_WATCH_INTERVAL_SECONDS).start()
+
+    # Warm the model, index, tokenizer and client in the background;
+    # /health answers meanwhile and /ready turns 200 when done
+    from config import WARMUP_ENABLED
+    if WARMUP_ENABLED:
+        from app.warmup import start_warmup
+        print("Starting warmup (GET /ready reports progress)...")
+        start_warmup()
+
     host = os.getenv('FLASK_HOST', '127.0.0.1')
     port = int(os.getenv('FLASK_PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    server_mode = os.getenv('SERVER_MODE', 'wsgi').lower()
 
     print(f"\nStarting AI Testing Resource...")
     print(f"Open http://{host}:{port}/viewer/tests in your browser")
@@ -73,8 +89,15 @@ def main():
     print(f"\nPress Ctrl+C to stop\n")
 
     try:
-        print(f"Starting Flask on {host}:{port} (debug={debug})...")
-        app.run(host=host, port=port, debug=debug)
+        if server_mode == 'asgi':
+            # Serve /ask/async on a single event loop; other routes run via WsgiToAsgi
+            import uvicorn
+            from app.asgi import create_asgi_app
+            print(f"Starting ASGI server on {host}:{port}...")
+            uvicorn.run(create_asgi_app(app), host=host, port=port)
+        else:
+            print(f"Starting Flask on {host}:{port} (debug={debug})...")
+            app.run(host=host, port=port, debug=debug)
     except Exception as e:
         print(f"CRITICAL ERROR: Flask failed to start: {e}")
         import traceback
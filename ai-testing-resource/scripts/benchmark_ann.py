@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Recall@k vs latency of the IVF index against exact search.
+
+Builds an exact NumpyIndex and an IVFIndex over the same embeddings, then for
+each nprobe setting reports recall@k (share of the exact top k that the IVF
+search also returns), p50/p95 query latency and the speedup over exact
+search. Use it to pick IVF_NLIST / IVF_NPROBE for a knowledge base size.
+
+By default the embeddings are synthetic (384 dimensions, grouped around
+topic centers the way real sentence embeddings are; uniformly random vectors
+have no cluster structure and are a worst case for IVF). --index reuses the
+vectors of an existing numpy index (e.g. VECTOR_INDEX_PATH), with queries
+taken from perturbed stored rows.
+
+Usage:
+    python scripts/benchmark_ann.py --chunks 200000
+    python scripts/benchmark_ann.py --chunks 50000 --nlist 512 --nprobe 1 4 16 64
+    python scripts/benchmark_ann.py --index vector_index --json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.vector_index import IVFIndex, NumpyIndex  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def normalized(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic(chunks: int, queries: int, dim: int, topics: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    spread = 0.8 * rng.normal(size=(chunks + queries, dim))
+    vectors = normalized(centers[rng.integers(topics, size=chunks + queries)] + spread)
+    return vectors[:chunks], vectors[chunks:]
+
+
+def from_index(path: str, queries: int, seed: int):
+    vectors = np.asarray(NumpyIndex(path)._snapshot.matrix, dtype=np.float32)
+    if not len(vectors):
+        sys.exit(f"No embeddings in {path}")
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(len(vectors), size=queries)]
+    return vectors, normalized(picked + 0.05 * rng.normal(size=picked.shape))
+
+
+def timed_queries(index, probes, k, **params):
+    latencies, results = [], []
+    for probe in probes:
+        started = time.perf_counter()
+        result = index.query(query_embeddings=[probe], n_results=k, **params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(result['ids'][0])
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=100000, help='Synthetic chunks (default 100000)')
+    parser.add_argument('--queries', type=int, default=300, help='Queries to time (default 300)')
+    parser.add_argument('--dim', type=int, default=384, help='Synthetic dimensions (default 384)')
+    parser.add_argument('--topics', type=int, default=500, help='Synthetic topic centers (default 500)')
+    parser.add_argument('--index', help='Benchmark the vectors of this numpy index instead')
+    parser.add_argument('--k', type=int, default=3, help='Results per query (default 3, as V3)')
+    parser.add_argument('--nlist', type=int, default=0, help='IVF lists (default 0: about 4 * sqrt(chunks))')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64],
+                        help='nprobe values to sweep')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if args.index:
+        vectors, probes = from_index(args.index, args.queries, args.seed)
+    else:
+        vectors, probes = synthetic(args.chunks, args.queries, args.dim, args.topics, args.seed)
+    ids = [f'chunk{i}' for i in range(len(vectors))]
+    documents = [''] * len(ids)
+    metadatas = [{}] * len(ids)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = NumpyIndex(str(Path(tmp) / 'exact'))
+        exact.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+        ivf = IVFIndex(str(Path(tmp) / 'ivf'), nlist=args.nlist, min_train_rows=0)
+        started = time.perf_counter()
+        ivf.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+        build_s = time.perf_counter() - started
+        nlist = len(ivf._ivf.centroids)
+
+        exact_latencies, expected = timed_queries(exact, probes, args.k)
+        exact_p50 = percentile(exact_latencies, 50)
+        rows = [{'nprobe': 'exact', 'recall_at_k': 1.0, 'query_p50_ms': round(exact_p50, 3),
+                 'query_p95_ms': round(percentile(exact_latencies, 95), 3), 'speedup': 1.0}]
+
+        for nprobe in sorted(n for n in args.nprobe if n <= nlist):
+            latencies, results = timed_queries(ivf, probes, args.k, nprobe=nprobe)
+            hits = sum(len(set(r) & set(e)) for r, e in zip(results, expected))
+            p50 = percentile(latencies, 50)
+            rows.append({
+                'nprobe': nprobe,
+                'recall_at_k': round(hits / sum(len(e) for e in expected), 4),
+                'query_p50_ms': round(p50, 3),
+                'query_p95_ms': round(percentile(latencies, 95), 3),
+                'speedup': round(exact_p50 / max(p50, 1e-6), 1),
+            })
+
+    if args.json:
+        print(json.dumps({'chunks': len(vectors), 'dim': vectors.shape[1], 'queries': len(probes), 'k': args.k,
+                          'nlist': nlist, 'build_s': round(build_s, 2), 'results': rows}, indent=2))
+        return
+
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims, {len(probes)} queries, top {args.k}")
+    print(f"IVF: {nlist} lists, built and trained in {build_s:.1f}s\n")
+    columns = ['recall_at_k', 'query_p50_ms', 'query_p95_ms', 'speedup']
+    print(f"{'nprobe':<8}" + ''.join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print(f"{row['nprobe']:<8}" + ''.join(f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Benchmark sync vs async /ask execution against a local fake LLM server.
+
+Starts an HTTP server that mimics the Anthropic Messages API with a fixed
+response delay, points both SDK clients at it, then pushes the same number of
+requests through:
+
+- sync:  ask() on a fixed-size thread pool (one thread per WSGI worker thread)
+- async: ask_async() with every request in flight on a single event loop
+
+Usage:
+    python scripts/benchmark_async.py --requests 200 --workers 8 --delay 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+FAKE_ANSWER = (
+    "Our return policy allows returns within 30 days of delivery. "
+    "Items must be unused and in original packaging."
+)
+
+
+def make_fake_llm_handler(delay_s: float):
+    """Build a request handler that answers /v1/messages after delay_s seconds"""
+
+    class FakeMessagesHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('content-length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(delay_s)
+
+            body = json.dumps({
+                'id': 'msg_fake',
+                'type': 'message',
+                'role': 'assistant',
+                'model': request.get('model', 'fake-model'),
+                'content': [{'type': 'text', 'text': FAKE_ANSWER}],
+                'stop_reason': 'end_turn',
+                'stop_sequence': None,
+                'usage': {'input_tokens': 72, 'output_tokens': 20},
+            }).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('content-type', 'application/json')
+            self.send_header('content-length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeMessagesHandler
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Thread-per-connection server with a listen backlog deep enough for bursts"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_fake_llm_server(delay_s: float) -> ThreadingHTTPServer:
+    """Start the fake LLM server on a free localhost port in a daemon thread"""
+    server = FakeLLMServer(('127.0.0.1', 0), make_fake_llm_handler(delay_s))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_sync(n_requests: int, workers: int, version: str) -> float:
+    """Run n_requests through ask() on a bounded thread pool, return seconds"""
+    from app.ai_service import ask
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda i: ask(f"What is your return policy? ({i})", version=version),
+                      range(n_requests)))
+    return time.perf_counter() - start
+
+
+def run_async(n_requests: int, version: str) -> float:
+    """Run n_requests concurrently through ask_async(), return seconds"""
+    from app.ai_service import ask_async
+
+    async def main():
+        await asyncio.gather(*[
+            ask_async(f"What is your return policy? ({i})", version=version)
+            for i in range(n_requests)
+        ])
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='Total requests per mode')
+    parser.add_argument('--workers', type=int, default=8, help='Sync worker threads')
+    parser.add_argument('--delay', type=float, default=1.0, help='Fake LLM latency (s)')
+    parser.add_argument('--version', default='v2', choices=['v1', 'v2', 'v3'],
+                        help='Prompt version (v3 also needs the knowledge base)')
+    args = parser.parse_args()
+
+    server = start_fake_llm_server(args.delay)
+    host, port = server.server_address
+    os.environ['ANTHROPIC_API_KEY'] = 'fake-key'
+    os.environ['ANTHROPIC_BASE_URL'] = f"http://{host}:{port}"
+
+    from app import ai_service
+    ai_service.client = None
+    ai_service.async_client = None
+
+    print(f"Fake LLM at http://{host}:{port} (delay {args.delay:.2f}s)")
+    print(f"{args.requests} requests, version {args.version}\n")
+
+    sync_s = run_sync(args.requests, args.workers, args.version)
+    async_s = run_async(args.requests, args.version)
+
+    print(f"{'mode':<28}{'seconds':>10}{'req/s':>10}")
+    print(f"{'sync (' + str(args.workers) + ' threads)':<28}{sync_s:>10.2f}{args.requests / sync_s:>10.1f}")
+    print(f"{'async (single event loop)':<28}{async_s:>10.2f}{args.requests / async_s:>10.1f}")
+    print(f"\nSpeedup: {sync_s / async_s:.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Benchmark batched retrieval against one get_relevant_docs call per query.
+
+Builds a synthetic knowledge base generation (unit-length embeddings,
+all-MiniLM-L6-v2 sized, with short texts from a fixed vocabulary so BM25 has
+terms to match) and retrieves the same queries twice: once per query with
+rag.get_relevant_docs, and once with rag.get_relevant_docs_batch. Reports
+throughput for each query count and checks both return the same documents.
+
+Embeddings are precomputed, so this times retrieval alone. With --embed it
+also times embedding the query texts with the configured model, one text
+per call versus rag.embed_many's batched forward passes.
+
+Usage:
+    python scripts/benchmark_batch_retrieval.py
+    python scripts/benchmark_batch_retrieval.py --queries 1000 10000 --chunks 20000 --mode hybrid
+    python scripts/benchmark_batch_retrieval.py --backend ivf --embed --json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+CATEGORIES = ('pricing', 'returns', 'shipping', 'products', 'general')
+
+
+def synthetic_generation(path: str, chunks: int, dim: int, backend: str, seed: int):
+    """A KnowledgeBaseGeneration over random chunks, with its BM25 index built"""
+    import numpy as np
+    from app import rag
+    from app.lexical import BM25Index
+    from app.vector_index import open_index
+
+    rng = np.random.default_rng(seed)
+    vocabulary = [f'term{i}' for i in range(2000)]
+    ids = [f'doc{i // 5}#{i % 5}' for i in range(chunks)]
+    documents = [' '.join(rng.choice(vocabulary, 30)) for _ in range(chunks)]
+    metadatas = [{'id': chunk_id, 'parent_id': chunk_id.split('#')[0], 'title': chunk_id.split('#')[0],
+                  'category': CATEGORIES[i // 5 % len(CATEGORIES)], 'section': '', 'start': 0,
+                  'end': len(documents[i])} for i, chunk_id in enumerate(ids)]
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = open_index(path, 'ivf' if backend == 'ivf' else 'exact', min_train_rows=1)
+    with index.deferred_writes():
+        for i in range(0, chunks, 4096):
+            batch = slice(i, i + 4096)
+            index.upsert(ids=ids[batch], embeddings=vectors[batch], documents=documents[batch],
+                         metadatas=metadatas[batch])
+    lexical = BM25Index()
+    lexical.upsert(ids, [rag.lexical_text(doc, meta) for doc, meta in zip(documents, metadatas)])
+    return rag.KnowledgeBaseGeneration('benchmark', index, 'benchmark', lexical=lexical), vocabulary
+
+
+def synthetic_queries(count: int, dim: int, vocabulary: list, seed: int):
+    import numpy as np
+    rng = np.random.default_rng(seed + count)
+    texts = [' '.join(rng.choice(vocabulary, 5)) for _ in range(count)]
+    embeddings = rng.normal(size=(count, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return texts, embeddings
+
+
+def time_retrieval(generation, texts, embeddings, k: int, mode: str) -> dict:
+    from app.rag import get_relevant_docs, get_relevant_docs_batch
+
+    started = time.perf_counter()
+    single = [get_relevant_docs(text, n_results=k, query_embedding=embedding, mode=mode, generation=generation)
+              for text, embedding in zip(texts, embeddings)]
+    single_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = get_relevant_docs_batch(texts, n_results=k, query_embeddings=embeddings, mode=mode,
+                                      generation=generation)
+    batch_s = time.perf_counter() - started
+
+    same = sum([doc['id'] for doc in a] == [doc['id'] for doc in b] for a, b in zip(single, batched))
+    return {
+        'queries': len(texts),
+        'single_qps': round(len(texts) / single_s, 1),
+        'batch_qps': round(len(texts) / batch_s, 1),
+        'speedup': round(single_s / batch_s, 2),
+        'same_results': round(same / len(texts), 4),
+    }
+
+
+def time_embedding(texts) -> dict:
+    from app.rag import embed_many
+
+    embed_many(texts[:1])  # Load the model outside the timings
+    started = time.perf_counter()
+    for text in texts:
+        embed_many([text])
+    single_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    embed_many(texts)
+    batch_s = time.perf_counter() - started
+    return {
+        'single_qps': round(len(texts) / single_s, 1),
+        'batch_qps': round(len(texts) / batch_s, 1),
+        'speedup': round(single_s / batch_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, nargs='+', default=[1000, 10000],
+                        help='Query counts to time (default 1000 10000)')
+    parser.add_argument('--chunks', type=int, default=5000, help='Indexed chunks (default 5000)')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimensions (default 384)')
+    parser.add_argument('--k', type=int, default=3, help='Results per query (default 3, as V3)')
+    parser.add_argument('--mode', choices=('vector', 'hybrid'), default='vector')
+    parser.add_argument('--backend', choices=('numpy', 'ivf'), default='numpy')
+    parser.add_argument('--embed', action='store_true',
+                        help='Also time embedding the query texts with the configured model')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # Embeddings of the synthetic texts must not land in a real embedding store
+    os.environ.setdefault('EMBEDDING_CACHE_PATH', '')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generation, vocabulary = synthetic_generation(os.path.join(tmp, 'index'), args.chunks, args.dim,
+                                                      args.backend, args.seed)
+        reports = []
+        for count in args.queries:
+            texts, embeddings = synthetic_queries(count, args.dim, vocabulary, args.seed)
+            report = time_retrieval(generation, texts, embeddings, args.k, args.mode)
+            if args.embed:
+                report['embedding'] = time_embedding(texts)
+            reports.append(report)
+
+    if args.json:
+        print(json.dumps({'chunks': args.chunks, 'dim': args.dim, 'k': args.k, 'mode': args.mode,
+                          'backend': args.backend, 'runs': reports}, indent=2))
+        return
+
+    print(f"{args.chunks} chunks x {args.dim} dims, top {args.k}, {args.mode} retrieval, {args.backend} index\n")
+    columns = ['queries', 'single_qps', 'batch_qps', 'speedup', 'same_results']
+    print(''.join(f"{c:>14}" for c in columns))
+    for report in reports:
+        print(''.join(f"{report[c]:>14}" for c in columns))
+    if args.embed:
+        print("\nEmbedding (configured model)")
+        for report in reports:
+            embedding = report['embedding']
+            print(f"{report['queries']:>14}{embedding['single_qps']:>14}{embedding['batch_qps']:>14}"
+                  f"{embedding['speedup']:>14}")
+
+
+if __name__ == '__main__':
+    main()
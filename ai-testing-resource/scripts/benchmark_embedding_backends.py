@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Benchmark the embedding backends: PyTorch vs onnxruntime fp32 vs int8.
+
+For each EMBEDDING_BACKEND, a fresh subprocess measures startup (imports
+plus model load), the first call, single-question latency (as V3 embeds one
+question per request), batch throughput, and resident memory. The persistent
+embedding store and the query LRU are bypassed, so every call runs the model.
+
+Usage:
+    python scripts/benchmark_embedding_backends.py
+    python scripts/benchmark_embedding_backends.py --queries 500 --json
+    python scripts/benchmark_embedding_backends.py --backends onnx onnx-int8
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+BACKENDS = ('sentence-transformers', 'onnx', 'onnx-int8')
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (Linux), else peak RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_model(backend: str):
+    """The raw model call for a backend, without the caching wrapper"""
+    if backend == 'sentence-transformers':
+        from app.rag import EMBEDDING_MODEL, SentenceTransformerEmbedder
+        return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+    from app.onnx_embedder import OnnxEmbedder
+    return OnnxEmbedder(quantize=backend == 'onnx-int8')
+
+
+def questions(count: int):
+    from tests.fixtures.questions import EDGE_CASE_QUESTIONS, SAMPLE_QUESTIONS
+    texts = [q['question'] for q in SAMPLE_QUESTIONS] + list(EDGE_CASE_QUESTIONS)
+    # Distinct texts, so no layer below could be serving repeats
+    return [f"{texts[i % len(texts)]} ({i})" for i in range(count)]
+
+
+def run_worker(args) -> dict:
+    """Measure one backend in this process"""
+    import numpy  # noqa: F401 - shared by every backend, not counted against one
+
+    baseline_mb = rss_mb()
+    started = time.perf_counter()
+    embed = load_model(args.worker)
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    texts = questions(args.queries)
+    started = time.perf_counter()
+    dim = len(embed([texts[0]])[0])
+    first_call_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        embed([text])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for i in range(0, len(texts), args.batch):
+        embed(texts[i:i + args.batch])
+    batch_s = time.perf_counter() - started
+
+    return {
+        'backend': args.worker,
+        'dimensions': dim,
+        'startup_ms': round(startup_ms, 1),
+        'first_call_ms': round(first_call_ms, 1),
+        'query_p50_ms': round(percentile(latencies, 50), 3),
+        'query_p95_ms': round(percentile(latencies, 95), 3),
+        'batch_texts_per_s': round(len(texts) / batch_s, 1),
+        'rss_mb': round(rss_mb() - baseline_mb, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=200, help='Questions to time (default 200)')
+    parser.add_argument('--batch', type=int, default=64, help='Batch size for throughput (default 64)')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    reports = {}
+    for backend in args.backends:
+        command = [sys.executable, __file__, '--worker', backend,
+                   '--queries', str(args.queries), '--batch', str(args.batch)]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ['failed'])[-1]
+            reports[backend] = {'backend': backend, 'error': error}
+            continue
+        reports[backend] = json.loads(result.stdout.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps({'queries': args.queries, 'batch': args.batch, 'backends': reports}, indent=2))
+        return
+
+    print(f"{args.queries} single-question embeddings, batches of {args.batch}\n")
+    columns = ['startup_ms', 'first_call_ms', 'query_p50_ms', 'query_p95_ms', 'batch_texts_per_s', 'rss_mb']
+    print(f"{'':<22}" + ''.join(f"{c:>18}" for c in columns))
+    for backend, report in reports.items():
+        if 'error' in report:
+            print(f"{backend:<22}  unavailable: {report['error']}")
+            continue
+        print(f"{backend:<22}" + ''.join(f"{report[c]:>18}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
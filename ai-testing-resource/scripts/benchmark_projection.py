@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Recall@k vs memory of reduced-dimension vector search against exact search.
+
+Builds an exact NumpyIndex and, for each setting, a ProjectedIndex over the
+same embeddings (VECTOR_INDEX_MODE=projected), then reports recall@k (share
+of the exact top k the projected search also returns), with and without the
+re-score on full vectors, the size of the matrix each query scans against
+the full float32 one, the share of embedding energy the projection keeps,
+and p50 query latency. Use it to pick PROJECTION_DIMENSIONS, PROJECTION_DTYPE
+and PROJECTION_RESCORE.
+
+By default the embeddings are synthetic: 384 dimensions around topic
+centers, as in benchmark_ann.py, with the variance of dimension i scaled by
+(i + 1) ** -decay so a few directions dominate, as is typical of sentence
+embeddings (--decay 0 spreads it evenly, the worst case for any reduction).
+--index measures the vectors of an existing numpy index (e.g.
+VECTOR_INDEX_PATH) instead, with queries taken from perturbed stored rows;
+that is the number to decide on.
+
+float16 rows are upcast on every scan (NumPy has no half-precision matrix
+product), so expect them to halve memory but not to speed queries up.
+
+Usage:
+    python scripts/benchmark_projection.py --chunks 100000
+    python scripts/benchmark_projection.py --dims 64 96 128 --dtype float16 --rescore 0 4 8
+    python scripts/benchmark_projection.py --index vector_index --method truncate --json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.projection import ProjectedIndex  # noqa: E402
+from app.vector_index import NumpyIndex  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def normalized(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic(chunks: int, queries: int, dim: int, topics: int, decay: float, seed: int):
+    rng = np.random.default_rng(seed)
+    scale = (1.0 + np.arange(dim)) ** (-decay / 2)  # Standard deviation per dimension
+    centers = rng.normal(size=(topics, dim)) * scale
+    spread = 0.8 * rng.normal(size=(chunks + queries, dim)) * scale
+    vectors = normalized(centers[rng.integers(topics, size=chunks + queries)] + spread)
+    return vectors[:chunks], vectors[chunks:]
+
+
+def from_index(path: str, queries: int, seed: int):
+    vectors = np.asarray(NumpyIndex(path)._snapshot.matrix, dtype=np.float32)
+    if not len(vectors):
+        sys.exit(f"No embeddings in {path}")
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(len(vectors), size=queries)]
+    return vectors, normalized(picked + 0.05 * rng.normal(size=picked.shape))
+
+
+def timed_queries(index, probes, k, **params):
+    latencies, results = [], []
+    for probe in probes:
+        started = time.perf_counter()
+        result = index.query(query_embeddings=[probe], n_results=k, **params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(result['ids'][0])
+    return latencies, results
+
+
+def recall(results, expected):
+    return round(sum(len(set(r) & set(e)) for r, e in zip(results, expected)) / sum(len(e) for e in expected), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=50000, help='Synthetic chunks (default 50000)')
+    parser.add_argument('--queries', type=int, default=300, help='Queries to time (default 300)')
+    parser.add_argument('--dim', type=int, default=384, help='Synthetic dimensions (default 384)')
+    parser.add_argument('--topics', type=int, default=500, help='Synthetic topic centers (default 500)')
+    parser.add_argument('--decay', type=float, default=1.0,
+                        help='Synthetic variance decay across dimensions (default 1.0; 0 = isotropic)')
+    parser.add_argument('--index', help='Benchmark the vectors of this numpy index instead')
+    parser.add_argument('--k', type=int, default=3, help='Results per query (default 3, as V3)')
+    parser.add_argument('--method', choices=('pca', 'truncate'), default='pca')
+    parser.add_argument('--dims', type=int, nargs='+', default=[64, 96, 128], help='Reduced dimensions to sweep')
+    parser.add_argument('--dtype', choices=('float32', 'float16'), nargs='+', default=['float32', 'float16'])
+    parser.add_argument('--rescore', type=int, nargs='+', default=[0, 4],
+                        help='Re-score multiples to sweep (0 = reduced-space results)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if args.index:
+        vectors, probes = from_index(args.index, args.queries, args.seed)
+    else:
+        vectors, probes = synthetic(args.chunks, args.queries, args.dim, args.topics, args.decay, args.seed)
+    ids = [f'chunk{i}' for i in range(len(vectors))]
+    documents = [''] * len(ids)
+    metadatas = [{}] * len(ids)
+    full_mb = vectors.shape[0] * vectors.shape[1] * 4 / 2 ** 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = NumpyIndex(str(Path(tmp) / 'exact'))
+        exact.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+        exact_latencies, expected = timed_queries(exact, probes, args.k)
+        rows = [{'dims': vectors.shape[1], 'dtype': 'float32', 'rescore': '-', 'recall_at_k': 1.0,
+                 'retained': 1.0, 'searched_mb': round(full_mb, 1), 'saved': 1.0,
+                 'query_p50_ms': round(percentile(exact_latencies, 50), 3)}]
+
+        for dims in sorted(d for d in args.dims if d < vectors.shape[1]):
+            for dtype in args.dtype:
+                index = ProjectedIndex(str(Path(tmp) / f'{dims}-{dtype}'), dimensions=dims, method=args.method,
+                                       dtype=dtype, min_fit_rows=0)
+                index.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+                storage = index.storage()
+                for rescore in args.rescore:
+                    latencies, results = timed_queries(index, probes, args.k, rescore=rescore)
+                    rows.append({
+                        'dims': dims,
+                        'dtype': dtype,
+                        'rescore': rescore,
+                        'recall_at_k': recall(results, expected),
+                        'retained': storage['retained'],
+                        'searched_mb': round(storage['searched_bytes'] / 2 ** 20, 1),
+                        'saved': round(storage['full_bytes'] / storage['searched_bytes'], 1),
+                        'query_p50_ms': round(percentile(latencies, 50), 3),
+                    })
+
+    if args.json:
+        print(json.dumps({'chunks': len(vectors), 'dim': vectors.shape[1], 'queries': len(probes), 'k': args.k,
+                          'method': args.method, 'results': rows}, indent=2))
+        return
+
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims, {len(probes)} queries, top {args.k}, "
+          f"{args.method} projection\n")
+    columns = ['dims', 'dtype', 'rescore', 'recall_at_k', 'retained', 'searched_mb', 'saved', 'query_p50_ms']
+    print(''.join(f"{c:>13}" for c in columns))
+    for row in rows:
+        print(''.join(f"{row[c]:>13}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
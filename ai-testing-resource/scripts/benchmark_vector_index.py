@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Benchmark the NumPy vector index against Chroma.
+
+Builds both stores from the same synthetic unit-length embeddings
+(all-MiniLM-L6-v2 sized, 384 dimensions), then measures import time, build
+time, cold open time, per-query latency and resident memory. Each backend
+runs in its own subprocess so import cost and memory are not shared.
+
+The model is not involved: this times the vector store alone, which is what
+VECTOR_BACKEND switches. Chroma's recall is measured against the exact NumPy
+results; random vectors are a hard case for its HNSW graph, so expect real
+embeddings to score higher.
+
+Usage:
+    python scripts/benchmark_vector_index.py --chunks 5000 --queries 500
+    python scripts/benchmark_vector_index.py --chunks 20000 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+BACKENDS = ('chroma', 'numpy')
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (Linux), else peak RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def synthetic(chunks: int, queries: int, dim: int, seed: int):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probes = rng.normal(size=(queries, dim)).astype(np.float32)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    return vectors, probes
+
+
+def open_store(backend: str, path: str):
+    if backend == 'numpy':
+        from app.vector_index import NumpyIndex
+        return NumpyIndex(path)
+    import chromadb
+    import chromadb.config
+    client = chromadb.PersistentClient(path=path, settings=chromadb.config.Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection('benchmark', embedding_function=None)
+
+
+def run_worker(args) -> dict:
+    """Measure one backend in this process"""
+    # Shared by both backends, so not counted against either
+    import numpy  # noqa: F401
+    import app  # noqa: F401
+
+    baseline_mb = rss_mb()
+    started = time.perf_counter()
+    if args.worker == 'numpy':
+        import app.vector_index  # noqa: F401
+    else:
+        import chromadb  # noqa: F401
+    import_ms = (time.perf_counter() - started) * 1000
+
+    vectors, probes = synthetic(args.chunks, args.queries, args.dim, args.seed)
+    ids = [f'chunk{i}' for i in range(len(vectors))]
+    documents = [f'chunk text {i}' for i in range(len(vectors))]
+    metadatas = [{'parent_id': f'doc{i // 5}'} for i in range(len(vectors))]
+    path = os.path.join(args.dir, args.worker)
+
+    store = open_store(args.worker, path)
+    started = time.perf_counter()
+    for i in range(0, len(ids), args.batch):
+        batch = slice(i, i + args.batch)
+        embeddings = vectors[batch] if args.worker == 'numpy' else vectors[batch].tolist()
+        store.upsert(ids=ids[batch], embeddings=embeddings, documents=documents[batch], metadatas=metadatas[batch])
+    build_ms = (time.perf_counter() - started) * 1000
+    del store
+
+    # Cold open of the persisted store, as at process start
+    started = time.perf_counter()
+    store = open_store(args.worker, path)
+    store.count()
+    open_ms = (time.perf_counter() - started) * 1000
+
+    latencies, results = [], []
+    for probe in probes:
+        query = [probe] if args.worker == 'numpy' else [probe.tolist()]
+        started = time.perf_counter()
+        result = store.query(query_embeddings=query, n_results=args.k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(result['ids'][0])
+
+    return {
+        'backend': args.worker,
+        'import_ms': round(import_ms, 1),
+        'build_ms': round(build_ms, 1),
+        'open_ms': round(open_ms, 1),
+        'query_p50_ms': round(percentile(latencies, 50), 3),
+        'query_p95_ms': round(percentile(latencies, 95), 3),
+        'rss_mb': round(rss_mb() - baseline_mb, 1),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=5000, help='Indexed chunks (default 5000)')
+    parser.add_argument('--queries', type=int, default=500, help='Queries to time (default 500)')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimensions (default 384)')
+    parser.add_argument('--k', type=int, default=3, help='Results per query (default 3, as V3)')
+    parser.add_argument('--batch', type=int, default=256, help='Upsert batch size (default 256)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in BACKENDS:
+            command = [sys.executable, __file__, '--worker', backend, '--dir', tmp,
+                       '--chunks', str(args.chunks), '--queries', str(args.queries), '--dim', str(args.dim),
+                       '--k', str(args.k), '--batch', str(args.batch), '--seed', str(args.seed)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            reports[backend] = json.loads(output.strip().splitlines()[-1])
+
+    # The NumPy index is exact, so it is the reference for Chroma's HNSW recall
+    exact = reports['numpy'].pop('results')
+    approximate = reports['chroma'].pop('results')
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+    reports['chroma']['recall_at_k'] = round(hits / sum(len(e) for e in exact), 4)
+    reports['numpy']['recall_at_k'] = 1.0
+
+    if args.json:
+        print(json.dumps({'chunks': args.chunks, 'queries': args.queries, 'dim': args.dim, 'k': args.k,
+                          'backends': reports}, indent=2))
+        return
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, top {args.k}\n")
+    columns = ['import_ms', 'build_ms', 'open_ms', 'query_p50_ms', 'query_p95_ms', 'rss_mb', 'recall_at_k']
+    print(f"{'':<8}" + ''.join(f"{c:>14}" for c in columns))
+    for backend, report in reports.items():
+        print(f"{backend:<8}" + ''.join(f"{report[c]:>14}" for c in columns))
+    speedup = reports['chroma']['query_p50_ms'] / max(reports['numpy']['query_p50_ms'], 1e-6)
+    print(f"\nnumpy p50 query is {speedup:.1f}x faster than chroma")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Build the knowledge base index snapshot that ships in the Docker image.
+
+Embeds data/knowledge_base into a throwaway NumPy index and writes it as one
+file: embeddings, chunk records, BM25 index, manifest, embedding model key
+and knowledge base fingerprint (see app/index_snapshot.py). Containers with
+INDEX_SNAPSHOT_PATH pointing at it memory-map it at startup instead of
+embedding the corpus, as long as the model and knowledge base still match.
+
+Usage:
+    python scripts/build_index_snapshot.py --output index_snapshot/kb.snapshot
+    python scripts/build_index_snapshot.py --check index_snapshot/kb.snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def build(output: str) -> dict:
+    from app import rag
+
+    counts = rag.initialize_knowledge_base(str(rag.KNOWLEDGE_BASE_DIR))
+    if counts is None:
+        raise SystemExit(f"Knowledge base directory not found: {rag.KNOWLEDGE_BASE_DIR}")
+    return rag.export_index_snapshot(output)
+
+
+def check(path: str) -> dict:
+    from app import rag
+    from app.index_snapshot import load_snapshot
+
+    fingerprint = rag._fingerprint(rag._scan(Path(rag.KNOWLEDGE_BASE_DIR)))
+    index = load_snapshot(path, rag.embedding_model_key(), fingerprint)
+    return {key: value for key, value in index.info.items() if key not in ('manifest', 'lexical')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--output', help='Snapshot file to write')
+    group.add_argument('--check', metavar='PATH',
+                       help='Verify a snapshot matches the current model and knowledge base')
+    args = parser.parse_args()
+
+    # Index into a scratch directory, never into an existing snapshot or the
+    # runtime index; the persistent embedding cache only if explicitly set
+    scratch = tempfile.mkdtemp(prefix='kb-snapshot-')
+    os.environ['VECTOR_BACKEND'] = 'numpy'
+    os.environ['VECTOR_INDEX_MODE'] = 'exact'
+    os.environ['VECTOR_INDEX_PATH'] = os.path.join(scratch, 'index')
+    os.environ['INDEX_SNAPSHOT_PATH'] = ''
+    os.environ.setdefault('EMBEDDING_CACHE_PATH', '')
+
+    if args.check:
+        from app.index_snapshot import SnapshotMismatch
+        try:
+            info = check(args.check)
+        except (OSError, SnapshotMismatch) as e:
+            print(f"Snapshot does not match: {e}")
+            sys.exit(1)
+        print(json.dumps(info, indent=2))
+        return
+
+    try:
+        info = build(args.output)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    size_mb = Path(args.output).stat().st_size / (1024 * 1024)
+    print(f"Wrote {args.output} ({size_mb:.1f} MiB): {info['rows']} chunks x {info['dimensions']} dims, "
+          f"model {info['embedding_model']}, knowledge base {info['kb_fingerprint']}")
+
+
+if __name__ == '__main__':
+    main()
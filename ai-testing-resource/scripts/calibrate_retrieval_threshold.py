@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Calibrate the V3 retrieval-confidence thresholds.
+
+Replays labelled questions against the knowledge base and reports Chroma
+distances:
+
+- answerable: the V3 trace questions (data/traces/v3_traces.json, labelled
+  with the document they were answered from), tests/fixtures SAMPLE_QUESTIONS
+  (labelled with a category) and the answerable EDGE_CASE_QUESTIONS
+- unanswerable: the out-of-KB edge case plus OFF_TOPIC_QUESTIONS below
+
+For the global threshold, a positive is the distance to the right document and
+a negative is the nearest document's distance. Per category, a negative is the
+distance to that category's nearest document, since the gate compares every
+retrieved doc with its own category's threshold.
+
+Usage:
+    python scripts/calibrate_retrieval_threshold.py
+    python scripts/calibrate_retrieval_threshold.py --min-recall 0.95 --json
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Allow imports from the parent package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.confidence import choose_threshold  # noqa: E402
+from app.rag import (categorize_doc, get_collection, get_relevant_docs_batch,  # noqa: E402
+                     initialize_knowledge_base)
+from config import KNOWLEDGE_BASE_DIR, RETRIEVAL_MAX_DISTANCE  # noqa: E402
+from tests.fixtures.questions import EDGE_CASE_QUESTIONS, SAMPLE_QUESTIONS  # noqa: E402
+
+TRACES_PATH = Path(__file__).parent.parent / 'data' / 'traces' / 'v3_traces.json'
+
+# Questions a customer might plausibly ask that the KB cannot answer
+OFF_TOPIC_QUESTIONS = [
+    "What is your cryptocurrency payment policy?",
+    "Do you have a physical store in Paris?",
+    "Who is the CEO of Acme Widgets?",
+    "Are you hiring software engineers?",
+    "What's the weather like today?",
+    "Can you write me a poem about the ocean?",
+    "How do I reset my router?",
+    "What is the capital of Australia?",
+    "Do you offer student discounts on textbooks?",
+    "Is Acme Widgets a publicly traded company?",
+]
+
+# EDGE_CASE_QUESTIONS entries the KB cannot answer
+UNANSWERABLE_EDGE_CASES = {"What is your cryptocurrency payment policy?"}
+
+
+def load_labelled_questions():
+    """Return (positives, negatives); a positive is (question, doc_id or None, category or None)"""
+    positives = []
+    for trace in json.loads(TRACES_PATH.read_text()):
+        doc_id = trace['sources'][0]['id'] if trace.get('sources') else None
+        positives.append((trace['question'], doc_id, categorize_doc(doc_id) if doc_id else None))
+
+    for item in SAMPLE_QUESTIONS:
+        positives.append((item['question'], None, item['category']))
+
+    negatives = list(OFF_TOPIC_QUESTIONS)
+    for question in EDGE_CASE_QUESTIONS:
+        if question in UNANSWERABLE_EDGE_CASES:
+            if question not in negatives:
+                negatives.append(question)
+        else:
+            positives.append((question, None, None))
+
+    return positives, negatives
+
+
+def _right_doc(docs, doc_id, category):
+    """The doc a positive should have matched: by id, else by category, else the nearest"""
+    for doc in docs:
+        if doc_id is not None and doc['id'] == doc_id:
+            return doc
+    for doc in docs:
+        if doc_id is None and category is not None and doc['category'] == category:
+            return doc
+    return docs[0]
+
+
+def collect_distances(n_docs):
+    """Distances of the right doc for positives, and per-category nearest docs for negatives"""
+    positives, negatives = load_labelled_questions()
+    pos_all, neg_all = [], []
+    pos_by_cat, neg_by_cat = defaultdict(list), defaultdict(list)
+
+    retrieved = get_relevant_docs_batch([question for question, _, _ in positives], n_results=n_docs)
+    for (question, doc_id, category), docs in zip(positives, retrieved):
+        right = _right_doc(docs, doc_id, category)
+        pos_all.append(right['distance'])
+        pos_by_cat[right['category']].append(right['distance'])
+
+    nearest_negative = []
+    for question, docs in zip(negatives, get_relevant_docs_batch(negatives, n_results=n_docs)):
+        neg_all.append(docs[0]['distance'])
+        nearest_negative.append((docs[0]['distance'], question, docs[0]['id']))
+        nearest = {}
+        for doc in docs:
+            nearest.setdefault(doc['category'], doc['distance'])
+        for category, distance in nearest.items():
+            neg_by_cat[category].append(distance)
+
+    return pos_all, neg_all, pos_by_cat, neg_by_cat, sorted(nearest_negative)
+
+
+def _range(values):
+    return f"{min(values):.3f}-{max(values):.3f}" if values else "-"
+
+
+def _accuracy(threshold, positive, negative):
+    kept = sum(d <= threshold for d in positive)
+    rejected = sum(d > threshold for d in negative)
+    return kept, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--min-recall', type=float, default=1.0,
+                        help='Share of answerable questions that must pass the gate (default 1.0)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    collection = get_collection()
+    if collection.count() == 0:
+        initialize_knowledge_base(str(KNOWLEDGE_BASE_DIR))
+    n_docs = collection.count()
+
+    pos_all, neg_all, pos_by_cat, neg_by_cat, nearest_negative = collect_distances(n_docs)
+
+    overall = choose_threshold(pos_all, neg_all, args.min_recall)
+    by_category = {
+        category: choose_threshold(pos_by_cat[category], neg_by_cat.get(category, []), args.min_recall)
+        for category in sorted(pos_by_cat)
+    }
+
+    if args.json:
+        print(json.dumps({
+            'min_recall': args.min_recall,
+            'current': RETRIEVAL_MAX_DISTANCE,
+            'recommended': overall,
+            'by_category': by_category,
+            'answerable': sorted(round(d, 4) for d in pos_all),
+            'unanswerable': sorted(round(d, 4) for d in neg_all),
+        }, indent=2))
+        return
+
+    print(f"Answerable questions:   {len(pos_all):3d}  distance {_range(pos_all)}")
+    print(f"Unanswerable questions: {len(neg_all):3d}  distance {_range(neg_all)}")
+    print()
+    print(f"{'category':<12} {'answerable':>14} {'unanswerable':>14} {'threshold':>10}")
+    for category, threshold in by_category.items():
+        print(f"{category:<12} {_range(pos_by_cat[category]):>14} "
+              f"{_range(neg_by_cat.get(category, [])):>14} {threshold:>10.3f}")
+    print()
+
+    for label, threshold in (('current', RETRIEVAL_MAX_DISTANCE), ('recommended', overall)):
+        kept, rejected = _accuracy(threshold, pos_all, neg_all)
+        print(f"{label:<12} {threshold:.3f}: answers {kept}/{len(pos_all)} answerable, "
+              f"short-circuits {rejected}/{len(neg_all)} unanswerable")
+
+    passing = [(d, q, doc_id) for d, q, doc_id in nearest_negative if d <= overall]
+    if passing:
+        print("\nUnanswerable questions that would still reach the model:")
+        for distance, question, doc_id in passing:
+            print(f"  {distance:.3f}  {question}  (nearest: {doc_id})")
+
+    print("\nSuggested settings:")
+    print(f"  RETRIEVAL_MAX_DISTANCE={overall}")
+    print("  RETRIEVAL_MAX_DISTANCE_BY_CATEGORY="
+          + ','.join(f"{category}={threshold}" for category, threshold in by_category.items()))
+
+
+if __name__ == '__main__':
+    main()
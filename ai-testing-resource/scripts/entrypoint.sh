@@ -16,6 +16,7 @@ python3 scripts/seed_test_data.py || {
 }
 
 # Step 3: Start the Flask application
-# Note: run.py already calls initialize_knowledge_base() which seeds ChromaDB
+# Note: run.py already calls initialize_knowledge_base(), which serves the
+# image's index snapshot (INDEX_SNAPSHOT_PATH) when it matches, else seeds ChromaDB
 echo "Starting Flask application..."
 exec python3 run.py
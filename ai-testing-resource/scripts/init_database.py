@@ -16,7 +16,7 @@ from sqlalchemy.exc import OperationalError, ProgrammingError
 import time
 
 from tsr.database import create_tables, drop_tables, Base
-from app.rag import initialize_knowledge_base, get_chroma_client
+from app.rag import initialize_knowledge_base, get_collection
 from config import TSR_DATABASE_URL, KNOWLEDGE_BASE_DIR, CHROMA_PATH
 
 
@@ -97,23 +97,15 @@ def initialize_chroma_database():
         os.makedirs(CHROMA_PATH, exist_ok=True)
         print(f"ChromaDB path: {CHROMA_PATH}")
 
-        # Initialize client
-        client = get_chroma_client()
-
-        # Check if collection exists
-        collections = [c.name for c in client.list_collections()]
+        # Open the configured vector store (Chroma or the NumPy index)
+        collection = get_collection()
+        count = collection.count()
 
-        if 'acme_knowledge_base' in collections:
+        if count > 0:
             print("⚠ Knowledge base collection already exists")
-
-            # Check document count
-            collection = client.get_collection("acme_knowledge_base")
-            count = collection.count()
             print(f"  Current document count: {count}")
-
-            if count > 0:
-                print("  Skipping knowledge base initialization")
-                return
+            print("  Skipping knowledge base initialization")
+            return
 
         # Load knowledge base documents
         print("Loading knowledge base documents...")
@@ -136,8 +128,7 @@ def initialize_chroma_database():
         initialize_knowledge_base()
 
         # Verify loaded documents
-        collection = client.get_collection("acme_knowledge_base")
-        count = collection.count()
+        count = get_collection().count()
         print(f"✓ Knowledge base initialized with {count} documents")
 
     except Exception as e:
@@ -17,6 +17,17 @@ else
     exit 1
 fi
 
+# Check readiness (startup warmup finished)
+echo "Checking readiness endpoint..."
+STATUS=$(curl -s -o /dev/null -w "%{http_code}" "$APP_URL/ready")
+if [ "$STATUS" == "200" ]; then
+    echo "Readiness check: PASS (HTTP $STATUS)"
+else
+    echo "Readiness check: FAIL (HTTP $STATUS)"
+    echo "Response: $(curl -s "$APP_URL/ready")"
+    exit 1
+fi
+
 # Check root page (should not return 500)
 echo "Checking root page..."
 STATUS=$(curl -s -o /dev/null -w "%{http_code}" "$APP_URL/")
@@ -154,7 +154,7 @@ async function submitDemoForm(event) {
   submitBtn.disabled = true;
 
   try {
-    const response = await fetch(appUrl('/ask'), {
+    const response = await fetch(appUrl('/ask/stream'), {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
@@ -162,12 +162,36 @@ async function submitDemoForm(event) {
       body: JSON.stringify({ question, version })
     });
 
-    const data = await response.json();
+    if (!response.ok) {
+      const err = await response.json();
+      throw new Error(err.error || `Request failed (${response.status})`);
+    }
+
+    // Show raw text as it streams in; replaced by rendered HTML on completion
+    let streamedText = '';
+    responseContainer.innerHTML = '<div class="demo-response__text"></div>';
+    const streamTarget = responseContainer.querySelector('.demo-response__text');
+
+    const data = await readEventStream(response, (event, payload) => {
+      if (event === 'delta') {
+        streamedText += payload.text;
+        streamTarget.textContent = streamedText;
+      } else if (event === 'error') {
+        throw new Error(payload.error);
+      }
+    });
+
+    if (!data) {
+      throw new Error('Stream ended before the answer was complete');
+    }
 
     // Display response (HTML from server-side markdown conversion)
     responseContainer.innerHTML = `
       <div class="demo-response__text">${data.text}</div>
       <div class="demo-response__metadata">
+        <span class="demo-response__meta-item">
+          <strong>First token:</strong> ${data.metadata.time_to_first_token_ms}ms
+        </span>
         <span class="demo-response__meta-item">
           <strong>Latency:</strong> ${data.metadata.latency_ms}ms
         </span>
@@ -184,7 +208,7 @@ async function submitDemoForm(event) {
     `;
 
     // Render trace panel
-    renderTracePanel(data.trace);
+    renderTracePanel(data.trace, data.metadata.latency_ms);
   } catch (error) {
     responseContainer.innerHTML = `
       <div class="demo-response__text" style="color: var(--color-error);">
@@ -197,6 +221,40 @@ async function submitDemoForm(event) {
   }
 }
 
+// Read a text/event-stream response, calling onEvent for each event.
+// Resolves with the payload of the final 'done' event (or null).
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let done = null;
+
+  while (true) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let payload = '';
+      raw.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) payload += line.slice(6);
+      });
+      if (!payload) continue;
+
+      const parsed = JSON.parse(payload);
+      if (event === 'done') done = parsed;
+      onEvent(event, parsed);
+    }
+  }
+  return done;
+}
+
 // Utility: escape HTML
 function escapeHtml(text) {
   const div = document.createElement('div');
@@ -211,7 +269,7 @@ function toggleTracePanel() {
 }
 
 // Render the KB trace panel
-function renderTracePanel(trace) {
+function renderTracePanel(trace, latencyMs) {
   const panel = document.getElementById('trace-panel');
   const content = document.getElementById('trace-panel__content');
 
@@ -233,6 +291,7 @@ function renderTracePanel(trace) {
           <p class="trace-step__hint">Switch to <strong>V3 - RAG</strong> to see the knowledge base pipeline in action.</p>
         </div>
       </div>
+      ${renderSpanTree(trace.spans, latencyMs)}
     `;
     return;
   }
@@ -303,6 +362,9 @@ function renderTracePanel(trace) {
         <code class="trace-step__code">${escapeHtml(trace.user_message)}</code>
       </div>
     </div>
+
+    <!-- Measured per-stage timings -->
+    ${renderSpanTree(trace.spans, latencyMs)}
   `;
 }
 
@@ -402,7 +464,7 @@ function renderSpanTree(spans, totalLatency) {
   const sortedSpans = [...spans].sort((a, b) => a.start_time - b.start_time);
 
   const spanHtml = sortedSpans.map(span => {
-    const percentDuration = (span.duration_ms / totalLatency) * 100;
+    const percentDuration = totalLatency ? (span.duration_ms / totalLatency) * 100 : 0;
     const spanColor = getSpanColor(span.span_type);
 
     return `
@@ -450,10 +512,13 @@ function renderSpanTree(spans, totalLatency) {
 function getSpanColor(spanType) {
   const colors = {
     embedding: '#4A9EFF',    // Blue
+    routing: '#34495E',      // Slate
     retrieval: '#9B59B6',    // Purple
     context: '#F39C12',      // Orange
     prompt: '#E74C3C',       // Red
-    llm: '#2ECC71'           // Green
+    llm: '#2ECC71',          // Green
+    cache: '#1ABC9C',        // Teal
+    render: '#7F8C8D'        // Gray
   };
   return colors[spanType] || '#95a5a6';
 }
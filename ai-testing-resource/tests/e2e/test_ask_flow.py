@@ -8,6 +8,59 @@ to receiving a formatted response.
 import pytest
 import json
 
+from app import ai_service
+from app.confidence import ConfidenceGate
+from app.pipeline import FunctionStage, Pipeline, StreamingStage
+from app.semantic_cache import SemanticCache
+
+MARKDOWN_ANSWER = "Returns are accepted for **30 days**."
+
+
+def read_events(response):
+    """(event, data) pairs of a Server-Sent Events body"""
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class FakeModel(StreamingStage):
+    """Streams a markdown answer in two deltas"""
+    name = 'Claude API Call'
+    span_type = 'llm'
+
+    def run(self, state, span):
+        state.text = MARKDOWN_ANSWER
+        state.tokens = {'prompt': 100, 'completion': 10}
+
+    def stream(self, state, span, started):
+        yield MARKDOWN_ANSWER[:12]
+        yield MARKDOWN_ANSWER[12:]
+        self.run(state, span)
+
+
+@pytest.fixture
+def early_exit_v3(monkeypatch):
+    """V3 with the real confidence, cache and render stages around a fake retrieval and model"""
+    distance = {'value': 0.5}
+
+    def retrieve(state, span):
+        state.embedding = [1.0, 0.0]
+        state.docs = [{'id': 'return_policy', 'title': 'Returns', 'category': 'returns',
+                       'content': 'Returns within 30 days.', 'distance': distance['value']}]
+
+    monkeypatch.setattr(ai_service, 'confidence_gate', ConfidenceGate(max_distance=1.0))
+    monkeypatch.setattr(ai_service, 'RETRIEVAL_SHORT_CIRCUIT_ENABLED', True)
+    monkeypatch.setattr(ai_service, 'SEMANTIC_CACHE_ENABLED', True)
+    monkeypatch.setattr(ai_service, 'semantic_cache', SemanticCache(threshold=0.9))
+    monkeypatch.setitem(ai_service.PIPELINES, 'v3', Pipeline('v3', [
+        FunctionStage('ChromaDB Retrieval', 'retrieval', retrieve),
+        ai_service.CONFIDENCE, ai_service.BUILD_CONTEXT, ai_service.CACHE_LOOKUP,
+        FakeModel(), ai_service.RENDER, ai_service.CACHE_STORE,
+    ]))
+    return distance
+
 
 class TestAskFlow:
     """Test suite for ask flow"""
@@ -58,3 +111,131 @@ class TestAskFlow:
 
             # Either success or API error (no key/service unavailable), but not version error
             assert response.status_code in [200, 500, 503]
+
+    def test_stream_empty_question(self, client):
+        """POST /ask/stream with empty question should return error"""
+        response = client.post(
+            "/ask/stream",
+            data=json.dumps({"question": "", "version": "v1"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_stream_returns_event_stream(self, client):
+        """POST /ask/stream should answer with Server-Sent Events"""
+        response = client.post(
+            "/ask/stream",
+            data=json.dumps({"question": "Hello", "version": "v1"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+        body = response.get_data(as_text=True)
+        # Ends with the full answer, or an error event without an API key
+        assert "event: done" in body or "event: error" in body
+
+    def test_stream_query_parameter(self, client):
+        """POST /ask?stream=1 should be equivalent to /ask/stream"""
+        response = client.post(
+            "/ask?stream=1",
+            data=json.dumps({"question": "Hello", "version": "v2"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+    def test_async_empty_question(self, client):
+        """POST /ask/async with empty question should return error"""
+        response = client.post(
+            "/ask/async",
+            data=json.dumps({"question": "", "version": "v3"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_async_version_selection(self, client):
+        """POST /ask/async should accept the same versions as /ask"""
+        response = client.post(
+            "/ask/async",
+            data=json.dumps({"question": "Hello", "version": "v1"}),
+            content_type="application/json",
+        )
+
+        # Either success or API error (no key/service unavailable), but not version error
+        assert response.status_code in [200, 500, 503]
+
+    def test_batch_requires_question_list(self, client):
+        """POST /ask/batch without a list of questions should return error"""
+        response = client.post(
+            "/ask/batch",
+            data=json.dumps({"questions": "Hello", "version": "v1"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    def test_batch_rejects_oversized_batch(self, client):
+        """POST /ask/batch over the size limit should be refused"""
+        from config import BATCH_MAX_QUESTIONS
+
+        response = client.post(
+            "/ask/batch",
+            data=json.dumps({"questions": ["Hello"] * (BATCH_MAX_QUESTIONS + 1), "version": "v1"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 413
+
+    def test_batch_streams_ndjson(self, client):
+        """POST /ask/batch should stream one line per question plus a summary"""
+        response = client.post(
+            "/ask/batch",
+            data=json.dumps({"questions": ["Hello", ""], "version": "v1"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        # Per-item failures (e.g. no API key) are reported inline, not as an HTTP error
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1]
+        assert lines[-1]["type"] == "summary"
+        assert lines[-1]["total"] == 2
+
+    def test_stream_cache_hit_sends_markdown_delta(self, client, early_exit_v3):
+        """A semantic cache hit should stream the same markdown a fresh answer does"""
+        body = json.dumps({"question": "What is your return policy?", "version": "v3"})
+        fresh = read_events(client.post("/ask/stream", data=body, content_type="application/json"))
+        cached = read_events(client.post("/ask/stream", data=body, content_type="application/json"))
+
+        assert "".join(data["text"] for event, data in fresh if event == "delta") == MARKDOWN_ANSWER
+        assert [event for event, _ in cached] == ["delta", "done"]
+        assert cached[0][1]["text"] == MARKDOWN_ANSWER
+        assert cached[1][1]["metadata"]["cache"]["hit"]
+        assert cached[1][1]["text"] == fresh[-1][1]["text"]
+        assert "<strong>30 days</strong>" in cached[1][1]["text"]
+
+    def test_stream_low_confidence_sends_markdown_delta(self, client, early_exit_v3):
+        """The low-confidence fallback should stream markdown and finish with HTML"""
+        early_exit_v3['value'] = 1.6
+
+        events = read_events(client.post(
+            "/ask/stream",
+            data=json.dumps({"question": "Do you accept cryptocurrency?", "version": "v3"}),
+            content_type="application/json",
+        ))
+
+        assert [event for event, _ in events] == ["delta", "done"]
+        assert events[0][1]["text"] == ai_service.V3_FALLBACK_ANSWER
+        assert "<" not in events[0][1]["text"]
+        assert events[1][1]["text"] == ai_service.convert_markdown_to_html(ai_service.V3_FALLBACK_ANSWER)
+        assert events[1][1]["trace"]["short_circuit"]["reason"] == "low_retrieval_confidence"
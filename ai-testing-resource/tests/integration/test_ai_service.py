@@ -4,9 +4,10 @@ Integration Test: AI Service
 Tests the AI service integration with OpenAI API.
 These tests require API credentials.
 """
+import asyncio
 import pytest
 import os
-from app.ai_service import ask, ask_v1, ask_v2, ask_v3
+from app.ai_service import ask, ask_async, ask_v1, ask_v2, ask_v3
 
 
 # Skip all tests if no API key
@@ -72,3 +73,12 @@ class TestAIServiceIntegration:
         assert 'prompt_tokens' in result['metadata']
         assert 'completion_tokens' in result['metadata']
         assert 'total_tokens' in result['metadata']
+
+    def test_ask_async_matches_sync_contract(self):
+        """ask_async() should return the same response structure as ask()"""
+        result = asyncio.run(ask_async("What is your return policy?", version='v3'))
+
+        assert len(result['text']) > 0
+        assert len(result['sources']) > 0
+        assert result['metadata']['completion_tokens'] > 0
+        assert result['trace']['version'] == 'v3'
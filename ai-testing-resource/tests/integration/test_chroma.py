@@ -41,6 +41,23 @@ class TestChromaIntegration:
         assert 'content' in doc
         assert 'distance' in doc
 
+    def test_stores_chunks_with_metadata(self):
+        """Documents are stored as header-aware chunks with parent and section"""
+        stored = get_collection().get(ids=['return_policy#0'], include=['metadatas', 'documents'])
+
+        metadata = stored['metadatas'][0]
+        assert metadata['parent_id'] == 'return_policy'
+        assert metadata['section'].endswith('Standard Returns')
+        assert stored['documents'][0].startswith('# Acme Widgets Return Policy')
+
+    def test_chunks_merged_per_document(self):
+        """Retrieved chunks are merged into one entry per parent document"""
+        docs = get_relevant_docs("return policy", n_results=3)
+
+        ids = [doc['id'] for doc in docs]
+        assert len(ids) == len(set(ids))
+        assert all(doc['chunks'] for doc in docs)
+
     def test_respects_n_results(self):
         """Should return requested number of results"""
         docs = get_relevant_docs("widgets", n_results=2)
@@ -0,0 +1,73 @@
+"""
+Integration Test: ONNX Embedding Backend Parity
+
+Runs all-MiniLM-L6-v2 through sentence-transformers (PyTorch) and through
+onnxruntime (fp32 and int8) on the real knowledge base chunks, and checks the
+ONNX vectors and retrieval rankings match. Skipped when either runtime or the
+ONNX model files are unavailable.
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.chunking import chunk_markdown
+from app.onnx_embedder import OnnxEmbedder
+from tests.fixtures.questions import SAMPLE_QUESTIONS
+
+KNOWLEDGE_DIR = Path(__file__).parent.parent.parent / 'data' / 'knowledge_base'
+
+
+def onnx_embedder(quantize: bool) -> OnnxEmbedder:
+    try:
+        return OnnxEmbedder(quantize=quantize)
+    except Exception as e:  # Missing onnx package, no network for the model download, ...
+        pytest.skip(f"ONNX embedder unavailable: {e}")
+
+
+@pytest.fixture(scope='module')
+def torch_model():
+    sentence_transformers = pytest.importorskip('sentence_transformers')
+    model = sentence_transformers.SentenceTransformer('all-MiniLM-L6-v2')
+    return lambda texts: model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+
+@pytest.fixture(scope='module')
+def chunks():
+    return [chunk for path in sorted(KNOWLEDGE_DIR.glob('*.md'))
+            for chunk in chunk_markdown(path.stem, path.read_text())]
+
+
+def rankings(embed, chunks, k):
+    matrix = np.asarray(embed([chunk.embedding_text() for chunk in chunks]))
+    queries = np.asarray(embed([q['question'] for q in SAMPLE_QUESTIONS]))
+    order = np.argsort(-(queries @ matrix.T), axis=1)[:, :k]
+    return [[chunks[i].id for i in row] for row in order]
+
+
+class TestOnnxParity:
+    """ONNX inference should reproduce the PyTorch model"""
+
+    def test_fp32_vectors_match(self, torch_model, chunks):
+        onnx = onnx_embedder(quantize=False)
+        texts = [chunk.embedding_text() for chunk in chunks[:8]] + ['What is your return policy?']
+
+        expected = torch_model(texts)
+        actual = np.asarray(onnx(texts))
+
+        assert actual.shape == expected.shape
+        assert np.min(np.sum(actual * expected, axis=1)) > 0.9999
+
+    def test_fp32_rankings_match(self, torch_model, chunks):
+        onnx = onnx_embedder(quantize=False)
+
+        assert rankings(onnx, chunks, k=3) == rankings(torch_model, chunks, k=3)
+
+    def test_int8_close_and_same_top_result(self, torch_model, chunks):
+        onnx = onnx_embedder(quantize=True)
+        texts = [q['question'] for q in SAMPLE_QUESTIONS]
+
+        similarity = np.sum(np.asarray(onnx(texts)) * torch_model(texts), axis=1)
+
+        assert np.min(similarity) > 0.98
+        assert [r[0] for r in rankings(onnx, chunks, k=1)] == [r[0] for r in rankings(torch_model, chunks, k=1)]
@@ -0,0 +1,148 @@
+"""
+Unit Test: Batch Fan-Out
+
+Tests run_batch ordering, per-item error isolation, bounded concurrency,
+single-call embedding and the aggregate summary. The answer function and
+embedding call are replaced with fakes - no model or API involved.
+"""
+import threading
+import time
+
+import pytest
+from app import batch
+from app.ai_service import AIServiceError
+
+
+def fake_response(latency_ms=100, prompt=50, completion=20):
+    return {
+        'text': 'answer',
+        'sources': [],
+        'metadata': {
+            'latency_ms': latency_ms,
+            'prompt_tokens': prompt,
+            'completion_tokens': completion,
+            'total_tokens': prompt + completion,
+        },
+    }
+
+
+@pytest.fixture
+def embed_calls(monkeypatch):
+    calls = []
+
+    def fake_embed(questions):
+        calls.append(list(questions))
+        return [[float(i)] for i in range(len(questions))]
+
+    monkeypatch.setattr(batch, 'embed_queries', fake_embed)
+    return calls
+
+
+class TestRunBatch:
+    """Test suite for batch question answering"""
+
+    def test_every_question_answered_then_summary(self, monkeypatch, embed_calls):
+        """Each question yields one item, followed by a summary"""
+        monkeypatch.setattr(batch, 'ask', lambda q, version, query_embedding: fake_response())
+
+        items = list(batch.run_batch(['a', 'b', 'c'], version='v1'))
+
+        assert sorted(item['index'] for item in items[:-1]) == [0, 1, 2]
+        assert all(item['type'] == 'result' for item in items[:-1])
+        assert items[-1]['type'] == 'summary'
+
+    def test_v3_embeds_once_for_whole_batch(self, monkeypatch, embed_calls):
+        """V3 should make one embedding call and pass each vector to its question"""
+        seen = {}
+
+        def fake_ask(question, version, query_embedding):
+            seen[question] = query_embedding
+            return fake_response()
+
+        monkeypatch.setattr(batch, 'ask', fake_ask)
+        list(batch.run_batch(['a', 'b', 'c'], version='v3'))
+
+        assert embed_calls == [['a', 'b', 'c']]
+        assert seen == {'a': [0.0], 'b': [1.0], 'c': [2.0]}
+
+    def test_v1_skips_embedding(self, monkeypatch, embed_calls):
+        """Versions without retrieval should not embed"""
+        monkeypatch.setattr(batch, 'ask', lambda q, version, query_embedding: fake_response())
+        list(batch.run_batch(['a'], version='v1'))
+
+        assert embed_calls == []
+
+    def test_item_error_does_not_fail_batch(self, monkeypatch, embed_calls):
+        """An AIServiceError on one question becomes an error item"""
+        def fake_ask(question, version, query_embedding):
+            if question == 'bad':
+                raise AIServiceError("AI service is busy. Please try again in a moment.")
+            return fake_response()
+
+        monkeypatch.setattr(batch, 'ask', fake_ask)
+        items = list(batch.run_batch(['ok', 'bad', 'ok too'], version='v1'))
+
+        errors = [item for item in items if item['type'] == 'error']
+        assert len(errors) == 1
+        assert errors[0]['index'] == 1
+        assert 'busy' in errors[0]['error']
+        assert items[-1]['succeeded'] == 2
+        assert items[-1]['failed'] == 1
+
+    def test_empty_question_reported_not_sent(self, monkeypatch, embed_calls):
+        """Blank entries should be errors without calling the model"""
+        asked = []
+        monkeypatch.setattr(batch, 'ask', lambda q, version, query_embedding: asked.append(q) or fake_response())
+
+        items = list(batch.run_batch(['', 'real'], version='v3'))
+
+        assert asked == ['real']
+        assert embed_calls == [['real']]
+        assert any(item['type'] == 'error' and item['index'] == 0 for item in items)
+
+    def test_concurrency_is_bounded(self, monkeypatch, embed_calls):
+        """No more than max_workers questions should be in flight at once"""
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def fake_ask(question, version, query_embedding):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05)
+            with lock:
+                state['active'] -= 1
+            return fake_response()
+
+        monkeypatch.setattr(batch, 'ask', fake_ask)
+        list(batch.run_batch([f"q{i}" for i in range(12)], version='v1', max_workers=3))
+
+        assert state['peak'] == 3
+
+
+class TestSummarize:
+    """Test suite for batch aggregate stats"""
+
+    def test_aggregates_latency_and_tokens(self):
+        """Summary should total tokens and report latency percentiles"""
+        items = [
+            {'type': 'result', 'response': fake_response(latency_ms=ms, prompt=10, completion=5)}
+            for ms in (100, 200, 300, 400)
+        ] + [{'type': 'error', 'error': 'x'}]
+
+        summary = batch.summarize(items, wall_ms=450)
+
+        assert summary['total'] == 5
+        assert summary['succeeded'] == 4
+        assert summary['failed'] == 1
+        assert summary['tokens'] == {'prompt': 40, 'completion': 20, 'total': 60}
+        assert summary['latency_ms']['mean'] == 250
+        assert summary['latency_ms']['max'] == 400
+        assert summary['wall_ms'] == 450
+
+    def test_all_failed(self):
+        """A batch with no successes should still summarize"""
+        summary = batch.summarize([{'type': 'error', 'error': 'x'}], wall_ms=5)
+
+        assert summary['succeeded'] == 0
+        assert summary['latency_ms']['p95'] == 0
@@ -0,0 +1,123 @@
+"""
+Unit Test: Knowledge Base Chunking
+
+Tests that markdown is split into header-aware chunks with section paths and
+exact source offsets, that oversized sections become overlapping windows, and
+that retrieved chunks merge back into one entry per parent document.
+"""
+import pytest
+from app.chunking import chunk_markdown, merge_chunks
+
+DOC = """# Return Policy
+
+## Standard Returns
+- 30-day return window
+
+## Defective Products
+- 90-day warranty
+
+### Replacements
+- Free replacement
+"""
+
+
+def hit(chunk, distance, title='Return Policy', category='returns'):
+    return {
+        'id': chunk.id, 'parent_id': chunk.parent_id, 'title': title, 'category': category,
+        'section': chunk.section, 'content': chunk.content, 'distance': distance,
+        'start': chunk.start, 'end': chunk.end,
+    }
+
+
+class TestChunkMarkdown:
+    """Test suite for chunk_markdown"""
+
+    def test_one_chunk_per_section(self):
+        """Each header with a body becomes a chunk"""
+        chunks = chunk_markdown('return_policy', DOC)
+
+        assert [c.section_path[-1] for c in chunks] == ['Standard Returns', 'Defective Products', 'Replacements']
+
+    def test_title_kept_with_first_section(self):
+        """A header with no body is not a chunk of its own"""
+        first = chunk_markdown('return_policy', DOC)[0]
+
+        assert first.content.startswith('# Return Policy')
+        assert '30-day' in first.content
+
+    def test_section_path_follows_nesting(self):
+        chunks = chunk_markdown('return_policy', DOC)
+
+        assert chunks[2].section == 'Return Policy > Defective Products > Replacements'
+
+    def test_offsets_match_source(self):
+        """content is exactly the source slice"""
+        for chunk in chunk_markdown('return_policy', DOC):
+            assert DOC[chunk.start:chunk.end] == chunk.content
+
+    def test_ids_are_parent_scoped(self):
+        chunks = chunk_markdown('return_policy', DOC)
+
+        assert [c.id for c in chunks] == ['return_policy#0', 'return_policy#1', 'return_policy#2']
+
+    def test_embedding_text_includes_missing_ancestors(self):
+        """Subsections are embedded with the headers above them"""
+        chunks = chunk_markdown('return_policy', DOC)
+
+        assert chunks[1].embedding_text().startswith('Return Policy\n## Defective Products')
+        assert chunks[0].embedding_text() == chunks[0].content
+
+    def test_no_headers(self):
+        chunks = chunk_markdown('notes', 'Plain text only.')
+
+        assert len(chunks) == 1
+        assert chunks[0].section_path == []
+
+    def test_oversized_section_windows_overlap(self):
+        """Long sections split under the cap with overlapping windows"""
+        body = '\n'.join(f'- line number {i} of the section' for i in range(40))
+        content = f'## Long\n{body}'
+        chunks = chunk_markdown('long', content, max_chars=200, overlap=40)
+
+        assert len(chunks) > 1
+        assert all(len(c.content) <= 200 for c in chunks)
+        for prev, nxt in zip(chunks, chunks[1:]):
+            assert nxt.start < prev.end
+        assert chunks[-1].end == len(content)
+
+
+class TestMergeChunks:
+    """Test suite for merge_chunks"""
+
+    def test_groups_by_parent_in_document_order(self):
+        """Chunks of one doc merge in source order, keeping the best distance"""
+        chunks = chunk_markdown('return_policy', DOC)
+        merged = merge_chunks([hit(chunks[2], 0.4), hit(chunks[0], 0.7)])
+
+        assert len(merged) == 1
+        doc = merged[0]
+        assert doc['id'] == 'return_policy'
+        assert doc['distance'] == 0.4
+        assert doc['chunks'] == ['return_policy#0', 'return_policy#2']
+        assert doc['content'].index('Standard Returns') < doc['content'].index('Replacements')
+
+    def test_parents_ordered_by_distance(self):
+        returns = chunk_markdown('return_policy', DOC)
+        shipping = chunk_markdown('shipping_info', '## Shipping\n- 5-7 days')
+        merged = merge_chunks([hit(returns[0], 0.9), hit(shipping[0], 0.5, 'Shipping', 'shipping')])
+
+        assert [doc['id'] for doc in merged] == ['shipping_info', 'return_policy']
+        assert merged[0]['category'] == 'shipping'
+
+    def test_overlap_not_repeated(self):
+        """Overlapping windows merge back into the original text"""
+        body = '\n'.join(f'- line number {i} of the section' for i in range(40))
+        content = f'## Long\n{body}'
+        chunks = chunk_markdown('long', content, max_chars=200, overlap=40)
+
+        merged = merge_chunks([hit(c, 0.5) for c in reversed(chunks)])
+
+        assert merged[0]['content'] == content
+
+    def test_empty(self):
+        assert merge_chunks([]) == []
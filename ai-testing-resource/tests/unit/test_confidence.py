@@ -0,0 +1,136 @@
+"""
+Unit Test: Retrieval-Confidence Gate
+
+Tests the distance thresholds that let V3 answer off-topic questions with the
+fallback sentence instead of calling the model, and the threshold calibration.
+"""
+import pytest
+from app.confidence import ConfidenceGate, choose_threshold, parse_category_thresholds
+from app.pipeline import AnswerState, Span
+from app import ai_service
+
+
+def doc(doc_id, distance, category='general'):
+    return {'id': doc_id, 'title': doc_id, 'category': category, 'content': '# Doc', 'distance': distance}
+
+
+class TestConfidenceGate:
+    """Test suite for ConfidenceGate"""
+
+    def test_close_doc_is_confident(self):
+        """One doc within the threshold is enough"""
+        gate = ConfidenceGate(max_distance=1.5)
+        assessment = gate.assess([doc('a', 1.7), doc('b', 0.9)])
+
+        assert assessment.confident
+        assert assessment.best_doc_id == 'b'
+        assert assessment.best_distance == 0.9
+
+    def test_all_docs_far_is_not_confident(self):
+        """No doc within the threshold should fail the gate"""
+        gate = ConfidenceGate(max_distance=1.5)
+        assessment = gate.assess([doc('a', 1.7), doc('b', 1.9)])
+
+        assert not assessment.confident
+        assert assessment.best_doc_id == 'a'
+
+    def test_threshold_is_inclusive(self):
+        """A distance equal to the threshold still counts"""
+        assert ConfidenceGate(max_distance=1.2).assess([doc('a', 1.2)]).confident
+
+    def test_no_docs_is_not_confident(self):
+        """An empty retrieval result fails the gate"""
+        assessment = ConfidenceGate(max_distance=1.5).assess([])
+
+        assert not assessment.confident
+        assert assessment.best_distance is None
+
+    def test_category_override(self):
+        """A doc is judged against its own category's threshold"""
+        gate = ConfidenceGate(max_distance=1.5, by_category={'pricing': 1.0})
+
+        assert not gate.assess([doc('pricing_tiers', 1.2, 'pricing')]).confident
+        assert gate.assess([doc('return_policy', 1.2, 'returns')]).confident
+
+    def test_best_doc_by_headroom(self):
+        """The reported doc has the most room under its own threshold"""
+        gate = ConfidenceGate(max_distance=1.5, by_category={'pricing': 1.0})
+        assessment = gate.assess([doc('pricing_tiers', 0.95, 'pricing'), doc('return_policy', 1.1, 'returns')])
+
+        assert assessment.best_doc_id == 'return_policy'
+        assert assessment.threshold == 1.5
+
+
+class TestParseCategoryThresholds:
+    """Test suite for the per-category env format"""
+
+    def test_parses_pairs(self):
+        assert parse_category_thresholds("returns=1.2, pricing=1.35") == {'returns': 1.2, 'pricing': 1.35}
+
+    def test_empty(self):
+        assert parse_category_thresholds('') == {}
+
+    def test_bad_value_raises(self):
+        with pytest.raises(ValueError):
+            parse_category_thresholds('returns=high')
+
+
+class TestChooseThreshold:
+    """Test suite for threshold calibration"""
+
+    def test_midpoint_of_gap(self):
+        """With separable data the threshold sits between the classes"""
+        assert choose_threshold([0.8, 1.0, 1.1], [1.5, 1.7]) == 1.3
+
+    def test_no_negatives_keeps_all_positives(self):
+        assert choose_threshold([0.8, 1.1], []) == 1.1
+
+    def test_overlap_keeps_recall(self):
+        """Overlapping classes still keep every positive at min_recall=1.0"""
+        assert choose_threshold([0.8, 1.4], [1.2, 1.6]) == 1.5
+
+    def test_lower_recall_tightens(self):
+        """Dropping the worst positive tightens the threshold"""
+        assert choose_threshold([0.8, 0.9, 1.0, 1.4], [1.2, 1.6], min_recall=0.75) == 1.1
+
+    def test_no_positives(self):
+        assert choose_threshold([], [1.5]) is None
+
+
+class TestConfidenceStage:
+    """Test suite for the V3 short-circuit stage"""
+
+    def test_far_docs_return_fallback(self, monkeypatch):
+        """Off-topic retrieval finishes with the fallback and a trace flag"""
+        monkeypatch.setattr(ai_service, 'confidence_gate', ConfidenceGate(max_distance=1.0))
+        monkeypatch.setattr(ai_service, 'RETRIEVAL_SHORT_CIRCUIT_ENABLED', True)
+        state = AnswerState(question="What is your cryptocurrency payment policy?", version='v3',
+                            docs=[doc('pricing_tiers', 1.6, 'pricing')])
+
+        ai_service._confidence_stage(state, Span('s', 'Retrieval Confidence', 'retrieval', 0))
+
+        assert state.done
+        assert "don't have specific information" in state.text
+        assert state.sources == []
+        assert state.trace['short_circuit']['reason'] == 'low_retrieval_confidence'
+        assert state.trace['short_circuit']['threshold'] == 1.0
+
+    def test_close_docs_continue(self, monkeypatch):
+        """Relevant retrieval leaves the pipeline running"""
+        monkeypatch.setattr(ai_service, 'confidence_gate', ConfidenceGate(max_distance=1.0))
+        state = AnswerState(question="What is your return policy?", version='v3',
+                            docs=[doc('return_policy', 0.6, 'returns')])
+
+        ai_service._confidence_stage(state, Span('s', 'Retrieval Confidence', 'retrieval', 0))
+
+        assert not state.done
+        assert state.text == ''
+
+    def test_disabled_never_short_circuits(self, monkeypatch):
+        monkeypatch.setattr(ai_service, 'confidence_gate', ConfidenceGate(max_distance=1.0))
+        monkeypatch.setattr(ai_service, 'RETRIEVAL_SHORT_CIRCUIT_ENABLED', False)
+        state = AnswerState(question="q", version='v3', docs=[doc('pricing_tiers', 1.6)])
+
+        ai_service._confidence_stage(state, Span('s', 'Retrieval Confidence', 'retrieval', 0))
+
+        assert not state.done
@@ -0,0 +1,119 @@
+"""
+Unit Test: Context Packing
+
+Tests that retrieved documents are packed into the V3 context in relevance
+order within a token budget, truncated only at section boundaries, and that
+dropped/truncated documents are reported. Token counting here is one token
+per word so budgets are easy to reason about.
+"""
+import pytest
+from app.context_packer import pack_context, split_sections
+
+
+def words(text):
+    return len(text.split())
+
+
+def fmt(doc):
+    return doc['content']
+
+
+def make_doc(doc_id, content):
+    return {'id': doc_id, 'title': doc_id, 'content': content, 'distance': 0.1}
+
+
+SECTIONED = "# Title\nintro words\n\n## One\na b c d\n\n## Two\ne f g h"
+
+
+class TestSplitSections:
+    """Test suite for markdown section splitting"""
+
+    def test_splits_at_headers(self):
+        """Each header starts a new section"""
+        sections = split_sections(SECTIONED)
+
+        assert len(sections) == 3
+        assert sections[0].startswith("# Title")
+        assert sections[2].startswith("## Two")
+
+    def test_text_before_first_header(self):
+        """Leading text without a header is its own section"""
+        assert split_sections("preamble\n# Head\nbody") == ["preamble", "# Head\nbody"]
+
+    def test_no_headers(self):
+        """A document without headers is one section"""
+        assert split_sections("just text") == ["just text"]
+
+
+class TestPackContext:
+    """Test suite for token-budgeted context packing"""
+
+    def test_everything_fits(self):
+        """Docs under budget are packed whole, in relevance order"""
+        docs = [make_doc('a', 'one two'), make_doc('b', 'three four')]
+
+        packed = pack_context(docs, budget=100, format_doc=fmt, separator=' | ', count=words)
+
+        assert [d['id'] for d in packed.docs] == ['a', 'b']
+        assert packed.dropped == [] and packed.truncated == []
+        assert packed.tokens == 2 + 1 + 2  # docs plus one separator
+
+    def test_truncates_at_section_boundary(self):
+        """A doc that does not fit keeps only whole leading sections"""
+        docs = [make_doc('big', SECTIONED)]
+
+        packed = pack_context(docs, budget=11, format_doc=fmt, count=words)
+
+        content = packed.docs[0]['content']
+        assert packed.truncated == ['big']
+        assert "## One" in content and "## Two" not in content
+        assert packed.docs[0]['truncated'] is True
+        assert packed.tokens <= 11
+
+    def test_drops_doc_when_first_section_too_big(self):
+        """A doc whose first section exceeds the remaining budget is dropped"""
+        docs = [make_doc('small', 'a b'), make_doc('big', SECTIONED)]
+
+        packed = pack_context(docs, budget=4, format_doc=fmt, separator=' ', count=words)
+
+        assert [d['id'] for d in packed.docs] == ['small']
+        assert packed.dropped == ['big']
+
+    def test_later_smaller_docs_still_fit(self):
+        """Dropping a large doc should not stop smaller later ones"""
+        docs = [make_doc('huge', ' '.join(['w'] * 50)), make_doc('tiny', 'x y')]
+
+        packed = pack_context(docs, budget=10, format_doc=fmt, count=words)
+
+        assert [d['id'] for d in packed.docs] == ['tiny']
+        assert packed.dropped == ['huge']
+
+    def test_never_exceeds_budget(self):
+        """Packed token count stays within the budget"""
+        docs = [make_doc(str(i), SECTIONED) for i in range(5)]
+
+        for budget in (0, 5, 13, 30, 100):
+            packed = pack_context(docs, budget=budget, format_doc=fmt, separator=' --- ', count=words)
+            assert packed.tokens <= budget
+
+    def test_input_docs_not_modified(self):
+        """Truncation should work on copies"""
+        docs = [make_doc('big', SECTIONED)]
+
+        pack_context(docs, budget=11, format_doc=fmt, count=words)
+
+        assert docs[0]['content'] == SECTIONED
+
+    def test_summary_for_trace(self):
+        """Summary reports budget, packed tokens and dropped docs"""
+        docs = [make_doc('a', 'one'), make_doc('b', ' '.join(['w'] * 20))]
+
+        summary = pack_context(docs, budget=5, format_doc=fmt, count=words).summary()
+
+        assert summary == {
+            'budget_tokens': 5,
+            'packed_tokens': 1,
+            'packed': ['a'],
+            'truncated': [],
+            'dropped': ['b'],
+        }
@@ -0,0 +1,190 @@
+"""
+Unit Test: Query Embedding Cache and Batched Embedding
+
+Tests the LRU of question embeddings (keys, eviction, stats, read-only
+vectors) and the rag helpers built on it: embed_query reuses cached
+vectors, embed_queries embeds only uncached distinct questions, and
+embed_many bounds each model call to batch_size texts. Also tests the
+persistent SQLite embedding store: sharing between instances (as between
+worker processes), concurrent writers, LRU eviction, and the embedding
+function wrapper that only runs the model on misses.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app import embedding_cache, rag
+from app.embedding_cache import CachedEmbeddingFunction, EmbeddingLRU, EmbeddingStore, normalize_text
+
+
+class RecordingEmbeddingFunction:
+    """Embeds text as [length, 1, 0, ...] and records each call's batch size"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(len(input))
+        return [np.array([len(text), 1.0, 0.0], dtype=np.float32) for text in input]
+
+
+@pytest.fixture
+def ef(monkeypatch):
+    ef = RecordingEmbeddingFunction()
+    monkeypatch.setattr(rag, '_embedding_function', ef)
+    monkeypatch.setattr(rag, 'query_embedding_cache', EmbeddingLRU(max_entries=8))
+    return ef
+
+
+class TestEmbeddingLRU:
+    """Test suite for EmbeddingLRU"""
+
+    def test_normalize_text(self):
+        assert normalize_text('  What is the\tReturn Policy? ') == 'what is the return policy?'
+
+    def test_hit_and_miss_counted(self):
+        cache = EmbeddingLRU()
+        assert cache.get('q') is None
+        cache.put('q', [1.0, 2.0])
+
+        assert cache.get('q').tolist() == [1.0, 2.0]
+        assert cache.snapshot() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'evictions': 0,
+                                    'entries': 1, 'max_entries': 1024}
+
+    def test_evicts_least_recently_used(self):
+        cache = EmbeddingLRU(max_entries=2)
+        cache.put('a', [1.0])
+        cache.put('b', [2.0])
+        cache.get('a')
+        cache.put('c', [3.0])
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.stats.evictions == 1
+
+    def test_cached_vectors_are_read_only(self):
+        vector = EmbeddingLRU().put('q', [1.0, 2.0])
+
+        with pytest.raises(ValueError):
+            vector[0] = 5.0
+
+    def test_zero_size_disables(self):
+        cache = EmbeddingLRU(max_entries=0)
+        cache.put('q', [1.0])
+
+        assert len(cache) == 0
+
+
+class TestQueryEmbedding:
+    """Test suite for embed_query, embed_queries and embed_many"""
+
+    def test_repeated_question_skips_model(self, ef):
+        first = rag.embed_query('What is the return policy?')
+        second = rag.embed_query('what is the  return policy?')
+
+        assert ef.calls == [1]
+        assert np.array_equal(first, second)
+
+    def test_cache_keyed_by_model(self, ef, monkeypatch):
+        rag.embed_query('hello')
+        monkeypatch.setattr(rag, 'EMBEDDING_MODEL', 'another-model')
+        rag.embed_query('hello')
+
+        assert ef.calls == [1, 1]
+
+    def test_embed_queries_embeds_only_new_distinct(self, ef):
+        rag.embed_query('cached')
+        ef.calls.clear()
+
+        vectors = rag.embed_queries(['new', 'cached', 'New', 'other'])
+
+        assert ef.calls == [2]
+        assert [v[0] for v in vectors] == [3, 6, 3, 5]
+
+    def test_embed_queries_empty(self, ef):
+        assert rag.embed_queries([]) == []
+        assert ef.calls == []
+
+    def test_embed_many_batches(self, ef):
+        vectors = rag.embed_many(['a', 'bb', 'ccc', 'dddd', 'eeeee'], batch_size=2)
+
+        assert ef.calls == [2, 2, 1]
+        assert [v[0] for v in vectors] == [1, 2, 3, 4, 5]
+        assert all(v.dtype == np.float32 for v in vectors)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+class TestEmbeddingStore:
+    """Test suite for EmbeddingStore and CachedEmbeddingFunction"""
+
+    def test_round_trip_per_model(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path / 'emb.sqlite'))
+        store.put_many('minilm', ['hello'], [np.array([1.0, 2.0])])
+
+        assert store.get_many('minilm', ['hello', 'other'])['hello'].tolist() == [1.0, 2.0]
+        assert store.get_many('another-model', ['hello']) == {}
+        assert store.stats.hits == 1 and store.stats.misses == 2
+
+    def test_shared_between_instances(self, tmp_path):
+        """Separate connections, as in separate worker processes, see each other's writes"""
+        path = str(tmp_path / 'emb.sqlite')
+        EmbeddingStore(path).put_many('minilm', ['a', 'b'], [[1.0], [2.0]])
+
+        assert set(EmbeddingStore(path).get_many('minilm', ['a', 'b'])) == {'a', 'b'}
+
+    def test_concurrent_writers_and_readers(self, tmp_path):
+        path = str(tmp_path / 'emb.sqlite')
+
+        def work(worker):
+            store = EmbeddingStore(path)
+            for i in range(20):
+                store.put_many('minilm', [f'{worker}-{i}'], [[float(i)]])
+                store.get_many('minilm', [f'{worker}-{i}', f'{(worker + 1) % 8}-{i}'])
+            return store.stats.errors
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            errors = list(pool.map(work, range(8)))
+
+        assert errors == [0] * 8
+        assert len(EmbeddingStore(path)) == 160
+
+    def test_evicts_least_recently_used(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(embedding_cache, 'time', FakeClock())
+        store = EmbeddingStore(str(tmp_path / 'emb.sqlite'), max_entries=2)
+        store.put_many('minilm', ['a'], [[1.0]])
+        store.put_many('minilm', ['b'], [[2.0]])
+        store.get_many('minilm', ['a'])
+        store.put_many('minilm', ['c'], [[3.0]])
+
+        assert set(store.get_many('minilm', ['a', 'b', 'c'])) == {'a', 'c'}
+        assert store.stats.evictions == 1
+
+    def test_wrapper_embeds_only_misses(self, tmp_path):
+        model = RecordingEmbeddingFunction()
+        store = EmbeddingStore(str(tmp_path / 'emb.sqlite'))
+        ef = CachedEmbeddingFunction(model, store, 'minilm')
+        ef(['one', 'two'])
+
+        vectors = ef(['two', 'three', 'three'])
+
+        assert model.calls == [2, 1]
+        assert [v[0] for v in vectors] == [3, 5, 5]
+        assert CachedEmbeddingFunction(RecordingEmbeddingFunction(), EmbeddingStore(store.path), 'minilm')(
+            ['three'])[0][0] == 5
+
+    def test_unusable_store_falls_back_to_model(self, tmp_path):
+        (tmp_path / 'emb.sqlite').mkdir()
+        model = RecordingEmbeddingFunction()
+        ef = CachedEmbeddingFunction(model, EmbeddingStore(str(tmp_path / 'emb.sqlite')), 'minilm')
+
+        assert ef(['one'])[0][0] == 3
+        assert ef.store.stats.errors == 2
@@ -5,7 +5,9 @@ Tests the format_response() utility that structures AI output
 for consistent display.
 """
 import pytest
-from app.utils import format_response
+import json
+
+from app.utils import format_response, format_sse
 
 
 class TestFormatResponse:
@@ -55,6 +57,17 @@ class TestFormatResponse:
         assert result['metadata']['completion_tokens'] == 0
         assert result['metadata']['total_tokens'] == 0
 
+    def test_time_to_first_token_defaults_to_latency(self):
+        """Non-streamed responses deliver the first token with the full answer"""
+        result = format_response("Hello", latency_ms=150)
+        assert result['metadata']['time_to_first_token_ms'] == 150
+
+    def test_time_to_first_token_recorded(self):
+        """Streamed responses report time-to-first-token separately"""
+        result = format_response("Hello", latency_ms=900, time_to_first_token_ms=120)
+        assert result['metadata']['latency_ms'] == 900
+        assert result['metadata']['time_to_first_token_ms'] == 120
+
     def test_handles_multiline_text(self):
         """Multiline text should be preserved but stripped"""
         text = "  Line 1\nLine 2\nLine 3  "
@@ -66,3 +79,29 @@ class TestFormatResponse:
         result = format_response("")
         assert result['text'] == ""
         assert 'metadata' in result
+
+    def test_prompt_cache_tokens(self):
+        """Prompt-cache read/creation counts should be reported separately"""
+        result = format_response(
+            "Hello",
+            tokens={'prompt': 900, 'completion': 60, 'cache_read': 800, 'cache_creation': 0}
+        )
+        assert result['metadata']['prompt_tokens'] == 900
+        assert result['metadata']['cache_read_input_tokens'] == 800
+        assert result['metadata']['cache_creation_input_tokens'] == 0
+
+
+class TestFormatSSE:
+    """Test suite for Server-Sent Event serialization"""
+
+    def test_event_and_data_lines(self):
+        """Event should have an event line, a JSON data line and a blank line"""
+        result = format_sse('delta', {'text': 'Hi'})
+        assert result == 'event: delta\ndata: {"text": "Hi"}\n\n'
+
+    def test_newlines_stay_on_one_data_line(self):
+        """Newlines in the payload must not break the event framing"""
+        result = format_sse('delta', {'text': 'Line 1\nLine 2'})
+        lines = result.rstrip('\n').split('\n')
+        assert len(lines) == 2
+        assert json.loads(lines[1][len('data: '):]) == {'text': 'Line 1\nLine 2'}
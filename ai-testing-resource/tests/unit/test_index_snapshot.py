@@ -0,0 +1,192 @@
+"""
+Unit Test: Index Snapshots
+
+Tests the single-file index snapshot built into the Docker image: the file
+round-trips memory-mapped and read-only, is refused when the embedding model
+or knowledge base no longer match, and at startup replaces embedding the
+corpus. Uses a hashing embedding function instead of the real model.
+"""
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from app import rag
+from app.index_snapshot import SnapshotIndex, SnapshotMismatch, load_snapshot, read_header, write_snapshot
+from app.vector_index import NumpyIndex
+
+
+class CountingEmbeddingFunction:
+    """Deterministic word-hash embeddings that count how many texts were embedded"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, input):
+        self.embedded += len(input)
+        vectors = []
+        for text in input:
+            vector = np.zeros(32, dtype=np.float32)
+            for word in re.findall(r'\w+', text.lower()):
+                vector[zlib.crc32(word.encode()) % 32] += 1.0
+            vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+        return vectors
+
+
+def records(n=20, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'ids': [f"doc{i}#0" for i in range(n)],
+        'embeddings': rng.normal(size=(n, dim)).astype(np.float32),
+        'documents': [f"text {i}" for i in range(n)],
+        'metadatas': [{'parent_id': f"doc{i}", 'title': f"Doc {i}"} for i in range(n)],
+    }
+
+
+INFO = {'embedding_model': 'model-a', 'kb_fingerprint': 'abc', 'manifest': {}, 'lexical': {}}
+
+
+class TestSnapshotFile:
+    """Test suite for writing and opening snapshot files"""
+
+    def test_round_trip_matches_numpy_index(self, tmp_path):
+        data = records()
+        write_snapshot(str(tmp_path / 'kb.snapshot'), data, INFO)
+        reference = NumpyIndex(str(tmp_path / 'ref'))
+        reference.upsert(ids=data['ids'], embeddings=data['embeddings'], documents=data['documents'],
+                         metadatas=data['metadatas'])
+
+        index = load_snapshot(str(tmp_path / 'kb.snapshot'), 'model-a', 'abc')
+        query = data['embeddings'][:3] + 0.1
+
+        assert index.count() == 20
+        assert index.query(query_embeddings=query, n_results=5) == reference.query(query_embeddings=query,
+                                                                                   n_results=5)
+        assert index.get(ids=['doc3#0'])['metadatas'] == [{'parent_id': 'doc3', 'title': 'Doc 3'}]
+
+    def test_matrix_is_memory_mapped_read_only(self, tmp_path):
+        write_snapshot(str(tmp_path / 'kb.snapshot'), records(), INFO)
+        header, offset = read_header(str(tmp_path / 'kb.snapshot'))
+        index = SnapshotIndex(str(tmp_path / 'kb.snapshot'), header, offset)
+
+        matrix = index._snapshot.matrix
+        assert isinstance(matrix, np.memmap)
+        assert not matrix.flags.writeable
+        assert offset % 64 == 0
+        with pytest.raises(ValueError):
+            index.upsert(ids=['x'], embeddings=[[1.0] * 8], documents=['x'], metadatas=[{}])
+        with pytest.raises(ValueError):
+            index.delete(ids=['doc0#0'])
+
+    def test_header_is_self_describing(self, tmp_path):
+        write_snapshot(str(tmp_path / 'kb.snapshot'), records(n=5, dim=4), INFO)
+        header, _ = read_header(str(tmp_path / 'kb.snapshot'))
+        assert (header['rows'], header['dimensions']) == (5, 4)
+        assert header['embedding_model'] == 'model-a'
+        assert header['kb_fingerprint'] == 'abc'
+        assert header['format_version'] == 1
+
+    def test_empty_snapshot(self, tmp_path):
+        write_snapshot(str(tmp_path / 'kb.snapshot'), {'ids': [], 'embeddings': [], 'documents': [],
+                                                       'metadatas': []}, INFO)
+        index = load_snapshot(str(tmp_path / 'kb.snapshot'), 'model-a', 'abc')
+        assert index.count() == 0
+        assert index.query(query_embeddings=[[1.0, 0.0]], n_results=3)['ids'] == [[]]
+
+    @pytest.mark.parametrize('model, fingerprint', [('model-b', 'abc'), ('model-a', 'other'), ('model-a', None)])
+    def test_refuses_mismatch(self, tmp_path, model, fingerprint):
+        write_snapshot(str(tmp_path / 'kb.snapshot'), records(), INFO)
+        with pytest.raises(SnapshotMismatch):
+            load_snapshot(str(tmp_path / 'kb.snapshot'), model, fingerprint)
+
+    def test_refuses_truncated_or_foreign_file(self, tmp_path):
+        path = tmp_path / 'kb.snapshot'
+        write_snapshot(str(path), records(), INFO)
+        path.write_bytes(path.read_bytes()[:-4])
+        with pytest.raises(SnapshotMismatch):
+            read_header(str(path))
+
+        path.write_bytes(b'not a snapshot at all')
+        with pytest.raises(SnapshotMismatch):
+            read_header(str(path))
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """Isolated NumPy index and KB directory; yields (kb_dir, snapshot path, embedding function)"""
+    ef = CountingEmbeddingFunction()
+    monkeypatch.setattr(rag, 'VECTOR_BACKEND', 'numpy')
+    monkeypatch.setattr(rag, 'VECTOR_INDEX_MODE', 'exact')
+    monkeypatch.setattr(rag, 'VECTOR_INDEX_PATH', str(tmp_path / 'numpy'))
+    monkeypatch.setattr(rag, 'INDEX_SNAPSHOT_PATH', '')
+    monkeypatch.setattr(rag, '_generation', None)
+    monkeypatch.setattr(rag, '_embedding_function', ef)
+
+    kb_dir = tmp_path / 'kb'
+    kb_dir.mkdir()
+    (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 30 days\n\n## Refunds\n- 5-7 days\n")
+    (kb_dir / 'shipping_info.md').write_text("# Shipping\n\n## Standard\n- 5-7 business days\n")
+    monkeypatch.setattr(rag, 'KNOWLEDGE_BASE_DIR', kb_dir)
+
+    # Build the snapshot, then start over as a fresh container would
+    rag.initialize_knowledge_base(str(kb_dir))
+    snapshot = tmp_path / 'kb.snapshot'
+    rag.export_index_snapshot(str(snapshot))
+    monkeypatch.setattr(rag, 'VECTOR_INDEX_PATH', str(tmp_path / 'runtime'))
+    monkeypatch.setattr(rag, 'INDEX_SNAPSHOT_PATH', str(snapshot))
+    monkeypatch.setattr(rag, '_generation', None)
+    ef.embedded = 0
+    yield kb_dir, snapshot, ef
+
+
+class TestSnapshotStartup:
+    """Test suite for serving the snapshot at startup"""
+
+    def test_startup_embeds_nothing(self, kb):
+        kb_dir, snapshot, ef = kb
+
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 0, 'updated': 0, 'skipped': 2, 'deleted': 0}
+        assert ef.embedded == 0
+        generation = rag.active_generation()
+        assert generation.slot == rag.SNAPSHOT_SLOT
+        assert generation.id == rag._fingerprint(rag._scan(kb_dir))
+        assert rag.get_collection().count() == 3
+
+    def test_snapshot_serves_hybrid_retrieval(self, kb):
+        kb_dir, snapshot, ef = kb
+        query = ef(['Returns Window days'])[0]
+
+        docs = rag.get_relevant_docs('30 days', n_results=1, query_embedding=query, mode='hybrid')
+
+        assert docs[0]['id'] == 'return_policy'
+        assert rag.get_lexical_index().ids() == {'return_policy#0', 'return_policy#1', 'shipping_info#0'}
+
+    def test_changed_kb_refuses_snapshot(self, kb):
+        kb_dir, snapshot, ef = kb
+        (kb_dir / 'shipping_info.md').write_text("# Shipping\n\n## Express\n- 2 business days\n")
+
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert rag.active_generation().slot != rag.SNAPSHOT_SLOT
+        assert counts['added'] == 2
+        assert ef.embedded == 3
+
+    def test_model_change_refuses_snapshot(self, kb, monkeypatch):
+        monkeypatch.setattr(rag, 'EMBEDDING_MODEL', 'another-model')
+        assert rag.active_generation().slot != rag.SNAPSHOT_SLOT
+
+    def test_reload_from_snapshot_embeds_only_changes(self, kb):
+        kb_dir, snapshot, ef = kb
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 60 days\n")
+        result = rag.reload_knowledge_base(str(kb_dir))
+
+        assert result['swapped'] and (result['updated'], result['skipped']) == (1, 1)
+        assert ef.embedded == 1
+        assert rag.active_generation().slot == 'gen-1'
+        assert rag.get_collection().count() == 2
+        assert snapshot.exists()
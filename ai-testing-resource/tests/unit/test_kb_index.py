@@ -0,0 +1,438 @@
+"""
+Unit Test: Incremental Knowledge Base Indexing
+
+Tests that initialize_knowledge_base only embeds new or changed files,
+deletes removed ones and reports what it did, keeps the BM25 index in sync,
+that hybrid retrieval fuses both rankings, that batched retrieval matches
+one query at a time, that reload_knowledge_base swaps in a new index
+generation without disturbing the old one, and that a store left at
+chromadb's default path is moved into CHROMA_PATH. Uses a throwaway vector store
+(Chroma, and the NumPy index in exact, IVF and projected mode) and a counting
+bag-of-words embedding function instead of the sentence-transformers model.
+"""
+import json
+import re
+import zlib
+
+import numpy as np
+import pytest
+from chromadb.api.types import EmbeddingFunction
+
+from app import rag
+
+
+class CountingEmbeddingFunction(EmbeddingFunction):
+    """Deterministic word-hash embeddings that count how many texts were embedded"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, input):
+        self.embedded += len(input)
+        vectors = []
+        for text in input:
+            vector = np.zeros(64, dtype=np.float32)
+            for word in re.findall(r'\w+', text.lower()):
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+            vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+        return vectors
+
+
+@pytest.fixture(params=['chroma', 'numpy', 'ivf', 'projected'])
+def index(request, tmp_path, monkeypatch):
+    """Isolated vector store and KB directory; yields (kb_dir, embedding function)"""
+    ef = CountingEmbeddingFunction()
+    monkeypatch.setattr(rag, 'VECTOR_BACKEND', 'chroma' if request.param == 'chroma' else 'numpy')
+    monkeypatch.setattr(rag, 'VECTOR_INDEX_MODE', request.param if request.param in ('ivf', 'projected') else 'exact')
+    monkeypatch.setattr(rag, 'IVF_MIN_TRAIN_ROWS', 1)
+    monkeypatch.setattr(rag, 'PROJECTION_MIN_ROWS', 1)
+    monkeypatch.setattr(rag, 'PROJECTION_DIMENSIONS', 8)
+    monkeypatch.setattr(rag, 'CHROMA_PATH', str(tmp_path / 'chroma'))
+    monkeypatch.setattr(rag, 'LEGACY_CHROMA_PATH', str(tmp_path / 'legacy'))
+    monkeypatch.setattr(rag, 'VECTOR_INDEX_PATH', str(tmp_path / 'numpy'))
+    monkeypatch.setattr(rag, '_chroma_client', None)
+    monkeypatch.setattr(rag, '_generation', None)
+    monkeypatch.setattr(rag, '_embedding_function', ef)
+
+    kb_dir = tmp_path / 'kb'
+    kb_dir.mkdir()
+    (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 30 days\n\n## Refunds\n- 5-7 days\n")
+    (kb_dir / 'shipping_info.md').write_text("# Shipping\n\n## Standard\n- 5-7 business days\n")
+    yield kb_dir, ef
+
+
+class TestIncrementalIndexing:
+    """Test suite for manifest-driven indexing"""
+
+    def test_first_run_adds_everything(self, index):
+        kb_dir, ef = index
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 2, 'updated': 0, 'skipped': 0, 'deleted': 0}
+        assert rag.get_collection().count() == 3
+        assert ef.embedded == 3
+
+    def test_unchanged_run_embeds_nothing(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        ef.embedded = 0
+
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 0, 'updated': 0, 'skipped': 2, 'deleted': 0}
+        assert ef.embedded == 0
+
+    def test_changed_file_reembedded(self, index):
+        """Only the edited file is embedded; chunks it no longer has are removed"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        ef.embedded = 0
+
+        (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 60 days\n")
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 0, 'updated': 1, 'skipped': 1, 'deleted': 0}
+        assert ef.embedded == 1
+        assert rag.get_collection().get(ids=['return_policy#1'])['ids'] == []
+        assert '60 days' in rag.get_collection().get(ids=['return_policy#0'])['documents'][0]
+
+    def test_removed_file_deleted(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        (kb_dir / 'shipping_info.md').unlink()
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts['deleted'] == 1
+        assert rag.get_collection().count() == 2
+
+    def test_new_file_added(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        (kb_dir / 'pricing_tiers.md').write_text("# Pricing\n\n## Starter\n- $49/month\n")
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 1, 'updated': 0, 'skipped': 2, 'deleted': 0}
+
+    def test_manifest_next_to_index_data(self, index, tmp_path):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        name = 'chroma' if rag.VECTOR_BACKEND == 'chroma' else 'numpy'
+        manifest = json.loads((tmp_path / f'{name}.manifest.json').read_text())
+        entry = manifest['docs']['return_policy']
+        assert entry['embedding_model'] == rag.EMBEDDING_MODEL
+        assert entry['chunks'] == ['return_policy#0', 'return_policy#1']
+        assert len(entry['hash']) == 64
+
+    def test_embedding_model_change_reindexes(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        monkeypatch.setattr(rag, 'EMBEDDING_MODEL', 'another-model')
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts['updated'] == 2
+
+    def test_int8_backend_switch_reindexes(self, index, monkeypatch):
+        """Quantized vectors differ from fp32 ones, so switching to int8 re-embeds"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        monkeypatch.setattr(rag, 'EMBEDDING_BACKEND', 'onnx')
+        assert rag.initialize_knowledge_base(str(kb_dir))['skipped'] == 2
+        monkeypatch.setattr(rag, 'EMBEDDING_BACKEND', 'onnx-int8')
+        assert rag.initialize_knowledge_base(str(kb_dir))['updated'] == 2
+
+    def test_missing_chunks_reindexed(self, index):
+        """A manifest entry whose chunks vanished from the collection is not trusted"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        rag.get_collection().delete(ids=['shipping_info#0'])
+
+        counts = rag.initialize_knowledge_base(str(kb_dir))
+
+        assert counts == {'added': 0, 'updated': 1, 'skipped': 1, 'deleted': 0}
+        assert rag.get_collection().count() == 3
+
+    def test_force_reembeds_all(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        ef.embedded = 0
+
+        counts = rag.initialize_knowledge_base(str(kb_dir), force=True)
+
+        assert counts['added'] == 2
+        assert ef.embedded == 3
+
+
+class TestLegacyStore:
+    """Test suite for moving the store from chromadb's default path into CHROMA_PATH"""
+
+    @pytest.fixture
+    def legacy(self, tmp_path, monkeypatch):
+        legacy = tmp_path / 'chroma'
+        (legacy / 'segment').mkdir(parents=True)
+        (legacy / 'chroma.sqlite3').write_text('store')
+        (legacy / 'segment' / 'data.bin').write_text('vectors')
+        monkeypatch.setattr(rag, 'LEGACY_CHROMA_PATH', str(legacy))
+        monkeypatch.setattr(rag, 'CHROMA_PATH', str(tmp_path / 'chroma_db'))
+        return legacy
+
+    def test_moved_into_empty_path(self, legacy, tmp_path):
+        (tmp_path / 'chroma_db').mkdir()
+
+        rag._migrate_legacy_store()
+
+        assert not legacy.exists()
+        assert (tmp_path / 'chroma_db' / 'chroma.sqlite3').read_text() == 'store'
+        assert (tmp_path / 'chroma_db' / 'segment' / 'data.bin').read_text() == 'vectors'
+
+    def test_existing_store_kept(self, legacy, tmp_path):
+        (tmp_path / 'chroma_db').mkdir()
+        (tmp_path / 'chroma_db' / 'chroma.sqlite3').write_text('current')
+
+        rag._migrate_legacy_store()
+
+        assert (tmp_path / 'chroma_db' / 'chroma.sqlite3').read_text() == 'current'
+        assert (legacy / 'chroma.sqlite3').exists()
+
+
+class TestHybridRetrieval:
+    """Test suite for the BM25 index kept beside the vector store"""
+
+    def test_lexical_index_tracks_collection(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        (kb_dir / 'shipping_info.md').unlink()
+        (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 60 days\n")
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        assert rag.get_lexical_index().ids() == set(rag.get_collection().get(include=[])['ids'])
+        assert rag.get_lexical_index().search('60 days')[0][0] == 'return_policy#0'
+
+    def test_lexical_index_rebuilt_from_collection(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        rag.lexical_index_path().unlink()
+        rag.active_generation().lexical = None
+
+        assert rag.get_lexical_index().ids() == {'return_policy#0', 'return_policy#1', 'shipping_info#0'}
+        assert rag.lexical_index_path().exists()
+
+    def test_hybrid_adds_lexical_match_with_its_distance(self, index, monkeypatch):
+        """A chunk only BM25 ranks still gets a real vector distance"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        monkeypatch.setattr(rag, 'HYBRID_CANDIDATES', 1)
+        shipping = ef(['Shipping Standard 5-7 business days'])[0]
+        timings = {}
+
+        docs = rag.get_relevant_docs('refunds', n_results=2, query_embedding=shipping,
+                                     mode='hybrid', timings=timings)
+
+        assert {doc['id'] for doc in docs} == {'shipping_info', 'return_policy'}
+        returns = next(doc for doc in docs if doc['id'] == 'return_policy')
+        assert returns['chunks'] == ['return_policy#1']
+        assert 0 < returns['distance'] <= 2
+        assert all('rrf_score' in doc for doc in docs)
+        assert set(timings) == {'vector_ms', 'lexical_ms', 'fusion_ms'}
+
+    def test_vector_mode_unchanged(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        timings = {}
+
+        docs = rag.get_relevant_docs('refunds', n_results=1, mode='vector', timings=timings)
+
+        assert 'rrf_score' not in docs[0]
+        assert set(timings) == {'vector_ms'}
+
+    def test_unknown_mode_raises(self, index):
+        with pytest.raises(ValueError):
+            rag.get_relevant_docs('refunds', mode='keyword')
+
+    @pytest.mark.parametrize('mode', ['vector', 'hybrid'])
+    def test_categories_restrict_both_paths(self, index, mode):
+        """A shipping question routed to returns only sees return chunks, from either path"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        shipping = ef(['Shipping Standard 5-7 business days'])[0]
+
+        docs = rag.get_relevant_docs('business days', n_results=3, query_embedding=shipping, mode=mode,
+                                     categories=['returns'])
+
+        assert [doc['id'] for doc in docs] == ['return_policy']
+        assert all(doc['category'] == 'returns' for doc in docs)
+
+    @pytest.mark.parametrize('mode', ['vector', 'hybrid'])
+    def test_batch_matches_single_queries(self, index, mode):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        queries = ['refunds', '30 days window', 'standard business days', 'refunds']
+
+        batch = rag.get_relevant_docs_batch(queries, n_results=2, mode=mode)
+
+        assert batch == [rag.get_relevant_docs(query, n_results=2, mode=mode) for query in queries]
+
+    def test_batch_embeds_each_distinct_query_once(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        monkeypatch.setattr(rag, 'QUERY_BATCH_SIZE', 2)
+        ef.embedded = 0
+
+        batch = rag.get_relevant_docs_batch(['refunds', 'shipping', 'refunds', 'window', 'shipping'],
+                                            n_results=1, mode='vector')
+
+        assert ef.embedded == 3
+        assert [docs[0]['id'] for docs in batch] == ['return_policy', 'shipping_info', 'return_policy',
+                                                     'return_policy', 'shipping_info']
+        assert rag.get_relevant_docs_batch([], mode='vector') == []
+
+    def test_category_centroids(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+
+        centroids = rag.category_centroids()
+
+        assert set(centroids) == {'returns', 'shipping'}
+        assert np.linalg.norm(centroids['returns']) == pytest.approx(1.0, abs=1e-5)
+        shipping = ef(['Shipping Standard 5-7 business days'])[0]
+        assert np.dot(centroids['shipping'], shipping) == pytest.approx(1.0, abs=1e-5)
+        assert rag.active_generation().centroids is centroids
+
+
+class TestGenerations:
+    """Test suite for hot reload into a new index generation"""
+
+    def test_unchanged_reload_keeps_generation(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        active = rag.active_generation()
+
+        result = rag.reload_knowledge_base(str(kb_dir))
+
+        assert result == {'generation': active.id, 'previous': active.id, 'swapped': False,
+                          'added': 0, 'updated': 0, 'skipped': 2, 'deleted': 0}
+        assert rag.active_generation() is active
+
+    def test_reload_swaps_in_new_generation(self, index):
+        """Only the changed file is embedded; the old generation still answers as before"""
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        old = rag.active_generation()
+        ef.embedded = 0
+
+        (kb_dir / 'return_policy.md').write_text("# Returns\n\n## Window\n- 60 days\n")
+        result = rag.reload_knowledge_base(str(kb_dir))
+
+        new = rag.active_generation()
+        assert result['swapped'] and result['previous'] == old.id and result['generation'] == new.id
+        assert (result['updated'], result['skipped']) == (1, 1)
+        assert ef.embedded == 1
+        assert new.id != old.id and new.slot == 'gen-1'
+        assert new.collection.count() == 2
+        assert '60 days' in new.collection.get(ids=['return_policy#0'])['documents'][0]
+
+        # A query pinned to the old generation finishes against it
+        query = ef(['Returns Window days'])[0]
+        docs = rag.get_relevant_docs('30 days', n_results=1, query_embedding=query, generation=old, mode='hybrid')
+        assert '30 days' in docs[0]['content']
+        docs = rag.get_relevant_docs('60 days', n_results=1, query_embedding=query, mode='hybrid')
+        assert '60 days' in docs[0]['content']
+
+    def test_restart_opens_active_generation(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        (kb_dir / 'shipping_info.md').unlink()
+        generation_id = rag.reload_knowledge_base(str(kb_dir))['generation']
+
+        monkeypatch.setattr(rag, '_generation', None)
+
+        assert rag.active_generation().slot == 'gen-1'
+        assert rag.active_generation().id == generation_id
+        assert rag.initialize_knowledge_base(str(kb_dir))['skipped'] == 1
+
+    def test_previous_generation_dropped_by_next_reload(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        (kb_dir / 'shipping_info.md').unlink()
+        rag.reload_knowledge_base(str(kb_dir))
+        assert rag.manifest_path('').exists()
+
+        (kb_dir / 'pricing_tiers.md').write_text("# Pricing\n\n## Starter\n- $49/month\n")
+        rag.reload_knowledge_base(str(kb_dir))
+
+        assert rag.active_generation().slot == 'gen-2'
+        assert rag._generation_slots() - {''} == {'gen-1', 'gen-2'}
+        assert not rag.manifest_path('').exists()
+        assert rag.manifest_path('gen-1').exists()
+
+    def test_failed_build_keeps_every_generation(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        (kb_dir / 'shipping_info.md').unlink()
+        rag.reload_knowledge_base(str(kb_dir))
+
+        def broken(*args):
+            raise OSError("disk full")
+        monkeypatch.setattr(rag, '_ingest', broken)
+        (kb_dir / 'pricing_tiers.md').write_text("# Pricing\n\n## Starter\n- $49/month\n")
+        with pytest.raises(OSError):
+            rag.reload_knowledge_base(str(kb_dir))
+
+        assert rag.active_generation().slot == 'gen-1'
+        assert rag.manifest_path('').exists() and rag.manifest_path('gen-1').exists()
+
+    def test_lost_pointer_opens_newest_built_generation(self, index, monkeypatch):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        (kb_dir / 'shipping_info.md').unlink()
+        rag.reload_knowledge_base(str(kb_dir))
+        (kb_dir / 'pricing_tiers.md').write_text("# Pricing\n\n## Starter\n- $49/month\n")
+        generation_id = rag.reload_knowledge_base(str(kb_dir))['generation']
+
+        # A build that never finished leaves a slot without a manifest
+        def killed(*args):
+            raise OSError("killed")
+        monkeypatch.setattr(rag, '_ingest', killed)
+        (kb_dir / 'pricing_tiers.md').write_text("# Pricing\n\n## Starter\n- $59/month\n")
+        with pytest.raises(OSError):
+            rag.reload_knowledge_base(str(kb_dir))
+        assert 'gen-3' in rag._generation_slots()
+
+        rag.generation_pointer_path().unlink()
+        monkeypatch.setattr(rag, '_generation', None)
+
+        assert rag.active_generation().slot == 'gen-2'
+        assert rag.active_generation().id == generation_id
+        assert rag.active_generation().collection.count() > 0
+
+    def test_force_reload_rebuilds(self, index):
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        ef.embedded = 0
+
+        result = rag.reload_knowledge_base(str(kb_dir), force=True)
+
+        assert result['swapped'] and result['added'] == 2
+        assert ef.embedded == 3
+        assert result['generation'] == result['previous']
+
+    def test_retrieval_trace_records_generation(self, index):
+        from app import ai_service
+        from app.pipeline import AnswerState, Span
+
+        kb_dir, ef = index
+        rag.initialize_knowledge_base(str(kb_dir))
+        state = AnswerState(question='refunds', version='v3', embedding=ef(['refunds'])[0])
+        span = Span('s', 'ChromaDB Retrieval', 'retrieval', 0)
+
+        ai_service._retrieve_stage(state, span)
+
+        assert state.kb_generation == rag.active_generation().id
+        assert span.metadata['kb_generation'] == state.kb_generation
+        trace = ai_service._build_v3_trace('refunds', state.docs, '', '', kb_generation=state.kb_generation)
+        assert trace['kb_generation'] == state.kb_generation
+        assert ai_service._v3_cache_key(state.docs, 'a') != ai_service._v3_cache_key(state.docs, 'b')
@@ -0,0 +1,134 @@
+"""
+Unit Test: Knowledge Base Hot Reload
+
+Tests the background reload runner, the directory watcher that triggers
+it, and the /kb/reload and /kb/generation endpoints. The reload itself
+(building and swapping generations) is covered in test_kb_index.
+"""
+import threading
+import time
+
+import pytest
+
+from app import kb_reload, rag, routes
+
+
+@pytest.fixture
+def fake_reload(monkeypatch):
+    """Replace the real reload with one that records calls and can be held open"""
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def reload(knowledge_dir, force=False):
+        calls.append((knowledge_dir, force))
+        release.wait(5)
+        return {'generation': 'new', 'previous': 'old', 'swapped': True}
+
+    monkeypatch.setattr(rag, 'reload_knowledge_base', reload)
+    monkeypatch.setattr(rag, 'active_generation', lambda: rag.KnowledgeBaseGeneration('gen-1', None, 'abc123'))
+    monkeypatch.setattr(kb_reload, '_status', {'running': False, 'last_result': None, 'last_error': None,
+                                               'finished_at': None})
+    return calls, release
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+class TestBackgroundReload:
+    """Test suite for start_reload and reload_status"""
+
+    def test_runs_and_records_result(self, fake_reload):
+        calls, release = fake_reload
+        assert kb_reload.start_reload('kb')
+        wait_for(lambda: not kb_reload.reload_status()['running'])
+
+        status = kb_reload.reload_status()
+        assert calls == [('kb', False)]
+        assert status['last_result']['swapped']
+        assert status['generation'] == 'abc123' and status['slot'] == 'gen-1'
+
+    def test_one_reload_at_a_time(self, fake_reload):
+        calls, release = fake_reload
+        release.clear()
+        assert kb_reload.start_reload('kb')
+        assert not kb_reload.start_reload('kb')
+
+        release.set()
+        wait_for(lambda: not kb_reload.reload_status()['running'])
+        assert len(calls) == 1
+
+    def test_failure_recorded(self, fake_reload, monkeypatch):
+        def broken(knowledge_dir, force=False):
+            raise RuntimeError('disk full')
+
+        monkeypatch.setattr(rag, 'reload_knowledge_base', broken)
+        kb_reload.start_reload('kb')
+        wait_for(lambda: kb_reload.reload_status()['finished_at'] is not None)
+
+        assert kb_reload.reload_status()['last_error'] == 'disk full'
+
+
+class TestWatcher:
+    """Test suite for the knowledge base directory watcher"""
+
+    def test_signature_tracks_files(self, tmp_path):
+        (tmp_path / 'a.md').write_text('one')
+        before = kb_reload.knowledge_base_signature(str(tmp_path))
+        (tmp_path / 'a.md').write_text('one two')
+        assert kb_reload.knowledge_base_signature(str(tmp_path)) != before
+        (tmp_path / 'notes.txt').write_text('ignored')
+        assert len(kb_reload.knowledge_base_signature(str(tmp_path))) == 1
+
+    def test_change_triggers_one_reload(self, tmp_path, monkeypatch):
+        triggered = []
+        monkeypatch.setattr(kb_reload, 'start_reload', lambda knowledge_dir: triggered.append(knowledge_dir) or True)
+        (tmp_path / 'a.md').write_text('one')
+        watcher = kb_reload.KnowledgeBaseWatcher(str(tmp_path), interval=0.02).start()
+        try:
+            time.sleep(0.1)
+            assert triggered == []
+
+            (tmp_path / 'b.md').write_text('two')
+            wait_for(lambda: triggered)
+            time.sleep(0.1)
+        finally:
+            watcher.stop()
+        assert triggered == [str(tmp_path)]
+
+
+class TestReloadEndpoints:
+    """Test suite for /kb/reload and /kb/generation"""
+
+    def test_generation(self, client, fake_reload):
+        data = client.get('/kb/generation').get_json()
+        assert data['generation'] == 'abc123'
+        assert data['running'] is False
+
+    def test_disabled_without_token(self, client, fake_reload, monkeypatch):
+        monkeypatch.setattr(routes, 'KB_ADMIN_TOKEN', '')
+        assert client.post('/kb/reload').status_code == 404
+
+    def test_rejects_wrong_token(self, client, fake_reload, monkeypatch):
+        monkeypatch.setattr(routes, 'KB_ADMIN_TOKEN', 'secret')
+        response = client.post('/kb/reload', headers={'X-Admin-Token': 'guess'})
+        assert response.status_code == 403
+        assert fake_reload[0] == []
+
+    def test_starts_reload(self, client, fake_reload, monkeypatch):
+        calls, release = fake_reload
+        release.clear()
+        monkeypatch.setattr(routes, 'KB_ADMIN_TOKEN', 'secret')
+
+        response = client.post('/kb/reload?force=true', headers={'X-Admin-Token': 'secret'})
+        assert response.status_code == 202
+        assert response.get_json()['status'] == 'started'
+        assert client.post('/kb/reload', headers={'X-Admin-Token': 'secret'}).status_code == 409
+
+        release.set()
+        wait_for(lambda: not kb_reload.reload_status()['running'])
+        assert calls[0][1] is True
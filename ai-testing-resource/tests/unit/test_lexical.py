@@ -0,0 +1,111 @@
+"""
+Unit Test: BM25 Lexical Index
+
+Tests the tokenizer, BM25 ranking (rare exact terms such as model names win),
+incremental upsert and delete, scoring outside the write lock, JSON
+persistence, and reciprocal-rank fusion.
+"""
+import threading
+
+import pytest
+from app.lexical import RRF_K, BM25Index, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index():
+    idx = BM25Index()
+    idx.upsert(
+        ['specs#0', 'specs#1', 'pricing#0'],
+        [
+            'Widget Pro X2: 5.5" display, IP67 water resistance, 3500mAh battery',
+            'Widget Basic: 5" display, splash resistant, 3000mAh battery',
+            'Starter plan costs $49/month. Pro plan costs $99/month.',
+        ],
+    )
+    return idx
+
+
+class TestTokenize:
+    """Test suite for tokenize"""
+
+    def test_lowercases_and_splits_identifiers(self):
+        assert tokenize('IP67-rated Widget Pro X2') == ['ip67', 'rated', 'widget', 'pro', 'x2']
+
+    def test_keeps_decimals_and_drops_stopwords(self):
+        assert tokenize('What is the price of the 5.5" model?') == ['price', '5.5', 'model']
+
+
+class TestBM25Index:
+    """Test suite for BM25Index"""
+
+    def test_rare_term_ranks_its_chunk_first(self, index):
+        results = index.search('Is the X2 waterproof?')
+
+        assert results[0][0] == 'specs#0'
+
+    def test_chunks_without_query_terms_excluded(self, index):
+        assert [chunk_id for chunk_id, _ in index.search('starter plan')] == ['pricing#0']
+
+    def test_no_match(self, index):
+        assert index.search('xyzzy') == []
+
+    def test_n_results(self, index):
+        assert len(index.search('widget battery display', n_results=1)) == 1
+
+    def test_upsert_replaces_text(self, index):
+        index.upsert(['pricing#0'], ['Enterprise plan is custom'])
+
+        assert index.search('starter') == []
+        assert index.search('enterprise')[0][0] == 'pricing#0'
+        assert len(index) == 3
+
+    def test_delete_removes_postings(self, index):
+        index.delete(['specs#0', 'missing'])
+
+        assert index.search('x2') == []
+        assert index.ids() == {'specs#1', 'pricing#0'}
+
+    def test_scores_outside_the_lock(self, index):
+        """A write landing mid-search neither waits for it nor changes its scores"""
+        before = index.search('widget battery')
+        writes = []
+
+        def include(chunk_id):
+            if not writes:
+                writer = threading.Thread(target=index.delete, args=(['specs#1'],))
+                writer.start()
+                writer.join(5)
+                writes.append(writer.is_alive())
+            return True
+
+        assert index.search('widget battery', include=include) == before
+        assert writes == [False]
+        assert [chunk_id for chunk_id, _ in index.search('widget battery')] == ['specs#0']
+
+    def test_save_and_load(self, index, tmp_path):
+        path = tmp_path / 'kb.bm25.json'
+        index.save(str(path))
+        loaded = BM25Index.load(str(path))
+
+        assert loaded.ids() == index.ids()
+        assert loaded.search('ip67 battery') == index.search('ip67 battery')
+
+    def test_load_missing_raises(self, tmp_path):
+        with pytest.raises(OSError):
+            BM25Index.load(str(tmp_path / 'missing.json'))
+
+
+class TestReciprocalRankFusion:
+    """Test suite for reciprocal_rank_fusion"""
+
+    def test_scores_sum_over_rankings(self):
+        fused = reciprocal_rank_fusion(['a', 'b'], ['b', 'c'])
+
+        assert fused['a'] == pytest.approx(1 / (RRF_K + 1))
+        assert fused['b'] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+        assert fused['c'] == pytest.approx(1 / (RRF_K + 2))
+
+    def test_agreement_beats_single_first_place(self):
+        fused = reciprocal_rank_fusion(['a', 'b'], ['c', 'b'])
+
+        assert max(fused, key=fused.get) == 'b'
@@ -0,0 +1,148 @@
+"""
+Unit Test: Production Trace Recording
+
+Tests that answers served by the /ask routes (plain, async, streamed,
+batched and the native ASGI /ask/async) are broadcast as production traces
+carrying the V3 router's category decision, that monitoring can be switched
+off, and that a recording failure never fails the request.
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app import asgi, routes
+
+ROUTED_ANSWER = {
+    'text': 'Refunds take 5-7 days.',
+    'sources': [{'id': 'return_policy', 'title': 'Returns'}],
+    'metadata': {'latency_ms': 812, 'prompt_tokens': 300, 'completion_tokens': 40},
+    'trace': {
+        'version': 'v3',
+        'spans': [{'span_id': 'v3-abc123-span-0'}],
+        'routing': {'category': 'returns', 'fallback': False},
+    },
+}
+
+
+@pytest.fixture
+def broadcasts(monkeypatch):
+    """Traces broadcast to monitoring clients, as dicts"""
+    # The monitoring package also sets up its Socket.IO stream on import
+    pytest.importorskip('flask_socketio')
+    from monitoring import recorder
+    sent = []
+    monkeypatch.setattr(recorder, 'broadcast_trace', sent.append)
+    monkeypatch.setattr(recorder, 'MONITORING_ENABLED', True)
+    return sent
+
+
+def post(client, path, body):
+    return client.post(path, data=json.dumps(body), content_type='application/json')
+
+
+class TestRecordedRoutes:
+    """Test suite for traces recorded from served answers"""
+
+    def test_ask_records_routed_trace(self, client, broadcasts, monkeypatch):
+        monkeypatch.setattr(routes, 'ask', lambda question, version: ROUTED_ANSWER)
+
+        response = post(client, '/ask', {'question': 'How long do refunds take?', 'version': 'v3'})
+
+        assert response.status_code == 200
+        [trace] = broadcasts
+        assert trace['id'] == 'v3-abc123'
+        assert trace['question'] == 'How long do refunds take?'
+        assert (trace['detected_category'], trace['routing_fallback']) == ('returns', False)
+        assert trace['latency_ms'] == 812
+
+    def test_async_records_trace(self, client, broadcasts, monkeypatch):
+        async def fake_ask_async(question, version):
+            return ROUTED_ANSWER
+        monkeypatch.setattr(routes, 'ask_async', fake_ask_async)
+
+        assert post(client, '/ask/async', {'question': 'Refunds?'}).status_code == 200
+        assert [t['detected_category'] for t in broadcasts] == ['returns']
+
+    def test_native_asgi_records_trace(self, app, broadcasts, monkeypatch):
+        async def fake_ask_async(question, version):
+            return ROUTED_ANSWER
+        monkeypatch.setattr(asgi, 'ask_async', fake_ask_async)
+        messages = iter([{'type': 'http.request', 'body': b'{"question": "Refunds?"}'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/ask/async',
+                 'headers': [(b'content-type', b'application/json')]}
+        asyncio.run(asgi.AsyncAskApplication(app, url_prefix='')(scope, receive, send))
+
+        assert sent[0]['status'] == 200
+        assert [t['detected_category'] for t in broadcasts] == ['returns']
+
+    def test_native_asgi_records_off_the_loop(self, app, broadcasts, monkeypatch):
+        async def fake_ask_async(question, version):
+            return ROUTED_ANSWER
+        monkeypatch.setattr(asgi, 'ask_async', fake_ask_async)
+        threads = []
+        monkeypatch.setattr(asgi, 'record_trace', lambda *args: threads.append(threading.get_ident()))
+        messages = iter([{'type': 'http.request', 'body': b'{"question": "Refunds?"}'}])
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            pass
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/ask/async',
+                 'headers': [(b'content-type', b'application/json')]}
+        asyncio.run(asgi.AsyncAskApplication(app, url_prefix='')(scope, receive, send))
+
+        assert len(threads) == 1 and threads[0] != threading.get_ident()
+
+    def test_stream_records_done_payload(self, client, broadcasts, monkeypatch):
+        events = [{'event': 'delta', 'data': {'text': 'Refunds'}}, {'event': 'done', 'data': ROUTED_ANSWER}]
+        monkeypatch.setattr(routes, 'ask_stream', lambda question, version: iter(events))
+
+        body = post(client, '/ask/stream', {'question': 'Refunds?'}).get_data(as_text=True)
+
+        assert 'event: done' in body
+        assert [t['routing_fallback'] for t in broadcasts] == [False]
+
+    def test_batch_records_results_only(self, client, broadcasts, monkeypatch):
+        items = [
+            {'type': 'result', 'index': 0, 'question': 'Refunds?', 'response': ROUTED_ANSWER},
+            {'type': 'error', 'index': 1, 'question': '', 'error': 'Please provide a question'},
+            {'type': 'summary', 'total': 2},
+        ]
+        monkeypatch.setattr(routes, 'run_batch', lambda questions, version, max_workers: iter(items))
+
+        post(client, '/ask/batch', {'questions': ['Refunds?', '']}).get_data()
+
+        assert [t['question'] for t in broadcasts] == ['Refunds?']
+
+    def test_disabled_records_nothing(self, client, broadcasts, monkeypatch):
+        from monitoring import recorder
+        monkeypatch.setattr(recorder, 'MONITORING_ENABLED', False)
+        monkeypatch.setattr(routes, 'ask', lambda question, version: ROUTED_ANSWER)
+
+        assert post(client, '/ask', {'question': 'Refunds?'}).status_code == 200
+        assert broadcasts == []
+
+    def test_recording_failure_still_answers(self, client, broadcasts, monkeypatch):
+        from monitoring import recorder
+
+        def broken(trace):
+            raise RuntimeError('socket closed')
+        monkeypatch.setattr(recorder, 'broadcast_trace', broken)
+        monkeypatch.setattr(routes, 'ask', lambda question, version: ROUTED_ANSWER)
+
+        response = post(client, '/ask', {'question': 'Refunds?'})
+
+        assert response.status_code == 200
+        assert response.get_json()['text'] == ROUTED_ANSWER['text']
@@ -0,0 +1,148 @@
+"""
+Unit Test: Answer Pipeline
+
+Tests that Pipeline runs stages in order, records one span per stage in the
+trace viewer's span schema, stops early when a stage finishes the answer and
+serves blocking, async and streaming callers from the same stages. Stages
+here are small fakes - no model or vector store involved.
+"""
+import asyncio
+import time
+
+import pytest
+from app.pipeline import FunctionStage, Pipeline, StreamingStage
+
+SPAN_KEYS = {'span_id', 'name', 'span_type', 'start_time', 'duration_ms', 'input', 'output', 'metadata'}
+
+
+def prompt_stage(state, span):
+    state.system = 'Be brief.'
+    state.trace = {'version': state.version}
+    span.output = {'prompt_length': len(state.system)}
+
+
+def slow_stage(state, span):
+    time.sleep(0.02)
+    state.docs = [{'id': 'doc'}]
+
+
+class FakeModel(StreamingStage):
+    """Answers 'hello world' in two deltas"""
+    name = 'Fake Model'
+    span_type = 'llm'
+
+    def run(self, state, span):
+        state.text = 'hello world'
+        state.tokens = {'prompt': 10, 'completion': 2}
+
+    def stream(self, state, span, started):
+        for part in ('hello', ' world'):
+            yield part
+        self.run(state, span)
+
+
+def make_pipeline(*extra):
+    return Pipeline('vtest', [
+        FunctionStage('Prompt Construction', 'prompt', prompt_stage),
+        *extra,
+        FakeModel(),
+    ])
+
+
+class TestPipeline:
+    """Test suite for the staged answer pipeline"""
+
+    def test_run_returns_formatted_response(self):
+        """The final state should come back in the format_response shape"""
+        result = make_pipeline().run("Hi")
+
+        assert result['text'] == 'hello world'
+        assert result['metadata']['total_tokens'] == 12
+        assert result['trace']['version'] == 'vtest'
+
+    def test_one_span_per_stage_in_viewer_schema(self):
+        """Each stage should produce a span with every viewer field"""
+        spans = make_pipeline().run("Hi")['trace']['spans']
+
+        assert [s['span_type'] for s in spans] == ['prompt', 'llm']
+        for span in spans:
+            assert set(span) == SPAN_KEYS
+        assert spans[0]['output'] == {'prompt_length': 9}
+        assert spans[0]['span_id'] != spans[1]['span_id']
+
+    def test_spans_measure_real_time(self):
+        """Durations and start offsets should reflect actual stage wall time"""
+        pipeline = make_pipeline(FunctionStage('Slow', 'retrieval', slow_stage))
+        result = pipeline.run("Hi")
+        spans = result['trace']['spans']
+
+        assert spans[1]['duration_ms'] >= 15
+        assert spans[2]['start_time'] >= spans[1]['start_time'] + spans[1]['duration_ms']
+        assert result['metadata']['latency_ms'] >= 15
+
+    def test_done_skips_remaining_stages(self):
+        """A stage that sets done should short-circuit the pipeline"""
+        def cached(state, span):
+            state.text = 'cached answer'
+            state.done = True
+
+        result = make_pipeline(FunctionStage('Cache', 'cache', cached)).run("Hi")
+
+        assert result['text'] == 'cached answer'
+        assert [s['name'] for s in result['trace']['spans']] == ['Prompt Construction', 'Cache']
+
+    def test_state_fields_passed_through(self):
+        """Keyword arguments should seed the pipeline state"""
+        seen = {}
+
+        def capture(state, span):
+            seen['embedding'] = state.embedding
+
+        make_pipeline(FunctionStage('Capture', 'embedding', capture)).run("Hi", embedding=[0.1])
+
+        assert seen['embedding'] == [0.1]
+
+    def test_failed_stage_is_raised(self):
+        """Stage exceptions should propagate to the caller"""
+        def broken(state, span):
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            make_pipeline(FunctionStage('Broken', 'retrieval', broken)).run("Hi")
+
+    def test_run_async_matches_run(self):
+        """The async runner should execute the same stages, blocking ones off-loop"""
+        pipeline = make_pipeline(FunctionStage('Slow', 'retrieval', slow_stage, blocking=True))
+
+        result = asyncio.run(pipeline.run_async("Hi"))
+
+        assert result['text'] == 'hello world'
+        assert [s['span_type'] for s in result['trace']['spans']] == ['prompt', 'retrieval', 'llm']
+
+    def test_stream_yields_deltas_then_done(self):
+        """Streaming should emit model deltas, then the full response"""
+        events = list(make_pipeline().stream("Hi"))
+
+        assert [e['event'] for e in events] == ['delta', 'delta', 'done']
+        assert ''.join(e['data']['text'] for e in events[:-1]) == 'hello world'
+        assert events[-1]['data']['trace']['spans'][-1]['span_type'] == 'llm'
+
+    def test_stream_short_circuit_sends_whole_answer(self):
+        """A finished-early stream should deliver the answer as one delta"""
+        def cached(state, span):
+            state.text = 'cached answer'
+            state.done = True
+
+        events = list(make_pipeline(FunctionStage('Cache', 'cache', cached)).stream("Hi"))
+
+        assert [e['event'] for e in events] == ['delta', 'done']
+        assert events[0]['data']['text'] == 'cached answer'
+
+    def test_v3_cpu_stages_leave_the_event_loop(self):
+        """Stages that tokenize, score or render should run in the executor under asyncio"""
+        from app import ai_service
+
+        stages = {stage.name: stage for stage in ai_service.PIPELINES['v3'].stages}
+
+        for name in ('Query Embedding', 'ChromaDB Retrieval', 'Lexical Rerank', 'Context Building', 'Render'):
+            assert stages[name].blocking, name
@@ -0,0 +1,177 @@
+"""
+Unit Test: Projected Vector Index
+
+Tests the dimensionality-reduced numpy index mode: PCA and truncation
+fitting, scanning float16 reduced vectors, exact re-scoring on the full
+vectors, recall against exact search, filtered queries, refitting as the
+index grows, persistence, and the storage report.
+"""
+import numpy as np
+import pytest
+
+from app.projection import ProjectedIndex, fit_projection
+from app.vector_index import NumpyIndex, open_index
+
+
+def low_rank(n, dim=64, rank=8, noise=0.05, seed=0):
+    """Unit vectors near a rank-dimensional subspace, like the few directions real embeddings vary in"""
+    rng = np.random.default_rng(seed)
+    basis = np.linalg.qr(np.random.default_rng(99).normal(size=(dim, rank)))[0]
+    vectors = rng.normal(size=(n, rank)) @ basis.T + noise * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def fill(index, vectors, start=0):
+    ids = [f'doc{i}' for i in range(start, start + len(vectors))]
+    index.upsert(ids=ids, embeddings=vectors, documents=ids,
+                 metadatas=[{'half': i % 2} for i in range(start, start + len(ids))])
+
+
+def recall(approximate, exact):
+    return sum(len(set(a) & set(e)) for a, e in zip(approximate['ids'], exact['ids'])) / sum(
+        len(e) for e in exact['ids'])
+
+
+@pytest.fixture
+def pair(tmp_path):
+    """A projected and an exact index over the same 1000 vectors"""
+    vectors = low_rank(1000)
+    projected = ProjectedIndex(str(tmp_path / 'projected'), dimensions=12, dtype='float16', min_fit_rows=100)
+    exact = NumpyIndex(str(tmp_path / 'exact'))
+    fill(projected, vectors)
+    fill(exact, vectors)
+    return projected, exact
+
+
+class TestFitProjection:
+    """Test suite for fitting projections"""
+
+    def test_pca_keeps_the_subspace(self):
+        projection = fit_projection(low_rank(500), 8)
+
+        assert projection.components.shape == (64, 8)
+        assert projection.retained > 0.9
+        assert projection.apply(low_rank(3, seed=1)).shape == (3, 8)
+
+    def test_pca_preserves_dot_products(self):
+        vectors = low_rank(500, noise=0.01)
+        projection = fit_projection(vectors, 8)
+        reduced = projection.apply(vectors[:50])
+
+        assert np.allclose(reduced @ reduced.T, vectors[:50] @ vectors[:50].T, atol=0.05)
+
+    def test_truncate_renormalizes_leading_dimensions(self):
+        projection = fit_projection(low_rank(10), 16, method='truncate')
+        reduced = projection.apply(low_rank(4, seed=1))
+
+        assert projection.components is None
+        assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0)
+
+    @pytest.mark.parametrize('dimensions, method', [(0, 'pca'), (64, 'pca'), (8, 'random')])
+    def test_invalid_settings_raise(self, dimensions, method):
+        with pytest.raises(ValueError):
+            fit_projection(low_rank(10), dimensions, method)
+
+
+class TestProjectedIndex:
+    """Test suite for searching reduced vectors"""
+
+    def test_stores_float16_reduced_rows(self, pair):
+        projected, _ = pair
+        state = projected._projected
+
+        assert state.reduced.shape == (1000, 12)
+        assert state.reduced.dtype == np.float16
+        assert state.projection.fitted_rows == 1000
+
+    def test_rescored_results_are_exact(self, pair):
+        projected, exact = pair
+        queries = low_rank(20, seed=1)
+
+        approximate = projected.query(queries, n_results=5)
+        expected = exact.query(queries, n_results=5)
+
+        assert approximate['ids'] == expected['ids']
+        assert np.allclose(approximate['distances'], expected['distances'], atol=1e-5)
+
+    def test_rescore_recovers_recall(self, tmp_path):
+        vectors = low_rank(2000, rank=32, noise=0.2)
+        projected = ProjectedIndex(str(tmp_path / 'projected'), dimensions=8, min_fit_rows=100)
+        exact = NumpyIndex(str(tmp_path / 'exact'))
+        fill(projected, vectors)
+        fill(exact, vectors)
+        queries = low_rank(50, rank=32, noise=0.2, seed=1)
+        expected = exact.query(queries, n_results=5)
+
+        reduced_only = recall(projected.query(queries, n_results=5, rescore=0), expected)
+        rescored = recall(projected.query(queries, n_results=5, rescore=8), expected)
+        assert reduced_only < rescored
+
+    def test_filtered_query(self, pair):
+        projected, exact = pair
+        queries = low_rank(5, seed=1)
+
+        result = projected.query(queries, n_results=3, where={'half': 1})
+        expected = exact.query(queries, n_results=3, where={'half': 1})
+
+        assert result['ids'] == expected['ids']
+        assert np.allclose(result['distances'], expected['distances'], atol=1e-5)
+        assert all(int(doc_id[3:]) % 2 == 1 for ids in result['ids'] for doc_id in ids)
+
+    def test_full_search_below_min_fit_rows(self, tmp_path):
+        projected = ProjectedIndex(str(tmp_path / 'projected'), dimensions=12, min_fit_rows=1000)
+        fill(projected, low_rank(50))
+
+        assert projected._projected.projection is None
+        assert not projected.storage()['projected']
+        assert projected.query(low_rank(1, seed=1), n_results=2)['ids'][0]
+
+    def test_refits_after_growth(self, tmp_path):
+        projected = ProjectedIndex(str(tmp_path / 'projected'), dimensions=12, min_fit_rows=100)
+        fill(projected, low_rank(100))
+        fill(projected, low_rank(50, seed=1), start=100)
+        assert projected._projected.projection.fitted_rows == 100
+        assert len(projected._projected.reduced) == 150
+
+        fill(projected, low_rank(60, seed=2), start=150)
+        assert projected._projected.projection.fitted_rows == 210
+
+    def test_deferred_bulk_load_fits_once(self, tmp_path, monkeypatch):
+        from app import projection as projection_module
+        fits = []
+        original = projection_module.fit_projection
+        monkeypatch.setattr(projection_module, 'fit_projection', lambda *args: fits.append(1) or original(*args))
+        projected = ProjectedIndex(str(tmp_path / 'projected'), dimensions=12, min_fit_rows=100)
+        vectors = low_rank(1000)
+
+        with projected.deferred_writes():
+            for start in range(0, 1000, 100):
+                fill(projected, vectors[start:start + 100], start=start)
+
+        assert len(fits) == 1
+
+    def test_persists_and_reloads(self, pair, tmp_path):
+        projected, _ = pair
+        queries = low_rank(5, seed=1)
+
+        reloaded = ProjectedIndex(str(tmp_path / 'projected'), dimensions=12, dtype='float16', min_fit_rows=100)
+
+        assert isinstance(reloaded._projected.reduced, np.memmap)
+        assert np.array_equal(reloaded._projected.projection.components,
+                              projected._projected.projection.components)
+        assert reloaded.query(queries, n_results=3) == projected.query(queries, n_results=3)
+
+    def test_other_settings_refit_on_open(self, pair, tmp_path):
+        reopened = open_index(str(tmp_path / 'projected'), 'projected', dimensions=6, dtype='float32',
+                              min_fit_rows=100)
+
+        assert reopened._projected.reduced.shape == (1000, 6)
+        assert reopened._projected.reduced.dtype == np.float32
+
+    def test_storage_report(self, pair):
+        projected, _ = pair
+        storage = projected.storage()
+
+        assert (storage['full_bytes'], storage['searched_bytes']) == (1000 * 64 * 4, 1000 * 12 * 2)
+        assert storage['method'] == 'pca'
+        assert storage['retained'] > 0.9
@@ -0,0 +1,58 @@
+"""
+Unit Test: V3 System Prompt Blocks
+
+Tests how the V3 system prompt is split into blocks with prompt-cache
+breakpoints. Deterministic - no API calls.
+"""
+import pytest
+from app.ai_service import (
+    MAX_CACHE_BREAKPOINTS,
+    V3_SYSTEM_PREAMBLE,
+    _build_v3_system_blocks,
+)
+
+
+def make_doc(doc_id):
+    return {'id': doc_id, 'title': doc_id.title(), 'content': f"Content of {doc_id}", 'distance': 0.3}
+
+
+class TestV3SystemBlocks:
+    """Test suite for prompt-cache block layout"""
+
+    def test_preamble_is_first_cached_block(self):
+        """Static instructions should be a block of their own with a breakpoint"""
+        blocks = _build_v3_system_blocks([make_doc('return_policy')])
+
+        assert blocks[0]['text'] == V3_SYSTEM_PREAMBLE
+        assert blocks[0]['cache_control'] == {'type': 'ephemeral'}
+
+    def test_one_block_per_document(self):
+        """Each retrieved document should be its own block"""
+        docs = [make_doc('shipping_info'), make_doc('return_policy')]
+        blocks = _build_v3_system_blocks(docs)
+
+        assert len(blocks) == 3
+        assert blocks[1]['text'].startswith('[Return_Policy]')
+
+    def test_order_independent_of_relevance(self):
+        """The same docs in a different relevance order should give identical blocks"""
+        a = _build_v3_system_blocks([make_doc('shipping_info'), make_doc('pricing_tiers')])
+        b = _build_v3_system_blocks([make_doc('pricing_tiers'), make_doc('shipping_info')])
+
+        assert a == b
+
+    def test_breakpoint_limit(self):
+        """Never emit more cache breakpoints than the API allows"""
+        docs = [make_doc(f"doc_{i}") for i in range(6)]
+        blocks = _build_v3_system_blocks(docs)
+
+        breakpoints = [b for b in blocks if 'cache_control' in b]
+        assert len(breakpoints) == MAX_CACHE_BREAKPOINTS
+        assert 'cache_control' in blocks[-1]
+
+    def test_no_documents(self):
+        """Without documents the prompt should say no information was found"""
+        blocks = _build_v3_system_blocks([])
+
+        assert len(blocks) == 2
+        assert 'cache_control' not in blocks[1]
@@ -0,0 +1,187 @@
+"""
+Unit Test: Query Router
+
+Tests the local query classifier that restricts V3 retrieval to the
+knowledge base categories a question is about: keyword rules, nearest
+category centroid, the global-search fallback on ambiguous questions, the
+fallback-rate counters, the pipeline stage that feeds retrieval and the
+trace, and the detected category on monitoring traces.
+"""
+import numpy as np
+import pytest
+
+from app import ai_service, rag
+from app.pipeline import AnswerState, Span
+from app.query_router import QueryRouter, RouteDecision
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+CENTROIDS = {
+    'pricing': unit(1, 0, 0, 0),
+    'returns': unit(0, 1, 0, 0),
+    'shipping': unit(0, 0, 1, 0),
+    'products': unit(0, 0, 0, 1),
+}
+
+
+class TestQueryRouter:
+    """Test suite for QueryRouter decisions"""
+
+    def test_nearest_centroid(self):
+        router = QueryRouter(min_margin=0.05)
+        decision = router.route("Tell me about it", unit(0.1, 0.9, 0.2, 0), CENTROIDS)
+
+        assert decision.category == 'returns'
+        assert decision.categories == ['returns']
+        assert decision.method == 'centroid'
+        assert not decision.fallback
+        assert decision.confidence > 0.05
+
+    def test_keywords_break_a_tie(self):
+        """An embedding halfway between two centroids is routed by its keywords"""
+        router = QueryRouter(min_margin=0.05, keyword_weight=0.2)
+        decision = router.route("How long does a refund take?", unit(0, 1, 1, 0), CENTROIDS)
+
+        assert decision.category == 'returns'
+        assert decision.categories == ['returns']
+        assert decision.method == 'keywords+centroid'
+
+    def test_close_runner_up_is_searched_too(self):
+        router = QueryRouter(min_margin=0.1, max_partitions=2)
+        decision = router.route("Tell me about it", unit(0, 1, 0.95, 0), CENTROIDS)
+
+        assert decision.categories == ['returns', 'shipping']
+        assert not decision.fallback
+
+    def test_ambiguous_question_falls_back(self):
+        router = QueryRouter(min_margin=0.1, max_partitions=2)
+        decision = router.route("Tell me about it", unit(1, 1, 1, 0.2), CENTROIDS)
+
+        assert decision.fallback
+        assert decision.categories == []
+        assert decision.category is not None
+
+    def test_nothing_to_route_on_falls_back(self):
+        router = QueryRouter()
+        assert router.route("refund", None, CENTROIDS).fallback
+        assert router.route("refund", unit(0, 1, 0, 0), {'returns': CENTROIDS['returns']}).fallback
+
+    def test_keyword_shares(self):
+        shares = QueryRouter().keyword_shares("Refund on express shipping?")
+
+        assert shares == {'returns': pytest.approx(1 / 3), 'shipping': pytest.approx(2 / 3)}
+        assert QueryRouter().keyword_shares("Hello there") == {}
+
+    def test_fallback_rate(self):
+        router = QueryRouter(min_margin=0.05)
+        router.route("q", unit(0, 1, 0, 0), CENTROIDS)
+        router.route("q", unit(0, 1, 0, 0), CENTROIDS)
+        router.route("q", unit(1, 1, 1, 1), CENTROIDS)
+        router.route("q", None, CENTROIDS)
+
+        stats = router.snapshot()
+        assert (stats['routed'], stats['fallbacks'], stats['fallback_rate']) == (4, 2, 0.5)
+        assert stats['by_category'] == {'returns': 2}
+
+        router.reset()
+        assert router.snapshot()['routed'] == 0
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = QueryRouter(min_margin=0.05)
+    monkeypatch.setattr(ai_service, 'query_router', router)
+    monkeypatch.setattr(ai_service, 'ROUTING_ENABLED', True)
+    monkeypatch.setattr(ai_service, 'category_centroids', lambda: CENTROIDS)
+    monkeypatch.setattr(ai_service, 'active_generation', lambda: rag.KnowledgeBaseGeneration('', None, 'abc123'))
+    return router
+
+
+class TestRoutingStage:
+    """Test suite for the V3 routing stage and what it hands on"""
+
+    def test_route_feeds_retrieval(self, router, monkeypatch):
+        calls = []
+        monkeypatch.setattr(ai_service, 'get_relevant_chunks', lambda *args, **kwargs: calls.append(kwargs) or [])
+        state = AnswerState(question="Where is my package?", version='v3', embedding=unit(0, 0, 1, 0))
+
+        ai_service._route_stage(state, Span('s', 'Query Routing', 'routing', 0))
+        ai_service._retrieve_stage(state, Span('s', 'ChromaDB Retrieval', 'retrieval', 0))
+
+        assert state.route.categories == ['shipping']
+        assert calls[0]['categories'] == ['shipping']
+
+    def test_fallback_searches_everything(self, router, monkeypatch):
+        calls = []
+        monkeypatch.setattr(ai_service, 'get_relevant_chunks', lambda *args, **kwargs: calls.append(kwargs) or [])
+        state = AnswerState(question="Hello", version='v3', embedding=unit(1, 1, 1, 1))
+
+        ai_service._route_stage(state, Span('s', 'Query Routing', 'routing', 0))
+        ai_service._retrieve_stage(state, Span('s', 'ChromaDB Retrieval', 'retrieval', 0))
+
+        assert state.route.fallback
+        assert calls[0]['categories'] is None
+
+    def test_disabled(self, router, monkeypatch):
+        monkeypatch.setattr(ai_service, 'ROUTING_ENABLED', False)
+        state = AnswerState(question="Refund?", version='v3', embedding=unit(0, 1, 0, 0))
+
+        ai_service._route_stage(state, Span('s', 'Query Routing', 'routing', 0))
+
+        assert state.route is None
+        assert router.snapshot()['routed'] == 0
+
+    def test_trace_records_category_and_fallback_rate(self, router):
+        state = AnswerState(question="Refund?", version='v3', embedding=unit(0, 1, 0, 0))
+        ai_service._route_stage(state, Span('s', 'Query Routing', 'routing', 0))
+
+        routing = ai_service._routing_trace(state.route)
+
+        assert routing['category'] == 'returns'
+        assert routing['fallback'] is False
+        assert routing['fallback_rate'] == 0.0
+        assert ai_service.get_service_metrics()['routing']['routed'] == 1
+
+
+@pytest.fixture
+def production_trace():
+    # The monitoring package also sets up its Socket.IO stream on import
+    pytest.importorskip('flask_socketio')
+    from monitoring.models import ProductionTrace
+    return ProductionTrace
+
+
+class TestProductionTrace:
+    """Test suite for building monitoring traces from answers"""
+
+    def test_detected_category_from_routing(self, production_trace):
+        response = {
+            'text': 'Refunds take 5-7 days.',
+            'sources': [{'id': 'return_policy', 'title': 'Returns'}],
+            'metadata': {'latency_ms': 812, 'prompt_tokens': 300, 'completion_tokens': 40,
+                         'time_to_first_token_ms': 812},
+            'trace': {
+                'version': 'v3',
+                'routing': RouteDecision('returns', ['returns'], 0.3, 'centroid').to_dict(),
+                'spans': [{'span_id': 'v3-abc123-span-1'}],
+            },
+        }
+
+        trace = production_trace.from_response("How long do refunds take?", response, 'claude-test')
+
+        assert trace.id == 'v3-abc123'
+        assert trace.detected_category == 'returns'
+        assert trace.routing_fallback is False
+        assert (trace.latency_ms, trace.prompt_tokens, trace.prompt_version) == (812, 300, 'v3')
+        assert trace.to_dict()['detected_category'] == 'returns'
+
+    def test_unrouted_answer(self, production_trace):
+        trace = production_trace.from_response("Hi", {'text': 'Hello', 'metadata': {},
+                                                      'trace': {'version': 'v1'}}, 'claude-test')
+
+        assert trace.detected_category is None
+        assert trace.routing_fallback is None
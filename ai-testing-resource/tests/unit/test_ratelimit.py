@@ -0,0 +1,233 @@
+"""
+Unit Test: Rate Limiter and Concurrency Governor
+
+Tests the token buckets, the AIMD governor and the RateLimiter that every
+model call goes through. Time is a fake clock; sleeping advances it.
+"""
+import asyncio
+
+import pytest
+from app.ratelimit import (
+    ConcurrencyGovernor, RateLimiter, RateLimitExceeded, TokenBucket,
+    ERROR, SUCCESS, THROTTLED,
+)
+
+
+class FakeClock:
+    """Manually advanced clock whose sleep() moves time forward"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_limiter(clock, rpm=60, tpm=6000, max_wait=5.0, concurrency=4):
+    return RateLimiter(
+        requests_per_minute=rpm,
+        tokens_per_minute=tpm,
+        max_wait_seconds=max_wait,
+        governor=ConcurrencyGovernor(initial=concurrency, minimum=1, maximum=8, clock=clock),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+
+class TestTokenBucket:
+    """Test suite for the refilling token bucket"""
+
+    def test_starts_full_and_refills(self):
+        """A drained bucket should refill at rate/60 per second"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+
+        bucket.reserve(60)
+        assert bucket.wait_time(1) == pytest.approx(1.0)
+
+        clock.now = 1.0
+        assert bucket.wait_time(1) == 0
+
+    def test_reservations_queue_behind_each_other(self):
+        """Negative balance makes each later caller wait longer"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, capacity=1, clock=clock)
+
+        bucket.reserve(1)
+        bucket.reserve(1)  # Now one token in debt
+        assert bucket.wait_time(1) == pytest.approx(2.0)
+
+    def test_refill_capped_at_capacity(self):
+        """Idle time should not bank more than capacity"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+
+        clock.now = 3600
+        assert bucket.available() == 60
+
+    def test_block_until(self):
+        """A retry-after block should hold even a full bucket"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+
+        bucket.block_until(10)
+        assert bucket.wait_time(1) == pytest.approx(10)
+
+
+class TestConcurrencyGovernor:
+    """Test suite for the AIMD concurrency governor"""
+
+    def test_limit_enforced(self):
+        """No more slots than the current limit"""
+        governor = ConcurrencyGovernor(initial=2)
+
+        assert governor.try_acquire()
+        assert governor.try_acquire()
+        assert not governor.try_acquire()
+        assert governor.acquire(timeout=0.01) is False
+
+    def test_additive_increase(self):
+        """About one limit's worth of successes should raise the limit by one"""
+        governor = ConcurrencyGovernor(initial=4, maximum=8)
+
+        for _ in range(5):
+            governor.try_acquire()
+            governor.release(SUCCESS)
+
+        assert governor.limit == 5
+
+    def test_multiplicative_decrease(self):
+        """A 429 should halve the limit, but not below the minimum"""
+        clock = FakeClock()
+        governor = ConcurrencyGovernor(initial=8, minimum=2, clock=clock)
+
+        governor.try_acquire()
+        governor.release(THROTTLED)
+        assert governor.limit == 4
+
+        for step in range(1, 4):
+            clock.now = step * 10
+            governor.try_acquire()
+            governor.release(THROTTLED)
+        assert governor.limit == 2
+
+    def test_burst_of_429s_counts_once(self):
+        """Throttles inside the cooldown window should decrease only once"""
+        governor = ConcurrencyGovernor(initial=8, cooldown_seconds=1.0, clock=FakeClock())
+
+        for _ in range(3):
+            governor.try_acquire()
+        for _ in range(3):
+            governor.release(THROTTLED)
+
+        assert governor.limit == 4
+
+    def test_errors_leave_limit_unchanged(self):
+        """Non-throttle failures should neither grow nor shrink the limit"""
+        governor = ConcurrencyGovernor(initial=4)
+
+        governor.try_acquire()
+        governor.release(ERROR)
+
+        assert governor.limit == 4
+        assert governor.in_flight == 0
+
+
+class TestRateLimiter:
+    """Test suite for the combined rate limiter"""
+
+    def test_immediate_grant_within_budget(self):
+        """Calls inside the buckets should not wait"""
+        clock = FakeClock()
+        limiter = make_limiter(clock)
+
+        permit = limiter.acquire(100)
+
+        assert permit.waited_ms == 0
+        assert limiter.snapshot()['in_flight'] == 1
+
+    def test_short_wait_queues(self):
+        """A wait under the deadline should sleep, then grant"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rpm=60, tpm=600, max_wait=5)
+
+        limiter.release(limiter.acquire(570))
+        permit = limiter.acquire(60)  # 30 tokens short at 10 tokens/s
+
+        assert permit.waited_ms == 3000
+        assert limiter.stats.queued == 1
+
+    def test_long_wait_fails_fast(self):
+        """A wait beyond the deadline should raise without sleeping"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rpm=60, tpm=600, max_wait=5)
+
+        limiter.release(limiter.acquire(600))
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            limiter.acquire(300)
+
+        assert exc_info.value.retry_after == pytest.approx(30)
+        assert clock.now == 0
+        assert limiter.stats.rejected == 1
+
+    def test_actual_usage_settles_reservation(self):
+        """Unused reserved tokens should be returned on release"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, tpm=6000)
+
+        permit = limiter.acquire(1000)
+        permit.used_tokens = 200
+        limiter.release(permit)
+
+        assert limiter.snapshot()['tokens_available'] == 5800
+
+    def test_throttle_applies_retry_after(self):
+        """A 429 with retry-after should hold new permits until it passes"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, max_wait=1)
+
+        limiter.release(limiter.acquire(10), THROTTLED, retry_after=30)
+
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire(10)
+        assert limiter.stats.throttled == 1
+        assert limiter.governor.limit == 2
+
+    def test_concurrency_deadline(self):
+        """Waiting for a concurrency slot should also respect the deadline"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, max_wait=0.05, concurrency=1)
+
+        limiter.acquire(10)
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire(10)
+
+        # The refused call's reservation is returned
+        assert limiter.snapshot()['requests_available'] == 59
+
+    def test_async_acquire_waits_for_slot(self):
+        """Async callers should get a slot once one is released"""
+        limiter = RateLimiter(
+            requests_per_minute=600,
+            tokens_per_minute=60000,
+            max_wait_seconds=1.0,
+            governor=ConcurrencyGovernor(initial=1),
+            poll_interval=0.005,
+        )
+
+        async def main():
+            first = await limiter.acquire_async(10)
+            waiter = asyncio.ensure_future(limiter.acquire_async(10))
+            await asyncio.sleep(0.02)
+            assert not waiter.done()
+            assert limiter.snapshot()['queue_depth'] == 1
+            limiter.release(first)
+            second = await waiter
+            limiter.release(second)
+
+        asyncio.run(main())
+        assert limiter.stats.granted == 2
+        assert limiter.snapshot()['in_flight'] == 0
@@ -0,0 +1,142 @@
+"""
+Unit Test: Lexical Reranker
+
+Tests the local rerank of V3's retrieval candidates: identifier extraction,
+exact number / SKU and section-title matches promoting a chunk over a
+slightly closer vector hit, the time budget (skipped up front or abandoned
+mid-way, keeping the retrieval order), and the pipeline stage that replaces
+the retrieved documents.
+"""
+import pytest
+
+from app import ai_service, rag
+from app.pipeline import AnswerState, Span
+from app.rerank import LexicalReranker, identifier_terms
+
+
+def chunk(chunk_id, content, distance, title='Doc', section=''):
+    return {'id': chunk_id, 'parent_id': chunk_id.split('#')[0], 'title': title, 'category': 'general',
+            'section': section, 'content': content, 'distance': distance, 'start': 0, 'end': len(content)}
+
+
+CANDIDATES = [
+    chunk('widget_pro#0', 'The Widget Pro X1 has a 10 hour battery.', 0.40, 'Widget Pro', 'X1'),
+    chunk('widget_pro#1', 'The Widget Pro X2 has a 14 hour battery and is rated IP67.', 0.42, 'Widget Pro', 'X2'),
+    chunk('pricing#0', 'The Starter plan is $49 per month.', 0.45, 'Pricing', 'Starter'),
+    chunk('returns#0', 'Items can be returned within 30 days.', 0.50, 'Returns', 'Window'),
+]
+
+
+class TestIdentifierTerms:
+    """Test suite for the terms that must match exactly"""
+
+    def test_numbers_codes_and_names(self):
+        terms = identifier_terms("Does the Widget Pro X2 last 14 hours on the Enterprise plan?")
+        assert {'x2', '14', 'widget', 'pro', 'enterprise'} <= terms
+
+    def test_sentence_start_is_not_a_name(self):
+        assert identifier_terms("What is the return window?") == set()
+
+
+class TestLexicalReranker:
+    """Test suite for LexicalReranker scoring and budget"""
+
+    def test_exact_code_beats_closer_vector_hit(self):
+        result = LexicalReranker(budget_ms=1000).rerank("How long does the X2 battery last?", CANDIDATES, 1)
+
+        assert result.applied
+        assert [c['id'] for c in result.chunks] == ['widget_pro#1']
+        assert 'rerank_score' in result.chunks[0]
+        assert 'rerank_score' not in CANDIDATES[1]
+
+    def test_section_title_match(self):
+        result = LexicalReranker(budget_ms=1000).rerank("starter price", CANDIDATES, 2)
+        assert result.chunks[0]['id'] == 'pricing#0'
+
+    def test_without_matches_keeps_vector_order(self):
+        result = LexicalReranker(budget_ms=1000).rerank("hello there", CANDIDATES, 3)
+        assert [c['id'] for c in result.chunks] == [c['id'] for c in CANDIDATES[:3]]
+
+    def test_too_few_candidates_is_skipped(self):
+        result = LexicalReranker().rerank("X2", CANDIDATES[:2], 3)
+
+        assert not result.applied
+        assert result.skipped == 'too_few_candidates'
+        assert result.chunks == CANDIDATES[:2]
+
+    def test_predicted_overrun_is_skipped(self):
+        reranker = LexicalReranker(budget_ms=1.0)
+        reranker._cost_ms = 1.0  # Four candidates would take ~4 ms
+
+        result = reranker.rerank("How long does the X2 battery last?", CANDIDATES, 1)
+
+        assert result.skipped == 'over_budget'
+        assert result.chunks == CANDIDATES[:1]
+        assert reranker._cost_ms == pytest.approx(0.9)
+
+    def test_overrun_mid_way_keeps_retrieval_order(self, monkeypatch):
+        reranker = LexicalReranker(budget_ms=0.0)
+        monkeypatch.setattr(reranker, 'score', lambda *args: 1.0)
+
+        result = reranker.rerank("X2", CANDIDATES, 2)
+
+        assert result.skipped == 'timeout'
+        assert result.chunks == CANDIDATES[:2]
+        assert reranker.snapshot()['cost_per_candidate_ms'] is not None
+
+    def test_snapshot_counts(self):
+        reranker = LexicalReranker(budget_ms=1000)
+        reranker.rerank("X2", CANDIDATES, 2)
+        reranker.rerank("X2", CANDIDATES[:1], 2)
+
+        stats = reranker.snapshot()
+        assert (stats['applied'], stats['too_few_candidates'], stats['over_budget']) == (1, 1, 0)
+
+
+@pytest.fixture
+def stage(monkeypatch):
+    reranker = LexicalReranker(budget_ms=1000)
+    monkeypatch.setattr(ai_service, 'reranker', reranker)
+    monkeypatch.setattr(ai_service, 'RERANK_ENABLED', True)
+    monkeypatch.setattr(ai_service, 'RERANK_CANDIDATES', 20)
+    monkeypatch.setattr(ai_service, 'ROUTING_ENABLED', False)
+    monkeypatch.setattr(ai_service, 'active_generation', lambda: rag.KnowledgeBaseGeneration('', None, 'abc123'))
+    return reranker
+
+
+class TestRerankStage:
+    """Test suite for the V3 rerank stage"""
+
+    def test_retrieves_candidates_and_reranks_them(self, stage, monkeypatch):
+        calls = []
+        monkeypatch.setattr(ai_service, 'get_relevant_chunks',
+                            lambda *args, **kwargs: calls.append(kwargs) or list(CANDIDATES))
+        state = AnswerState(question="How long does the X2 battery last?", version='v3', embedding=[0.0])
+
+        ai_service._retrieve_stage(state, Span('s', 'ChromaDB Retrieval', 'retrieval', 0))
+        assert calls[0]['n_results'] == 20
+        assert [doc['id'] for doc in state.docs] == ['widget_pro', 'pricing']
+
+        span = Span('s', 'Lexical Rerank', 'retrieval', 0)
+        ai_service._rerank_stage(state, span)
+
+        assert span.output['applied']
+        assert state.docs[0]['id'] == 'widget_pro'
+        assert state.docs[0]['content'].startswith('The Widget Pro X2')
+        assert [doc['id'] for doc in state.docs] == ['widget_pro', 'pricing']
+        assert ai_service.get_service_metrics()['rerank']['applied'] == 1
+
+    def test_disabled(self, stage, monkeypatch):
+        monkeypatch.setattr(ai_service, 'RERANK_ENABLED', False)
+        calls = []
+        monkeypatch.setattr(ai_service, 'get_relevant_chunks',
+                            lambda *args, **kwargs: calls.append(kwargs) or list(CANDIDATES))
+        state = AnswerState(question="X2 battery", version='v3', embedding=[0.0])
+
+        ai_service._retrieve_stage(state, Span('s', 'ChromaDB Retrieval', 'retrieval', 0))
+        docs = list(state.docs)
+        ai_service._rerank_stage(state, Span('s', 'Lexical Rerank', 'retrieval', 0))
+
+        assert calls[0]['n_results'] == ai_service.V3_N_RESULTS
+        assert state.docs == docs
+        assert stage.snapshot()['applied'] == 0
@@ -0,0 +1,99 @@
+"""
+Unit Test: Semantic Response Cache
+
+Tests the SemanticCache that lets V3 reuse answers for reworded questions.
+Embeddings are plain vectors here - no model involved.
+"""
+import pytest
+from app.semantic_cache import SemanticCache
+
+KEY = ('v3', 'prompt-hash', 'model', ('return_policy',))
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSemanticCache:
+    """Test suite for the semantic cache"""
+
+    def test_similar_question_hits(self):
+        """A near-identical embedding should return the cached answer"""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(KEY, [1.0, 0.0, 0.0], "What is your return policy?", "<p>30 days</p>", {'prompt': 500, 'completion': 60})
+
+        hit = cache.lookup(KEY, [0.99, 0.05, 0.0])
+
+        assert hit is not None
+        assert hit.entry.text == "<p>30 days</p>"
+        assert hit.similarity > 0.9
+
+    def test_dissimilar_question_misses(self):
+        """An embedding below the threshold should miss"""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(KEY, [1.0, 0.0, 0.0], "q", "a", {})
+
+        assert cache.lookup(KEY, [0.0, 1.0, 0.0]) is None
+        assert cache.stats.misses == 1
+
+    def test_key_must_match_exactly(self):
+        """Same embedding with different retrieved docs should miss"""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(KEY, [1.0, 0.0], "q", "a", {})
+
+        other_docs = ('v3', 'prompt-hash', 'model', ('shipping_info',))
+        assert cache.lookup(other_docs, [1.0, 0.0]) is None
+
+    def test_expired_entries_miss(self):
+        """Entries older than the TTL should not be served"""
+        clock = FakeClock()
+        cache = SemanticCache(threshold=0.9, ttl_seconds=60, clock=clock)
+        cache.store(KEY, [1.0, 0.0], "q", "a", {})
+
+        clock.now = 61
+        assert cache.lookup(KEY, [1.0, 0.0]) is None
+        assert len(cache) == 0
+        assert cache.stats.expirations == 1
+
+    def test_lru_eviction_by_entry_count(self):
+        """The least recently used entry should be evicted first"""
+        cache = SemanticCache(threshold=0.99, max_entries=2)
+        cache.store(KEY, [1.0, 0.0, 0.0], "first", "a1", {})
+        cache.store(KEY, [0.0, 1.0, 0.0], "second", "a2", {})
+
+        # Touch "first" so "second" becomes least recently used
+        assert cache.lookup(KEY, [1.0, 0.0, 0.0]) is not None
+        cache.store(KEY, [0.0, 0.0, 1.0], "third", "a3", {})
+
+        assert len(cache) == 2
+        assert cache.lookup(KEY, [0.0, 1.0, 0.0]) is None
+        assert cache.lookup(KEY, [1.0, 0.0, 0.0]) is not None
+
+    def test_memory_cap_enforced(self):
+        """Total cached bytes should stay under max_bytes"""
+        cache = SemanticCache(threshold=0.9, max_bytes=2000)
+        for i in range(10):
+            cache.store(KEY, [float(i), 1.0], f"q{i}", "x" * 500, {})
+
+        assert cache.size_bytes <= 2000
+        assert cache.stats.evictions > 0
+
+    def test_savings_counted_on_hit(self):
+        """Hits should accumulate the tokens the cached call consumed"""
+        cache = SemanticCache(threshold=0.9)
+        cache.store(KEY, [1.0, 0.0], "q", "a", {'prompt': 500, 'completion': 60})
+
+        cache.lookup(KEY, [1.0, 0.0])
+        cache.lookup(KEY, [1.0, 0.0])
+
+        snapshot = cache.snapshot()
+        assert snapshot['hits'] == 2
+        assert snapshot['saved_prompt_tokens'] == 1000
+        assert snapshot['saved_completion_tokens'] == 120
+        assert snapshot['hit_rate'] == 1.0
@@ -0,0 +1,291 @@
+"""
+Unit Test: Request Coalescing
+
+Tests the SingleFlight group that lets concurrent identical questions share
+one computation, in both the threaded and asyncio paths, and that concurrent
+POST /ask/async requests coalesce under the ASGI and WSGI servers alike.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from app import ai_service
+from app.asgi import AsyncAskApplication
+from app.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test suite for single-flight request coalescing"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Threads asking for the same key while in flight should coalesce"""
+        group = SingleFlight()
+        executions = []
+        results = []
+
+        def slow():
+            executions.append(1)
+            time.sleep(0.2)
+            return {'answer': 42}
+
+        def worker():
+            results.append(group.do('key', slow))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(executions) == 1
+        assert [r[0] for r in results] == [{'answer': 42}] * 5
+        assert sum(1 for _, shared in results if shared) == 4
+        assert group.stats.coalesced == 4
+
+    def test_different_keys_run_separately(self):
+        """Distinct keys should never share a result"""
+        group = SingleFlight()
+
+        assert group.do('a', lambda: 1) == (1, False)
+        assert group.do('b', lambda: 2) == (2, False)
+        assert group.stats.executions == 2
+
+    def test_sequential_calls_are_not_cached(self):
+        """Once the leader finishes, the next call runs again"""
+        group = SingleFlight()
+        counter = iter(range(10))
+
+        assert group.do('key', lambda: next(counter))[0] == 0
+        assert group.do('key', lambda: next(counter))[0] == 1
+
+    def test_error_propagates_to_followers(self):
+        """Followers should see the leader's exception"""
+        group = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        def worker():
+            try:
+                group.do('key', failing)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=worker)
+        follower.start()
+        leader.join()
+        follower.join()
+
+        assert len(errors) == 2
+        assert group.snapshot()['in_flight'] == 0
+
+    def test_async_calls_share_one_execution(self):
+        """Coroutines on one loop should coalesce like threads"""
+        group = SingleFlight()
+        executions = []
+
+        async def slow():
+            executions.append(1)
+            await asyncio.sleep(0.1)
+            return 'answer'
+
+        async def main():
+            return await asyncio.gather(*[group.do_async('key', slow) for _ in range(10)])
+
+        results = asyncio.run(main())
+
+        assert len(executions) == 1
+        assert all(result == 'answer' for result, _ in results)
+        assert sum(1 for _, shared in results if shared) == 9
+
+    def test_async_calls_on_separate_loops_share_one_execution(self):
+        """Each WSGI request runs its async view on its own loop; they should still coalesce"""
+        group = SingleFlight()
+        executions = []
+        results = []
+
+        async def slow():
+            executions.append(1)
+            await asyncio.sleep(0.2)
+            return 'answer'
+
+        def worker():
+            results.append(asyncio.run(group.do_async('key', slow)))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(executions) == 1
+        assert [result for result, _ in results] == ['answer'] * 5
+        assert sum(1 for _, shared in results if shared) == 4
+        assert group.snapshot()['in_flight'] == 0
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        """A leader whose client went away should leave the computation running for the others"""
+        group = SingleFlight()
+        executions = []
+
+        async def slow():
+            executions.append(1)
+            await asyncio.sleep(0.1)
+            return 'answer'
+
+        async def main():
+            leader = asyncio.ensure_future(group.do_async('key', slow))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.ensure_future(group.do_async('key', slow)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*followers)
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return results
+
+        results = asyncio.run(main())
+
+        assert len(executions) == 1
+        assert results == [('answer', True)] * 3
+
+    def test_cancelled_computation_is_retried(self):
+        """Followers of a computation that was itself cancelled should run it again"""
+        group = SingleFlight()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise asyncio.CancelledError()
+            return 'answer'
+
+        async def main():
+            first = group.do_async('key', flaky)
+            return await asyncio.gather(first, group.do_async('key', flaky))
+
+        results = asyncio.run(main())
+
+        assert len(attempts) == 2
+        assert [result for result, _ in results] == ['answer', 'answer']
+        assert group.snapshot()['in_flight'] == 0
+
+    def test_follower_stops_waiting_after_timeout(self):
+        """A hung leader should hold threaded followers for at most wait_timeout"""
+        group = SingleFlight(wait_timeout=0.05)
+        release = threading.Event()
+        results = []
+
+        def hung():
+            release.wait(5)
+            return 'late'
+
+        leader = threading.Thread(target=lambda: results.append(group.do('key', hung)))
+        leader.start()
+        time.sleep(0.02)
+        started = time.perf_counter()
+
+        assert group.do('key', lambda: 'own') == ('own', False)
+        assert time.perf_counter() - started < 1.0
+        assert group.snapshot()['wait_timeouts'] == 1
+
+        release.set()
+        leader.join()
+        assert results == [('late', False)]
+
+    def test_async_error_propagates(self):
+        """Async followers should see the leader's exception"""
+        group = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        async def main():
+            return await asyncio.gather(
+                *[group.do_async('key', failing) for _ in range(3)],
+                return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.fixture
+def slow_ask(monkeypatch):
+    """A one-at-a-time V1 answer that counts executions, behind a fresh SingleFlight group"""
+    executions = []
+
+    async def answer(question):
+        executions.append(question)
+        await asyncio.sleep(0.2)
+        return {'text': 'Hello!', 'sources': [], 'metadata': {'latency_ms': 200}}
+
+    monkeypatch.setattr(ai_service, 'ask_v1_async', answer)
+    monkeypatch.setattr(ai_service, 'inflight', SingleFlight())
+    monkeypatch.setattr(ai_service, 'SINGLE_FLIGHT_ENABLED', True)
+    return executions
+
+
+async def asgi_post(asgi_app, path, payload):
+    """POST a JSON body to an ASGI app; returns (status, parsed body)"""
+    body = json.dumps(payload).encode('utf-8')
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': [(b'content-type', b'application/json')]}
+    messages = iter([{'type': 'http.request', 'body': body, 'more_body': False}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+class TestAskAsyncCoalescing:
+    """Test suite for coalescing concurrent POST /ask/async requests"""
+
+    def test_asgi_requests_coalesce(self, app, slow_ask):
+        asgi_app = AsyncAskApplication(app, url_prefix='')
+
+        async def main():
+            return await asyncio.gather(*[
+                asgi_post(asgi_app, '/ask/async', {'question': 'Hello', 'version': 'v1'}) for _ in range(5)
+            ])
+
+        responses = asyncio.run(main())
+
+        assert slow_ask == ['Hello']
+        assert [status for status, _ in responses] == [200] * 5
+        assert sum(1 for _, body in responses if body['metadata'].get('coalesced')) == 4
+        assert ai_service.inflight.stats.coalesced == 4
+
+    def test_wsgi_requests_coalesce(self, app, slow_ask):
+        app.test_client().get('/health')  # Run the lazy per-app setup before the concurrent requests
+        statuses = []
+
+        def worker():
+            response = app.test_client().post('/ask/async', data=json.dumps({'question': 'Hello', 'version': 'v1'}),
+                                              content_type='application/json')
+            statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert slow_ask == ['Hello']
+        assert statuses == [200] * 5
+        assert ai_service.inflight.stats.coalesced == 4
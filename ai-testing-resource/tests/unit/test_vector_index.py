@@ -0,0 +1,419 @@
+"""
+Unit Test: NumPy Vector Index
+
+Tests the in-process matrix index that can replace Chroma behind
+rag.get_collection(): top-k ordering, Chroma-compatible distances, upsert and
+delete, memory-mapped persistence, deferred writes, metadata-filtered
+(partitioned) queries, agreement with a Chroma
+collection over the same vectors, and the approximate IVF mode (training,
+recall against exact search, incremental inserts and persisted lists).
+"""
+import numpy as np
+import pytest
+from app.vector_index import IVFIndex, NumpyIndex, kmeans, open_index
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = NumpyIndex(str(tmp_path / 'index'))
+    idx.upsert(
+        ids=['a', 'b', 'c'],
+        embeddings=[unit(1, 0, 0), unit(1, 1, 0), unit(0, 0, 1)],
+        documents=['doc a', 'doc b', 'doc c'],
+        metadatas=[{'id': 'a'}, {'id': 'b'}, {'id': 'c'}],
+    )
+    return idx
+
+
+class TestNumpyIndex:
+    """Test suite for NumpyIndex"""
+
+    def test_query_orders_by_distance(self, index):
+        result = index.query(query_embeddings=[unit(1, 0.1, 0)], n_results=2)
+
+        assert result['ids'] == [['a', 'b']]
+        assert result['documents'] == [['doc a', 'doc b']]
+        assert result['metadatas'][0][0] == {'id': 'a'}
+
+    def test_distance_is_squared_l2_of_unit_vectors(self, index):
+        """Same scale as Chroma's default space: 2 - 2 * cosine"""
+        result = index.query(query_embeddings=[unit(1, 0, 0)], n_results=3)
+        distances = dict(zip(result['ids'][0], result['distances'][0]))
+
+        assert distances['a'] == pytest.approx(0.0, abs=1e-6)
+        assert distances['b'] == pytest.approx(2 - 2 * np.cos(np.pi / 4), abs=1e-6)
+        assert distances['c'] == pytest.approx(2.0, abs=1e-6)
+
+    def test_unnormalized_input_is_normalized(self, index):
+        result = index.query(query_embeddings=[[5.0, 0.0, 0.0]], n_results=1)
+
+        assert result['distances'][0][0] == pytest.approx(0.0, abs=1e-6)
+
+    def test_n_results_larger_than_index(self, index):
+        result = index.query(query_embeddings=[unit(0, 0, 1)], n_results=10)
+
+        assert result['ids'][0][0] == 'c'
+        assert len(result['ids'][0]) == 3
+
+    def test_multiple_queries(self, index):
+        result = index.query(query_embeddings=[unit(1, 0, 0), unit(0, 0, 1)], n_results=1)
+
+        assert result['ids'] == [['a'], ['c']]
+
+    def test_batched_queries_match_single_queries(self, tmp_path, monkeypatch):
+        """Queries scored a block at a time rank exactly as when sent one by one"""
+        monkeypatch.setattr('app.vector_index.QUERY_BATCH_ROWS', 7)
+        idx = NumpyIndex(str(tmp_path / 'index'))
+        fill(idx, clustered(300))
+        queries = clustered(20, seed=1)
+
+        batched = idx.query(queries, n_results=5)
+        single = [idx.query([query], n_results=5) for query in queries]
+
+        assert batched['ids'] == [result['ids'][0] for result in single]
+        assert np.allclose(batched['distances'], [result['distances'][0] for result in single], atol=1e-6)
+
+    def test_empty_index(self, tmp_path):
+        result = NumpyIndex(str(tmp_path / 'empty')).query(query_embeddings=[unit(1, 0, 0)], n_results=3)
+
+        assert result['ids'] == [[]]
+
+    def test_upsert_replaces_existing(self, index):
+        index.upsert(ids=['a'], embeddings=[unit(0, 0, 1)], documents=['new a'], metadatas=[{'id': 'a'}])
+
+        assert index.count() == 3
+        assert index.get(ids=['a'])['documents'] == ['new a']
+        result = index.query(query_embeddings=[unit(0, 0, 1)], n_results=2)
+        assert set(result['ids'][0]) == {'a', 'c'}
+
+    def test_delete(self, index):
+        index.delete(ids=['b', 'missing'])
+
+        assert index.count() == 2
+        assert index.get(include=[])['ids'] == ['a', 'c']
+
+    def test_get_skips_unknown_ids(self, index):
+        assert index.get(ids=['c', 'zzz'])['ids'] == ['c']
+
+    def test_id_positions_built_once_per_snapshot(self, index):
+        positions = index._snapshot.positions
+
+        index.get(ids=['b'])
+        assert index._snapshot.positions is positions
+
+        index.upsert(ids=['d'], embeddings=[unit(0, 1, 0)], documents=['doc d'], metadatas=[{'id': 'd'}])
+        assert index._snapshot.positions == {'a': 0, 'b': 1, 'c': 2, 'd': 3}
+
+    def test_dimension_mismatch_raises(self, index):
+        with pytest.raises(ValueError):
+            index.upsert(ids=['d'], embeddings=[[1.0, 0.0]], documents=['d'], metadatas=[{}])
+
+    def test_persists_and_reloads_memory_mapped(self, index):
+        reloaded = NumpyIndex(str(index.path))
+
+        assert reloaded.count() == 3
+        assert isinstance(reloaded._snapshot.matrix, np.memmap)
+        assert reloaded.query(query_embeddings=[unit(1, 0, 0)], n_results=1)['ids'] == [['a']]
+
+    def test_inconsistent_files_start_empty(self, index):
+        (index.path / 'metadata.json').write_text('{"ids": ["a"], "documents": [], "metadatas": []}')
+
+        assert NumpyIndex(str(index.path)).count() == 0
+
+    def test_deferred_writes_publish_once_at_the_end(self, index):
+        with index.deferred_writes():
+            index.upsert(ids=['d'], embeddings=[unit(0, 1, 0)], documents=['doc d'], metadatas=[{'id': 'd'}])
+            index.delete(ids=['a'])
+
+            assert index.count() == 3
+            assert NumpyIndex(str(index.path)).count() == 3
+
+        assert index.get(include=[])['ids'] == ['b', 'c', 'd']
+        assert NumpyIndex(str(index.path)).get(include=[])['ids'] == ['b', 'c', 'd']
+
+    def test_appends_do_not_change_published_rows(self, index):
+        """Readers holding the previous snapshot keep seeing the same vectors"""
+        before = index._snapshot
+        index.upsert(ids=['d'], embeddings=[unit(0, 1, 0)], documents=['doc d'], metadatas=[{'id': 'd'}])
+        index.upsert(ids=['a'], embeddings=[unit(0, 1, 1)], documents=['new a'], metadatas=[{'id': 'a'}])
+
+        assert len(before.ids) == 3
+        assert np.allclose(before.matrix[0], unit(1, 0, 0))
+
+    def test_duplicate_ids_rejected(self, index):
+        with pytest.raises(ValueError):
+            index.upsert(ids=['d', 'd'], embeddings=[unit(0, 1, 0)] * 2, documents=['d', 'd'], metadatas=[{}, {}])
+
+
+class TestPartitionedQuery:
+    """Test suite for where-filtered queries over metadata partitions"""
+
+    @pytest.fixture
+    def categorized(self, tmp_path):
+        idx = NumpyIndex(str(tmp_path / 'index'))
+        idx.upsert(
+            ids=['a', 'b', 'c', 'd'],
+            embeddings=[unit(1, 0, 0), unit(1, 1, 0), unit(0, 0, 1), unit(0, 1, 1)],
+            documents=['doc a', 'doc b', 'doc c', 'doc d'],
+            metadatas=[{'category': 'returns'}, {'category': 'shipping'}, {'category': 'returns'},
+                       {'category': 'pricing'}],
+        )
+        return idx
+
+    def test_equality_filter_searches_one_partition(self, categorized):
+        result = categorized.query(query_embeddings=[unit(1, 1, 0)], n_results=3, where={'category': 'returns'})
+
+        assert result['ids'] == [['a', 'c']]
+
+    def test_in_filter_searches_several(self, categorized):
+        result = categorized.query(query_embeddings=[unit(0, 1, 1)], n_results=2,
+                                   where={'category': {'$in': ['shipping', 'returns']}})
+
+        assert result['ids'] == [['c', 'b']]
+
+    def test_matches_unfiltered_distances(self, categorized):
+        filtered = categorized.query(query_embeddings=[unit(1, 0, 1)], n_results=4, where={'category': 'returns'})
+        full = categorized.query(query_embeddings=[unit(1, 0, 1)], n_results=4)
+        distances = dict(zip(full['ids'][0], full['distances'][0]))
+
+        assert filtered['distances'][0] == [distances[i] for i in filtered['ids'][0]]
+
+    def test_unknown_value_returns_nothing(self, categorized):
+        result = categorized.query(query_embeddings=[unit(1, 0, 0)], n_results=3, where={'category': 'general'})
+
+        assert result['ids'] == [[]]
+
+    def test_partitions_follow_writes(self, categorized):
+        categorized.query(query_embeddings=[unit(1, 0, 0)], n_results=3, where={'category': 'pricing'})
+        categorized.upsert(ids=['e'], embeddings=[unit(1, 0, 0)], documents=['doc e'],
+                           metadatas=[{'category': 'pricing'}])
+        categorized.delete(ids=['d'])
+
+        result = categorized.query(query_embeddings=[unit(1, 0, 0)], n_results=3, where={'category': 'pricing'})
+        assert result['ids'] == [['e']]
+
+    def test_partition_block_built_once_per_snapshot(self, categorized):
+        where = {'category': 'returns'}
+        categorized.query(query_embeddings=[unit(1, 0, 0)], n_results=2, where=where)
+        [partition] = categorized._partitions_for(categorized._snapshot, where)
+        block = partition.block('matrix', categorized._snapshot.matrix)
+
+        categorized.query(query_embeddings=[unit(0, 0, 1)], n_results=2, where=where)
+        assert partition.block('matrix', categorized._snapshot.matrix) is block
+        assert block.flags['C_CONTIGUOUS'] and block.shape == (2, 3)
+
+        categorized.upsert(ids=['e'], embeddings=[unit(1, 0, 0)], documents=['doc e'],
+                           metadatas=[{'category': 'returns'}])
+        [partition] = categorized._partitions_for(categorized._snapshot, where)
+        assert partition.block('matrix', categorized._snapshot.matrix).shape == (3, 3)
+
+    def test_unsupported_filter_raises(self, categorized):
+        with pytest.raises(ValueError):
+            categorized.query(query_embeddings=[unit(1, 0, 0)], where={'category': {'$ne': 'returns'}})
+
+    @pytest.fixture
+    def parity(self, tmp_path):
+        """An IVF and an exact index over the same 2000 rows, tagged odd or even"""
+        vectors = clustered(2000)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=32, nprobe=4, min_train_rows=500)
+        exact = NumpyIndex(str(tmp_path / 'exact'))
+        for index in (ivf, exact):
+            ids = [f'doc{i}' for i in range(len(vectors))]
+            index.upsert(ids=ids, embeddings=vectors, documents=ids,
+                         metadatas=[{'parity': 'even' if i % 2 == 0 else 'odd'} for i in range(len(ids))])
+        return ivf, exact
+
+    def test_ivf_filtered_query_probes_partition_lists(self, parity, monkeypatch):
+        ivf, exact = parity
+        queries = clustered(20, seed=1)
+        expected = exact.query(queries, n_results=5, where={'parity': 'odd'})
+        monkeypatch.setattr(NumpyIndex, 'query', lambda *args, **kwargs: pytest.fail('scanned exactly'))
+
+        approximate = ivf.query(queries, n_results=5, where={'parity': 'odd'})
+
+        assert all(int(i[3:]) % 2 == 1 for ids in approximate['ids'] for i in ids)
+        assert recall(approximate, expected) >= 0.8
+        assert ivf.query(queries, n_results=5, nprobe=32, where={'parity': 'odd'})['ids'] == expected['ids']
+
+    def test_ivf_small_partition_is_exact(self, parity):
+        ivf, exact = parity
+        ivf.min_train_rows = 1500
+        queries = clustered(10, seed=1)
+
+        approximate = ivf.query(queries, n_results=5, nprobe=1, where={'parity': 'odd'})
+
+        assert approximate['ids'] == exact.query(queries, n_results=5, where={'parity': 'odd'})['ids']
+
+
+class TestChromaParity:
+    """NumpyIndex should agree with Chroma over the same vectors"""
+
+    def test_same_metric_and_at_least_as_close(self, tmp_path):
+        """Chroma's HNSW search is approximate: numpy must match its distances and never do worse"""
+        chromadb = pytest.importorskip('chromadb')
+        rng = np.random.default_rng(7)
+        vectors = rng.normal(size=(200, 32)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f'doc{i}' for i in range(len(vectors))]
+        documents = [f'text {i}' for i in range(len(vectors))]
+        metadatas = [{'n': i} for i in range(len(vectors))]
+
+        client = chromadb.PersistentClient(path=str(tmp_path / 'chroma'),
+                                           settings=chromadb.config.Settings(anonymized_telemetry=False))
+        collection = client.get_or_create_collection('parity', embedding_function=None)
+        collection.upsert(ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas)
+        index = NumpyIndex(str(tmp_path / 'numpy'))
+        index.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+        queries = rng.normal(size=(5, 32)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        expected = collection.query(query_embeddings=queries.tolist(), n_results=5)
+        actual = index.query(query_embeddings=queries, n_results=5)
+        everything = index.query(query_embeddings=queries, n_results=len(ids))
+
+        for q in range(len(queries)):
+            exact = dict(zip(everything['ids'][q], everything['distances'][q]))
+            for doc_id, distance in zip(expected['ids'][q], expected['distances'][q]):
+                assert exact[doc_id] == pytest.approx(distance, abs=1e-4)
+            assert all(a <= e + 1e-4 for a, e in zip(actual['distances'][q], expected['distances'][q]))
+
+
+def clustered(n, dim=16, centers=20, seed=0):
+    """Unit vectors around a few random centers, like topic-clustered embeddings"""
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(centers, dim))
+    vectors = means[rng.integers(centers, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def fill(index, vectors, start=0):
+    ids = [f'doc{i}' for i in range(start, start + len(vectors))]
+    index.upsert(ids=ids, embeddings=vectors, documents=ids, metadatas=[{'n': i} for i in range(len(ids))])
+
+
+def recall(approximate, exact):
+    return sum(len(set(a) & set(e)) for a, e in zip(approximate['ids'], exact['ids'])) / sum(
+        len(e) for e in exact['ids'])
+
+
+class TestIVFIndex:
+    """Test suite for the approximate IVF-flat mode"""
+
+    def test_kmeans_separates_clusters(self):
+        vectors = np.concatenate([np.tile(unit(1, 0, 0), (10, 1)), np.tile(unit(0, 1, 0), (10, 1))])
+        centroids = kmeans(vectors, 2)
+
+        assert sorted(np.round(centroids @ unit(1, 0, 0), 3)) == [0.0, 1.0]
+
+    def test_exact_below_min_train_rows(self, tmp_path):
+        vectors = clustered(300)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=8, nprobe=1, min_train_rows=1000)
+        exact = NumpyIndex(str(tmp_path / 'exact'))
+        fill(ivf, vectors)
+        fill(exact, vectors)
+        queries = clustered(20, seed=1)
+
+        assert ivf._ivf.centroids is None
+        assert ivf.query(queries, n_results=5) == exact.query(queries, n_results=5)
+
+    def test_trains_once_large_enough(self, tmp_path):
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=16, min_train_rows=500)
+        fill(ivf, clustered(600))
+
+        assert ivf._ivf.centroids.shape == (16, 16)
+        assert ivf._ivf.trained_rows == 600
+        assert ivf._ivf.offsets[-1] == 600
+
+    def test_probing_every_list_is_exact(self, tmp_path):
+        vectors = clustered(1000)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=16, min_train_rows=500)
+        exact = NumpyIndex(str(tmp_path / 'exact'))
+        fill(ivf, vectors)
+        fill(exact, vectors)
+        queries = clustered(20, seed=1)
+
+        approximate = ivf.query(queries, n_results=5, nprobe=16)
+        expected = exact.query(queries, n_results=5)
+        assert approximate['ids'] == expected['ids']
+        assert np.allclose(approximate['distances'], expected['distances'], atol=1e-5)
+
+    def test_nprobe_trades_recall(self, tmp_path):
+        vectors = clustered(2000)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=32, min_train_rows=500)
+        exact = NumpyIndex(str(tmp_path / 'exact'))
+        fill(ivf, vectors)
+        fill(exact, vectors)
+        queries = clustered(50, seed=1)
+        expected = exact.query(queries, n_results=5)
+
+        low = recall(ivf.query(queries, n_results=5, nprobe=1), expected)
+        high = recall(ivf.query(queries, n_results=5, nprobe=8), expected)
+        assert low <= high
+        assert high >= 0.9
+
+    def test_incremental_insert_is_searchable(self, tmp_path):
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=16, nprobe=2, min_train_rows=500)
+        fill(ivf, clustered(600))
+        new = clustered(1, seed=5)
+        fill(ivf, new, start=600)
+
+        assert ivf._ivf.trained_rows == 600
+        assert ivf.query(new, n_results=1)['ids'] == [['doc600']]
+
+    def test_delete_keeps_lists_aligned(self, tmp_path):
+        vectors = clustered(600)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=16, min_train_rows=500)
+        fill(ivf, vectors)
+        ivf.delete(ids=[f'doc{i}' for i in range(0, 600, 2)])
+
+        assert ivf._ivf.offsets[-1] == ivf.count() == 300
+        assert ivf.query(vectors[1:2], n_results=1)['ids'] == [['doc1']]
+        assert ivf.query(vectors[0:1], n_results=1)['ids'][0] != ['doc0']
+
+    def test_retrains_after_growth(self, tmp_path):
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=8, min_train_rows=200, retrain_growth=2.0)
+        fill(ivf, clustered(200))
+        fill(ivf, clustered(201, seed=2), start=200)
+
+        assert ivf._ivf.trained_rows == 401
+
+    def test_deferred_bulk_load_trains_once(self, tmp_path, monkeypatch):
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=8, min_train_rows=200)
+        trainings = []
+        original = ivf._train
+        monkeypatch.setattr(ivf, '_train', lambda state: trainings.append(1) or original(state))
+        vectors = clustered(1000)
+
+        with ivf.deferred_writes():
+            for start in range(0, 1000, 100):
+                fill(ivf, vectors[start:start + 100], start=start)
+
+        assert len(trainings) == 1
+        assert ivf.count() == 1000
+
+    def test_persists_lists(self, tmp_path):
+        vectors = clustered(600)
+        ivf = IVFIndex(str(tmp_path / 'ivf'), nlist=16, nprobe=2, min_train_rows=500)
+        fill(ivf, vectors)
+
+        reloaded = IVFIndex(str(tmp_path / 'ivf'), nlist=16, nprobe=2, min_train_rows=500)
+
+        assert np.array_equal(reloaded._ivf.centroids, ivf._ivf.centroids)
+        assert reloaded.query(vectors[:5], n_results=3) == ivf.query(vectors[:5], n_results=3)
+
+    def test_exact_index_opened_as_ivf_trains(self, tmp_path):
+        fill(NumpyIndex(str(tmp_path / 'index')), clustered(600))
+
+        ivf = open_index(str(tmp_path / 'index'), 'ivf', nlist=16, min_train_rows=500)
+
+        assert ivf._ivf.centroids is not None
+        assert (tmp_path / 'index' / 'ivf.npz').exists()
+
+    def test_unknown_mode_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            open_index(str(tmp_path / 'index'), 'hnsw')
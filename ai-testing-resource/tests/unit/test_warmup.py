@@ -0,0 +1,207 @@
+"""
+Unit Test: Startup Warmup
+
+Tests the warmup phase that loads the embedding model, index, tokenizer and
+Anthropic client before traffic arrives, and the /ready endpoint that
+reports each component's warm state.
+"""
+import threading
+
+import pytest
+
+import app.warmup as warmup_module
+from app.embedding_cache import CachedEmbeddingFunction, EmbeddingStore
+from app.warmup import FAILED, PENDING, READY, WARMING, ReadinessRegistry, warmup
+
+
+@pytest.fixture
+def components(monkeypatch):
+    """Replace the real components with recorded fakes"""
+    calls = []
+
+    def make(name, detail=None, error=None):
+        def warm():
+            calls.append(name)
+            if error:
+                raise error
+            return detail or {}
+        return warm
+
+    def install(**overrides):
+        names = ['embedding_model', 'collection', 'retrieval', 'tokenizer', 'anthropic_client']
+        monkeypatch.setattr(warmup_module, 'COMPONENTS',
+                            [(name, overrides.get(name, make(name))) for name in names])
+        return ReadinessRegistry(names, optional=warmup_module.OPTIONAL_COMPONENTS)
+
+    install.make = make
+    install.calls = calls
+    return install
+
+
+class TestReadinessRegistry:
+    """Test suite for the per-component readiness record"""
+
+    def test_starts_pending(self):
+        registry = ReadinessRegistry(['a', 'b'])
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == PENDING
+        assert snapshot['components']['a'] == {'status': PENDING, 'load_ms': None}
+        assert not registry.is_ready()
+
+    def test_warming_until_every_component_is_ready(self):
+        registry = ReadinessRegistry(['a', 'b'])
+        registry.start()
+        registry.update('a', READY, 12.34, {'chunks': 3})
+        assert registry.snapshot()['status'] == WARMING
+
+        registry.update('b', READY, 1.0)
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == READY
+        assert snapshot['components']['a'] == {'status': READY, 'load_ms': 12.3, 'detail': {'chunks': 3}}
+        assert 'warmup_ms' in snapshot
+
+    def test_failed_once_finished(self):
+        registry = ReadinessRegistry(['a', 'b'])
+        registry.start()
+        registry.update('a', FAILED, 5.0, error='boom')
+        assert registry.snapshot()['status'] == WARMING
+
+        registry.update('b', READY, 1.0)
+        registry.finish()
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == FAILED
+        assert snapshot['components']['a']['error'] == 'boom'
+
+    def test_optional_component_must_still_finish(self):
+        registry = ReadinessRegistry(['a', 'b'], optional=('b',))
+        registry.start()
+        registry.update('a', READY, 1.0)
+        assert not registry.is_ready()
+
+        registry.update('b', FAILED, 1.0, error='no key')
+        assert registry.is_ready()
+
+    def test_start_only_once(self):
+        registry = ReadinessRegistry(['a'])
+        assert registry.start()
+        assert not registry.start()
+
+
+class TestWarmup:
+    """Test suite for the warmup sequence"""
+
+    def test_warms_every_component_in_order(self, components):
+        registry = components(collection=components.make('collection', {'chunks': 42}))
+
+        assert warmup(registry)
+        assert components.calls == ['embedding_model', 'collection', 'retrieval', 'tokenizer', 'anthropic_client']
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == READY
+        assert snapshot['components']['collection']['detail'] == {'chunks': 42}
+        assert all(c['load_ms'] is not None for c in snapshot['components'].values())
+
+    def test_failure_is_recorded_and_the_rest_still_warm(self, components):
+        registry = components(tokenizer=components.make('tokenizer', error=RuntimeError('encoding unreadable')))
+
+        assert not warmup(registry)
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == FAILED
+        assert snapshot['components']['tokenizer']['status'] == FAILED
+        assert 'unreadable' in snapshot['components']['tokenizer']['error']
+        assert snapshot['components']['anthropic_client']['status'] == READY
+
+    def test_knowledge_base_failure_does_not_block_readiness(self, components):
+        """The app answers without the knowledge base, as run.py always allowed"""
+        error = RuntimeError('index unreadable')
+        registry = components(collection=components.make('collection', error=error),
+                              retrieval=components.make('retrieval', error=error))
+
+        assert warmup(registry)
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == READY
+        assert snapshot['degraded'] == ['collection', 'retrieval']
+        assert 'unreadable' in snapshot['components']['retrieval']['error']
+
+    def test_missing_api_key_does_not_block_readiness(self, components):
+        """Every task lacks the same key; an ALB on /ready must not drain them all"""
+        registry = components(anthropic_client=components.make(
+            'anthropic_client', error=RuntimeError('AI service is not configured')))
+
+        assert warmup(registry)
+        snapshot = registry.snapshot()
+        assert snapshot['status'] == READY
+        assert snapshot['degraded'] == ['anthropic_client']
+        assert 'not configured' in snapshot['components']['anthropic_client']['error']
+
+    def test_runs_once(self, components):
+        registry = components()
+        warmup(registry)
+        warmup(registry)
+        assert components.calls.count('embedding_model') == 1
+
+    def test_background_thread(self, components):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_model():
+            started.set()
+            release.wait(5)
+            return {}
+
+        registry = components(embedding_model=slow_model)
+        thread = warmup_module.start_warmup(registry)
+        assert started.wait(5)
+        assert registry.snapshot()['components']['embedding_model']['status'] == WARMING
+
+        release.set()
+        thread.join(5)
+        assert registry.is_ready()
+
+    def test_embedding_warmup_bypasses_the_store(self, tmp_path, monkeypatch):
+        """The model itself runs once; the warmup text is not stored"""
+        import app.rag as rag
+        model_calls = []
+
+        def model(texts):
+            model_calls.append(list(texts))
+            return [[0.0, 1.0, 0.0] for _ in texts]
+
+        store = EmbeddingStore(str(tmp_path / 'cache.sqlite'))
+        monkeypatch.setattr(rag, 'get_embedding_function', lambda: CachedEmbeddingFunction(model, store, 'm'))
+
+        assert warmup_module._warm_embedding_model() == {'dimensions': 3}
+        assert len(model_calls) == 1
+        assert len(store) == 0
+
+
+class TestReadyEndpoint:
+    """Test suite for GET /ready"""
+
+    def test_not_ready_before_warmup(self, client, monkeypatch):
+        monkeypatch.setattr(warmup_module, 'readiness', ReadinessRegistry(['embedding_model']))
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['status'] == PENDING
+
+    def test_ready_after_warmup(self, client, components, monkeypatch):
+        registry = components()
+        warmup(registry)
+        monkeypatch.setattr(warmup_module, 'readiness', registry)
+
+        response = client.get('/ready')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == READY
+        assert set(data['components']) == {'embedding_model', 'collection', 'retrieval', 'tokenizer',
+                                           'anthropic_client'}
+
+    def test_disabled_warmup_is_ready(self, client, monkeypatch):
+        import config
+        monkeypatch.setattr(config, 'WARMUP_ENABLED', False)
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.get_json()['warmup'] == 'disabled'
+
+    def test_health_stays_liveness(self, client, monkeypatch):
+        monkeypatch.setattr(warmup_module, 'readiness', ReadinessRegistry(['embedding_model']))
+        assert client.get('/health').status_code == 200
@@ -69,12 +69,15 @@ resource "aws_lb_target_group" "main" {
   vpc_id      = var.vpc_id
   target_type = "ip"
 
+  # Readiness, not liveness: /ready answers 503 until startup warmup has
+  # loaded the embedding model, index and tokenizer, so a new task gets no
+  # traffic before it is warm. The ECS container check stays on /health.
   health_check {
     enabled             = true
     healthy_threshold   = 2
     interval            = 30
     matcher             = "200"
-    path                = "/ai-evals/health"
+    path                = "/ai-evals/ready"
     port                = "traffic-port"
     protocol            = "HTTP"
     timeout             = 5
@@ -216,6 +216,7 @@ resource "aws_ecs_task_definition" "main" {
         }
       }
 
+      # Liveness only; the ALB target group routes on /ready
       healthCheck = {
         command     = ["CMD-SHELL", "curl -f http://localhost:${var.container_port}/ai-evals/health || exit 1"]
         interval    = 30
@@ -297,6 +298,10 @@ resource "aws_ecs_service" "main" {
     }
   }
 
+  # The target group checks /ready, which fails while startup warmup runs;
+  # don't replace tasks for that before warmup has had time to finish
+  health_check_grace_period_seconds = var.target_group_arn != "" ? 180 : null
+
   # Service discovery (for API Gateway fallback)
   service_registries {
     registry_arn = aws_service_discovery_service.main.arn